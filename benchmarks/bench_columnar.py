@@ -0,0 +1,63 @@
+"""
+Benchmark for the columnar outage filter and device join.
+
+Compares the per-dict filter and join in outages_processor.api against the columnar engine in
+outages_processor.columnar, on synthetic outages for a large number of devices. The columnar engine is timed both
+with and without loading the outages into columns, as the load is paid once per run and shared by every site.
+
+Run from the repository root: python -m benchmarks.bench_columnar [--count 1000000]
+"""
+import argparse
+
+from benchmarks.synthetic import generate_outages
+from benchmarks.timing import compare
+from outages_processor.api.outages import (
+    DEFAULT_DATETIME_EARLIEST,
+    add_device_info_to_outages,
+    filter_outages_after_datetime,
+)
+from outages_processor.api.site import SiteDeviceInfo
+from outages_processor.columnar import OutageColumns
+from outages_processor.columnar import add_device_info_to_outages as add_device_info_to_columns
+from outages_processor.columnar import filter_outages_after_datetime as filter_columns_after_datetime
+
+
+def main():
+    """
+    Runs the benchmark and prints the results
+    """
+    parser = argparse.ArgumentParser("Columnar outage filter and join benchmark")
+    parser.add_argument("--count", type=int, default=1000000, help="Number of outages to process")
+    parser.add_argument("--devices", type=int, default=10000, help="Number of distinct devices")
+    parser.add_argument("--site-devices", type=int, default=1000, help="Number of devices in the site")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of runs, the fastest is reported")
+    args = parser.parse_args()
+
+    outages = generate_outages(args.count, args.devices)
+    site_devices_map = {
+        f"device-{index}": SiteDeviceInfo(f"device-{index}", f"Device {index}") for index in range(args.site_devices)
+    }
+    columns = OutageColumns.from_outages(outages)
+
+    def per_dict():
+        filtered = filter_outages_after_datetime(outages, DEFAULT_DATETIME_EARLIEST)
+        return add_device_info_to_outages(filtered, site_devices_map)
+
+    def columnar(loaded=None):
+        filtered = filter_columns_after_datetime(loaded or OutageColumns.from_outages(outages),
+                                                 DEFAULT_DATETIME_EARLIEST)
+        return add_device_info_to_columns(filtered, site_devices_map)
+
+    implementations = {
+        "per-dict (original)": per_dict,
+        "columnar incl. load": columnar,
+        "columnar pre-loaded": lambda: columnar(columns),
+    }
+    expected = per_dict()
+    print(f"Filtering and joining {args.count} outages for {args.site_devices} of {args.devices} devices, "
+          f"best of {args.repeat} runs")
+    compare(implementations, expected, args.count, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
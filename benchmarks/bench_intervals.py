@@ -0,0 +1,72 @@
+"""
+Benchmark for time range queries over outages.
+
+Compares linear scans of the outage dicts against queries on an outages_processor.api.IntervalIndex, for the cutoff
+filter, window overlap queries for single devices and for every device. The index is built once and shared by every
+query, so the time to build it is reported separately, along with how many queries it takes to pay for itself.
+
+Run from the repository root: python -m benchmarks.bench_intervals [--count 1000000]
+"""
+import argparse
+import datetime
+import random
+import timeit
+
+from benchmarks.synthetic import generate_outages
+from outages_processor.api.intervals import IntervalIndex
+from outages_processor.api.outages import DEFAULT_DATETIME_EARLIEST, filter_outages_after_datetime
+from outages_processor.utils.timestamps import parse_timestamp
+
+
+def main():
+    """
+    Runs the benchmark and prints the results
+    """
+    parser = argparse.ArgumentParser("Outage interval index benchmark")
+    parser.add_argument("--count", type=int, default=1000000, help="Number of outages to index")
+    parser.add_argument("--devices", type=int, default=10000, help="Number of distinct devices")
+    parser.add_argument("--queries", type=int, default=20, help="Number of random windows queried")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of runs, the fastest is reported")
+    args = parser.parse_args()
+
+    outages = generate_outages(args.count, args.devices)
+    rng = random.Random(0)
+    first = datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc)
+    windows = [
+        (start, start + datetime.timedelta(days=1), f"device-{rng.randrange(args.devices)}")
+        for start in (first + datetime.timedelta(days=rng.randrange(4 * 365)) for _ in range(args.queries))
+    ]
+
+    def scan_overlapping(start, end, device_id=None):
+        return [outage for outage in outages
+                if (device_id is None or outage["id"] == device_id)
+                and parse_timestamp(outage["begin"]) <= end and parse_timestamp(outage["end"]) >= start]
+
+    build = min(timeit.repeat(lambda: IntervalIndex(outages), number=1, repeat=args.repeat))
+    index = IntervalIndex(outages)
+    queries = {
+        "cutoff filter": (
+            lambda: filter_outages_after_datetime(outages, DEFAULT_DATETIME_EARLIEST),
+            lambda: filter_outages_after_datetime(index, DEFAULT_DATETIME_EARLIEST),
+        ),
+        "device window": (
+            lambda: [scan_overlapping(*window) for window in windows],
+            lambda: [index.overlapping(*window) for window in windows],
+        ),
+        "feed window": (
+            lambda: [scan_overlapping(start, end) for start, end, _ in windows[:1]],
+            lambda: [index.overlapping(start, end) for start, end, _ in windows[:1]],
+        ),
+    }
+    print(f"Querying {args.count} outages for {args.devices} devices, best of {args.repeat} runs")
+    print(f"{'index build':<16} {build * 1000:10.1f} ms")
+    for name, (scan, query) in queries.items():
+        assert scan() == query(), f"{name} gave different results"
+        scan_best = min(timeit.repeat(scan, number=1, repeat=args.repeat))
+        query_best = min(timeit.repeat(query, number=1, repeat=args.repeat))
+        print(f"{name:<16} scan {scan_best * 1000:10.1f} ms  index {query_best * 1000:10.3f} ms "
+              f"{scan_best / query_best:10.1f}x  build repaid after {build / (scan_best - query_best):6.1f} runs")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+"""
+Benchmark for the JSON backends used for API request and response bodies.
+
+Parses a synthetic outages feed from bytes and encodes the joined outages for upload with each installed backend,
+as utils.http does for /outages and /site-outages.
+
+Run from the repository root: python -m benchmarks.bench_json [--count 200000]
+"""
+import argparse
+import json
+import timeit
+
+from benchmarks.synthetic import generate_outages
+from outages_processor.utils.serialization import available_backends, resolve_backend
+
+
+def main():
+    """
+    Runs the benchmark and prints the results
+    """
+    parser = argparse.ArgumentParser("JSON backend benchmark")
+    parser.add_argument("--count", type=int, default=200000, help="Number of outages")
+    parser.add_argument("--repeat", type=int, default=5, help="Number of times to repeat each measurement")
+    args = parser.parse_args()
+
+    outages = [{**outage, "name": f"Device {outage['id']}"} for outage in generate_outages(args.count, 1000)]
+    body = json.dumps(outages).encode("utf-8")
+
+    print(f"JSON backends for {args.count} outages, {len(body) / 1e6:.1f} MB, best of {args.repeat}")
+    for backend in available_backends():
+        serializer = resolve_backend(backend)
+        loads = min(timeit.repeat(lambda serializer=serializer: serializer.loads(body), number=1, repeat=args.repeat))
+        dumps = min(timeit.repeat(lambda serializer=serializer: serializer.dumps(outages), number=1,
+                                  repeat=args.repeat))
+        print(f"{backend:<8} loads {loads * 1000:8.1f} ms   dumps {dumps * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
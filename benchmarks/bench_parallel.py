@@ -0,0 +1,64 @@
+"""
+Benchmark for the multi-process outage filter and device join.
+
+Compares the single process filter and multi-site join in outages_processor.api against the sharded filter and join
+in outages_processor.parallel, at increasing numbers of worker processes, on synthetic outages for a large number of
+devices and several sites. Each parallel run includes copying the outages into shared memory, which is paid once per
+run. The worker processes are started by the first run for each number of processes and then reused, as they are by a
+daemon. Speed-ups are bounded by the number of CPUs, which is printed with the results.
+
+Run from the repository root: python -m benchmarks.bench_parallel [--count 1000000] [--processes 1,2,4,8]
+"""
+import argparse
+import os
+
+from benchmarks.synthetic import generate_outages
+from benchmarks.timing import compare
+from outages_processor.api.outages import (
+    DEFAULT_DATETIME_EARLIEST,
+    add_device_info_to_site_outages,
+    filter_outages_after_datetime,
+)
+from outages_processor.api.site import SiteDeviceInfo
+from outages_processor.parallel import add_device_info_to_site_outages as add_device_info_to_site_outages_parallel
+
+
+def main():
+    """
+    Runs the benchmark and prints the results
+    """
+    parser = argparse.ArgumentParser("Parallel outage filter and join benchmark")
+    parser.add_argument("--count", type=int, default=1000000, help="Number of outages to process")
+    parser.add_argument("--devices", type=int, default=10000, help="Number of distinct devices")
+    parser.add_argument("--sites", type=int, default=10, help="Number of sites")
+    parser.add_argument("--site-devices", type=int, default=1000, help="Number of devices in each site")
+    parser.add_argument("--processes", default="1,2,4,8", help="Comma separated numbers of worker processes")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of runs, the fastest is reported")
+    args = parser.parse_args()
+
+    outages = generate_outages(args.count, args.devices)
+    site_devices_maps = {
+        f"site-{site}": {
+            f"device-{index}": SiteDeviceInfo(f"device-{index}", f"Device {index}")
+            for index in range(site * args.site_devices, (site + 1) * args.site_devices)
+        }
+        for site in range(args.sites)
+    }
+
+    def single_process():
+        filtered = filter_outages_after_datetime(outages, DEFAULT_DATETIME_EARLIEST)
+        return add_device_info_to_site_outages(filtered, site_devices_maps)
+
+    implementations = {"single process": single_process}
+    for processes in map(int, args.processes.split(",")):
+        implementations[f"{processes} processes"] = (
+            lambda processes=processes: add_device_info_to_site_outages_parallel(outages, site_devices_maps, processes)
+        )
+    expected = single_process()
+    print(f"Filtering and joining {args.count} outages for {args.sites} sites of {args.site_devices} devices, "
+          f"best of {args.repeat} runs on {os.cpu_count()} CPUs")
+    compare(implementations, expected, args.count, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Benchmark for the memory used per outage by outage dicts and compact OutageRecord objects.
+
+Parses a synthetic outages feed with json, as the API helpers do, and measures the memory held by the resulting list
+of dicts and by the same outages converted to records, before and after joining them with the site devices.
+
+Run from the repository root: python -m benchmarks.bench_records [--count 200000]
+"""
+import argparse
+import gc
+import json
+import tracemalloc
+
+from benchmarks.synthetic import generate_outages
+from outages_processor.api.outages import add_device_info_to_outages
+from outages_processor.api.records import OutageRecord
+from outages_processor.api.site import SiteDeviceInfo
+
+
+def measure(build) -> tuple:
+    """
+    Measures the memory held by the result of a function
+    :param build: Function building the value to measure
+    :return: A (value, bytes) tuple
+    """
+    gc.collect()
+    tracemalloc.start()
+    value = build()
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return value, size
+
+
+def main():
+    """
+    Runs the benchmark and prints the results
+    """
+    parser = argparse.ArgumentParser("Outage record memory benchmark")
+    parser.add_argument("--count", type=int, default=200000, help="Number of outages")
+    parser.add_argument("--devices", type=int, default=1000, help="Number of distinct devices")
+    args = parser.parse_args()
+
+    body = json.dumps(generate_outages(args.count, args.devices))
+    site_devices_map = {
+        f"device-{index}": SiteDeviceInfo(f"device-{index}", f"Device {index}") for index in range(args.devices)
+    }
+    outages, dict_bytes = measure(lambda: json.loads(body))
+    records, record_bytes = measure(lambda: [OutageRecord.from_dict(outage) for outage in json.loads(body)])
+    _, joined_dict_bytes = measure(lambda: add_device_info_to_outages(outages, site_devices_map))
+    _, joined_record_bytes = measure(lambda: add_device_info_to_outages(records, site_devices_map))
+
+    print(f"Memory for {args.count} outages across {args.devices} devices")
+    for name, dicts, compact in (("parsed", dict_bytes, record_bytes),
+                                 ("joined", joined_dict_bytes, joined_record_bytes)):
+        print(f"{name:<8} dicts {dicts / args.count:8.1f} bytes/outage   records {compact / args.count:8.1f} "
+              f"bytes/outage   {dicts / compact:5.1f}x smaller")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""
+Benchmark for the outage begin time filter.
+
+Compares the original iso8601 based filter against the fast-path parser and the string comparison option of
+outages_processor.api.filter_outages_after_datetime, on synthetic outages in the API timestamp format.
+
+Run from the repository root: python -m benchmarks.bench_timestamps [--count 100000]
+"""
+import argparse
+import timeit
+
+import iso8601
+
+from benchmarks.synthetic import generate_outages
+from outages_processor.api.outages import DEFAULT_DATETIME_EARLIEST, filter_outages_after_datetime
+
+
+def filter_iso8601(outages: list[dict]) -> list[dict]:
+    """
+    The original implementation of the filter, parsing every begin time with iso8601
+    """
+    return [item for item in outages if iso8601.parse_date(item.get("begin")) >= DEFAULT_DATETIME_EARLIEST]
+
+
+def main():
+    """
+    Runs the benchmark and prints the results
+    """
+    parser = argparse.ArgumentParser("Outage begin time filter benchmark")
+    parser.add_argument("--count", type=int, default=100000, help="Number of outages to filter")
+    parser.add_argument("--devices", type=int, default=1000, help="Number of distinct devices")
+    parser.add_argument("--repeat", type=int, default=5, help="Number of runs, the fastest is reported")
+    args = parser.parse_args()
+
+    outages = generate_outages(args.count, args.devices)
+    implementations = {
+        "iso8601 (original)": filter_iso8601,
+        "fast parser": lambda items: filter_outages_after_datetime(items, DEFAULT_DATETIME_EARLIEST),
+        "string compare": lambda items: filter_outages_after_datetime(items, DEFAULT_DATETIME_EARLIEST, True),
+    }
+    expected = filter_iso8601(outages)
+    baseline = None
+    print(f"Filtering {args.count} outages, best of {args.repeat} runs")
+    for name, implementation in implementations.items():
+        assert implementation(outages) == expected, f"{name} gave different results"
+        best = min(timeit.repeat(lambda impl=implementation: impl(outages), number=1, repeat=args.repeat))
+        baseline = baseline or best
+        print(f"{name:<20} {best * 1000:10.1f} ms {args.count / best:14,.0f} outages/s {baseline / best:6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,318 @@
+"""
+Local mock of the outages API, serving synthetic data over real sockets.
+
+Serves GET /outages, GET /site-info/{site} and POST /site-outages/{site} from the root of the server, so clients
+should use http://host:port as the API base URL. Latency, server errors and rate limiting can be injected to
+load-test the client's connection pooling, retries and concurrency without a network.
+
+Run from the repository root, then point the client at it with OP_API_BASE_URL:
+
+    python -m benchmarks.mock_server --port 8080 --count 1m --devices 100k --latency 0.05 --error-rate 0.1
+    OP_API_BASE_URL=http://127.0.0.1:8080 process_outages
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import math
+import multiprocessing
+import random
+import threading
+import time
+from collections import Counter, namedtuple
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmarks.synthetic import generate_outages, generate_site_info
+from outages_processor.utils.serialization import dumps
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+SITE_NAME = "norwich-pear-tree"
+SUFFIXES = {"k": 1000, "m": 1000000}
+
+
+class Dataset(namedtuple("_Dataset", ("outages_body", "site_info_bodies"))):
+    """
+    Container class for the pre-encoded response bodies served by the mock.
+    site_info_bodies is a dictionary of site name to encoded site information.
+    """
+
+    @classmethod
+    def generate(cls, count: int, devices: int, site_devices: int, site_names: tuple = (SITE_NAME,)):
+        """
+        Generates a synthetic dataset, see benchmarks.synthetic
+        :param count: Number of outages
+        :param devices: Number of devices the outages are spread across
+        :param site_devices: Number of those devices in each site
+        :param site_names: Names of the sites to serve
+        :return: The dataset
+        """
+        return cls(
+            dumps(generate_outages(count, devices)),
+            {site_name: dumps(generate_site_info(site_name, devices, site_devices)) for site_name in site_names},
+        )
+
+
+class Faults(namedtuple("_Faults", ("latency", "jitter", "error_rate", "rate_limit", "burst", "seed"),
+                        defaults=(0.0, 0.0, 0.0, 0.0, 1, 0))):
+    """
+    Container class for the faults injected by the mock.
+    latency is the delay in seconds before every response, plus a random delay of up to jitter seconds. error_rate is
+    the fraction of requests answered with a 500 or 503 error. rate_limit is the sustained number of requests per
+    second accepted across all connections, with up to burst requests at once, 0 for no limit. Requests over the limit
+    are answered with 429 Too Many Requests and a Retry-After header.
+    """
+
+
+class RateLimiter:  # pylint: disable=too-few-public-methods
+    """
+    Thread-safe token bucket
+    """
+    def __init__(self, rate: float, burst: int):
+        """
+        :param rate: Tokens added per second
+        :param burst: Maximum number of tokens held
+        """
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """
+        Takes a token if one is available
+        :return: 0 if a token was taken, otherwise the number of seconds until one will be available
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+
+class MockAPIServer(ThreadingHTTPServer):
+    """
+    Mock API server, serving each connection on its own thread and counting the responses it sends
+    """
+    daemon_threads = True
+
+    def __init__(self, dataset: Dataset, faults: Faults = None, address: tuple = ("127.0.0.1", 0)):
+        """
+        :param dataset: The data to serve
+        :param faults: Faults to inject, none by default
+        :param address: (host, port) to listen on, port 0 picks a free port
+        """
+        super().__init__(address, MockAPIHandler)
+        self.dataset = dataset
+        self.etags = {body: f'"{hashlib.sha256(body).hexdigest()[:16]}"'
+                      for body in (dataset.outages_body, *dataset.site_info_bodies.values())}
+        self.faults = faults or Faults()
+        self.limiter = RateLimiter(self.faults.rate_limit, self.faults.burst) if self.faults.rate_limit else None
+        self.random = random.Random(self.faults.seed)
+        self.stats = Counter()
+        self.lock = threading.Lock()
+
+    def record(self, stat: str, amount: int = 1) -> None:
+        """
+        Increments a statistic
+        """
+        with self.lock:
+            self.stats[stat] += amount
+
+    def inject_fault(self) -> tuple:
+        """
+        Applies the injected latency and decides whether the request fails
+        :return: None to serve the request, or a (status, headers) tuple for the error response to send instead
+        """
+        faults = self.faults
+        with self.lock:
+            delay = faults.latency + (self.random.uniform(0, faults.jitter) if faults.jitter else 0)
+            failed = faults.error_rate and self.random.random() < faults.error_rate
+            status = self.random.choice((500, 503)) if failed else None
+        if delay:
+            time.sleep(delay)
+        wait = self.limiter.acquire() if self.limiter else 0
+        if wait:
+            return 429, {"Retry-After": str(math.ceil(wait))}
+        if status:
+            return status, {}
+        return None
+
+
+class MockAPIHandler(BaseHTTPRequestHandler):
+    """
+    Request handler for the mock API
+    """
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately, without this Nagle's algorithm delays every response on keep-alive
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        """
+        Requests are not logged, the logging would dominate the time taken to serve them
+        """
+
+    def _send(self, status: int, body: bytes = b"", headers: dict = None) -> None:
+        self.server.record(str(status))
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_body(self, body: bytes) -> None:
+        etag = self.server.etags[body]
+        if self.headers.get("If-None-Match") == etag:
+            self._send(304, headers={"ETag": etag})
+        else:
+            self._send(200, body, headers={"ETag": etag})
+
+    def _read_body(self) -> bytes:
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.server.record("bytes_received", len(body))
+        encoding = self.headers.get("Content-Encoding")
+        if encoding == "gzip":
+            return gzip.decompress(body)
+        if encoding == "zstd" and zstandard is not None:
+            return zstandard.ZstdDecompressor().decompressobj().decompress(body)
+        return body
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        """
+        Serves the outages feed and site information
+        """
+        fault = self.server.inject_fault()
+        site_name = self.path[len("/site-info/"):] if self.path.startswith("/site-info/") else None
+        if fault:
+            self._send(fault[0], b'{"message":"Injected fault"}', fault[1])
+        elif self.path == "/outages":
+            self._send_body(self.server.dataset.outages_body)
+        elif site_name in self.server.dataset.site_info_bodies:
+            self._send_body(self.server.dataset.site_info_bodies[site_name])
+        else:
+            self._send(404, b'{"message":"Not found"}')
+
+    def do_POST(self):  # pylint: disable=invalid-name
+        """
+        Accepts and counts uploaded site outages
+        """
+        body = self._read_body()
+        fault = self.server.inject_fault()
+        if fault:
+            self._send(fault[0], b'{"message":"Injected fault"}', fault[1])
+        elif self.path.startswith("/site-outages/"):
+            try:
+                self.server.record("outages_uploaded", len(json.loads(body)))
+            except ValueError:
+                self._send(400, b'{"message":"Invalid JSON"}')
+                return
+            self._send(200)
+        else:
+            self._send(404, b'{"message":"Not found"}')
+
+
+def create_server(dataset: Dataset, faults: Faults = None, host: str = "127.0.0.1", port: int = 0) -> MockAPIServer:
+    """
+    Creates a mock API server
+    :param dataset: The data to serve
+    :param faults: Faults to inject, none by default
+    :param host: Address to listen on
+    :param port: Port to listen on, 0 to pick a free port
+    :return: The server, call serve_forever to start it
+    """
+    return MockAPIServer(dataset, faults, (host, port))
+
+
+def _serve(dataset_args: tuple, faults: Faults, connection) -> None:
+    server = create_server(Dataset.generate(*dataset_args), faults)
+    connection.send(server.server_address)
+    server.serve_forever()
+
+
+class MockServerProcess:
+    """
+    Runs a mock API server in a child process, so serving requests does not compete with the client for the GIL.
+    Use as a context manager, the base URL of the server is available once entered.
+    """
+    def __init__(self, count: int, devices: int, site_devices: int, faults: Faults = None):
+        """
+        :param count: Number of outages to serve
+        :param devices: Number of devices the outages are spread across
+        :param site_devices: Number of those devices in the site
+        :param faults: Faults to inject, none by default
+        """
+        self.dataset_args = (count, devices, site_devices)
+        self.faults = faults
+        self.base_url = None
+        self._process = None
+
+    def __enter__(self) -> "MockServerProcess":
+        receiver, sender = multiprocessing.Pipe(duplex=False)
+        self._process = multiprocessing.Process(target=_serve, args=(self.dataset_args, self.faults, sender),
+                                                daemon=True)
+        self._process.start()
+        host, port = receiver.recv()
+        self.base_url = f"http://{host}:{port}"
+        return self
+
+    def __exit__(self, *exc_info):
+        self._process.terminate()
+        self._process.join()
+
+
+def parse_count(value: str) -> int:
+    """
+    Parses a count with an optional k or m suffix, e.g. 100k
+    """
+    value = value.strip().lower()
+    if value[-1:] in SUFFIXES:
+        return int(float(value[:-1]) * SUFFIXES[value[-1]])
+    return int(value)
+
+
+def main():
+    """
+    Runs the mock server until interrupted, then prints the number of responses by status code
+    """
+    parser = argparse.ArgumentParser("Mock outages API server")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on")
+    parser.add_argument("--port", type=int, default=8080, help="Port to listen on")
+    parser.add_argument("--count", type=parse_count, default=100000, help="Number of outages, e.g. 1m")
+    parser.add_argument("--devices", type=parse_count, default=1000, help="Number of distinct devices")
+    parser.add_argument("--site-devices", type=parse_count, default=100, help="Number of devices in each site")
+    parser.add_argument("--sites", type=lambda value: tuple(value.split(",")), default=(SITE_NAME,),
+                        help="Comma separated names of the sites to serve")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds to delay every response by")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Maximum random extra delay in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests to fail with a 5xx")
+    parser.add_argument("--rate-limit", type=float, default=0.0,
+                        help="Requests per second to accept before responding 429, 0 for no limit")
+    parser.add_argument("--burst", type=int, default=10, help="Number of requests accepted at once under the limit")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for the injected errors and jitter")
+    args = parser.parse_args()
+
+    print(f"Generating {args.count} outages across {args.devices} devices", flush=True)
+    dataset = Dataset.generate(args.count, args.devices, args.site_devices, args.sites)
+    faults = Faults(args.latency, args.jitter, args.error_rate, args.rate_limit, args.burst, args.seed)
+    server = create_server(dataset, faults, args.host, args.port)
+    print(f"Serving on http://{args.host}:{server.server_address[1]} with {faults}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(json.dumps(dict(server.stats), indent=2))
+
+
+if __name__ == "__main__":
+    main()
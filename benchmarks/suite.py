@@ -0,0 +1,192 @@
+"""
+Benchmark suite for the outage processing pipeline.
+
+Generates synthetic feeds at several scales and measures the wall time, throughput and peak memory of each stage:
+the cutoff filter, the device join, joining the feed with several sites by scanning it once per site (sites_scan)
+or through an OutageIndex built once (sites_index), serializing the joined outages for upload and
+process_outages_inner end to end against a local mock API server. Wall time is the best of several runs, peak memory
+is measured by tracemalloc in a separate run so the tracing does not affect the timings. The end to end peak excludes
+the mock server, which runs in its own process.
+
+Results are written as JSON so runs can be compared, pass a previous results file as --baseline to print the speedup
+of each stage against it.
+
+Run from the repository root: python -m benchmarks.suite [--scales 1k:10,100k:1k,1m:100k] [--output results.json]
+"""
+import argparse
+import datetime
+import json
+import logging
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+import unittest.mock
+
+from benchmarks.mock_server import SITE_NAME, MockServerProcess, parse_count
+from benchmarks.synthetic import generate_outages, generate_site_info
+from outages_processor.api.index import OutageIndex
+from outages_processor.api.outages import DEFAULT_DATETIME_EARLIEST, add_device_info_to_outages
+from outages_processor.api.outages import filter_outages_after_datetime
+from outages_processor.api.site import build_devices_map, get_site_info_cache
+from outages_processor.scripts.outages import process_outages_inner
+from outages_processor.utils.http import close_session
+from outages_processor.utils.serialization import get_serializer
+
+
+# Number of sites joined with the feed by the sites_scan and sites_index stages
+SITES = 50
+
+
+def parse_scales(value: str) -> list[tuple]:
+    """
+    Parses scales given as a comma separated list of outages:devices pairs, e.g. 1k:10,100k:1k
+    """
+    scales = []
+    for scale in value.split(","):
+        count, _, devices = scale.partition(":")
+        scales.append((parse_count(count), parse_count(devices or "1k")))
+    return scales
+
+
+def measure(stage, repeat: int) -> tuple:
+    """
+    Measures a stage
+    :param stage: Function running the stage
+    :param repeat: Number of timed runs, the fastest is reported
+    :return: A (seconds, peak bytes) tuple
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        stage()
+        timings.append(time.perf_counter() - start)
+    tracemalloc.start()
+    stage()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return min(timings), peak
+
+
+def stages(count: int, devices: int, site_devices: int, base_url: str) -> dict:
+    """
+    Builds the stages to measure for one scale, each taking the output of the previous stage as prepared input
+    """
+    outages = generate_outages(count, devices)
+    site_devices_map = build_devices_map(generate_site_info(SITE_NAME, devices, site_devices))
+    filtered = filter_outages_after_datetime(outages, DEFAULT_DATETIME_EARLIEST)
+    joined = add_device_info_to_outages(filtered, site_devices_map)
+
+    def sites_index():
+        index = OutageIndex(filtered)
+        return [add_device_info_to_outages(index, site_devices_map) for _ in range(SITES)]
+
+    def end_to_end():
+        # Every run fetches the site information again, as a fresh process would
+        get_site_info_cache().clear()
+        with unittest.mock.patch("outages_processor.utils.http.API_BASE_URL", base_url):
+            process_outages_inner(SITE_NAME)
+
+    return {
+        "filter": lambda: filter_outages_after_datetime(outages, DEFAULT_DATETIME_EARLIEST),
+        "join": lambda: add_device_info_to_outages(filtered, site_devices_map),
+        "sites_scan": lambda: [add_device_info_to_outages(filtered, site_devices_map) for _ in range(SITES)],
+        "sites_index": sites_index,
+        "serialize": lambda: get_serializer().dumps(joined),
+        "end_to_end": end_to_end,
+    }
+
+
+def run_scale(count: int, devices: int, args: argparse.Namespace) -> list[dict]:
+    """
+    Measures every stage at one scale
+    :return: A result dict for each stage
+    """
+    site_devices = max(1, devices // 10)
+    results = []
+    with MockServerProcess(count, devices, site_devices) as server:
+        for stage, function in stages(count, devices, site_devices, server.base_url).items():
+            seconds, peak = measure(function, args.repeat)
+            results.append({
+                "outages": count,
+                "devices": devices,
+                "site_devices": site_devices,
+                "stage": stage,
+                "wall_seconds": seconds,
+                "outages_per_second": count / seconds if seconds else None,
+                "peak_bytes": peak,
+            })
+            print(f"{count:>9} {devices:>7} {stage:<11} {seconds * 1000:10.1f} ms {count / seconds:14,.0f} outages/s "
+                  f"{peak / 1e6:9.1f} MB{compare(results[-1], args.baseline)}", file=sys.stderr)
+    close_session()
+    return results
+
+
+def compare(result: dict, baseline: dict) -> str:
+    """
+    Formats the speedup of a result against the same stage and scale in a baseline run
+    """
+    previous = baseline.get((result["outages"], result["devices"], result["stage"]))
+    if previous is None:
+        return ""
+    return f" {previous['wall_seconds'] / result['wall_seconds']:6.2f}x vs baseline"
+
+
+def load_baseline(path: str) -> dict:
+    """
+    Loads a previous results file, keyed by scale and stage
+    """
+    if not path:
+        return {}
+    with open(path, "r", encoding="utf-8") as file_handle:
+        results = json.load(file_handle)["results"]
+    return {(result["outages"], result["devices"], result["stage"]): result for result in results}
+
+
+def environment() -> dict:
+    """
+    Describes the environment the benchmarks ran in, so results from different runs can be told apart
+    """
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "json_backend": get_serializer().name,
+    }
+
+
+def main():
+    """
+    Runs the benchmark suite and writes the results
+    """
+    parser = argparse.ArgumentParser("Outage processing pipeline benchmark suite")
+    parser.add_argument("--scales", type=parse_scales, default=parse_scales("1k:10,100k:1k,1m:100k"),
+                        help="Comma separated outages:devices pairs, each device count is also split 10:1 into "
+                             "the site, e.g. 1k:10,100k:1k")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of timed runs per stage, the fastest is reported")
+    parser.add_argument("--output", help="File to write the JSON results to, defaults to stdout")
+    parser.add_argument("--baseline", type=load_baseline, default={}, help="Previous results file to compare against")
+    args = parser.parse_args()
+
+    # The pipeline logs every run at INFO level, which would swamp the results
+    logging.disable(logging.INFO)
+    print(f"{'outages':>9} {'devices':>7} {'stage':<11} {'wall time':>13} {'throughput':>25} {'peak memory':>12}",
+          file=sys.stderr)
+    results = [result for count, devices in args.scales for result in run_scale(count, devices, args)]
+    report = json.dumps({"environment": environment(), "results": results}, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file_handle:
+            file_handle.write(report + "\n")
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""
+Synthetic outage data shared by the benchmarks
+"""
+import datetime
+import random
+
+
+def generate_outages(count: int, devices: int, seed: int = 0) -> list[dict]:
+    """
+    Generates outages for the given number of devices, with begin times spread either side of the default cutoff
+    :param count: Number of outages to generate
+    :param devices: Number of devices to spread the outages across
+    :param seed: Random seed, so runs are comparable
+    :return: A list of outage dicts
+    """
+    rng = random.Random(seed)
+    start = datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc)
+    outages = []
+    for _ in range(count):
+        begin = start + datetime.timedelta(milliseconds=rng.randrange(4 * 365 * 24 * 3600 * 1000))
+        end = begin + datetime.timedelta(milliseconds=rng.randrange(30 * 24 * 3600 * 1000))
+        outages.append({
+            "id": f"device-{rng.randrange(devices)}",
+            "begin": f"{begin:%Y-%m-%dT%H:%M:%S}.{begin.microsecond // 1000:03d}Z",
+            "end": f"{end:%Y-%m-%dT%H:%M:%S}.{end.microsecond // 1000:03d}Z",
+        })
+    return outages
+
+
+def generate_site_info(site_name: str, devices: int, site_devices: int) -> dict:
+    """
+    Generates site information for a site made up of the first devices used by generate_outages
+    :param site_name: Name of the site
+    :param devices: Number of devices the outages are spread across
+    :param site_devices: Number of those devices in the site
+    :return: The site information, in the format returned by the /site-info API
+    """
+    return {
+        "id": site_name,
+        "name": site_name.title(),
+        "devices": [
+            {"id": f"device-{index}", "name": f"Device {index}"} for index in range(min(devices, site_devices))
+        ],
+    }
@@ -0,0 +1,22 @@
+"""
+Timing helpers shared by the benchmarks
+"""
+import timeit
+from typing import Callable
+
+
+def compare(implementations: dict[str, Callable], expected, count: int, repeat: int) -> None:
+    """
+    Checks each implementation gives the expected result, then times it and prints its throughput and speed-up
+    against the first implementation
+    :param implementations: Functions taking no arguments, by name, the first is the baseline
+    :param expected: The result every implementation should return
+    :param count: Number of outages each call processes, for the throughput
+    :param repeat: Number of runs, the fastest is reported
+    """
+    baseline = None
+    for name, implementation in implementations.items():
+        assert implementation() == expected, f"{name} gave different results"
+        best = min(timeit.repeat(implementation, number=1, repeat=repeat))
+        baseline = baseline or best
+        print(f"{name:<20} {best * 1000:10.1f} ms {count / best:14,.0f} outages/s {baseline / best:6.1f}x")
@@ -0,0 +1,18 @@
+"""
+Exports for the asyncio API module, requires the aio extra (aiohttp) to be installed
+"""
+from .http import api_request, close_client, set_client
+from .outages import get_outages_after_datetime
+from .pipeline import process_outages_inner, process_sites
+from .site import get_site_info, upload_site_outages
+
+__all__ = [
+    "api_request",
+    "close_client",
+    "get_outages_after_datetime",
+    "get_site_info",
+    "process_outages_inner",
+    "process_sites",
+    "set_client",
+    "upload_site_outages",
+]
@@ -0,0 +1,247 @@
+"""
+Asyncio helpers for communicating with the outages API
+"""
+import asyncio
+from collections import namedtuple
+
+import aiohttp
+from requests.adapters import Retry
+
+from outages_processor.constants import API_BASE_URL, API_KEY, HTTP_TIMEOUT_SECONDS
+from outages_processor.utils.errors import APIError
+from outages_processor.utils.http import (
+    RETRY_STATUS_CODES,
+    TOO_MANY_REQUESTS,
+    PoolConfig,
+    get_backoff_time,
+    get_retry_after,
+)
+from outages_processor.utils.logging import get_logger
+from outages_processor.utils.metrics import get_metrics
+from outages_processor.utils.ratelimit import THROTTLE_STATUS_CODES, get_rate_limiter
+from outages_processor.utils.serialization import get_serializer
+
+
+logger = get_logger(__name__)
+
+
+class APIResponse(namedtuple("_APIResponse", ("status_code", "headers", "content"))):
+    """
+    Container class for a completed API response, the body has already been read so the connection is released
+    """
+
+    @property
+    def ok(self) -> bool:  # pylint: disable=invalid-name
+        """
+        :return: True if the status code is less than 400, matching requests.Response.ok
+        :rtype: bool
+        """
+        return self.status_code < 400
+
+    def json(self):
+        """
+        Parses the response body as JSON with the current serializer, see outages_processor.utils.serialization
+        :return: The parsed JSON body
+        :raises APIError: If the response body is not valid JSON
+        """
+        try:
+            return get_serializer().loads(self.content)
+        except ValueError as exc:
+            logger.debug("Caught error parsing response body: %s", exc)
+            raise APIError("Failed to parse the response from the API") from exc
+
+
+def create_client(pool_config: PoolConfig = None) -> aiohttp.ClientSession:
+    """
+    Create an aiohttp client session with a connection pool sized from the given settings.
+    Must be called from a running event loop.
+    :param pool_config: Connection pool settings, defaults to the values in constants when not given
+    :type pool_config: PoolConfig
+    :return: The client session
+    :rtype: aiohttp.ClientSession
+    """
+    pool_config = pool_config or PoolConfig()
+    logger.debug("Creating client session with connection pool config: %s", pool_config)
+    connector = aiohttp.TCPConnector(
+        limit=pool_config.connections * pool_config.maxsize,
+        limit_per_host=pool_config.maxsize,
+        force_close=not pool_config.keep_alive,
+    )
+    return aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=HTTP_TIMEOUT_SECONDS))
+
+
+class SharedClient:
+    """
+    Holder for the client session shared by all async API requests.
+    A client session belongs to the event loop it was created on, so a new one is created when used from another loop.
+    """
+    def __init__(self, pool_config: PoolConfig = None):
+        """
+        :param pool_config: Connection pool settings used when the client is created
+        :type pool_config: PoolConfig
+        """
+        self._client = None
+        self._loop = None
+        self._pool_config = pool_config
+
+    def get(self) -> aiohttp.ClientSession:
+        """
+        Gets the shared client session, creating it if required. Must be called from a running event loop.
+        :return: The shared client session
+        :rtype: aiohttp.ClientSession
+        """
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client.closed or self._loop is not loop:
+            self._client = create_client(self._pool_config)
+            self._loop = loop
+        return self._client
+
+    def set(self, client: aiohttp.ClientSession) -> aiohttp.ClientSession:
+        """
+        Injects a client session to be shared by all subsequent requests on the running event loop.
+        The caller owns the previous client session, which is returned without being closed.
+        :param client: The client session to share, or None to create a new one on next use
+        :type client: aiohttp.ClientSession
+        :return: The previously shared client session, if any
+        :rtype: aiohttp.ClientSession
+        """
+        previous, self._client = self._client, client
+        self._loop = asyncio.get_running_loop() if client is not None else None
+        return previous
+
+    async def close(self) -> None:
+        """
+        Closes the shared client session and its pooled connections. A new one is created on next use.
+        """
+        client = self.set(None)
+        if client is not None and not client.closed:
+            logger.debug("Closing shared client session")
+            await client.close()
+
+
+_shared_client = SharedClient()
+
+
+def get_client() -> aiohttp.ClientSession:
+    """
+    Gets the client session shared by all async API requests. Must be called from a running event loop.
+    :return: The shared client session
+    :rtype: aiohttp.ClientSession
+    """
+    return _shared_client.get()
+
+
+def set_client(client: aiohttp.ClientSession) -> aiohttp.ClientSession:
+    """
+    Injects the client session to be shared by all async API requests, see SharedClient.set
+    :param client: The client session to share, or None to create a new one on next use
+    :type client: aiohttp.ClientSession
+    :return: The previously shared client session, if any
+    :rtype: aiohttp.ClientSession
+    """
+    return _shared_client.set(client)
+
+
+async def close_client() -> None:
+    """
+    Closes the client session shared by all async API requests
+    """
+    await _shared_client.close()
+
+
+def _is_retryable(verb: str, exc: Exception) -> bool:
+    """
+    Checks whether a request which failed with the given exception can be retried.
+    As with urllib3, failures to connect are always retried, other failures only for idempotent methods.
+    """
+    return isinstance(exc, aiohttp.ClientConnectorError) or verb.upper() in Retry.DEFAULT_ALLOWED_METHODS
+
+
+async def _send(client: aiohttp.ClientSession, request_args: dict) -> APIResponse:
+    """
+    Sends a request within the limits of the shared rate limiter, reporting throttled requests back to it
+    """
+    async with get_rate_limiter().permit() as permit:
+        try:
+            async with client.request(**request_args) as raw_response:
+                response = APIResponse(raw_response.status, raw_response.headers, await raw_response.read())
+        except asyncio.TimeoutError:
+            permit.throttled = True
+            raise
+        permit.throttled = response.status_code in THROTTLE_STATUS_CODES
+    return response
+
+
+async def api_request(verb: str,
+                      route: str,
+                      json: dict = None,
+                      client: aiohttp.ClientSession = None,
+                      retries: int = 3) -> APIResponse:
+    """
+    Helper function to make a request to the API with the given HTTP verb and route.
+    Retries and backoff match outages_processor.utils.api_request: server errors for idempotent methods and
+    connection errors are retried, as are 429 responses after their Retry-After delay, other client errors are not.
+    Requests are sent within the limits of the shared rate limiter, see outages_processor.utils.ratelimit, and a 429
+    response pauses every request sharing it, in any thread or coroutine, rather than just this one.
+    :param verb: HTTP verb to attach to the request, e.g. GET, POST
+    :type verb: str
+    :param route: Route to send the request to, relative to the API root URL. e.g. /outages
+    :type route: str
+    :param json: Optional JSON body to send with the request (if permitted for the method)
+    :type json: dict
+    :param client: Optional client session to send the request with, defaults to the shared client session
+    :type client: aiohttp.ClientSession
+    :param retries: Maximum number of times to retry the HTTP request
+    :type retries: int
+    :return: HTTP response with the body read
+    :rtype: APIResponse
+    :raises APIError: In the event of an issue connecting to the API or an unexpected HTTP response
+    """
+    processed_route = route.lstrip("/")
+    url = f"{API_BASE_URL}/{processed_route}"
+    client = client or get_client()
+
+    request_args = {
+        "method": verb,
+        "url": url,
+        "headers": {
+            "x-api-key": API_KEY,
+        },
+    }
+    if json:
+        request_args["headers"]["Content-Type"] = "application/json"
+        request_args.update({
+            "data": get_serializer().dumps(json),
+        })
+
+    delay = 0.0
+    for retry_number in range(retries + 1):
+        if retry_number:
+            await asyncio.sleep(delay)
+        delay = get_backoff_time(retry_number + 1)
+        try:
+            logger.debug("About to make HTTP request. Method: %s, URL: %s", verb, url)
+            response = await _send(client, request_args)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as exc:
+            logger.debug("Caught request exception: %s", exc)
+            if retry_number < retries and _is_retryable(verb, exc):
+                continue
+            raise APIError("Failed to communicate with the API") from exc
+
+        logger.debug("Response code: %s", response.status_code)
+        if response.status_code == TOO_MANY_REQUESTS and retry_number < retries:
+            get_metrics().increment("throttled_requests")
+            pause = get_retry_after(response) or get_backoff_time(retry_number + 2)
+            logger.debug("Request throttled, retrying after %s seconds", pause)
+            get_rate_limiter().pause(pause)
+            delay = 0.0
+            continue
+        if (response.status_code in RETRY_STATUS_CODES
+                and verb.upper() in Retry.DEFAULT_ALLOWED_METHODS
+                and retry_number < retries):
+            continue
+        if not response.ok:
+            raise APIError(f"Failed to communicate with the API, response code: {response.status_code}")
+        return response
+    # Unreachable, the final attempt either returns or raises
+    raise APIError("Failed to communicate with the API")
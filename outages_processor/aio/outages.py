@@ -0,0 +1,23 @@
+"""
+Asyncio outages interfaces for API communication
+"""
+import datetime
+
+from outages_processor.aio.http import api_request
+from outages_processor.api.outages import DEFAULT_DATETIME_EARLIEST, filter_outages_after_datetime
+
+
+async def get_outages_after_datetime(datetime_earliest: datetime.datetime = DEFAULT_DATETIME_EARLIEST,
+                                     compare_strings: bool = False) -> list:
+    """
+    Gets a list of outages filtered by time window, see outages_processor.api.get_outages_after_datetime
+    :param datetime_earliest: The datetime to use for filtering. Events occurring before this datetime
+    will be filtered out.
+    :param compare_strings: Set to True to compare begin times as normalised UTC strings rather than datetimes
+    :type compare_strings: bool
+    :return: A list of outages from the HTTP response body
+    :rtype: list
+    :raises APIError: In the event of an issue connecting to the API or an unexpected HTTP response
+    """
+    all_outages = (await api_request("GET", "/outages")).json()
+    return filter_outages_after_datetime(all_outages, datetime_earliest, compare_strings=compare_strings)
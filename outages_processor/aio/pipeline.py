@@ -0,0 +1,97 @@
+"""
+Asyncio version of the outages processing pipeline
+"""
+import asyncio
+
+import outages_processor.constants
+from outages_processor.aio.outages import get_outages_after_datetime
+from outages_processor.aio.site import get_site_info, upload_site_outages
+from outages_processor.api.index import OutageIndex
+from outages_processor.api.outages import add_device_info_to_outages
+from outages_processor.api.site import SiteResult
+from outages_processor.utils.errors import OutagesProcessorError
+from outages_processor.utils.logging import get_logger
+
+
+logger = get_logger(__name__)
+
+
+async def process_site_outages(site_name: str, all_outages: list[dict]) -> int:
+    """
+    Enhances the given outages with the device information for a site and uploads them
+    :param site_name: The name of the site to process outages for
+    :type site_name: str
+    :param all_outages: Outages to filter and enhance, these are not modified so can be shared between sites
+    :type all_outages: list
+    :return: The number of outages uploaded
+    :rtype: int
+    :raises: Any exception thrown by the API
+    """
+    return await _join_and_upload(site_name, all_outages, await _get_site_devices_map(site_name))
+
+
+async def _fetch_outages(index: bool = False) -> list[dict]:
+    all_outages = await get_outages_after_datetime()
+    logger.info("Found %s outages after cutoff date", len(all_outages))
+    # Grouped by device once when shared between sites, so each site's join only touches its own devices' outages
+    return OutageIndex(all_outages) if index else all_outages
+
+
+async def _get_site_devices_map(site_name: str) -> dict:
+    site_devices_map = await get_site_info(site_name, devices_map=True)
+    logger.info("Found %s devices for site %s", len(site_devices_map.keys()), site_name)
+    return site_devices_map
+
+
+async def _join_and_upload(site_name: str, all_outages: list[dict], site_devices_map: dict) -> int:
+    outages_with_devices = add_device_info_to_outages(all_outages, site_devices_map)
+    logger.info("Outages with valid device IDs for site %s: %s", site_name, len(outages_with_devices))
+    await upload_site_outages(site_name, outages_with_devices)
+    logger.info("Successfully uploaded enhanced outages information for site %s", site_name)
+    return len(outages_with_devices)
+
+
+async def process_outages_inner(site_name: str) -> None:
+    """
+    Performs the inner logic to process the outages and enhance them with the device information
+    :param site_name: The name of the site to process outages for
+    :type site_name: str
+    :raises: Any exception thrown by the API
+    """
+    # The outages and the site's devices are fetched concurrently
+    all_outages, site_devices_map = await asyncio.gather(_fetch_outages(), _get_site_devices_map(site_name))
+    await _join_and_upload(site_name, all_outages, site_devices_map)
+
+
+async def process_sites(site_names: list[str], max_concurrency: int = outages_processor.constants.MAX_WORKERS) -> list:
+    """
+    Processes outages for several sites, fetching the outages once and sharing them between the sites.
+    The outages are fetched while the devices of each site are. A failure for one site does not stop the others
+    being processed.
+    :param site_names: The names of the sites to process outages for
+    :type site_names: list
+    :param max_concurrency: Maximum number of sites to process concurrently
+    :type max_concurrency: int
+    :return: A SiteResult for each site, in the order the sites were given
+    :rtype: list
+    :raises: Any exception thrown by the API when fetching the outages
+    """
+    index = len(site_names) >= outages_processor.constants.OUTAGE_INDEX_MIN_SITES
+    all_outages = asyncio.ensure_future(_fetch_outages(index=index))
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+    async def process_site(site_name: str) -> SiteResult:
+        async with semaphore:
+            try:
+                site_devices_map = await _get_site_devices_map(site_name)
+                uploaded = await _join_and_upload(site_name, await all_outages, site_devices_map)
+                return SiteResult(site_name, True, uploaded, None)
+            except OutagesProcessorError as exc:
+                logger.error("Failed to process outages for site %s. Error: %s", site_name, exc)
+                logger.debug("Traceback for site %s", site_name, exc_info=exc)
+                return SiteResult(site_name, False, 0, exc)
+
+    results = list(await asyncio.gather(*(process_site(site_name) for site_name in site_names)))
+    # Failing to fetch the outages fails the run, as no site can be processed without them
+    await all_outages
+    return results
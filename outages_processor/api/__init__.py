@@ -1,12 +1,31 @@
 """
 Exports for the API module
 """
-from .outages import add_device_info_to_outages, get_outages_after_datetime
+from .index import OutageIndex
+from .intervals import IntervalIndex
+from .outages import (
+    add_device_info_to_outages,
+    add_device_info_to_site_outages,
+    filter_outages_after_datetime,
+    get_outages_after_datetime,
+    index_site_devices,
+    iter_device_info_to_outages,
+    iter_device_info_to_site_outages,
+    iter_outages_after_datetime,
+)
 from .site import get_site_info, upload_site_outages
 
 __all__ = [
+    "IntervalIndex",
+    "OutageIndex",
     "add_device_info_to_outages",
+    "add_device_info_to_site_outages",
+    "filter_outages_after_datetime",
     "get_outages_after_datetime",
     "get_site_info",
+    "index_site_devices",
+    "iter_device_info_to_outages",
+    "iter_device_info_to_site_outages",
+    "iter_outages_after_datetime",
     "upload_site_outages",
 ]
@@ -0,0 +1,87 @@
+"""
+Index of an outage feed by device ID, so that joining the feed with each of several sites only touches the outages of
+the site's own devices rather than scanning the whole feed once per site
+"""
+import array
+import collections
+import itertools
+from typing import Iterator, Sequence
+
+from outages_processor.api.records import with_device_name
+from outages_processor.utils.metrics import get_metrics
+
+
+class OutageIndex:
+    """
+    Outages grouped by device ID, built in a single pass over the feed.
+    The positions of each device's outages in the feed are stored contiguously in one compact array, with each
+    device's slot in a dictionary and the offsets of the slots in a second array, so the index costs a few bytes per
+    outage on top of the feed itself. The outages are not copied, and are joined in the order they appear in the feed.
+    """
+    def __init__(self, outages: Sequence):
+        """
+        :param outages: A list of outage events as dicts or OutageRecord objects, which must not be modified while
+        the index is in use
+        :type outages: Sequence
+        """
+        with get_metrics().stage("index") as timer:
+            groups = collections.defaultdict(list)
+            for position, device_id in enumerate([outage.get("id") for outage in outages]):
+                groups[device_id].append(position)
+            self.outages = outages
+            self._slots = {device_id: slot for slot, device_id in enumerate(groups)}
+            self._offsets = array.array("L", itertools.accumulate(map(len, groups.values()), initial=0))
+            self._positions = array.array("L", itertools.chain.from_iterable(groups.values()))
+            timer.records = len(outages)
+
+    def __len__(self) -> int:
+        return len(self.outages)
+
+    @property
+    def device_ids(self) -> list:
+        """
+        :return: The IDs of the devices with outages, in the order they first appear in the feed
+        :rtype: list
+        """
+        return list(self._slots)
+
+    def positions(self, device_id) -> array.array:
+        """
+        Gets the positions in the feed of a device's outages
+        :param device_id: ID of the device
+        :return: The positions, in ascending order, empty if the device has no outages
+        :rtype: array.array
+        """
+        slot = self._slots.get(device_id)
+        if slot is None:
+            return array.array("L")
+        return self._positions[self._offsets[slot]:self._offsets[slot + 1]]
+
+    def outages_for_device(self, device_id) -> list:
+        """
+        Gets the outages of a device
+        :param device_id: ID of the device
+        :return: The device's outages in feed order, empty if the device has no outages
+        :rtype: list
+        """
+        return [self.outages[position] for position in self.positions(device_id)]
+
+    def iter_device_info(self, site_devices_map: dict) -> Iterator:
+        """
+        Enhances the outages of a site's devices with the names of the devices, see
+        outages_processor.api.iter_device_info_to_outages, touching only those outages
+        :param site_devices_map: A dictionary where the keys are device IDs and the values are device info
+        :type site_devices_map: dict
+        :return: An iterator over new outages, each including the name of the device, in feed order
+        :rtype: Iterator
+        """
+        positions = []
+        for device_id in site_devices_map:
+            slot = self._slots.get(device_id)
+            if slot is not None:
+                positions.extend(self._positions[self._offsets[slot]:self._offsets[slot + 1]])
+        # Each device's positions are already sorted, so this only merges the runs
+        positions.sort()
+        for position in positions:
+            outage = self.outages[position]
+            yield with_device_name(outage, site_devices_map[outage.get("id")].name)
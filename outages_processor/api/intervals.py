@@ -0,0 +1,194 @@
+"""
+Index of an outage feed by time, for finding the outages which overlap a time window, were ongoing at a point in time
+or began within a range, for every device or for a single device, without scanning the whole feed for each query
+"""
+import array
+import bisect
+import datetime
+import itertools
+from typing import Sequence
+
+import iso8601
+
+from outages_processor.api.records import OutageRecord
+from outages_processor.utils.metrics import get_metrics
+from outages_processor.utils.timestamps import is_api_format
+
+
+_EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+_NAIVE_EPOCH = datetime.datetime(1970, 1, 1)
+_MICROSECOND = datetime.timedelta(microseconds=1)
+# Outages without an end time are treated as ongoing
+_OPEN_END = 2 ** 63 - 1
+
+
+def _to_epoch_us(value: datetime.datetime) -> int:
+    """
+    Converts a datetime to integer microseconds since the Unix epoch, exactly, so comparisons give the same result as
+    comparing the datetimes themselves
+    """
+    return (value.astimezone(datetime.timezone.utc) - _EPOCH) // _MICROSECOND
+
+
+def _parse_epoch_us(value: str) -> int:
+    """
+    Parses a timestamp into integer microseconds since the Unix epoch. Timestamps in the API format are already in
+    UTC, so are converted without building a timezone aware datetime, which is most of the cost of building the index.
+    """
+    if is_api_format(value):
+        delta = datetime.datetime.fromisoformat(value[:23]) - _NAIVE_EPOCH
+        return (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+    return _to_epoch_us(iso8601.parse_date(value))
+
+
+def _interval(outage) -> tuple:
+    """
+    Gets the begin and end times of an outage dict or record in microseconds since the epoch
+    """
+    if isinstance(outage, OutageRecord):
+        return outage.begin * 1000, _OPEN_END if outage.end is None else outage.end * 1000
+    end = outage.get("end")
+    return _parse_epoch_us(outage.get("begin")), _OPEN_END if end is None else _parse_epoch_us(end)
+
+
+class _SortedIntervals:
+    """
+    Intervals stored as runs sorted by begin time, each run alongside the running maximum of its end times.
+    As the running maximum never decreases within a run, the first interval of a run which could still be ongoing at
+    a given time is found by bisection, as is the last which began by a given time.
+    """
+    def __init__(self, begins: list, ends: list, runs: list):
+        """
+        :param begins: Begin time of each interval
+        :param ends: End time of each interval
+        :param runs: A list of runs, each a list of the positions of its intervals in order of begin time
+        """
+        self.offsets = array.array("L", itertools.accumulate(map(len, runs), initial=0))
+        positions = list(itertools.chain.from_iterable(runs))
+        # Arrays are built from lists, which is faster than from iterators
+        self.positions = array.array("L", positions)
+        self.begins = array.array("q", list(map(begins.__getitem__, positions)))
+        self.ends = array.array("q", list(map(ends.__getitem__, positions)))
+        self.max_ends = array.array("q", list(itertools.chain.from_iterable(
+            itertools.accumulate(map(ends.__getitem__, run), max) for run in runs
+        )))
+
+    def overlapping(self, run: int, start: int, end: int) -> list:
+        """
+        Gets the positions of the intervals in a run which began at or before end and ended at or after start
+        """
+        lo, hi = self.offsets[run], self.offsets[run + 1]
+        hi = bisect.bisect_right(self.begins, end, lo, hi)
+        lo = bisect.bisect_left(self.max_ends, start, lo, hi)
+        ends = self.ends
+        return [self.positions[index] for index in range(lo, hi) if ends[index] >= start]
+
+    def beginning(self, run: int, start: int, end: int) -> array.array:
+        """
+        Gets the positions of the intervals in a run which began at or after start and before end
+        """
+        lo, hi = self.offsets[run], self.offsets[run + 1]
+        return self.positions[bisect.bisect_left(self.begins, start, lo, hi):
+                              bisect.bisect_left(self.begins, end, lo, hi)]
+
+
+class IntervalIndex:
+    """
+    Outages indexed by begin and end time, for the feed as a whole and for each device, built in one pass over the
+    feed. Times are stored as integer microseconds in compact arrays, so queries compare integers rather than
+    parsing timestamps, and find their outages by bisection. Outages without an end time are treated as ongoing.
+    Query results are the outages themselves, not copies, in the order they appear in the feed.
+    """
+    def __init__(self, outages: Sequence):
+        """
+        :param outages: A list of outage events as dicts or OutageRecord objects, which must not be modified while
+        the index is in use
+        :type outages: Sequence
+        :raises iso8601.ParseError: If a begin or end time is not a valid ISO 8601 timestamp
+        """
+        with get_metrics().stage("index") as timer:
+            intervals = list(map(_interval, outages))
+            begins = [begin for begin, _ in intervals]
+            ends = [end for _, end in intervals]
+            # Sorted once for the whole feed, then split by device, so each device's run is already in begin order
+            order = sorted(range(len(outages)), key=begins.__getitem__)
+            ids = [outage.get("id") for outage in outages]
+            groups = {device_id: [] for device_id in ids}
+            for position in order:
+                groups[ids[position]].append(position)
+            self.outages = outages
+            self._slots = {device_id: slot for slot, device_id in enumerate(groups)}
+            self._devices = _SortedIntervals(begins, ends, list(groups.values()))
+            self._feed = _SortedIntervals(begins, ends, [order])
+            timer.records = len(outages)
+
+    def __len__(self) -> int:
+        return len(self.outages)
+
+    @property
+    def device_ids(self) -> list:
+        """
+        :return: The IDs of the devices with outages, in the order they first appear in the feed
+        :rtype: list
+        """
+        return list(self._slots)
+
+    def _query(self, device_id, query: str, start: int, end: int) -> list:
+        """
+        Runs a query against the whole feed, or a single device if device_id is given, returning the outages in feed
+        order
+        """
+        if device_id is None:
+            positions = getattr(self._feed, query)(0, start, end)
+        elif device_id in self._slots:
+            positions = getattr(self._devices, query)(self._slots[device_id], start, end)
+        else:
+            return []
+        return [self.outages[position] for position in sorted(positions)]
+
+    def overlapping(self,
+                    start: datetime.datetime,
+                    end: datetime.datetime,
+                    device_id=None) -> list:
+        """
+        Gets the outages which were ongoing at any time between two datetimes, inclusive
+        :param start: Start of the time window
+        :type start: datetime.datetime
+        :param end: End of the time window
+        :type end: datetime.datetime
+        :param device_id: Optional ID of a device, to only get that device's outages
+        :return: The outages which began at or before end and ended at or after start, in feed order
+        :rtype: list
+        """
+        return self._query(device_id, "overlapping", _to_epoch_us(start), _to_epoch_us(end))
+
+    def at(self, moment: datetime.datetime, device_id=None) -> list:
+        """
+        Gets the outages which were ongoing at a point in time
+        :param moment: The point in time
+        :type moment: datetime.datetime
+        :param device_id: Optional ID of a device, to only get that device's outages
+        :return: The outages which began at or before and ended at or after the given time, in feed order
+        :rtype: list
+        """
+        return self.overlapping(moment, moment, device_id)
+
+    def beginning_between(self,
+                          start: datetime.datetime = None,
+                          end: datetime.datetime = None,
+                          device_id=None) -> list:
+        """
+        Gets the outages which began within a range. Ranges include their start but not their end, so consecutive
+        ranges never share an outage.
+        :param start: Optional start of the range, unbounded if not given
+        :type start: datetime.datetime
+        :param end: Optional end of the range, unbounded if not given
+        :type end: datetime.datetime
+        :param device_id: Optional ID of a device, to only get that device's outages
+        :return: The outages which began at or after start and before end, in feed order
+        :rtype: list
+        """
+        return self._query(device_id,
+                           "beginning",
+                           -_OPEN_END if start is None else _to_epoch_us(start),
+                           _OPEN_END if end is None else _to_epoch_us(end))
@@ -2,50 +2,305 @@
 Outages interfaces for API communication
 """
 import datetime
+import logging
+from typing import Iterable, Iterator
 
 import iso8601
 
 import outages_processor.utils
+from outages_processor.api.index import OutageIndex
+from outages_processor.api.intervals import IntervalIndex
+from outages_processor.api.records import to_records_after_datetime, with_device_name
+from outages_processor.utils.cache import CacheEntry, FileCache
+from outages_processor.utils.http import iter_response_content, read_json
+from outages_processor.utils.jsonstream import iter_json_array
+from outages_processor.utils.metrics import get_metrics
+from outages_processor.utils.timestamps import begins_at_or_after
 
 
 logger = outages_processor.utils.get_logger(__name__)
 
 
-def get_outages_after_datetime(
-        datetime_earliest: datetime.datetime = iso8601.parse_date("2022-01-01T00:00:00.000Z")
-) -> list:
+DEFAULT_DATETIME_EARLIEST = iso8601.parse_date("2022-01-01T00:00:00.000Z")
+
+_outages_cache = None  # pylint: disable=invalid-name
+
+
+def get_outages_cache() -> FileCache:
+    """
+    Gets the cache of the /outages feed shared by all get_outages_after_datetime calls
+    :return: The shared cache, or None if the feed is not cached
+    :rtype: FileCache
+    """
+    return _outages_cache
+
+
+def configure_outages_cache(path: str = None, in_memory: bool = False) -> FileCache:
+    """
+    Sets the file the /outages feed is cached in. The cached feed is revalidated with a conditional request on every
+    use, and reused without downloading or parsing it again if the API responds 304 Not Modified.
+    :param path: Path of the cache file, or None to stop caching the feed
+    :type path: str
+    :param in_memory: Set to True to cache the feed in memory when no path is given, e.g. in a long-running process
+    :type in_memory: bool
+    :return: The new cache, or None if the feed is not cached
+    :rtype: FileCache
+    """
+    global _outages_cache  # pylint: disable=global-statement
+    _outages_cache = FileCache(path) if path or in_memory else None
+    return _outages_cache
+
+
+def _get_cached_entry(cache: FileCache, stream: bool) -> tuple:
+    """
+    Requests the /outages feed, conditionally on the cached feed having changed if there is one.
+    Returns a (entry, response) tuple, where entry is the cached entry if it can be reused and response is the response
+    to read the feed from otherwise.
+    """
+    entry = cache.get() if cache is not None else None
+    headers = entry.conditional_headers() if entry is not None else {}
+    response = outages_processor.utils.api_request("GET", "/outages", headers=headers, stream=stream)
+    if entry is not None and response.status_code == 304:
+        logger.debug("Outages not modified, reusing %s cached outages", len(entry.value))
+        response.close()
+        cache.record("revalidations")
+        return entry, None
+    if cache is not None:
+        cache.record("misses")
+    return None, response
+
+
+def _is_cacheable(cache: FileCache, response) -> bool:
+    """
+    Checks whether a response should be cached, which is only worthwhile if it has validators to revalidate it with
+    """
+    return cache is not None and bool(CacheEntry.from_response(None, response).conditional_headers())
+
+
+def filter_outages_after_datetime(outages: list[dict],
+                                  datetime_earliest: datetime.datetime,
+                                  compare_strings: bool = False) -> list:
+    """
+    Filters outages by time window, any outages that began before the given datetime will be filtered out
+    :param outages: A list of outage events as dicts, or an IntervalIndex of them, in which case the outages are
+    found by bisection rather than by comparing every begin time
+    :type outages: list
+    :param datetime_earliest: The datetime to use for filtering
+    :type datetime_earliest: datetime.datetime
+    :param compare_strings: Set to True to compare begin times as normalised UTC strings rather than datetimes,
+    see outages_processor.utils.timestamps.begins_at_or_after. Has no effect on an IntervalIndex, which compares
+    begin times as integers.
+    :type compare_strings: bool
+    :return: A list of the outages which began at or after the given datetime, in the order given
+    :rtype: list
+    """
+    if isinstance(outages, IntervalIndex):
+        return outages.beginning_between(datetime_earliest)
+    is_after = begins_at_or_after(datetime_earliest, compare_strings=compare_strings)
+    return [item for item in outages if is_after(item.get("begin"))]
+
+
+def get_outages_after_datetime(datetime_earliest: datetime.datetime = DEFAULT_DATETIME_EARLIEST,
+                               stream: bool = False,
+                               compare_strings: bool = False,
+                               as_records: bool = False) -> list:
     """
     Gets a list of outages filtered by time window.
     Any outages that began before the given datetime will be filtered out
     :param datetime_earliest: The datetime to use for filtering. Events occurring before this datetime
     will be filtered out.
+    :param stream: Set to True to parse the response incrementally and return an iterator instead of a list,
+    see iter_outages_after_datetime
+    :type stream: bool
+    :param compare_strings: Set to True to compare begin times as normalised UTC strings rather than datetimes
+    :type compare_strings: bool
+    :param as_records: Set to True to return compact OutageRecord objects rather than dicts, see
+    outages_processor.api.records. Begin times are compared as integers, so compare_strings has no effect.
+    :type as_records: bool
+    :return: A list of outages from the HTTP response body, or an iterator if stream is True
+    :rtype: list
+    :raises APIError: In the event of an issue connecting to the API or an unexpected HTTP response
+    :raises StateError: If the outages cannot be saved to the cache file, see configure_outages_cache
+    """
+    if stream:
+        return iter_outages_after_datetime(datetime_earliest, compare_strings=compare_strings, as_records=as_records)
+    all_outages = get_all_outages()
+    with get_metrics().stage("filter") as timer:
+        if as_records:
+            outages = list(to_records_after_datetime(all_outages, datetime_earliest))
+        else:
+            outages = filter_outages_after_datetime(all_outages, datetime_earliest, compare_strings=compare_strings)
+        timer.records = len(outages)
+    return outages
+
+
+def get_all_outages() -> list:
+    """
+    Gets every outage from the API, unfiltered. Uses the outages cache if configured, see configure_outages_cache.
+    Cached outages are shared between callers and must not be modified.
     :return: A list of outages from the HTTP response body
     :rtype: list
     :raises APIError: In the event of an issue connecting to the API or an unexpected HTTP response
+    :raises StateError: If the outages cannot be saved to the cache file
+    """
+    cache = _outages_cache
+    metrics = get_metrics()
+    with metrics.stage("fetch"):
+        entry, response = _get_cached_entry(cache, stream=False)
+    if entry is not None:
+        return entry.value
+    with metrics.stage("parse") as timer:
+        all_outages = read_json(response)
+        timer.records = len(all_outages)
+    if _is_cacheable(cache, response):
+        cache.set(CacheEntry.from_response(all_outages, response))
+    return all_outages
+
+
+def iter_outages_after_datetime(datetime_earliest: datetime.datetime = DEFAULT_DATETIME_EARLIEST,
+                                compare_strings: bool = False,
+                                as_records: bool = False) -> Iterator[dict]:
+    """
+    Gets the outages filtered by time window, parsing the response as it is downloaded and yielding the outages
+    one at a time. Peak memory is bounded by a single outage rather than the size of the whole response, unless the
+    feed is cached (see configure_outages_cache) in which case the parsed feed is kept to refresh the cache.
+    The request is made when iteration starts.
+    :param datetime_earliest: The datetime to use for filtering. Events occurring before this datetime
+    will be filtered out.
+    :type datetime_earliest: datetime.datetime
+    :param compare_strings: Set to True to compare begin times as normalised UTC strings rather than datetimes
+    :type compare_strings: bool
+    :param as_records: Set to True to yield compact OutageRecord objects rather than dicts
+    :type as_records: bool
+    :return: An iterator over the outages which began at or after the given datetime
+    :rtype: Iterator
+    :raises APIError: In the event of an issue connecting to the API or an unexpected HTTP response
+    :raises StateError: If the outages cannot be saved to the cache file
     """
-    all_outages = outages_processor.utils.api_request("GET", "/outages").json()
-    return [item for item in all_outages if iso8601.parse_date(item.get("begin")) >= datetime_earliest]
+    if as_records:
+        yield from to_records_after_datetime(_iter_all_outages(), datetime_earliest)
+        return
+    is_after = begins_at_or_after(datetime_earliest, compare_strings=compare_strings)
+    for item in _iter_all_outages():
+        if is_after(item.get("begin")):
+            yield item
 
 
-def add_device_info_to_outages(outages: list[dict], site_devices_map: dict) -> list:
+def _iter_all_outages() -> Iterator[dict]:
+    """
+    Streams every outage from the API, unfiltered, using the outages cache if configured
+    """
+    cache = _outages_cache
+    # Only the request is timed, the body is parsed as the outages are consumed
+    with get_metrics().stage("fetch"):
+        entry, response = _get_cached_entry(cache, stream=True)
+    if entry is not None:
+        yield from entry.value
+        return
+
+    # The feed has to be kept in full to refresh the cache, which is only saved once it has been read to the end
+    all_outages = [] if _is_cacheable(cache, response) else None
+    try:
+        for item in iter_json_array(iter_response_content(response)):
+            if all_outages is not None:
+                all_outages.append(item)
+            yield item
+    finally:
+        response.close()
+    if all_outages is not None:
+        cache.set(CacheEntry.from_response(all_outages, response))
+
+
+def add_device_info_to_outages(outages: Iterable[dict], site_devices_map: dict) -> list:
     """
     Enhances outage information with the name of the associated device.
     ! - Outages where the device does not exist in the map will be filtered out (ignored).
-    :param outages: A list of outage events as dicts
+    :param outages: A list (or any iterable) of outage events as dicts or OutageRecord objects, or an OutageIndex
+    of them, in which case only the outages of the site's devices are touched rather than every outage
     :type outages: list
     :param site_devices_map: A dictionary where the keys are device IDs and the values are device info dicts
+    :return: A list of new outages of the same type, each including the name of the device. The given outages are
+    not modified.
+    :rtype: list
+    """
+    with get_metrics().stage("join") as timer:
+        if isinstance(outages, OutageIndex):
+            outages_with_devices = list(outages.iter_device_info(site_devices_map))
+        else:
+            outages_with_devices = list(iter_device_info_to_outages(outages, site_devices_map))
+        timer.records = len(outages_with_devices)
+    return outages_with_devices
+
+
+def iter_device_info_to_outages(outages: Iterable[dict], site_devices_map: dict) -> Iterator[dict]:
     """
-    outages_with_devices = []
+    Enhances outage information with the name of the associated device, see add_device_info_to_outages.
+    Outages are consumed and yielded one at a time, so this can be chained with iter_outages_after_datetime.
+    :param outages: An iterable of outage events as dicts or OutageRecord objects
+    :type outages: Iterable
+    :param site_devices_map: A dictionary where the keys are device IDs and the values are device info dicts
+    :return: An iterator over new outages, each including the name of the device
+    :rtype: Iterator
+    """
+    # Checked once rather than per outage, most outages in a large feed belong to other sites
+    debug = logger.isEnabledFor(logging.DEBUG)
     for outage in outages:
         outage_id = outage.get("id")
         device_info = site_devices_map.get(outage_id)
         if device_info:
-            additional_info = {
-                "name": device_info.name,
-            }
-            outage.update(additional_info)
-            outages_with_devices.append(outage)
-        else:
+            # Copy rather than update in place, the same outages may be shared between several sites
+            yield with_device_name(outage, device_info.name)
+        elif debug:
             logger.debug("No device info found for ID: %s", outage_id)
 
-    return outages_with_devices
+
+def index_site_devices(site_devices_maps: dict) -> dict:
+    """
+    Indexes the devices of several sites by device ID, for joining outages with every site in a single pass
+    :param site_devices_maps: A dictionary where the keys are site names and the values are site devices maps
+    :type site_devices_maps: dict
+    :return: A dictionary where the keys are device IDs and the values are lists of (site name, device info) tuples
+    :rtype: dict
+    """
+    devices_sites = {}
+    for site_name, site_devices_map in site_devices_maps.items():
+        for device_id, device_info in site_devices_map.items():
+            devices_sites.setdefault(device_id, []).append((site_name, device_info))
+    return devices_sites
+
+
+def iter_device_info_to_site_outages(outages: Iterable[dict], devices_sites: dict) -> Iterator[tuple]:
+    """
+    Enhances outage information with the name of the associated device for several sites, consuming and yielding the
+    outages one at a time. An outage for a device shared by several sites is yielded once for each site.
+    :param outages: An iterable of outage events as dicts or OutageRecord objects
+    :type outages: Iterable
+    :param devices_sites: The devices of every site indexed by device ID, see index_site_devices
+    :type devices_sites: dict
+    :return: An iterator over (site name, enhanced outage) tuples
+    :rtype: Iterator
+    """
+    for outage in outages:
+        for site_name, device_info in devices_sites.get(outage.get("id"), ()):
+            yield site_name, with_device_name(outage, device_info.name)
+
+
+def add_device_info_to_site_outages(outages: Iterable[dict], site_devices_maps: dict) -> dict:
+    """
+    Enhances outage information with the name of the associated device for several sites in a single pass over the
+    outages, see add_device_info_to_outages. Suitable for use with iter_outages_after_datetime.
+    :param outages: An iterable of outage events as dicts
+    :type outages: Iterable
+    :param site_devices_maps: A dictionary where the keys are site names and the values are site devices maps
+    :type site_devices_maps: dict
+    :return: A dictionary where the keys are site names and the values are lists of enhanced outages for the site
+    :rtype: dict
+    """
+    devices_sites = index_site_devices(site_devices_maps)
+    site_outages = {site_name: [] for site_name in site_devices_maps}
+    # When the outages are streamed, the join also includes downloading and parsing them
+    with get_metrics().stage("join") as timer:
+        for site_name, outage in iter_device_info_to_site_outages(outages, devices_sites):
+            site_outages[site_name].append(outage)
+        timer.records = sum(map(len, site_outages.values()))
+    return site_outages
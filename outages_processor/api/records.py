@@ -0,0 +1,150 @@
+"""
+Compact representation of outage events, for holding large outage feeds in memory
+"""
+import datetime
+import functools
+import json
+import sys
+from typing import Iterable, Iterator
+
+from outages_processor.utils.timestamps import format_timestamp, from_epoch_ms, parse_timestamp, to_epoch_ms
+
+
+@functools.lru_cache(maxsize=65536)
+def _encode_string(value: str) -> str:
+    """
+    Encodes a string as JSON. Device IDs and names repeat across many outages, so their encodings are cached.
+    """
+    return json.dumps(value)
+
+
+class OutageRecord:
+    """
+    Compact outage event, an alternative to the outage dicts returned by the API.
+    Device IDs and names are interned so each distinct value is stored once, and begin and end times are stored as
+    integer milliseconds since the Unix epoch. Timestamps are therefore normalised to UTC with millisecond precision,
+    and only the id, begin, end and name fields are kept.
+    """
+    __slots__ = ("id", "begin", "end", "name")
+
+    def __init__(self, device_id: str, begin: int, end: int, name: str = None):
+        """
+        :param device_id: ID of the device the outage occurred on
+        :type device_id: str
+        :param begin: Begin time, in milliseconds since the epoch
+        :type begin: int
+        :param end: End time, in milliseconds since the epoch
+        :type end: int
+        :param name: Optional name of the device, added when joined with the site devices
+        :type name: str
+        """
+        self.id = sys.intern(device_id) if isinstance(device_id, str) else device_id
+        self.begin = begin
+        self.end = end
+        self.name = sys.intern(name) if isinstance(name, str) else name
+
+    @classmethod
+    def from_dict(cls, outage: dict) -> "OutageRecord":
+        """
+        Creates a record from an outage dict in the API format
+        :param outage: The outage dict
+        :type outage: dict
+        :return: The outage record
+        :rtype: OutageRecord
+        :raises iso8601.ParseError: If the begin or end time is not a valid ISO 8601 timestamp
+        """
+        end = outage.get("end")
+        return cls(
+            outage.get("id"),
+            to_epoch_ms(parse_timestamp(outage.get("begin"))),
+            to_epoch_ms(parse_timestamp(end)) if end is not None else None,
+            outage.get("name"),
+        )
+
+    def with_name(self, name: str) -> "OutageRecord":
+        """
+        :param name: Name of the device
+        :type name: str
+        :return: A copy of the record including the name of the device
+        :rtype: OutageRecord
+        """
+        return OutageRecord(self.id, self.begin, self.end, name)
+
+    def get(self, key: str, default=None):
+        """
+        Gets a field in the form used by outage dicts, with timestamps formatted in the API format.
+        Allows records to be used where outage dicts are expected.
+        :param key: The field name, e.g. id or begin
+        :type key: str
+        :param default: Value to return if the field is not set
+        :return: The field value
+        """
+        value = getattr(self, key, None) if key in self.__slots__ else None
+        if value is None:
+            return default
+        if key in ("begin", "end"):
+            return format_timestamp(from_epoch_ms(value))
+        return value
+
+    def to_dict(self) -> dict:
+        """
+        :return: The outage as a dict in the upload format, the name is only included if set
+        :rtype: dict
+        """
+        outage = {"id": self.id, "begin": self.get("begin"), "end": self.get("end")}
+        if self.name is not None:
+            outage["name"] = self.name
+        return outage
+
+    def to_json(self) -> str:
+        """
+        Encodes the outage straight to JSON in the upload format, without building a dict
+        :return: The JSON object
+        :rtype: str
+        """
+        end = f'"{self.get("end")}"' if self.end is not None else "null"
+        name = f',"name":{_encode_string(self.name)}' if self.name is not None else ""
+        return f'{{"id":{_encode_string(self.id)},"begin":"{self.get("begin")}","end":{end}{name}}}'
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, OutageRecord):
+            return NotImplemented
+        return (self.id, self.begin, self.end, self.name) == (other.id, other.begin, other.end, other.name)
+
+    def __hash__(self) -> int:
+        return hash((self.id, self.begin, self.end, self.name))
+
+    def __repr__(self) -> str:
+        return f"OutageRecord({self.id!r}, {self.begin!r}, {self.end!r}, {self.name!r})"
+
+
+def to_records_after_datetime(outages: Iterable[dict], datetime_earliest: datetime.datetime) -> Iterator[OutageRecord]:
+    """
+    Converts outages to records, filtering out any outages that began before the given datetime.
+    Begin times are compared as integers, with the datetime rounded up to whole milliseconds.
+    :param outages: An iterable of outage events as dicts
+    :type outages: Iterable
+    :param datetime_earliest: The datetime to use for filtering
+    :type datetime_earliest: datetime.datetime
+    :return: An iterator over records of the outages which began at or after the given datetime
+    :rtype: Iterator
+    :raises iso8601.ParseError: If a begin or end time is not a valid ISO 8601 timestamp
+    """
+    cutoff = to_epoch_ms(datetime_earliest, round_up=True)
+    for outage in outages:
+        record = OutageRecord.from_dict(outage)
+        if record.begin >= cutoff:
+            yield record
+
+
+def with_device_name(outage, name: str):
+    """
+    Adds the name of the device to an outage, without modifying it
+    :param outage: An outage dict or OutageRecord
+    :param name: Name of the device
+    :type name: str
+    :return: A new outage of the same type including the name of the device
+    """
+    if isinstance(outage, OutageRecord):
+        return outage.with_name(name)
+    return {**outage, "name": name}
@@ -1,9 +1,29 @@
 """
 Helpers for the site-* APIs
 """
+import concurrent.futures
+import itertools
+import time
 from collections import namedtuple
+from typing import Iterable, Iterator
 
 import outages_processor.utils
+from outages_processor.constants import (
+    SITE_INFO_CACHE_SIZE,
+    SITE_INFO_CACHE_TTL,
+    UPLOAD_CHUNK_SIZE,
+    UPLOAD_COMPRESSION,
+    UPLOAD_MAX_WORKERS,
+)
+from outages_processor.api.records import OutageRecord
+from outages_processor.utils.cache import CacheEntry, TTLCache
+from outages_processor.utils.errors import APIError, ChunkUploadError
+from outages_processor.utils.http import get_backoff_time, get_retry_after, is_retryable_error, read_json
+from outages_processor.utils.jsonstream import encode_json_array
+from outages_processor.utils.metrics import get_metrics
+
+
+logger = outages_processor.utils.get_logger(__name__)
 
 
 class SiteDeviceInfo(namedtuple("_SiteDeviceInfo", ("id", "name"))):
@@ -12,7 +32,115 @@ class SiteDeviceInfo(namedtuple("_SiteDeviceInfo", ("id", "name"))):
     """
 
 
-def get_site_info(site_name: str, devices_map: bool = True) -> dict:
+class UploadConfig(namedtuple("_UploadConfig",
+                              ("chunk_size", "max_workers", "retries", "compression"),
+                              defaults=(UPLOAD_CHUNK_SIZE, UPLOAD_MAX_WORKERS, 3, UPLOAD_COMPRESSION))):
+    """
+    Container class for upload settings.
+    A chunk_size of 0 uploads all outages in a single request, otherwise the outages are uploaded in chunks of up to
+    chunk_size outages, with up to max_workers chunks in flight at once and each chunk retried up to retries times.
+    compression is the content encoding for request bodies, gzip, zstd or none.
+    """
+
+
+class ChunkFailure(namedtuple("_ChunkFailure", ("index", "offset", "size", "error"))):
+    """
+    Container class for holding details of a chunk which failed to upload.
+    offset is the position of the chunk's first outage in the uploaded outages.
+    """
+
+
+class SiteResult(namedtuple("_SiteResult", ("site_name", "success", "outages_uploaded", "error"))):
+    """
+    Container class for holding the outcome of processing a single site
+    """
+
+
+def build_devices_map(site_info: dict) -> dict:
+    """
+    Converts site information from the API to a dictionary with device IDs as keys and full device info as values
+    :param site_info: The site information JSON body
+    :type site_info: dict
+    :return: A dictionary of device ID to SiteDeviceInfo
+    :rtype: dict
+    """
+    return {
+        item.get("id"): SiteDeviceInfo(item.get("id"), item.get("name")) for item in site_info.get("devices")
+    }
+
+
+_site_info_cache = TTLCache(maxsize=SITE_INFO_CACHE_SIZE, ttl=SITE_INFO_CACHE_TTL)
+# Site name -> (cached site information, devices map built from it), so cache hits do not rebuild the map
+_devices_maps = {}
+
+
+def get_site_info_cache() -> TTLCache:
+    """
+    Gets the cache of site information shared by all get_site_info calls
+    :return: The shared cache
+    :rtype: TTLCache
+    """
+    return _site_info_cache
+
+
+def configure_site_info_cache(maxsize: int = SITE_INFO_CACHE_SIZE,
+                              ttl: float = SITE_INFO_CACHE_TTL,
+                              path: str = None) -> TTLCache:
+    """
+    Replaces the cache of site information shared by all get_site_info calls
+    :param maxsize: Maximum number of sites to cache
+    :type maxsize: int
+    :param ttl: Number of seconds before cached site information is revalidated with the API
+    :type ttl: float
+    :param path: Optional path of a JSON file to persist the cache to between runs
+    :type path: str
+    :return: The new cache
+    :rtype: TTLCache
+    :raises StateError: If the cache file exists but cannot be read
+    """
+    global _site_info_cache  # pylint: disable=global-statement
+    _site_info_cache = TTLCache(maxsize=maxsize, ttl=ttl, path=path)
+    return _site_info_cache
+
+
+def _get_cached_site_info(site_name: str) -> dict:
+    """
+    Gets site information from the shared cache, fetching it from the API if there is no entry.
+    Stale entries are revalidated with a conditional request and reused if the API responds 304 Not Modified.
+    """
+    cache = _site_info_cache
+    entry = cache.get(site_name)
+    if entry is not None and cache.is_fresh(entry):
+        cache.record("hits")
+        return entry.value
+
+    headers = entry.conditional_headers() if entry is not None else {}
+    response = outages_processor.utils.api_request("GET", f"/site-info/{site_name}", headers=headers)
+    if entry is not None and response.status_code == 304:
+        logger.debug("Site information for %s not modified, reusing cached entry", site_name)
+        cache.record("revalidations")
+        cache.set(site_name, entry.revalidated())
+        return entry.value
+
+    cache.record("misses")
+    site_info = read_json(response)
+    cache.set(site_name, CacheEntry.from_response(site_info, response))
+    return site_info
+
+
+def _get_cached_devices_map(site_name: str, site_info: dict) -> dict:
+    """
+    Gets the devices map for cached site information, building it only when the cached entry has been replaced
+    """
+    cached = _devices_maps.get(site_name)
+    if cached is not None and cached[0] is site_info:
+        return cached[1]
+    devices = build_devices_map(site_info)
+    _devices_maps[site_name] = (site_info, devices)
+    return devices
+
+
+def get_site_info(site_name: str, devices_map: bool = True, use_cache: bool = True) -> dict:
     """
     Gets information about the given site from the API
     :param site_name: Site name to retrieve information for
@@ -20,26 +148,144 @@ def get_site_info(site_name: str, devices_map: bool = True) -> dict:
     :param devices_map: Set to True to convert the resulting information to a dictionary with device IDs as keys and
     full device info as values
     :type devices_map: bool
+    :param use_cache: Set to False to always fetch the site information from the API, bypassing the shared cache.
+    Cached site information, and the devices map built from it, is shared between callers and must not be modified.
+    :type use_cache: bool
     :return: The JSON body if devices_map is False, a dictionary as per above if devices_map is True
     :rtype: dict
     :raises APIError: In the event of an issue connecting to the API or an unexpected HTTP response
+    :raises StateError: If the site information cannot be saved to the cache file
     """
-    response = outages_processor.utils.api_request("GET", f"/site-info/{site_name}").json()
-    if devices_map:
-        response = {
-            item.get("id"): SiteDeviceInfo(item.get("id"), item.get("name")) for item in response.get("devices")
-        }
-    return response
+    with get_metrics().stage("site_info"):
+        if use_cache:
+            response = _get_cached_site_info(site_name)
+            return _get_cached_devices_map(site_name, response) if devices_map else response
+        response = read_json(outages_processor.utils.api_request("GET", f"/site-info/{site_name}"))
+    return build_devices_map(response) if devices_map else response
 
 
-def upload_site_outages(site_name: str, outages_with_devices: list[dict]) -> bool:
+def upload_site_outages(site_name: str,
+                        outages_with_devices: Iterable[dict],
+                        upload_config: UploadConfig = None) -> bool:
     """
     Uploads enhanced site outage information to the API
     :param site_name: Site name to associate enhanced outage information with
-    :param outages_with_devices: A list of dicts, each containing a blob of enhanced outage data
+    :param outages_with_devices: A list of dicts, each containing a blob of enhanced outage data, or of OutageRecord
+    objects. Any other iterable, such as the iterator from iter_device_info_to_outages, is consumed one outage at a
+    time and encoded straight into the request body, so the outages are never all held in memory as dicts.
+    :param upload_config: Upload settings, defaults to the values in constants. If a chunk size is set the outages
+    are uploaded in chunks, see upload_site_outages_chunked.
+    :type upload_config: UploadConfig
     :return: True if the request completed successfully, False otherwise
     :rtype: bool
     :raises APIError: In the event of an issue connecting to the API or an unexpected HTTP response
+    :raises ChunkUploadError: If uploading in chunks and any chunk could not be uploaded
     """
-    response = outages_processor.utils.api_request("POST", f"/site-outages/{site_name}", json=outages_with_devices)
+    upload_config = upload_config or UploadConfig()
+    if upload_config.chunk_size:
+        return upload_site_outages_chunked(site_name, outages_with_devices, upload_config)
+
+    response = outages_processor.utils.api_request("POST",
+                                                   f"/site-outages/{site_name}",
+                                                   compression=upload_config.compression,
+                                                   **_request_body(outages_with_devices))
     return response.ok
+
+
+def _request_body(outages: Iterable) -> dict:
+    """
+    Gets the api_request arguments to send outages as the JSON body of a request.
+    Lists of dicts are encoded by api_request, anything else with encode_json_array.
+    """
+    if isinstance(outages, list) and not any(isinstance(outage, OutageRecord) for outage in outages[:1]):
+        return {"json": outages}
+    # The body is encoded up front rather than streamed so that it can be resent if the request is retried
+    return {"data": encode_json_array(outages), "headers": {"Content-Type": "application/json"}}
+
+
+def _iter_chunks(outages: Iterable[dict], chunk_size: int) -> Iterator[tuple]:
+    """
+    Splits outages into chunks, yielding (index, offset, chunk) tuples
+    """
+    outages = iter(outages)
+    for index in itertools.count():
+        chunk = list(itertools.islice(outages, chunk_size))
+        if not chunk:
+            return
+        yield index, index * chunk_size, chunk
+
+
+def _upload_chunk(site_name: str, chunk: list[dict], upload_config: UploadConfig) -> None:
+    """
+    Uploads a single chunk, retrying server errors, timeouts and connection errors with a backoff delay, or the delay
+    given by the API's Retry-After header if longer. Rate limiting is already retried by api_request.
+    """
+    retry_after = 0.0
+    for retry_number in range(upload_config.retries + 1):
+        if retry_number:
+            time.sleep(max(get_backoff_time(retry_number), retry_after))
+        try:
+            outages_processor.utils.api_request("POST",
+                                                f"/site-outages/{site_name}",
+                                                compression=upload_config.compression,
+                                                **_request_body(chunk))
+            return
+        except APIError as exc:
+            if retry_number >= upload_config.retries or not is_retryable_error(exc):
+                raise
+            retry_after = get_retry_after(getattr(exc.__cause__, "response", None))
+            logger.debug("Retrying chunk upload for site %s after error: %s", site_name, exc.__cause__)
+            get_metrics().increment("upload_chunk_retries")
+
+
+def upload_site_outages_chunked(site_name: str,
+                                outages_with_devices: Iterable[dict],
+                                upload_config: UploadConfig) -> bool:
+    """
+    Uploads enhanced site outage information to the API in chunks, with several chunks in flight at once.
+    Each chunk is retried on its own, so a transient error only resends the affected chunk. Chunks may reach the API
+    in any order. Outages are consumed from the iterable as chunks are sent, so at most max_workers chunks are held
+    in memory at a time.
+    :param site_name: Site name to associate enhanced outage information with
+    :type site_name: str
+    :param outages_with_devices: A list or any other iterable of enhanced outage dicts
+    :type outages_with_devices: Iterable
+    :param upload_config: Upload settings, the chunk size must be set
+    :type upload_config: UploadConfig
+    :return: True if every chunk was uploaded successfully
+    :rtype: bool
+    :raises ChunkUploadError: If any chunk could not be uploaded, failed_chunks lists the chunks which failed
+    """
+    max_workers = max(1, upload_config.max_workers)
+    failures = []
+    chunk_count = 0
+
+    def collect(futures: dict) -> None:
+        for future, (index, offset, size) in futures.items():
+            try:
+                future.result()
+            except APIError as exc:
+                logger.debug("Failed to upload chunk %s for site %s: %s", index, site_name, exc)
+                failures.append(ChunkFailure(index, offset, size, exc))
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = {}
+        for index, offset, chunk in _iter_chunks(outages_with_devices, upload_config.chunk_size):
+            if len(pending) >= max_workers:
+                # Wait for a chunk to finish before reading the next one, to bound memory use
+                done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                collect({future: pending.pop(future) for future in done})
+            future = executor.submit(_upload_chunk, site_name, chunk, upload_config)
+            pending[future] = (index, offset, len(chunk))
+            chunk_count += 1
+        collect(pending)
+
+    logger.debug("Uploaded %s chunks for site %s, %s failed", chunk_count, site_name, len(failures))
+    if failures:
+        failures.sort(key=lambda failure: failure.index)
+        raise ChunkUploadError(
+            f"Failed to upload {len(failures)} of {chunk_count} chunks for site {site_name}, "
+            f"chunks: {', '.join(str(failure.index) for failure in failures)}",
+            failures,
+        )
+    return True
@@ -0,0 +1,20 @@
+"""
+Exports for the columnar outages module, requires the columnar extra (numpy) to be installed
+"""
+# The exports mirror outages_processor.api
+# pylint: disable=duplicate-code
+from .outages import (
+    OutageColumns,
+    add_device_info_to_outages,
+    add_device_info_to_site_outages,
+    filter_outages_after_datetime,
+    get_outages_after_datetime,
+)
+
+__all__ = [
+    "add_device_info_to_outages",
+    "add_device_info_to_site_outages",
+    "filter_outages_after_datetime",
+    "get_outages_after_datetime",
+    "OutageColumns",
+]
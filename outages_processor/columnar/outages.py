@@ -0,0 +1,217 @@
+"""
+Columnar outages, filtered and joined with site devices using vectorised NumPy operations
+"""
+import datetime
+from typing import Iterable
+
+import numpy as np
+
+import outages_processor.api.outages
+from outages_processor.api.outages import DEFAULT_DATETIME_EARLIEST
+from outages_processor.utils.logging import get_logger
+from outages_processor.utils.metrics import get_metrics
+from outages_processor.utils.timestamps import parse_timestamp
+
+
+logger = get_logger(__name__)
+
+# Microseconds match the precision of datetime, so comparisons give the same results as the per-dict path
+DATETIME_UNIT = "datetime64[us]"
+
+
+def to_datetime64(datetime_value: datetime.datetime) -> np.datetime64:
+    """
+    Converts a datetime to a NumPy datetime64 in UTC
+    :param datetime_value: The datetime to convert, a naive datetime is assumed to be in local time
+    :type datetime_value: datetime.datetime
+    :return: The UTC datetime64
+    :rtype: np.datetime64
+    """
+    return np.datetime64(datetime_value.astimezone(datetime.timezone.utc).replace(tzinfo=None), "us")
+
+
+def parse_timestamps(values: list[str]) -> np.ndarray:
+    """
+    Parses timestamps into an array of UTC datetime64 values.
+    Timestamps in the API format are parsed by NumPy in one pass, anything else falls back to parse_timestamp.
+    Missing timestamps, such as the end of an ongoing outage, are parsed as NaT.
+    :param values: The timestamps to parse, or None where missing
+    :type values: list
+    :return: The parsed timestamps
+    :rtype: np.ndarray
+    :raises ValueError: If a timestamp is not a valid ISO 8601 timestamp
+    """
+    if not values:
+        return np.empty(0, dtype=DATETIME_UNIT)
+    text = np.asarray(values, dtype=str)
+    # The shape of the API format, YYYY-MM-DDTHH:MM:SS.sssZ, validated in full by NumPy's parser
+    is_api_format = (np.char.str_len(text) == 24) & np.char.endswith(text, "Z") & (np.char.find(text, "T") == 10)
+    result = np.empty(len(text), dtype=DATETIME_UNIT)
+    result[is_api_format] = text[is_api_format].astype("U23").astype(DATETIME_UNIT)
+    for index in np.flatnonzero(~is_api_format):
+        value = values[index]
+        result[index] = np.datetime64("NaT") if value is None else to_datetime64(parse_timestamp(value))
+    return result
+
+
+class OutageColumns:
+    """
+    Outages held as columns: begin and end times as datetime64 arrays, with NaT for outages without an end time, and
+    device IDs coded as integers into an array of the unique device IDs.
+    The original begin and end strings are kept so that outages are uploaded unchanged.
+    Only the id, begin and end fields of each outage are kept.
+    """
+    def __init__(self, device_ids: np.ndarray, codes: np.ndarray, begin: np.ndarray, end: np.ndarray, text: tuple):
+        """
+        :param device_ids: The unique device IDs
+        :type device_ids: np.ndarray
+        :param codes: For each outage, the index of its device ID in device_ids
+        :type codes: np.ndarray
+        :param begin: For each outage, the begin time
+        :type begin: np.ndarray
+        :param end: For each outage, the end time
+        :type end: np.ndarray
+        :param text: Arrays of the original begin and end strings for each outage, as a (begin, end) tuple
+        :type text: tuple
+        """
+        self.device_ids = device_ids
+        self.codes = codes
+        self.begin = begin
+        self.end = end
+        self.text = text
+
+    @classmethod
+    def from_outages(cls, outages: Iterable[dict]) -> "OutageColumns":
+        """
+        Loads outages into columns
+        :param outages: An iterable of outage events as dicts
+        :type outages: Iterable
+        :return: The columnar outages
+        :rtype: OutageColumns
+        :raises ValueError: If a begin or end time is not a valid ISO 8601 timestamp
+        """
+        outages = outages if isinstance(outages, list) else list(outages)
+        ids = [outage.get("id") for outage in outages]
+        begin_text = [outage.get("begin") for outage in outages]
+        end_text = [outage.get("end") for outage in outages]
+        # Codes are assigned in order of first appearance
+        device_codes = {device_id: code for code, device_id in enumerate(dict.fromkeys(ids))}
+        device_ids = np.empty(len(device_codes), dtype=object)
+        device_ids[:] = list(device_codes)
+        return cls(
+            device_ids,
+            np.fromiter(map(device_codes.__getitem__, ids), dtype=np.int32, count=len(ids)),
+            parse_timestamps(begin_text),
+            parse_timestamps(end_text),
+            (np.array(begin_text, dtype=object), np.array(end_text, dtype=object)),
+        )
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def take(self, rows: np.ndarray) -> "OutageColumns":
+        """
+        Selects outages by row
+        :param rows: A boolean mask or integer indexes of the outages to select
+        :type rows: np.ndarray
+        :return: The selected outages, sharing the device IDs of these outages
+        :rtype: OutageColumns
+        """
+        return OutageColumns(self.device_ids, self.codes[rows], self.begin[rows], self.end[rows],
+                             (self.text[0][rows], self.text[1][rows]))
+
+    def to_outages(self, names: np.ndarray = None) -> list[dict]:
+        """
+        Converts the outages back to dicts, in the upload format if names are given
+        :param names: Optional device name for each outage
+        :type names: np.ndarray
+        :return: A list of outage dicts
+        :rtype: list
+        """
+        columns = [self.device_ids[self.codes].tolist(), self.text[0].tolist(), self.text[1].tolist()]
+        if names is None:
+            return [{"id": device_id, "begin": begin, "end": end} for device_id, begin, end in zip(*columns)]
+        return [
+            {"id": device_id, "begin": begin, "end": end, "name": name}
+            for device_id, begin, end, name in zip(*columns, names.tolist())
+        ]
+
+
+def filter_outages_after_datetime(columns: OutageColumns, datetime_earliest: datetime.datetime) -> OutageColumns:
+    """
+    Filters outages by time window, any outages that began before the given datetime will be filtered out
+    :param columns: The columnar outages
+    :type columns: OutageColumns
+    :param datetime_earliest: The datetime to use for filtering
+    :type datetime_earliest: datetime.datetime
+    :return: The outages which began at or after the given datetime
+    :rtype: OutageColumns
+    """
+    return columns.take(columns.begin >= to_datetime64(datetime_earliest))
+
+
+def get_outages_after_datetime(datetime_earliest: datetime.datetime = DEFAULT_DATETIME_EARLIEST) -> OutageColumns:
+    """
+    Gets the outages filtered by time window as columns, see outages_processor.api.get_outages_after_datetime
+    :param datetime_earliest: The datetime to use for filtering. Events occurring before this datetime
+    will be filtered out.
+    :type datetime_earliest: datetime.datetime
+    :return: The outages which began at or after the given datetime
+    :rtype: OutageColumns
+    :raises APIError: In the event of an issue connecting to the API or an unexpected HTTP response
+    """
+    all_outages = outages_processor.api.outages.get_all_outages()
+    with get_metrics().stage("filter") as timer:
+        columns = filter_outages_after_datetime(OutageColumns.from_outages(all_outages), datetime_earliest)
+        timer.records = len(columns)
+    return columns
+
+
+def add_device_info_to_outages(columns: OutageColumns, site_devices_map: dict) -> list:
+    """
+    Enhances outage information with the name of the associated device, see
+    outages_processor.api.add_device_info_to_outages. The lookup is made once per unique device ID and applied to
+    every outage as an array operation.
+    :param columns: The columnar outages
+    :type columns: OutageColumns
+    :param site_devices_map: A dictionary where the keys are device IDs and the values are device info
+    :type site_devices_map: dict
+    :return: A list of new outage dicts in the upload format, each including the name of the device
+    :rtype: list
+    """
+    with get_metrics().stage("join") as timer:
+        outages_with_devices = _join_device_names(columns, site_devices_map)
+        timer.records = len(outages_with_devices)
+    return outages_with_devices
+
+
+def _join_device_names(columns: OutageColumns, site_devices_map: dict) -> list:
+    """
+    Selects the outages for the devices in the map and converts them to dicts including the device names
+    """
+    device_names = np.array(
+        [getattr(site_devices_map.get(device_id), "name", None) for device_id in columns.device_ids.tolist()],
+        dtype=object,
+    )
+    is_known = np.array([device_id in site_devices_map for device_id in columns.device_ids.tolist()], dtype=bool)
+    rows = np.flatnonzero(is_known[columns.codes])
+    logger.debug("Matched %s of %s outages to site devices", len(rows), len(columns))
+    selected = columns.take(rows)
+    return selected.to_outages(device_names[selected.codes])
+
+
+def add_device_info_to_site_outages(columns: OutageColumns, site_devices_maps: dict) -> dict:
+    """
+    Enhances outage information with the name of the associated device for several sites,
+    see add_device_info_to_outages
+    :param columns: The columnar outages
+    :type columns: OutageColumns
+    :param site_devices_maps: A dictionary where the keys are site names and the values are site devices maps
+    :type site_devices_maps: dict
+    :return: A dictionary where the keys are site names and the values are lists of enhanced outages for the site
+    :rtype: dict
+    """
+    return {
+        site_name: add_device_info_to_outages(columns, site_devices_map)
+        for site_name, site_devices_map in site_devices_maps.items()
+    }
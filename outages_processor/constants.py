@@ -4,8 +4,39 @@ Outages processor package constants
 import os
 
 
-API_BASE_URL = "https://api.krakenflex.systems/interview-tests-mock-api/v1"
+API_BASE_URL = os.getenv("OP_API_BASE_URL", "https://api.krakenflex.systems/interview-tests-mock-api/v1")
 API_KEY = os.getenv("API_KEY", "EltgJ5G8m44IzwE6UN2Y4B4NjPW77Zk6FJK3lL23")
+# Directory for the on-disk API response caches, empty to only cache in memory
+CACHE_DIR = os.getenv("OP_CACHE_DIR", "")
+DEBUG = os.getenv("OP_DEBUG", "false").lower() == "true"
+# Empty to advertise every encoding the HTTP client can decode, identity to request uncompressed responses
+HTTP_ACCEPT_ENCODING = os.getenv("OP_HTTP_ACCEPT_ENCODING", "")
+HTTP_KEEP_ALIVE = os.getenv("OP_HTTP_KEEP_ALIVE", "true").lower() == "true"
+# Maximum number of API requests in flight at once, reduced automatically while the API is throttling, 0 for no limit
+HTTP_MAX_CONCURRENCY = int(os.getenv("OP_HTTP_MAX_CONCURRENCY", "32"))
+HTTP_POOL_CONNECTIONS = int(os.getenv("OP_HTTP_POOL_CONNECTIONS", "10"))
+HTTP_POOL_MAXSIZE = int(os.getenv("OP_HTTP_POOL_MAXSIZE", "10"))
+# Sustained API requests per second, 0 for no limit, with up to the burst size sent at once
+HTTP_RATE_BURST = int(os.getenv("OP_HTTP_RATE_BURST", "10"))
+HTTP_RATE_LIMIT = float(os.getenv("OP_HTTP_RATE_LIMIT", "0"))
 HTTP_TIMEOUT_SECONDS = 10
+# One of auto, orjson, ujson or json, auto picks the fastest installed backend
+JSON_BACKEND = os.getenv("OP_JSON_BACKEND", "auto").lower()
+# One of text or json, json writes each log record as a single line JSON object
+LOG_FORMAT = os.getenv("OP_LOG_FORMAT", "text").lower()
+# Set to true to write log records from a background thread, so logging never blocks on the output stream
+LOG_QUEUE = os.getenv("OP_LOG_QUEUE", "false").lower() == "true"
+MAX_WORKERS = int(os.getenv("OP_MAX_WORKERS", "4"))
+# Minimum number of sites in a run for the outages to be indexed by device ID, rather than scanned once per site
+OUTAGE_INDEX_MIN_SITES = int(os.getenv("OP_OUTAGE_INDEX_MIN_SITES", "16"))
+# Outages passed between the stages of --pipeline at a time, and the number of batches each queue holds
+PIPELINE_BATCH_SIZE = int(os.getenv("OP_PIPELINE_BATCH_SIZE", "500"))
+PIPELINE_QUEUE_SIZE = int(os.getenv("OP_PIPELINE_QUEUE_SIZE", "4"))
+SITE_INFO_CACHE_SIZE = int(os.getenv("OP_SITE_INFO_CACHE_SIZE", "128"))
+SITE_INFO_CACHE_TTL = float(os.getenv("OP_SITE_INFO_CACHE_TTL", "300"))
 SITE_NAME = "norwich-pear-tree"
+STATE_FILE = os.getenv("OP_STATE_FILE", os.path.join(os.path.expanduser("~"), ".outages_processor", "state.json"))
+UPLOAD_CHUNK_SIZE = int(os.getenv("OP_UPLOAD_CHUNK_SIZE", "0"))
+UPLOAD_COMPRESSION = os.getenv("OP_UPLOAD_COMPRESSION", "none").lower()
+UPLOAD_MAX_WORKERS = int(os.getenv("OP_UPLOAD_MAX_WORKERS", "4"))
 VERSION = "1.0"
@@ -0,0 +1,20 @@
+"""
+Exports for the parallel outages module, which filters and joins the outages across a pool of worker processes
+"""
+from .outages import (
+    SharedOutages,
+    add_device_info_to_site_outages,
+    close_process_pool,
+    create_process_pool,
+    filter_outages_after_datetime,
+    get_process_pool,
+)
+
+__all__ = [
+    "add_device_info_to_site_outages",
+    "close_process_pool",
+    "create_process_pool",
+    "filter_outages_after_datetime",
+    "get_process_pool",
+    "SharedOutages",
+]
@@ -0,0 +1,315 @@
+"""
+Outages filtered and joined with site devices across a pool of worker processes.
+The device ID and begin time of each outage are copied once into shared memory, and each worker reads only its own
+shard of them, so the outages are never pickled. Workers return the positions of the outages they selected, which are
+merged in shard order, so the results are in the same order as the single process path. The worker processes are
+started once and shared by every call, see get_process_pool.
+"""
+import array
+import concurrent.futures
+import datetime
+import itertools
+import multiprocessing
+import os
+import sys
+import threading
+from collections import namedtuple
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+
+from outages_processor.api.outages import DEFAULT_DATETIME_EARLIEST
+from outages_processor.api.records import with_device_name
+from outages_processor.utils.logging import get_logger
+from outages_processor.utils.metrics import get_metrics
+from outages_processor.utils.timestamps import begins_at_or_after
+
+
+logger = get_logger(__name__)
+
+# Device IDs are coded as unsigned ints, and positions returned as unsigned longs
+_CODE_TYPE = "I"
+_POSITION_TYPE = "L"
+_CODE_SIZE = array.array(_CODE_TYPE).itemsize
+
+
+class _Shard(namedtuple("_Shard", ("name", "start", "stop", "text_start", "text_stop"))):
+    """
+    Container class for a worker's shard of the shared outages: the name of the shared memory block, the range of
+    outage positions and the byte range of their begin times
+    """
+
+
+class SharedOutages:
+    """
+    The device IDs and begin times of a list of outages, copied into a shared memory block for worker processes.
+    Device IDs are coded as integers in order of first appearance, and begin times stored as newline separated text.
+    Use as a context manager, which frees the shared memory on exit.
+    """
+    def __init__(self, outages: list):
+        """
+        :param outages: A list of outage events as dicts, which must not be modified while the shared copy is in use
+        :type outages: list
+        :raises ValueError: If a begin time contains a newline
+        """
+        self.outages = outages
+        ids = [outage.get("id") for outage in outages]
+        self.device_codes = {device_id: code for code, device_id in enumerate(dict.fromkeys(ids))}
+        codes = array.array(_CODE_TYPE, map(self.device_codes.__getitem__, ids))
+        # Anything other than a string, such as a missing begin time, is written as text so it fails to parse
+        self._begins = [begin if isinstance(begin, str) else str(begin) for begin in
+                        (outage.get("begin") for outage in outages)]
+        # Timestamps are ASCII, anything else is replaced to keep one byte per character, and fails to parse
+        text = "\n".join(self._begins).encode("ascii", "replace")
+        if text.count(b"\n") != max(0, len(outages) - 1):
+            raise ValueError("Outage begin times must not contain newlines")
+        self._text_start = len(codes) * _CODE_SIZE
+        self.memory = shared_memory.SharedMemory(create=True, size=max(1, self._text_start + len(text)))
+        try:
+            self.memory.buf[:self._text_start] = codes.tobytes()
+            self.memory.buf[self._text_start:self._text_start + len(text)] = text
+        except BaseException:
+            # Nothing else holds the block yet, so it would never be freed
+            self.close()
+            raise
+
+    def __len__(self) -> int:
+        return len(self.outages)
+
+    def codes_for(self, site_devices_map: dict) -> frozenset:
+        """
+        Gets the codes of a site's devices
+        :param site_devices_map: A dictionary where the keys are device IDs and the values are device info
+        :type site_devices_map: dict
+        :return: The codes of the site's devices which have outages
+        :rtype: frozenset
+        """
+        return frozenset(self.device_codes[device_id] for device_id in site_devices_map
+                         if device_id in self.device_codes)
+
+    def shards(self, count: int) -> list:
+        """
+        Splits the outages into contiguous shards of about equal size
+        :param count: Maximum number of shards
+        :type count: int
+        :return: A list of shards, in order
+        :rtype: list
+        """
+        size = -(-len(self) // max(1, count))
+        shards = []
+        text_start = self._text_start
+        for start in range(0, len(self), size):
+            stop = min(start + size, len(self))
+            # One byte per character, plus the newline between each begin time
+            text_stop = text_start + sum(map(len, itertools.islice(self._begins, start, stop))) + (stop - start - 1)
+            shards.append(_Shard(self.memory.name, start, stop, text_start, text_stop))
+            text_start = text_stop + 1
+        return shards
+
+    def close(self) -> None:
+        """
+        Frees the shared memory
+        """
+        self.memory.close()
+        self.memory.unlink()
+
+    def __enter__(self) -> "SharedOutages":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    """
+    Attaches to a shared memory block created by the parent process, which is responsible for freeing it
+    """
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name, track=False)  # pylint: disable=unexpected-keyword-arg
+    return shared_memory.SharedMemory(name)
+
+
+def _filter_and_join_shard(shard: _Shard,
+                           datetime_earliest: datetime.datetime,
+                           compare_strings: bool,
+                           site_codes: list) -> tuple:
+    """
+    Runs in a worker process, selecting the outages of a shard which began at or after the given datetime and, for
+    each site, those of the site's devices. Returns the number of outages selected by the filter and, for each site,
+    the positions of the site's outages as bytes, with a site's codes of None selecting every filtered outage.
+    """
+    memory = _attach(shard.name)
+    try:
+        codes = array.array(_CODE_TYPE, bytes(memory.buf[shard.start * _CODE_SIZE:shard.stop * _CODE_SIZE]))
+        begins = bytes(memory.buf[shard.text_start:shard.text_stop]).decode("ascii").split("\n")
+    finally:
+        memory.close()
+    is_after = begins_at_or_after(datetime_earliest, compare_strings=compare_strings)
+    selected = [
+        (position, code)
+        for position, code, begin in zip(range(shard.start, shard.stop), codes, begins)
+        if is_after(begin)
+    ]
+    return len(selected), [
+        array.array(_POSITION_TYPE, (position for position, code in selected
+                                     if codes_set is None or code in codes_set)).tobytes()
+        for codes_set in site_codes
+    ]
+
+
+_process_pool = None  # pylint: disable=invalid-name
+_process_pool_size = 0  # pylint: disable=invalid-name
+_process_pool_lock = threading.Lock()
+
+
+def create_process_pool(processes: int = None) -> concurrent.futures.ProcessPoolExecutor:
+    """
+    Creates a pool of worker processes for the parallel filter and join. Workers are started from a fork server
+    where available, as forking the main process directly is unsafe once it has started threads.
+    :param processes: Number of worker processes, defaults to the number of CPUs
+    :type processes: int
+    :return: The process pool
+    :rtype: concurrent.futures.ProcessPoolExecutor
+    """
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+    if context.get_start_method() == "forkserver":
+        context.set_forkserver_preload([__name__])
+    return concurrent.futures.ProcessPoolExecutor(max_workers=processes or os.cpu_count(), mp_context=context)
+
+
+def get_process_pool(processes: int = None) -> concurrent.futures.ProcessPoolExecutor:
+    """
+    Gets the process pool shared by every parallel filter and join, creating it on first use, so that long-running
+    processes such as the daemon only start the worker processes once. The pool is replaced if a different number
+    of processes is asked for.
+    :param processes: Number of worker processes, defaults to the number of CPUs
+    :type processes: int
+    :return: The shared process pool
+    :rtype: concurrent.futures.ProcessPoolExecutor
+    """
+    global _process_pool, _process_pool_size  # pylint: disable=global-statement
+    processes = processes or os.cpu_count()
+    with _process_pool_lock:
+        if _process_pool is not None and _process_pool_size != processes:
+            _process_pool.shutdown()
+            _process_pool = None
+        if _process_pool is None:
+            logger.debug("Starting a pool of %s worker processes", processes)
+            _process_pool = create_process_pool(processes)
+            _process_pool_size = processes
+        return _process_pool
+
+
+def close_process_pool() -> None:
+    """
+    Shuts down the shared process pool, if it has been started. The next call to get_process_pool starts a new one.
+    """
+    global _process_pool  # pylint: disable=global-statement
+    with _process_pool_lock:
+        if _process_pool is not None:
+            _process_pool.shutdown()
+            _process_pool = None
+
+
+def _select(outages: list,
+            site_devices_maps: list,
+            datetime_earliest: datetime.datetime,
+            processes: int,
+            compare_strings: bool) -> list:
+    """
+    Filters the outages across a pool of processes, selecting the outages of each site's devices, or every filtered
+    outage if site_devices_maps is None. Returns the positions of the selected outages for each site, in feed order.
+    """
+    site_count = 1 if site_devices_maps is None else len(site_devices_maps)
+    if not outages:
+        return [array.array(_POSITION_TYPE) for _ in range(site_count)]
+    processes = processes or os.cpu_count()
+    metrics = get_metrics()
+    with metrics.stage("share"):
+        shared = SharedOutages(outages)
+    with shared:
+        site_codes = [None] if site_devices_maps is None else list(map(shared.codes_for, site_devices_maps))
+        shards = shared.shards(processes)
+        with metrics.stage("filter") as timer:
+            try:
+                results = list(get_process_pool(processes).map(_filter_and_join_shard,
+                                                               shards,
+                                                               itertools.repeat(datetime_earliest),
+                                                               itertools.repeat(compare_strings),
+                                                               itertools.repeat(site_codes)))
+            except BrokenProcessPool:
+                # A worker died, so the pool cannot be used again
+                close_process_pool()
+                raise
+            timer.records = sum(filtered for filtered, _ in results)
+    logger.debug("Filtered %s outages across %s processes", len(outages), len(shards))
+    return _merge(results, site_count)
+
+
+def _merge(results: list, site_count: int) -> list:
+    """
+    Merges the positions selected for each site from every shard, returning an array of positions for each site
+    """
+    # Each shard's positions are in order and the shards cover the outages in order, so appending gives feed order
+    positions = [array.array(_POSITION_TYPE) for _ in range(site_count)]
+    for _, shard_positions in results:
+        for site_positions, shard_site_positions in zip(positions, shard_positions):
+            site_positions.frombytes(shard_site_positions)
+    return positions
+
+
+def filter_outages_after_datetime(outages: list,
+                                  datetime_earliest: datetime.datetime,
+                                  processes: int = None,
+                                  compare_strings: bool = False) -> list:
+    """
+    Filters outages by time window across a pool of processes, see
+    outages_processor.api.filter_outages_after_datetime
+    :param outages: A list of outage events as dicts
+    :type outages: list
+    :param datetime_earliest: The datetime to use for filtering
+    :type datetime_earliest: datetime.datetime
+    :param processes: Number of worker processes, defaults to the number of CPUs
+    :type processes: int
+    :param compare_strings: Set to True to compare begin times as normalised UTC strings rather than datetimes
+    :type compare_strings: bool
+    :return: A list of the outages which began at or after the given datetime, in the order given
+    :rtype: list
+    :raises iso8601.ParseError: If a begin time is not a valid ISO 8601 timestamp
+    """
+    positions, = _select(outages, None, datetime_earliest, processes, compare_strings)
+    return [outages[position] for position in positions]
+
+
+def add_device_info_to_site_outages(outages: list,
+                                    site_devices_maps: dict,
+                                    processes: int = None,
+                                    datetime_earliest: datetime.datetime = DEFAULT_DATETIME_EARLIEST) -> dict:
+    """
+    Filters outages by time window and enhances them with the name of the associated device for several sites, see
+    outages_processor.api.add_device_info_to_site_outages. The filter and the selection of each site's outages are
+    sharded across a pool of processes, only the selected outages are copied with their device names.
+    :param outages: A list of unfiltered outage events as dicts
+    :type outages: list
+    :param site_devices_maps: A dictionary where the keys are site names and the values are site devices maps
+    :type site_devices_maps: dict
+    :param processes: Number of worker processes, defaults to the number of CPUs
+    :type processes: int
+    :param datetime_earliest: The datetime to use for filtering
+    :type datetime_earliest: datetime.datetime
+    :return: A dictionary where the keys are site names and the values are lists of enhanced outages for the site,
+    in the order given
+    :rtype: dict
+    :raises iso8601.ParseError: If a begin time is not a valid ISO 8601 timestamp
+    """
+    positions = _select(outages, list(site_devices_maps.values()), datetime_earliest, processes, False)
+    site_outages = {}
+    with get_metrics().stage("join") as timer:
+        for (site_name, site_devices_map), site_positions in zip(site_devices_maps.items(), positions):
+            site_outages[site_name] = [
+                with_device_name(outage, site_devices_map[outage.get("id")].name)
+                for outage in map(outages.__getitem__, site_positions)
+            ]
+        timer.records = sum(map(len, site_outages.values()))
+    return site_outages
@@ -2,67 +2,947 @@
 Command line entry point script for the outages processor
 """
 import argparse
+import concurrent.futures
+import functools
+import importlib.util
+import itertools
+import json
+import os
 import sys
-import traceback
+from typing import Callable
 
 import outages_processor.api
 import outages_processor.constants
 import outages_processor.utils
+from outages_processor import parallel
+from outages_processor.api.site import SiteResult, UploadConfig
+from outages_processor.utils.channels import Channel, produce
+from outages_processor.utils.compression import NO_COMPRESSION, available_encodings
+from outages_processor.utils.errors import StateError
+from outages_processor.utils.logging import LOG_FORMATS, configure_logging
+from outages_processor.utils.metrics import configure_metrics, get_metrics, send_statsd, write_prometheus_textfile
+from outages_processor.utils.profiling import PROFILE_FORMATS, PSTATS, MemoryTrace, Profiling, create_profile
+from outages_processor.utils.ratelimit import configure_rate_limiter
+from outages_processor.utils.scheduler import Scheduler, restore_signal_handlers
+from outages_processor.utils.stages import StageGraph
+from outages_processor.utils.watermarks import WatermarkStore
 
 
 logger = outages_processor.utils.get_logger(__name__)
 
 
-def parse_args() -> argparse.Namespace:
+def _parse_address(value: str) -> tuple:
+    """
+    Parses a HOST:PORT address for argparse
+    """
+    host, _, port = value.rpartition(":")
+    if not host or not port.isdigit():
+        raise argparse.ArgumentTypeError(f"Invalid address, expected HOST:PORT: {value}")
+    return host, int(port)
+
+
+def parse_args(argv: list = None) -> argparse.Namespace:
     """
     Parses incoming command line arguments
+    :param argv: Arguments to parse, defaults to the arguments the process was started with
+    :type argv: list
     :return: A namespace containing the parsed arguments
     :rtype: argparse.Namespace
     """
     parser = argparse.ArgumentParser("Outages Processor")
     parser.add_argument("--site-name",
-                        dest="site_name",
-                        default=outages_processor.constants.SITE_NAME,
-                        help="Name of the site to process enhanced outages for")
-    return parser.parse_args()
+                        dest="site_names",
+                        action="append",
+                        metavar="SITE_NAME",
+                        help="Name of the site to process enhanced outages for. "
+                             "Can be repeated to process several sites in one run. "
+                             f"Defaults to {outages_processor.constants.SITE_NAME}")
+    parser.add_argument("--sites-file",
+                        dest="sites_file",
+                        type=argparse.FileType("r", encoding="utf-8"),
+                        help="Path to a file of site names to process, one per line. Blank lines and lines starting "
+                             "with # are ignored")
+    parser.add_argument("--max-workers",
+                        dest="max_workers",
+                        type=int,
+                        default=outages_processor.constants.MAX_WORKERS,
+                        help="Maximum number of sites to process concurrently")
+    engine = parser.add_mutually_exclusive_group()
+    engine.add_argument("--stream",
+                        dest="stream",
+                        action="store_true",
+                        help="Parse the outages as they are downloaded rather than loading the whole response, "
+                             "keeping peak memory bounded for large outage feeds")
+    engine.add_argument("--columnar",
+                        dest="columnar",
+                        action="store_true",
+                        help="Filter the outages and join them with the site devices as NumPy arrays, faster for "
+                             "large outage feeds. Requires the columnar extra")
+    engine.add_argument("--processes",
+                        dest="processes",
+                        type=int,
+                        metavar="N",
+                        help="Filter the outages and join them with the site devices across N worker processes, "
+                             "sharing the outages through shared memory, for large outage feeds on machines with "
+                             "several cores")
+    engine.add_argument("--pipeline",
+                        dest="pipeline",
+                        action="store_true",
+                        help="Stream the outages through the join and into chunked uploads, with each stage running "
+                             "in its own thread and connected by bounded queues, so downloading, joining and "
+                             "uploading overlap")
+    parser.add_argument("--incremental",
+                        dest="incremental",
+                        action="store_true",
+                        help="Only upload outages which are new or changed since the last incremental run for each "
+                             "site, tracked in the state file")
+    parser.add_argument("--state-file",
+                        dest="state_file",
+                        default=outages_processor.constants.STATE_FILE,
+                        help="Path of the state file used by --incremental")
+    parser.add_argument("--cache-dir",
+                        dest="cache_dir",
+                        default=outages_processor.constants.CACHE_DIR,
+                        help="Directory to persist cached API responses to between runs, by default responses are "
+                             "only cached in memory")
+    parser.add_argument("--no-cache",
+                        dest="no_cache",
+                        action="store_true",
+                        help="Fetch every API response in full, without reading or writing the caches")
+    parser.add_argument("--clear-cache",
+                        dest="clear_cache",
+                        action="store_true",
+                        help="Delete the cached API responses before processing")
+    parser.add_argument("--interval",
+                        dest="interval",
+                        type=float,
+                        default=0,
+                        metavar="SECONDS",
+                        help="Run as a daemon, processing the sites every this many seconds until stopped with "
+                             "SIGTERM or SIGINT. The connection pool and caches are kept warm between runs")
+    parser.add_argument("--jitter",
+                        dest="jitter",
+                        type=float,
+                        metavar="SECONDS",
+                        help="Maximum random delay added before each run of a daemon, so daemons started together do "
+                             "not run in step. Defaults to a tenth of --interval")
+    parser.add_argument("--upload-chunk-size",
+                        dest="upload_chunk_size",
+                        type=int,
+                        default=outages_processor.constants.UPLOAD_CHUNK_SIZE,
+                        help="Upload each site's outages in chunks of this many outages, 0 uploads them all in one "
+                             "request")
+    parser.add_argument("--upload-workers",
+                        dest="upload_workers",
+                        type=int,
+                        default=outages_processor.constants.UPLOAD_MAX_WORKERS,
+                        help="Maximum number of chunks to upload concurrently for each site")
+    parser.add_argument("--upload-compression",
+                        dest="upload_compression",
+                        choices=(NO_COMPRESSION,) + available_encodings(),
+                        type=str.lower,
+                        default=outages_processor.constants.UPLOAD_COMPRESSION,
+                        help="Compress upload request bodies with the given content encoding")
+    parser.add_argument("--rate-limit",
+                        dest="rate_limit",
+                        type=float,
+                        default=outages_processor.constants.HTTP_RATE_LIMIT,
+                        help="Maximum sustained API requests per second across every site, 0 for no limit")
+    parser.add_argument("--rate-burst",
+                        dest="rate_burst",
+                        type=int,
+                        default=outages_processor.constants.HTTP_RATE_BURST,
+                        help="Number of API requests which can be sent at once under --rate-limit")
+    parser.add_argument("--max-concurrency",
+                        dest="max_concurrency",
+                        type=int,
+                        default=outages_processor.constants.HTTP_MAX_CONCURRENCY,
+                        help="Maximum number of API requests in flight across every site, reduced automatically "
+                             "while the API is throttling requests, 0 for no limit")
+    parser.add_argument("--log-format",
+                        dest="log_format",
+                        choices=LOG_FORMATS,
+                        type=str.lower,
+                        default=outages_processor.constants.LOG_FORMAT,
+                        help="Write log output as text, or as one JSON object per line for log aggregators")
+    parser.add_argument("--log-queue",
+                        dest="log_queue",
+                        action="store_true",
+                        default=outages_processor.constants.LOG_QUEUE,
+                        help="Write log output from a background thread, so logging never blocks processing")
+    parser.add_argument("--metrics",
+                        dest="metrics",
+                        action="store_true",
+                        help="Record stage timings, HTTP latencies, retries and bytes transferred, and log a summary "
+                             "at the end of the run")
+    parser.add_argument("--metrics-file",
+                        dest="metrics_file",
+                        help="Write the metrics to this Prometheus textfile at the end of the run, implies --metrics")
+    parser.add_argument("--statsd",
+                        dest="statsd",
+                        type=_parse_address,
+                        metavar="HOST:PORT",
+                        help="Send the metrics to this StatsD server at the end of the run, implies --metrics")
+    parser.add_argument("--profile",
+                        dest="profile",
+                        metavar="PATH",
+                        help="Profile the run and write the profile to this file, see --profile-format")
+    parser.add_argument("--profile-format",
+                        dest="profile_format",
+                        choices=PROFILE_FORMATS,
+                        default=PSTATS,
+                        help="Format of the --profile file: pstats profiles every function call with cProfile, "
+                             "collapsed samples the stacks of every thread for a flame graph with less overhead")
+    parser.add_argument("--profile-memory",
+                        dest="profile_memory",
+                        metavar="PATH",
+                        help="Trace memory allocations with tracemalloc, logging the peak and the largest allocation "
+                             "sites and writing a snapshot taken near the peak to this file")
+    args = parser.parse_args(argv)
+    args.metrics = bool(args.metrics or args.metrics_file or args.statsd)
+    if args.interval < 0 or (args.jitter or 0) < 0:
+        parser.error("--interval and --jitter must not be negative")
+    if args.jitter is None:
+        args.jitter = args.interval / 10
+    if args.processes is not None and args.processes < 1:
+        parser.error("--processes must be at least 1")
+    if args.profile and args.profile_memory and os.path.abspath(args.profile) == os.path.abspath(args.profile_memory):
+        parser.error("--profile and --profile-memory must be written to different files")
+    if args.columnar and importlib.util.find_spec("numpy") is None:
+        parser.error("--columnar requires numpy, install the columnar extra")
+    return args
 
 
-def process_outages_inner(site_name: str) -> None:
+def get_site_names(args: argparse.Namespace) -> list[str]:
     """
-    Performs the inner logic to process the outages and enhance them with the device information
+    Collects the site names to process from the parsed command line arguments
+    :param args: The parsed command line arguments
+    :type args: argparse.Namespace
+    :return: Unique site names in the order given, or the default site if none were given
+    :rtype: list
+    """
+    site_names = list(args.site_names or [])
+    if args.sites_file:
+        with args.sites_file as file_handle:
+            for line in file_handle:
+                line = line.strip()
+                if line and not line.startswith("#"):
+                    site_names.append(line)
+    # Drop duplicates, keeping the order they were given in
+    return list(dict.fromkeys(site_names)) or [outages_processor.constants.SITE_NAME]
+
+
+def upload_outages(site_name: str,
+                   outages_with_devices,
+                   watermarks: WatermarkStore = None,
+                   upload_config: UploadConfig = None) -> int:
+    """
+    Uploads enhanced outages for a site.
+    When a watermark store is given only the outages which are new or changed since the site's high-water mark are
+    uploaded, the upload is skipped if there are none, and the high-water mark is advanced once the upload succeeds.
+    :param site_name: The name of the site to upload outages for
+    :type site_name: str
+    :param outages_with_devices: A list or iterator of enhanced outages
+    :param watermarks: Optional store of per-site high-water marks for incremental processing
+    :type watermarks: WatermarkStore
+    :param upload_config: Optional upload settings, e.g. to upload in chunks
+    :type upload_config: UploadConfig
+    :return: The number of outages uploaded
+    :rtype: int
+    :raises: Any exception thrown by the API or the watermark store
+    """
+    # When the outages are streamed, the upload also includes downloading, parsing and joining them
+    with get_metrics().stage("upload") as timer:
+        uploaded = _upload_outages(site_name, outages_with_devices, watermarks, upload_config)
+        timer.records = uploaded
+    return uploaded
+
+
+def _upload_outages(site_name: str,
+                    outages_with_devices,
+                    watermarks: WatermarkStore,
+                    upload_config: UploadConfig) -> int:
+    """
+    Uploads enhanced outages for a site, see upload_outages
+    """
+    if watermarks is None and isinstance(outages_with_devices, list):
+        outages_processor.api.upload_site_outages(site_name, outages_with_devices, upload_config)
+        return len(outages_with_devices)
+
+    tracker = watermarks.tracker(site_name) if watermarks is not None else None
+    uploaded = 0
+
+    def count(outages):
+        nonlocal uploaded
+        for outage in outages:
+            uploaded += 1
+            yield outage
+
+    outages = count(tracker.select(outages_with_devices) if tracker else outages_with_devices)
+    first = next(outages, None)
+    if first is None and tracker:
+        logger.info("No new or changed outages for site %s", site_name)
+    else:
+        outages_processor.api.upload_site_outages(site_name,
+                                                  itertools.chain([first] if first is not None else [], outages),
+                                                  upload_config)
+    if tracker:
+        watermarks.update(site_name, tracker.watermark)
+    return uploaded
+
+
+def process_site_outages(site_name: str,
+                         all_outages: list[dict],
+                         watermarks: WatermarkStore = None,
+                         upload_config: UploadConfig = None) -> int:
+    """
+    Enhances the given outages with the device information for a site and uploads them
     :param site_name: The name of the site to process outages for
     :type site_name: str
+    :param all_outages: Outages to filter and enhance, these are not modified so can be shared between sites
+    :type all_outages: list
+    :param watermarks: Optional store of per-site high-water marks, to only upload new or changed outages
+    :type watermarks: WatermarkStore
+    :param upload_config: Optional upload settings, e.g. to upload in chunks
+    :type upload_config: UploadConfig
+    :return: The number of outages uploaded
+    :rtype: int
+    :raises: Any exception thrown by the API
+    """
+    return join_and_upload(site_name, all_outages, get_site_devices_map(site_name), watermarks, upload_config)
+
+
+def fetch_outages() -> list[dict]:
+    """
+    Fetches the outages after the cutoff date, as the first stage of the pipeline
+    :return: The outages
+    :rtype: list
     :raises: Any exception thrown by the API
     """
-    # Fetch all outages from the API
     all_outages = outages_processor.api.outages.get_outages_after_datetime()
     logger.info("Found %s outages after cutoff date", len(all_outages))
-    # Get site device info in a dict with device ids as keys
+    return all_outages
+
+
+def get_site_devices_map(site_name: str) -> dict:
+    """
+    Fetches the devices of a site, as a stage of the pipeline which does not depend on the outages
+    :param site_name: The name of the site
+    :type site_name: str
+    :return: A dictionary where the keys are device IDs and the values are device info
+    :rtype: dict
+    :raises: Any exception thrown by the API
+    """
     site_devices_map = outages_processor.api.get_site_info(site_name, devices_map=True)
-    logger.info("Found %s devices", len(site_devices_map.keys()))
-    # Merge the outages and devices
+    logger.info("Found %s devices for site %s", len(site_devices_map.keys()), site_name)
+    return site_devices_map
+
+
+def join_and_upload(site_name: str,
+                    all_outages: list[dict],
+                    site_devices_map: dict,
+                    watermarks: WatermarkStore = None,
+                    upload_config: UploadConfig = None) -> int:
+    """
+    Enhances the given outages with the devices of a site and uploads them, the stage of the pipeline which depends
+    on both the outages and the site's devices
+    :param site_name: The name of the site to process outages for
+    :type site_name: str
+    :param all_outages: Outages to enhance, or an OutageIndex of them, these are not modified so can be shared
+    between sites
+    :type all_outages: list
+    :param site_devices_map: The devices of the site, see get_site_devices_map
+    :type site_devices_map: dict
+    :param watermarks: Optional store of per-site high-water marks, to only upload new or changed outages
+    :type watermarks: WatermarkStore
+    :param upload_config: Optional upload settings, e.g. to upload in chunks
+    :type upload_config: UploadConfig
+    :return: The number of outages uploaded
+    :rtype: int
+    :raises: Any exception thrown by the API
+    """
     outages_with_devices = outages_processor.api.add_device_info_to_outages(all_outages, site_devices_map)
-    logger.info("Outages with valid device IDs: %s", len(outages_with_devices))
-    # Upload the enhanced info
-    outages_processor.api.upload_site_outages(site_name, outages_with_devices)
-    logger.info("Successfully uploaded enhanced outages information")
+    logger.info("Outages with valid device IDs for site %s: %s", site_name, len(outages_with_devices))
+    uploaded = upload_outages(site_name, outages_with_devices, watermarks, upload_config)
+    logger.info("Successfully uploaded %s enhanced outages for site %s", uploaded, site_name)
+    return uploaded
+
+
+def process_outages_inner(site_name: str,
+                          stream: bool = False,
+                          watermarks: WatermarkStore = None,
+                          upload_config: UploadConfig = None,
+                          pipeline: bool = False) -> None:
+    """
+    Performs the inner logic to process the outages and enhance them with the device information
+    :param site_name: The name of the site to process outages for
+    :type site_name: str
+    :param stream: Set to True to stream the outages through the filter, join and upload one at a time
+    :type stream: bool
+    :param watermarks: Optional store of per-site high-water marks, to only upload new or changed outages
+    :type watermarks: WatermarkStore
+    :param upload_config: Optional upload settings, e.g. to upload in chunks
+    :type upload_config: UploadConfig
+    :param pipeline: Set to True to download, join and upload the outages concurrently, see process_sites_pipelined
+    :type pipeline: bool
+    :raises: Any exception thrown by the API
+    """
+    if pipeline:
+        result, = process_sites_pipelined([site_name], watermarks=watermarks, upload_config=upload_config)
+        if not result.success:
+            raise result.error
+        return
+    if stream:
+        site_devices_map = outages_processor.api.get_site_info(site_name, devices_map=True)
+        logger.info("Found %s devices for site %s", len(site_devices_map.keys()), site_name)
+        outages = outages_processor.api.get_outages_after_datetime(stream=True)
+        outages_with_devices = outages_processor.api.iter_device_info_to_outages(outages, site_devices_map)
+        uploaded = upload_outages(site_name, outages_with_devices, watermarks, upload_config)
+        logger.info("Successfully uploaded %s enhanced outages for site %s", uploaded, site_name)
+        return
+
+    # The outages and the site's devices are fetched concurrently, the join starts once both have arrived
+    with StageGraph(max_workers=2) as graph:
+        uploaded = graph.add(functools.partial(join_and_upload, site_name,
+                                               watermarks=watermarks, upload_config=upload_config),
+                             graph.add(fetch_outages),
+                             graph.add(functools.partial(get_site_devices_map, site_name)))
+    uploaded.result()
+
+
+def _failed_site(site_name: str, exc: BaseException) -> SiteResult:
+    """
+    Logs the failure of a site and wraps it in a SiteResult
+    :param site_name: The name of the site which failed
+    :type site_name: str
+    :param exc: The error raised while processing the site
+    :type exc: BaseException
+    :return: A failed SiteResult
+    :rtype: SiteResult
+    """
+    logger.error("Failed to process outages for site %s. Error: %s", site_name, exc)
+    logger.debug("Traceback for site %s", site_name, exc_info=exc)
+    return SiteResult(site_name, False, 0, exc)
+
+
+def process_sites(site_names: list[str],
+                  max_workers: int = outages_processor.constants.MAX_WORKERS,
+                  stream: bool = False,
+                  watermarks: WatermarkStore = None,
+                  upload_config: UploadConfig = None) -> list:
+    """
+    Processes outages for several sites, fetching the outages once and sharing them between the sites.
+    The outages and the devices of each site are fetched concurrently, and each site is joined and uploaded as soon
+    as both have arrived. With many sites (see OUTAGE_INDEX_MIN_SITES) the outages are indexed by device ID once, so
+    the join for each site only touches the outages of its own devices rather than scanning them all. A failure for
+    one site does not stop the others being processed.
+    :param site_names: The names of the sites to process outages for
+    :type site_names: list
+    :param max_workers: Maximum number of sites to process concurrently
+    :type max_workers: int
+    :param stream: Set to True to join the outages with every site in a single pass as they are downloaded,
+    so only the enhanced outages are held in memory, see process_sites_streamed
+    :type stream: bool
+    :param watermarks: Optional store of per-site high-water marks, to only upload new or changed outages
+    :type watermarks: WatermarkStore
+    :param upload_config: Optional upload settings, e.g. to upload in chunks
+    :type upload_config: UploadConfig
+    :return: A SiteResult for each site, in the order the sites were given
+    :rtype: list
+    :raises: Any exception thrown by the API when fetching the outages
+    """
+    if stream:
+        return process_sites_streamed(site_names, max_workers, watermarks, upload_config)
+
+    # One more worker than sites, so fetching the outages never holds up the sites
+    with StageGraph(max_workers=max(1, max_workers) + 1) as graph:
+        all_outages = graph.add(fetch_outages)
+        if len(site_names) >= outages_processor.constants.OUTAGE_INDEX_MIN_SITES:
+            # Grouped by device once, so each site's join only touches the outages of the site's devices
+            all_outages = graph.add(outages_processor.api.OutageIndex, all_outages)
+        futures = [
+            (site_name, graph.add(functools.partial(join_and_upload, site_name,
+                                                    watermarks=watermarks, upload_config=upload_config),
+                                  all_outages,
+                                  graph.add(functools.partial(get_site_devices_map, site_name))))
+            for site_name in site_names
+        ]
+    # Failing to fetch the outages fails the run, as no site can be processed without them
+    all_outages.result()
+
+    results = []
+    for site_name, future in futures:
+        try:
+            results.append(SiteResult(site_name, True, future.result(), None))
+        except outages_processor.utils.OutagesProcessorError as exc:
+            results.append(_failed_site(site_name, exc))
+    return results
+
+
+def process_sites_streamed(site_names: list[str],
+                           max_workers: int = outages_processor.constants.MAX_WORKERS,
+                           watermarks: WatermarkStore = None,
+                           upload_config: UploadConfig = None) -> list:
+    """
+    Processes outages for several sites, streaming the outages once and joining them with every site as they are
+    parsed. The site information is fetched, and the enhanced outages uploaded, concurrently.
+    :param site_names: The names of the sites to process outages for
+    :type site_names: list
+    :param max_workers: Maximum number of sites to fetch or upload concurrently
+    :type max_workers: int
+    :param watermarks: Optional store of per-site high-water marks, to only upload new or changed outages
+    :type watermarks: WatermarkStore
+    :param upload_config: Optional upload settings, e.g. to upload in chunks
+    :type upload_config: UploadConfig
+    :return: A SiteResult for each site, in the order the sites were given
+    :rtype: list
+    :raises: Any exception thrown by the API when fetching the outages
+    """
+    def join(site_devices_maps: dict) -> dict:
+        # A single pass over the streamed outages, only the enhanced outages for each site are kept
+        return outages_processor.api.add_device_info_to_site_outages(
+            outages_processor.api.get_outages_after_datetime(stream=True),
+            site_devices_maps,
+        )
+    return _process_sites_joined(site_names, max_workers, join, watermarks, upload_config)
+
+
+def process_sites_columnar(site_names: list[str],
+                           max_workers: int = outages_processor.constants.MAX_WORKERS,
+                           watermarks: WatermarkStore = None,
+                           upload_config: UploadConfig = None) -> list:
+    """
+    Processes outages for several sites, loading the outages once into columns and filtering them and joining them
+    with every site as array operations, see outages_processor.columnar. Requires numpy.
+    :param site_names: The names of the sites to process outages for
+    :type site_names: list
+    :param max_workers: Maximum number of sites to fetch or upload concurrently
+    :type max_workers: int
+    :param watermarks: Optional store of per-site high-water marks, to only upload new or changed outages
+    :type watermarks: WatermarkStore
+    :param upload_config: Optional upload settings, e.g. to upload in chunks
+    :type upload_config: UploadConfig
+    :return: A SiteResult for each site, in the order the sites were given
+    :rtype: list
+    :raises: Any exception thrown by the API when fetching the outages
+    """
+    # Imported here as numpy is an optional dependency
+    from outages_processor import columnar  # pylint: disable=import-outside-toplevel
+
+    def fetch_columns():
+        columns = columnar.get_outages_after_datetime()
+        logger.info("Found %s outages after cutoff date", len(columns))
+        return columns
+
+    # The outages are fetched while the site information is, the join waits for both
+    with StageGraph(max_workers=1) as graph:
+        columns = graph.add(fetch_columns)
+
+        def join(site_devices_maps: dict) -> dict:
+            return columnar.add_device_info_to_site_outages(columns.result(), site_devices_maps)
+        return _process_sites_joined(site_names, max_workers, join, watermarks, upload_config)
+
+
+def process_sites_parallel(site_names: list[str],
+                           max_workers: int = outages_processor.constants.MAX_WORKERS,
+                           processes: int = None,
+                           watermarks: WatermarkStore = None,
+                           upload_config: UploadConfig = None) -> list:
+    """
+    Processes outages for several sites, filtering the outages and joining them with every site across a pool of
+    worker processes which read the outages from shared memory, see outages_processor.parallel
+    :param site_names: The names of the sites to process outages for
+    :type site_names: list
+    :param max_workers: Maximum number of sites to fetch or upload concurrently
+    :type max_workers: int
+    :param processes: Number of worker processes, defaults to the number of CPUs
+    :type processes: int
+    :param watermarks: Optional store of per-site high-water marks, to only upload new or changed outages
+    :type watermarks: WatermarkStore
+    :param upload_config: Optional upload settings, e.g. to upload in chunks
+    :type upload_config: UploadConfig
+    :return: A SiteResult for each site, in the order the sites were given
+    :rtype: list
+    :raises: Any exception thrown by the API when fetching the outages
+    """
+    def fetch_all_outages():
+        all_outages = outages_processor.api.outages.get_all_outages()
+        logger.info("Found %s outages", len(all_outages))
+        return all_outages
+
+    # The outages are fetched while the site information is, the join waits for both
+    with StageGraph(max_workers=1) as graph:
+        all_outages = graph.add(fetch_all_outages)
+
+        def join(site_devices_maps: dict) -> dict:
+            return parallel.add_device_info_to_site_outages(all_outages.result(), site_devices_maps, processes)
+        return _process_sites_joined(site_names, max_workers, join, watermarks, upload_config)
+
+
+def _process_sites_joined(site_names: list[str],
+                          max_workers: int,
+                          join: Callable[[dict], dict],
+                          watermarks: WatermarkStore,
+                          upload_config: UploadConfig) -> list:
+    """
+    Fetches the site information for several sites concurrently, joins the outages with every site in one step using
+    the given join function and uploads the enhanced outages for each site concurrently
+    """
+    results = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        site_devices_maps = _get_site_devices_maps(executor, site_names, results)
+        futures = [
+            (site_name, executor.submit(upload_outages, site_name, outages, watermarks, upload_config))
+            for site_name, outages in join(site_devices_maps).items()
+        ]
+        _collect_site_results(futures, results)
+    return [results[site_name] for site_name in site_names]
+
+
+def _get_site_devices_maps(executor: concurrent.futures.Executor, site_names: list[str], results: dict) -> dict:
+    """
+    Fetches the site information for several sites concurrently on the given executor, returning the devices map of
+    each site which succeeded and adding a failed SiteResult to results for each site which did not
+    """
+    futures = [
+        (site_name, executor.submit(outages_processor.api.get_site_info, site_name, devices_map=True))
+        for site_name in site_names
+    ]
+    site_devices_maps = {}
+    for site_name, future in futures:
+        try:
+            site_devices_maps[site_name] = future.result()
+        except outages_processor.utils.OutagesProcessorError as exc:
+            results[site_name] = _failed_site(site_name, exc)
+    return site_devices_maps
+
+
+def _collect_site_results(futures: list, results: dict) -> None:
+    """
+    Waits for the uploads of several sites, adding a SiteResult for each site to results
+    :param futures: (site name, future) tuples, each future returning the number of outages uploaded for the site
+    :type futures: list
+    :param results: Dictionary of site name to SiteResult to add to
+    :type results: dict
+    """
+    for site_name, future in futures:
+        try:
+            results[site_name] = SiteResult(site_name, True, future.result(), None)
+        except outages_processor.utils.OutagesProcessorError as exc:
+            results[site_name] = _failed_site(site_name, exc)
+
+
+def process_sites_pipelined(site_names: list[str],
+                            max_workers: int = outages_processor.constants.MAX_WORKERS,
+                            watermarks: WatermarkStore = None,
+                            upload_config: UploadConfig = None) -> list:
+    """
+    Processes outages for several sites as a pipeline of concurrent stages connected by bounded channels: the outages
+    are streamed and parsed by one thread, joined with every site by another and uploaded in chunks by a thread for
+    each site. The stages overlap, so the run takes about as long as the slowest stage rather than the sum of them,
+    and a stage which falls behind holds the stages before it back, so memory stays bounded by the channel sizes
+    (see PIPELINE_BATCH_SIZE and PIPELINE_QUEUE_SIZE). The outages are downloaded while the site information is
+    fetched. The uploads are always chunked, in batches of PIPELINE_BATCH_SIZE unless a chunk size is set.
+    :param site_names: The names of the sites to process outages for
+    :type site_names: list
+    :param max_workers: Maximum number of sites to fetch the site information for concurrently
+    :type max_workers: int
+    :param watermarks: Optional store of per-site high-water marks, to only upload new or changed outages
+    :type watermarks: WatermarkStore
+    :param upload_config: Optional upload settings
+    :type upload_config: UploadConfig
+    :return: A SiteResult for each site, in the order the sites were given
+    :rtype: list
+    :raises: Any exception thrown by the API when fetching the outages
+    """
+    upload_config = upload_config or UploadConfig()
+    if not upload_config.chunk_size:
+        upload_config = upload_config._replace(chunk_size=outages_processor.constants.PIPELINE_BATCH_SIZE)
+    outages = Channel("join")
+    results = {}
+    # Every stage needs its own thread for the whole run, or a full channel would never be drained
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(site_names) + 2) as executor:
+        stages = [executor.submit(produce, outages, outages_processor.api.get_outages_after_datetime(stream=True))]
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, max_workers)) as site_info_executor:
+            site_devices_maps = _get_site_devices_maps(site_info_executor, site_names, results)
+        channels = {site_name: Channel("upload") for site_name in site_devices_maps}
+        uploads = [
+            (site_name, executor.submit(_upload_from_channel, site_name, channel, watermarks, upload_config))
+            for site_name, channel in channels.items()
+        ]
+        stages.append(executor.submit(_join_into_channels, outages, site_devices_maps, channels))
+    # Failing to fetch or join the outages fails the run, the fetch first as it is the cause of both
+    for stage in stages:
+        stage.result()
+    _collect_site_results(uploads, results)
+    return [results[site_name] for site_name in site_names]
+
+
+def _join_into_channels(outages: Channel, site_devices_maps: dict, channels: dict) -> int:
+    """
+    The join stage of process_sites_pipelined, sending the outages joined with each site to the site's channel.
+    Stops reading the outages once every site's upload has stopped, and passes any error on to every site.
+    """
+    devices_sites = outages_processor.api.index_site_devices(site_devices_maps)
+    joined = 0
+    try:
+        # Includes waiting for the outages to be downloaded, and for the uploads to make room for more
+        with get_metrics().stage("join") as timer:
+            for batch in outages.batches():
+                for site_name, outage in outages_processor.api.iter_device_info_to_site_outages(batch, devices_sites):
+                    channels[site_name].put(outage)
+                    joined += 1
+                if all(channel.cancelled for channel in channels.values()):
+                    outages.cancel()
+                    break
+            timer.records = joined
+    except BaseException as exc:  # pylint: disable=broad-except
+        # Including OutagesProcessorError, which derives from BaseException
+        outages.cancel()
+        for channel in channels.values():
+            channel.close(exc)
+        raise
+    for channel in channels.values():
+        channel.close()
+    logger.info("Joined %s outages with %s sites", joined, len(channels))
+    return joined
+
+
+def _upload_from_channel(site_name: str,
+                         channel: Channel,
+                         watermarks: WatermarkStore,
+                         upload_config: UploadConfig) -> int:
+    """
+    The upload stage of process_sites_pipelined for a site, uploading the outages from the site's channel as they
+    arrive. Cancels the channel if the upload stops early, so the join is not held up.
+    """
+    try:
+        uploaded = upload_outages(site_name, iter(channel), watermarks, upload_config)
+    finally:
+        channel.cancel()
+    logger.info("Successfully uploaded %s enhanced outages for site %s", uploaded, site_name)
+    return uploaded
+
+
+def configure_caches(args: argparse.Namespace) -> None:
+    """
+    Configures the API response caches from the parsed command line arguments
+    :param args: The parsed command line arguments
+    :type args: argparse.Namespace
+    :raises StateError: If a cache file cannot be read or deleted
+    """
+    if args.no_cache:
+        outages_processor.api.site.configure_site_info_cache(maxsize=0)
+        outages_processor.api.outages.configure_outages_cache(None)
+        return
+    if args.cache_dir:
+        outages_processor.api.site.configure_site_info_cache(path=os.path.join(args.cache_dir, "site-info.json"))
+        outages_processor.api.outages.configure_outages_cache(os.path.join(args.cache_dir, "outages.pickle"))
+    elif args.interval:
+        # A daemon keeps the parsed feed between runs, so an unchanged feed is neither downloaded nor parsed again
+        outages_processor.api.outages.configure_outages_cache(in_memory=True)
+    if args.clear_cache:
+        logger.info("Clearing cached API responses")
+        outages_processor.api.site.get_site_info_cache().clear()
+        outages_cache = outages_processor.api.outages.get_outages_cache()
+        if outages_cache is not None:
+            outages_cache.clear()
+
+
+def flush_caches() -> None:
+    """
+    Saves the site information cache file once at the end of a run, rather than after every site.
+    Failing to save the cache is logged rather than failing the run, as the cache only saves requests.
+    """
+    try:
+        outages_processor.api.site.get_site_info_cache().flush()
+    except StateError as exc:
+        logger.warning("Failed to save the site information cache: %s", exc)
+
+
+def log_summary(results: list) -> None:
+    """
+    Logs the outcome of processing each site
+    :param results: SiteResult entries to summarise
+    :type results: list
+    """
+    failures = sum(1 for result in results if not result.success)
+    logger.info("Processed %s sites: %s succeeded, %s failed", len(results), len(results) - failures, failures)
+    for result in results:
+        if result.success:
+            logger.info("Site %s: OK, %s outages uploaded", result.site_name, result.outages_uploaded)
+        else:
+            logger.info("Site %s: FAILED, %s", result.site_name, result.error)
+    stats = outages_processor.api.site.get_site_info_cache().stats()
+    logger.info("Site information cache: %s hits, %s misses, %s revalidated",
+                stats.hits, stats.misses, stats.revalidations)
+    outages_cache = outages_processor.api.outages.get_outages_cache()
+    if outages_cache is not None:
+        stats = outages_cache.stats()
+        logger.info("Outages cache: %s misses, %s revalidated", stats.misses, stats.revalidations)
+
+
+def create_profiling(args: argparse.Namespace) -> Profiling:
+    """
+    Creates the profilers requested by the command line arguments
+    :param args: The parsed command line arguments
+    :type args: argparse.Namespace
+    :return: A context manager running the profilers, which does nothing if no profiling was requested
+    :rtype: Profiling
+    """
+    profilers = {}
+    if args.profile:
+        profilers[args.profile] = create_profile(args.profile_format)
+    if args.profile_memory:
+        profilers[args.profile_memory] = MemoryTrace()
+    return Profiling(profilers)
+
+
+def export_metrics(args: argparse.Namespace) -> None:
+    """
+    Logs a summary of the metrics recorded during the run and exports them as configured by the command line
+    arguments. Failing to export the metrics is logged rather than failing the run.
+    :param args: The parsed command line arguments
+    :type args: argparse.Namespace
+    """
+    metrics = get_metrics()
+    if not metrics.enabled:
+        return
+    logger.info("Metrics: %s", json.dumps(metrics.summary()))
+    try:
+        if args.metrics_file:
+            write_prometheus_textfile(metrics, args.metrics_file)
+        if args.statsd:
+            send_statsd(metrics, args.statsd)
+    except OSError as exc:
+        logger.warning("Failed to export metrics: %s", exc)
+
+
+def run_once(args: argparse.Namespace,
+             site_names: list[str],
+             watermarks: WatermarkStore,
+             upload_config: UploadConfig) -> bool:
+    """
+    Processes every site once with the engine chosen by the command line arguments, then logs the summary and
+    exports the metrics
+    :param args: The parsed command line arguments
+    :type args: argparse.Namespace
+    :param site_names: The names of the sites to process
+    :type site_names: list
+    :param watermarks: Optional store of per-site high-water marks, to only upload new or changed outages
+    :type watermarks: WatermarkStore
+    :param upload_config: Upload settings
+    :type upload_config: UploadConfig
+    :return: True if every site was processed successfully
+    :rtype: bool
+    :raises: Any exception thrown by the API while fetching the outages
+    """
+    try:
+        results = _run_engine(args, site_names, watermarks, upload_config)
+    finally:
+        flush_caches()
+    log_summary(results)
+    export_metrics(args)
+    return all(result.success for result in results)
+
+
+def _run_engine(args: argparse.Namespace,
+                site_names: list[str],
+                watermarks: WatermarkStore,
+                upload_config: UploadConfig) -> list:
+    """
+    Processes every site once with the engine chosen by the command line arguments, see run_once
+    """
+    if args.columnar:
+        results = process_sites_columnar(site_names,
+                                         max_workers=args.max_workers,
+                                         watermarks=watermarks,
+                                         upload_config=upload_config)
+    elif args.processes:
+        results = process_sites_parallel(site_names,
+                                         max_workers=args.max_workers,
+                                         processes=args.processes,
+                                         watermarks=watermarks,
+                                         upload_config=upload_config)
+    elif args.pipeline:
+        results = process_sites_pipelined(site_names,
+                                          max_workers=args.max_workers,
+                                          watermarks=watermarks,
+                                          upload_config=upload_config)
+    else:
+        results = process_sites(site_names,
+                                max_workers=args.max_workers,
+                                stream=args.stream,
+                                watermarks=watermarks,
+                                upload_config=upload_config)
+    return results
+
+
+def run_daemon(args: argparse.Namespace,
+               site_names: list[str],
+               watermarks: WatermarkStore,
+               upload_config: UploadConfig) -> None:
+    """
+    Processes every site every --interval seconds until SIGTERM or SIGINT is received, reusing the session and caches
+    between runs. A failed run is logged and the next run goes ahead as scheduled. Metrics are exported and reset
+    after every run, so each export describes one run.
+    :param args: The parsed command line arguments
+    :type args: argparse.Namespace
+    :param site_names: The names of the sites to process
+    :type site_names: list
+    :param watermarks: Optional store of per-site high-water marks, to only upload new or changed outages
+    :type watermarks: WatermarkStore
+    :param upload_config: Upload settings
+    :type upload_config: UploadConfig
+    """
+    scheduler = Scheduler(args.interval, args.jitter)
+
+    def run():
+        try:
+            run_once(args, site_names, watermarks, upload_config)
+        except (Exception, outages_processor.utils.OutagesProcessorError) as exc:  # pylint: disable=broad-except
+            logger.error("Failed to process outages. Error: %s", exc)
+            logger.debug("Traceback", exc_info=True)
+        get_metrics().reset()
+
+    logger.info("Processing %s sites every %s seconds, with up to %s seconds jitter",
+                len(site_names), args.interval, args.jitter)
+    handlers = scheduler.install_signal_handlers()
+    try:
+        runs = scheduler.run(run)
+    finally:
+        restore_signal_handlers(handlers)
+    logger.info("Stopped after %s runs", runs)
 
 
 def process_outages():
     """
     Command line entry point, wraps the logic in an exception handler for error handling
-    :return: Exits with code 0 if successful, 1 otherwise
+    :return: Exits with code 0 if all sites were processed successfully, or a daemon stopped gracefully, 1 otherwise
     """
     args = parse_args()
+    configure_logging(log_format=args.log_format, use_queue=args.log_queue)
     failed = True
+    configure_metrics(args.metrics)
+    configure_rate_limiter(args.rate_limit, args.rate_burst, args.max_concurrency)
     try:
-        # Treat command line args as kwargs
-        process_outages_inner(**vars(args))
-        # If we get to here then everything completed successfully
-        failed = False
+        configure_caches(args)
+        site_names = get_site_names(args)
+        watermarks = WatermarkStore(args.state_file) if args.incremental else None
+        upload_config = UploadConfig(chunk_size=args.upload_chunk_size,
+                                     max_workers=args.upload_workers,
+                                     compression=args.upload_compression)
+        with create_profiling(args):
+            if args.interval:
+                run_daemon(args, site_names, watermarks, upload_config)
+                failed = False
+            else:
+                # If this completes, check whether any individual site failed
+                failed = not run_once(args, site_names, watermarks, upload_config)
     except outages_processor.utils.OutagesProcessorError as exc:
         logger.error("Failed to process outages. Error: %s", exc)
-        logger.debug(traceback.format_exc())
+        logger.debug("Traceback", exc_info=True)
+    parallel.close_process_pool()
 
     sys.exit(int(failed))
 
@@ -0,0 +1,56 @@
+"""
+Local aiohttp server standing in for the outages API in the asyncio test suites
+"""
+import collections
+import unittest.mock
+
+import aiohttp.test_utils
+import aiohttp.web
+
+import outages_processor.aio
+
+
+class AsyncAPITestCase(unittest.IsolatedAsyncioTestCase):
+    """
+    Base test case which serves registered responses from a local server and points the aio helpers at it
+    """
+    async def asyncSetUp(self):
+        """
+        Starts the local server, shared across the suite
+        """
+        self.responses = collections.defaultdict(list)
+        self.requests = []
+        app = aiohttp.web.Application()
+        app.router.add_route("*", "/{route:.*}", self.handle)
+        self.server = aiohttp.test_utils.TestServer(app)
+        await self.server.start_server()
+        patcher = unittest.mock.patch("outages_processor.aio.http.API_BASE_URL", str(self.server.make_url("/v1")))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def asyncTearDown(self):
+        """
+        Closes the shared client session and stops the local server
+        """
+        await outages_processor.aio.close_client()
+        await self.server.close()
+
+    def register(self, method: str, path: str, *responses):
+        """
+        Registers responses for a route, served in order with the last one repeated
+        :param method: HTTP method, e.g. GET
+        :param path: Path relative to the API root, e.g. /outages
+        :param responses: Tuples of (status, body)
+        """
+        self.responses[(method, f"/v1{path}")].extend(responses)
+
+    async def handle(self, request: aiohttp.web.Request) -> aiohttp.web.Response:
+        """
+        Serves the next registered response for the request route
+        """
+        self.requests.append((request.method, request.path, await request.read()))
+        responses = self.responses.get((request.method, request.path))
+        if not responses:
+            return aiohttp.web.Response(status=404)
+        status, body = responses.pop(0) if len(responses) > 1 else responses[0]
+        return aiohttp.web.Response(status=status, text=body)
@@ -0,0 +1,242 @@
+"""
+Tests for aio.http
+"""
+import asyncio
+import json
+import unittest.mock
+
+import pytest
+
+pytest.importorskip("aiohttp")
+
+# pylint: disable=wrong-import-position
+import outages_processor.aio.http  # noqa: E402
+from outages_processor.tests.aio.server import AsyncAPITestCase  # noqa: E402
+import outages_processor.utils.ratelimit  # noqa: E402
+from outages_processor.tests.utils.test_ratelimit import FakeClock  # noqa: E402
+from outages_processor.utils.errors import APIError  # noqa: E402
+
+
+real_sleep = asyncio.sleep
+
+
+class TestAPIRequest(AsyncAPITestCase):
+    """
+    Test suite for the async api_request function
+    """
+
+    async def asyncSetUp(self):
+        """
+        Common setup, shared across the suite
+        """
+        await super().asyncSetUp()
+        self.outages_get_body = [
+            {
+                "id": "002b28fc-283c-47ec-9af2-ea287336dc1b",
+                "begin": "2021-07-26T17:09:31.036Z",
+                "end": "2021-08-29T00:37:42.253Z",
+            },
+        ]
+        patcher = unittest.mock.patch("asyncio.sleep")
+        self.mock_sleep = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def test_api_request_get(self):
+        """
+        GIVEN
+        I call the function with a GET request to /outages
+        WHEN
+        The server responds gracefully with the expected data
+        THEN
+        I should receive a response back with the correct data and the API key header should have been sent
+        """
+        self.register("GET", "/outages", (200, json.dumps(self.outages_get_body)))
+        response = await outages_processor.aio.http.api_request("GET", "outages")
+        self.assertEqual(200, response.status_code)
+        self.assertTrue(response.ok)
+        self.assertEqual(self.outages_get_body, response.json())
+
+    async def test_api_request_invalid_json(self):
+        """
+        GIVEN
+        I call the function with a GET request to /outages
+        WHEN
+        The server responds with a body which is not valid JSON
+        THEN
+        An APIError should be raised when parsing the body, as for the synchronous helpers
+        """
+        self.register("GET", "/outages", (200, "[{"))
+        response = await outages_processor.aio.http.api_request("GET", "outages")
+        with self.assertRaises(APIError):
+            response.json()
+
+    async def test_api_request_post_with_data(self):
+        """
+        GIVEN
+        I call the function with a POST request with JSON data to /site-outages/norwich-pear-tree
+        WHEN
+        The server responds with a 200 response
+        THEN
+        The JSON payload should be sent to the correct route
+        """
+        self.register("POST", "/site-outages/norwich-pear-tree", (200, ""))
+        response = await outages_processor.aio.http.api_request("POST",
+                                                                "/site-outages/norwich-pear-tree",
+                                                                json=self.outages_get_body)
+        self.assertEqual(200, response.status_code)
+        method, path, body = self.requests[-1]
+        self.assertEqual(("POST", "/v1/site-outages/norwich-pear-tree"), (method, path))
+        self.assertEqual(self.outages_get_body, json.loads(body))
+
+    async def test_api_request_retry_on_500_then_success(self):
+        """
+        GIVEN
+        I call the function with a GET request to /outages
+        WHEN
+        The server responds twice with a 500 error followed by a 200
+        THEN
+        I should receive the correct data, having backed off as urllib3 does between attempts
+        """
+        self.register("GET", "/outages", (500, ""), (500, ""), (200, json.dumps(self.outages_get_body)))
+        response = await outages_processor.aio.http.api_request("GET", "/outages")
+        self.assertEqual(self.outages_get_body, response.json())
+        self.assertEqual(3, len(self.requests))
+        self.assertEqual([unittest.mock.call(0.0), unittest.mock.call(2.0)], self.mock_sleep.call_args_list)
+
+    async def test_api_request_retry_on_500_attempts_exceeded(self):
+        """
+        GIVEN
+        I call the function with a GET request to /outages
+        WHEN
+        The server always responds with a 500 error
+        THEN
+        The retries are exceeded and an APIError should be raised
+        """
+        self.register("GET", "/outages", (500, ""))
+        with self.assertRaises(APIError):
+            await outages_processor.aio.http.api_request("GET", "/outages")
+        self.assertEqual(4, len(self.requests))
+
+    async def test_api_request_post_500_not_retried(self):
+        """
+        GIVEN
+        I call the function with a POST request
+        WHEN
+        The server responds with a 500 error
+        THEN
+        The request is not retried, as POST is not idempotent, and an APIError should be raised
+        """
+        self.register("POST", "/site-outages/norwich-pear-tree", (500, ""))
+        with self.assertRaises(APIError):
+            await outages_processor.aio.http.api_request("POST", "/site-outages/norwich-pear-tree")
+        self.assertEqual(1, len(self.requests))
+
+    async def test_api_request_with_non_retry_code_400(self):
+        """
+        GIVEN
+        I call the function with a GET request to /outages
+        WHEN
+        The server responds once with a 400 error
+        THEN
+        No retries are attempted and an APIError should be raised
+        """
+        self.register("GET", "/outages", (400, ""))
+        with self.assertRaises(APIError):
+            await outages_processor.aio.http.api_request("GET", "/outages")
+        self.assertEqual(1, len(self.requests))
+
+    async def test_api_request_connection_error(self):
+        """
+        GIVEN
+        I call the function with a GET request to /outages
+        WHEN
+        The server cannot be connected to
+        THEN
+        The request is retried and an APIError should be raised
+        """
+        await self.server.close()
+        self.mock_sleep.reset_mock()
+        with self.assertRaises(APIError):
+            await outages_processor.aio.http.api_request("GET", "/outages")
+        self.assertEqual([unittest.mock.call(0.0), unittest.mock.call(2.0), unittest.mock.call(4.0)],
+                         self.mock_sleep.call_args_list[:3])
+
+    async def test_api_request_throttled_pauses_other_coroutines(self):
+        """
+        GIVEN
+        Two coroutines making requests through a shared rate limiter with a maximum concurrency of 4
+        WHEN
+        The server throttles the first coroutine's request with a 429, and the second then makes a request
+        THEN
+        The second coroutine should wait out the pause before sending, the first should be retried, and the
+        concurrency limit should have been halved
+        """
+        self.addCleanup(outages_processor.utils.ratelimit.configure_rate_limiter)
+        limiter = outages_processor.utils.ratelimit.configure_rate_limiter(max_concurrency=4)
+        clock = FakeClock()
+        patcher = unittest.mock.patch("outages_processor.utils.ratelimit.time")
+        patcher.start().monotonic.side_effect = clock.monotonic
+        self.addCleanup(patcher.stop)
+        sleeps = []
+
+        async def sleep(seconds):
+            sleeps.append((asyncio.current_task().get_name(), seconds))
+            clock.sleep(seconds)
+            await real_sleep(0)
+
+        self.mock_sleep.side_effect = sleep
+        throttled = asyncio.Event()
+
+        def pause(seconds):
+            outages_processor.utils.ratelimit.RateLimiter.pause(limiter, seconds)
+            throttled.set()
+
+        async def request_after_throttle():
+            await throttled.wait()
+            return await outages_processor.aio.http.api_request("GET", "/site-info/norwich-pear-tree")
+
+        self.register("GET", "/outages", (429, ""), (200, "[]"))
+        self.register("GET", "/site-info/norwich-pear-tree", (200, "{}"))
+        with unittest.mock.patch.object(limiter, "pause", side_effect=pause):
+            responses = await asyncio.wait_for(asyncio.gather(
+                asyncio.create_task(outages_processor.aio.http.api_request("GET", "/outages"), name="first"),
+                asyncio.create_task(request_after_throttle(), name="second"),
+            ), timeout=5)
+        self.assertEqual([200, 200], [response.status_code for response in responses])
+        self.assertEqual(3, len(self.requests))
+        self.assertIn(("second", 2.0), sleeps)
+        self.assertEqual(2, limiter.concurrency.limit)
+
+    async def test_shared_client_reused(self):
+        """
+        GIVEN
+        I make several requests
+        WHEN
+        No client session is passed explicitly
+        THEN
+        The same shared client session should be used, until it is closed
+        """
+        self.register("GET", "/outages", (200, "[]"))
+        await outages_processor.aio.http.api_request("GET", "/outages")
+        client = outages_processor.aio.http.get_client()
+        await outages_processor.aio.http.api_request("GET", "/outages")
+        self.assertIs(client, outages_processor.aio.http.get_client())
+        await outages_processor.aio.close_client()
+        self.assertTrue(client.closed)
+        self.assertIsNot(client, outages_processor.aio.http.get_client())
+
+    async def test_injected_client_used(self):
+        """
+        GIVEN
+        I inject a client session with set_client
+        WHEN
+        I make a request
+        THEN
+        The injected client session should be used
+        """
+        self.register("GET", "/outages", (200, "[]"))
+        client = outages_processor.aio.http.create_client()
+        outages_processor.aio.set_client(client)
+        await outages_processor.aio.http.api_request("GET", "/outages")
+        self.assertIs(client, outages_processor.aio.set_client(None))
+        await client.close()
@@ -0,0 +1,117 @@
+"""
+Tests for the aio API helpers and pipeline
+"""
+import json
+import os
+
+import pytest
+
+pytest.importorskip("aiohttp")
+
+# pylint: disable=wrong-import-position
+import outages_processor.aio  # noqa: E402
+from outages_processor.api.site import SiteDeviceInfo  # noqa: E402
+from outages_processor.tests.aio.server import AsyncAPITestCase  # noqa: E402
+
+
+SCRIPTS_TESTS_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "scripts")
+
+
+class TestAsyncAPI(AsyncAPITestCase):
+    """
+    Test suite for the async outages and site helpers
+    """
+
+    async def test_get_outages_after_datetime(self):
+        """
+        GIVEN
+        I request filtering of outage events
+        WHEN
+        The default cutoff is for events before 2022-01-01T00:00:00.000Z
+        THEN
+        I should receive a list of only outages beginning after the cutoff
+        """
+        outages = [
+            {"begin": "2021-12-31T23:59:59.000Z"},
+            {"begin": "2022-01-01T00:00:00.000Z"},
+        ]
+        self.register("GET", "/outages", (200, json.dumps(outages)))
+        self.assertEqual(outages[1:], await outages_processor.aio.get_outages_after_datetime())
+
+    async def test_get_site_info_map_convert(self):
+        """
+        GIVEN
+        I call the function to retrieve site info
+        WHEN
+        I request the data parsed into a map
+        THEN
+        A dict should be returned with ids as keys and SiteDeviceInfo as values
+        """
+        site_data = {"id": "some-site-name", "devices": [{"id": "device-1", "name": "Battery 1"}]}
+        self.register("GET", "/site-info/some-site-name", (200, json.dumps(site_data)))
+        self.assertEqual({"device-1": SiteDeviceInfo("device-1", "Battery 1")},
+                         await outages_processor.aio.get_site_info("some-site-name"))
+        self.assertEqual(site_data, await outages_processor.aio.get_site_info("some-site-name", devices_map=False))
+
+    async def test_upload_site_outages(self):
+        """
+        GIVEN
+        I call the API to upload site outages
+        WHEN
+        I provide valid data
+        THEN
+        A post request should be sent to the correct URL and True returned
+        """
+        self.register("POST", "/site-outages/some-site-name", (200, ""))
+        outages = [{"id": "device-1", "name": "Battery 1"}]
+        self.assertTrue(await outages_processor.aio.upload_site_outages("some-site-name", outages))
+        self.assertEqual(outages, json.loads(self.requests[-1][2]))
+
+
+class TestAsyncPipeline(AsyncAPITestCase):
+    """
+    Test suite for the async processing pipeline
+    """
+
+    async def asyncSetUp(self):
+        """
+        Common setup, shared across the suite
+        """
+        await super().asyncSetUp()
+        with open(os.path.join(SCRIPTS_TESTS_DIR, "outages_get.json"), "r", encoding="utf-8") as file_handle:
+            self.register("GET", "/outages", (200, file_handle.read()))
+        with open(os.path.join(SCRIPTS_TESTS_DIR, "site_info_get.json"), "r", encoding="utf-8") as file_handle:
+            site_info_get_body = file_handle.read()
+        for site_name in ("norwich-pear-tree", "kingfisher"):
+            self.register("GET", f"/site-info/{site_name}", (200, site_info_get_body))
+
+    async def test_process_outages_inner(self):
+        """
+        GIVEN
+        I process the outages for a given site
+        WHEN
+        All required data can be retrieved successfully
+        THEN
+        A POST request with the enhanced outages should be sent
+        """
+        self.register("POST", "/site-outages/norwich-pear-tree", (200, ""))
+        await outages_processor.aio.process_outages_inner("norwich-pear-tree")
+        method, path, body = self.requests[-1]
+        self.assertEqual(("POST", "/v1/site-outages/norwich-pear-tree"), (method, path))
+        self.assertEqual(["Battery 1", "Battery 1", "Battery 2"], [outage["name"] for outage in json.loads(body)])
+
+    async def test_process_sites_one_fails(self):
+        """
+        GIVEN
+        I process the outages for several sites
+        WHEN
+        The upload for one of the sites fails with a HTTP 400 error
+        THEN
+        The outages should be fetched once and the other site reported as successful
+        """
+        self.register("POST", "/site-outages/norwich-pear-tree", (200, ""))
+        self.register("POST", "/site-outages/kingfisher", (400, ""))
+        results = await outages_processor.aio.process_sites(["norwich-pear-tree", "kingfisher"], max_concurrency=2)
+        self.assertEqual([True, False], [result.success for result in results])
+        self.assertEqual(3, results[0].outages_uploaded)
+        self.assertEqual(1, sum(1 for _, path, _ in self.requests if path == "/v1/outages"))
@@ -0,0 +1,76 @@
+"""
+Tests for api.index
+"""
+import unittest
+
+import outages_processor.api.outages
+from outages_processor.api.index import OutageIndex
+from outages_processor.api.records import OutageRecord
+from outages_processor.api.site import SiteDeviceInfo
+
+
+class TestOutageIndex(unittest.TestCase):
+    """
+    Test suite for the OutageIndex class
+    """
+    def setUp(self):
+        """
+        Common setup, an index of outages for three devices in interleaved order
+        """
+        self.outages = [
+            {"id": "a", "begin": "1"},
+            {"id": "b", "begin": "2"},
+            {"id": "a", "begin": "3"},
+            {"id": "c", "begin": "4"},
+            {"id": "b", "begin": "5"},
+        ]
+        self.index = OutageIndex(self.outages)
+
+    def test_outages_grouped_by_device(self):
+        """
+        GIVEN
+        An index of outages for several devices
+        WHEN
+        I get the outages of each device
+        THEN
+        Each device's outages should be returned in feed order, and none for an unknown device
+        """
+        self.assertEqual(5, len(self.index))
+        self.assertEqual(["a", "b", "c"], self.index.device_ids)
+        self.assertEqual([0, 2], list(self.index.positions("a")))
+        self.assertEqual([self.outages[1], self.outages[4]], self.index.outages_for_device("b"))
+        self.assertEqual([], self.index.outages_for_device("unknown"))
+
+    def test_join_matches_scan(self):
+        """
+        GIVEN
+        An index of outages and the devices of several sites
+        WHEN
+        I add the device info for each site using the index
+        THEN
+        Each site should receive the same outages, in the same order, as when scanning the outages
+        """
+        site_devices_maps = [
+            {"a": SiteDeviceInfo("a", "A"), "b": SiteDeviceInfo("b", "B")},
+            {"c": SiteDeviceInfo("c", "C"), "unknown": SiteDeviceInfo("unknown", "U")},
+            {},
+        ]
+        for site_devices_map in site_devices_maps:
+            self.assertEqual(
+                outages_processor.api.outages.add_device_info_to_outages(self.outages, site_devices_map),
+                outages_processor.api.outages.add_device_info_to_outages(self.index, site_devices_map),
+            )
+        self.assertEqual([{"id": "a", "begin": "1"}, {"id": "b", "begin": "2"}], self.outages[:2])
+
+    def test_join_records(self):
+        """
+        GIVEN
+        An index of outages as compact records
+        WHEN
+        I add the device info for a site
+        THEN
+        I should receive new records including the device names, for only the devices in the site
+        """
+        records = [OutageRecord("a", 0, 1), OutageRecord("b", 2, 3), OutageRecord("a", 4, 5)]
+        result = list(OutageIndex(records).iter_device_info({"a": SiteDeviceInfo("a", "A")}))
+        self.assertEqual([OutageRecord("a", 0, 1, "A"), OutageRecord("a", 4, 5, "A")], result)
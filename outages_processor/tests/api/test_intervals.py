@@ -0,0 +1,87 @@
+"""
+Tests for api.intervals
+"""
+import unittest
+
+import iso8601
+
+import outages_processor.api.outages
+from outages_processor.api.intervals import IntervalIndex
+from outages_processor.api.records import OutageRecord
+
+
+class TestIntervalIndex(unittest.TestCase):
+    """
+    Test suite for the IntervalIndex class
+    """
+    def setUp(self):
+        """
+        Common setup, an index of overlapping outages for two devices, out of order and in mixed formats
+        """
+        self.outages = [
+            {"id": "a", "begin": "2022-01-03T00:00:00.000Z", "end": "2022-01-04T00:00:00.000Z"},
+            {"id": "b", "begin": "2022-01-01T00:00:00.000Z", "end": "2022-01-10T00:00:00.000Z"},
+            {"id": "a", "begin": "2022-01-01T01:00:00.000+01:00", "end": "2022-01-02T00:00:00.000Z"},
+            {"id": "b", "begin": "2022-01-05T00:00:00.000Z", "end": None},
+            {"id": "a", "begin": "2021-12-31T23:59:59.999Z", "end": "2022-01-01T00:00:00.000Z"},
+        ]
+        self.index = IntervalIndex(self.outages)
+
+    def test_overlapping(self):
+        """
+        GIVEN
+        An index of outages for several devices
+        WHEN
+        I query the outages overlapping time windows and ongoing at points in time, for every device and for one
+        THEN
+        The outages which began by the end of the window and ended at or after its start should be returned, in feed
+        order, treating outages without an end time as ongoing
+        """
+        self.assertEqual(
+            [self.outages[1], self.outages[2], self.outages[4]],
+            self.index.overlapping(iso8601.parse_date("2021-12-01T00:00:00Z"),
+                                   iso8601.parse_date("2022-01-01T00:00:00Z")),
+        )
+        self.assertEqual(
+            [self.outages[0], self.outages[2]],
+            self.index.overlapping(iso8601.parse_date("2022-01-02T00:00:00Z"),
+                                   iso8601.parse_date("2022-01-03T00:00:00Z"), device_id="a"),
+        )
+        self.assertEqual([self.outages[3]], self.index.at(iso8601.parse_date("2030-01-01T00:00:00Z")))
+        self.assertEqual([], self.index.at(iso8601.parse_date("2022-01-06T00:00:00Z"), device_id="a"))
+        self.assertEqual([], self.index.at(iso8601.parse_date("2022-01-06T00:00:00Z"), device_id="unknown"))
+        self.assertEqual(["a", "b"], self.index.device_ids)
+
+    def test_beginning_between(self):
+        """
+        GIVEN
+        An index of outages for several devices
+        WHEN
+        I query the outages which began within ranges, and filter the index with the cutoff filter
+        THEN
+        The outages which began at or after the start of each range and before its end should be returned in feed
+        order, and the filter should give the same result as filtering the outages themselves
+        """
+        cutoff = outages_processor.api.outages.DEFAULT_DATETIME_EARLIEST
+        self.assertEqual(
+            [self.outages[1], self.outages[2]],
+            self.index.beginning_between(cutoff, iso8601.parse_date("2022-01-03T00:00:00Z")),
+        )
+        self.assertEqual([self.outages[4]], self.index.beginning_between(end=cutoff, device_id="a"))
+        self.assertEqual(
+            outages_processor.api.outages.filter_outages_after_datetime(self.outages, cutoff),
+            outages_processor.api.outages.filter_outages_after_datetime(self.index, cutoff),
+        )
+
+    def test_records(self):
+        """
+        GIVEN
+        An index of outages as compact records
+        WHEN
+        I query the outages ongoing at a point in time
+        THEN
+        The records ongoing at that time should be returned
+        """
+        records = [OutageRecord.from_dict(outage) for outage in self.outages]
+        moment = iso8601.parse_date("2022-01-03T12:00:00Z")
+        self.assertEqual([records[0], records[1]], IntervalIndex(records).at(moment))
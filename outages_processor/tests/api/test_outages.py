@@ -3,12 +3,15 @@ Tests for api.outages
 """
 import datetime
 import json
+import os
+import tempfile
 import unittest
 
 import httpretty
 
 import outages_processor.api.outages
 from outages_processor.constants import API_BASE_URL
+from outages_processor.api.records import OutageRecord
 from outages_processor.api.site import SiteDeviceInfo
 
 
@@ -105,6 +108,166 @@ class TestGetOutagesFilteredDatetime(unittest.TestCase):
         ))
         self.assertEqual(outages[2:], list(returned_outages))
 
+    @httpretty.activate
+    def test_filtering_by_date_comparing_strings(self):
+        """
+        GIVEN
+        I request filtering of outage events, comparing begin times as strings
+        WHEN
+        The default cutoff is for events before 2022-01-01T00:00:00.000Z
+        THEN
+        I should receive a list of only outages beginning after the cutoff, including ones in other formats
+        """
+        outages = [
+            {"begin": "2021-12-31T23:59:59.999Z"},
+            {"begin": "2022-01-01T00:59:59.999+01:00"},
+            {"begin": "2022-01-01T00:00:00.000Z"},
+            {"begin": "2022-01-01T01:00:00.000+01:00"},
+            {"begin": "2023-01-01T00:00:00.000Z"},
+        ]
+        httpretty.register_uri(
+            httpretty.GET,
+            f"{API_BASE_URL}/outages",
+            body=json.dumps(outages),
+        )
+        returned_outages = outages_processor.api.outages.get_outages_after_datetime(compare_strings=True)
+        self.assertEqual(outages[2:], returned_outages)
+
+    @httpretty.activate
+    def test_filtering_by_date_streamed(self):
+        """
+        GIVEN
+        I request filtering of outage events in streaming mode
+        WHEN
+        The default cutoff is for events before 2022-01-01T00:00:00.000Z
+        THEN
+        I should receive an iterator over only outages beginning after the cutoff
+        """
+        outages = [
+            {"id": "a", "begin": "2021-12-31T23:59:59.000Z"},
+            {"id": "b", "begin": "2022-01-01T00:00:00.000Z"},
+            {"id": "c", "begin": "2023-01-01T00:00:00.000Z"},
+        ]
+        httpretty.register_uri(
+            httpretty.GET,
+            f"{API_BASE_URL}/outages",
+            body=json.dumps(outages),
+        )
+        returned_outages = outages_processor.api.outages.get_outages_after_datetime(stream=True)
+        self.assertNotIsInstance(returned_outages, list)
+        self.assertEqual(outages[1:], list(returned_outages))
+
+
+
+    @httpretty.activate
+    def test_filtering_by_date_as_records(self):
+        """
+        GIVEN
+        I request filtering of outage events as compact records, in list and streaming mode
+        WHEN
+        The default cutoff is for events before 2022-01-01T00:00:00.000Z
+        THEN
+        I should receive records of only outages beginning after the cutoff
+        """
+        outages = [
+            {"id": "a", "begin": "2021-12-31T23:59:59.000Z", "end": "2022-01-01T00:00:00.000Z"},
+            {"id": "b", "begin": "2022-01-01T00:00:00.000Z", "end": "2022-01-02T00:00:00.000Z"},
+            {"id": "c", "begin": "2023-01-01T00:00:00.000Z", "end": "2023-01-02T00:00:00.000Z"},
+        ]
+        httpretty.register_uri(
+            httpretty.GET,
+            f"{API_BASE_URL}/outages",
+            body=json.dumps(outages),
+        )
+        for stream in (False, True):
+            returned_outages = outages_processor.api.outages.get_outages_after_datetime(stream=stream,
+                                                                                         as_records=True)
+            self.assertEqual([OutageRecord.from_dict(outage) for outage in outages[1:]], list(returned_outages))
+
+class TestGetOutagesCached(unittest.TestCase):
+    """
+    Test suite for get_outages_after_datetime with the outages cache configured
+    """
+    def setUp(self):
+        """
+        Common setup, shared across the suite
+        """
+        self.outages = [
+            {"id": "a", "begin": "2021-12-31T23:59:59.000Z"},
+            {"id": "b", "begin": "2022-01-01T00:00:00.000Z"},
+            {"id": "c", "begin": "2023-01-01T00:00:00.000Z"},
+        ]
+        temp_dir = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.addCleanup(temp_dir.cleanup)
+        self.path = os.path.join(temp_dir.name, "outages.pickle")
+        outages_processor.api.outages.configure_outages_cache(self.path)
+        self.addCleanup(outages_processor.api.outages.configure_outages_cache, None)
+
+    def register_not_modified(self, headers: dict):
+        """
+        Registers a response with the given validators followed by a 304 Not Modified response
+        :param headers: Validator headers for the first response
+        """
+        httpretty.register_uri(
+            httpretty.GET,
+            f"{API_BASE_URL}/outages",
+            responses=[
+                httpretty.Response(body=json.dumps(self.outages), adding_headers=headers),
+                httpretty.Response(body="", status=304),
+            ],
+        )
+
+    @httpretty.activate
+    def test_reused_when_not_modified(self):
+        """
+        GIVEN
+        I request filtered outages twice with the cache configured
+        WHEN
+        The API responds with an ETag and then 304 Not Modified
+        THEN
+        The second request should send the ETag and the cached outages should be filtered and returned,
+        including after reloading the cache from its file
+        """
+        self.register_not_modified({"ETag": '"v1"'})
+        first = outages_processor.api.outages.get_outages_after_datetime()
+        outages_processor.api.outages.configure_outages_cache(self.path)
+        second = outages_processor.api.outages.get_outages_after_datetime()
+        self.assertEqual(self.outages[1:], first)
+        self.assertEqual(self.outages[1:], second)
+        self.assertEqual('"v1"', httpretty.last_request().headers.get("If-None-Match"))
+        self.assertEqual(1, outages_processor.api.outages.get_outages_cache().stats().revalidations)
+
+    @httpretty.activate
+    def test_reused_when_not_modified_streamed(self):
+        """
+        GIVEN
+        I request filtered outages twice in streaming mode with the cache configured
+        WHEN
+        The API responds with a Last-Modified date and then 304 Not Modified
+        THEN
+        The second request should send the date and the cached outages should be filtered and returned
+        """
+        last_modified = "Mon, 23 May 2022 12:21:27 GMT"
+        self.register_not_modified({"Last-Modified": last_modified})
+        first = list(outages_processor.api.outages.get_outages_after_datetime(stream=True))
+        second = list(outages_processor.api.outages.get_outages_after_datetime(stream=True))
+        self.assertEqual(self.outages[1:], first)
+        self.assertEqual(self.outages[1:], second)
+        self.assertEqual(last_modified, httpretty.last_request().headers.get("If-Modified-Since"))
+
+    @httpretty.activate
+    def test_not_cached_without_validators(self):
+        """
+        GIVEN
+        I request filtered outages with the cache configured
+        WHEN
+        The API response has no ETag or Last-Modified headers
+        THEN
+        The outages should be returned without being cached
+        """
+        httpretty.register_uri(httpretty.GET, f"{API_BASE_URL}/outages", body=json.dumps(self.outages))
+        self.assertEqual(self.outages[1:], outages_processor.api.outages.get_outages_after_datetime())
+        self.assertFalse(os.path.exists(self.path))
 
 class TestAddDeviceInfoToOutages(unittest.TestCase):
     """
@@ -190,3 +353,79 @@ class TestAddDeviceInfoToOutages(unittest.TestCase):
             },
         ]
         self.assertEqual(expected, result)
+
+    def test_device_association_does_not_modify_outages(self):
+        """
+        GIVEN
+        An association request is made
+        WHEN
+        An outage and a device share a common ID
+        THEN
+        The given outage should not be modified, so that it can be shared between sites
+        """
+        outage = {"id": "3af21ee3-08cb-46e5-baa9-2c056d770494"}
+        outages_processor.api.outages.add_device_info_to_outages(
+            [outage],
+            {
+                "3af21ee3-08cb-46e5-baa9-2c056d770494": SiteDeviceInfo("3af21ee3-08cb-46e5-baa9-2c056d770494", "DName")
+            })
+        self.assertEqual({"id": "3af21ee3-08cb-46e5-baa9-2c056d770494"}, outage)
+
+    def test_device_association_from_iterator(self):
+        """
+        GIVEN
+        An association request is made with iter_device_info_to_outages
+        WHEN
+        The outages are given as an iterator
+        THEN
+        The associated outages should be yielded lazily, in order
+        """
+        outages = iter([{"id": "a"}, {"id": "b"}, {"id": "a", "begin": "later"}])
+        result = outages_processor.api.outages.iter_device_info_to_outages(outages, {"a": SiteDeviceInfo("a", "A")})
+        self.assertEqual({"id": "a", "name": "A"}, next(result))
+        self.assertEqual([{"id": "a", "begin": "later", "name": "A"}], list(result))
+
+
+    def test_add_device_info_to_records(self):
+        """
+        GIVEN
+        Outages as compact records
+        WHEN
+        I add the device info for a site
+        THEN
+        I should receive new records including the device names, for only the devices in the site
+        """
+        records = [
+            OutageRecord("002b28fc-283c-47ec-9af2-ea287336dc1b", 0, 1),
+            OutageRecord("unknown-device", 0, 1),
+        ]
+        result = outages_processor.api.outages.add_device_info_to_outages(records, {
+            "002b28fc-283c-47ec-9af2-ea287336dc1b": SiteDeviceInfo("002b28fc-283c-47ec-9af2-ea287336dc1b", "Battery 1"),
+        })
+        self.assertEqual([OutageRecord("002b28fc-283c-47ec-9af2-ea287336dc1b", 0, 1, "Battery 1")], result)
+        self.assertIsNone(records[0].name)
+
+class TestAddDeviceInfoToSiteOutages(unittest.TestCase):
+    """
+    Test suite for the add_device_info_to_site_outages function
+    """
+    def test_device_association_for_several_sites(self):
+        """
+        GIVEN
+        An association request is made for several sites
+        WHEN
+        Sites share some devices and have other devices of their own
+        THEN
+        Each site should receive its own associated outages, in order
+        """
+        outages = iter([{"id": "a"}, {"id": "b"}, {"id": "c"}, {"id": "d"}])
+        result = outages_processor.api.outages.add_device_info_to_site_outages(outages, {
+            "site-1": {"a": SiteDeviceInfo("a", "A1"), "b": SiteDeviceInfo("b", "B1")},
+            "site-2": {"b": SiteDeviceInfo("b", "B2"), "c": SiteDeviceInfo("c", "C2")},
+            "site-3": {},
+        })
+        self.assertEqual({
+            "site-1": [{"id": "a", "name": "A1"}, {"id": "b", "name": "B1"}],
+            "site-2": [{"id": "b", "name": "B2"}, {"id": "c", "name": "C2"}],
+            "site-3": [],
+        }, result)
@@ -0,0 +1,108 @@
+"""
+Tests for api.records
+"""
+import datetime
+import json
+import unittest
+
+import outages_processor.api
+from outages_processor.api.records import OutageRecord, to_records_after_datetime, with_device_name
+from outages_processor.utils.jsonstream import encode_json_array
+
+
+class TestOutageRecord(unittest.TestCase):
+    """
+    Test suite for the OutageRecord class
+    """
+    def setUp(self):
+        """
+        Common setup, shared across the suite
+        """
+        self.outage = {
+            "id": "002b28fc-283c-47ec-9af2-ea287336dc1b",
+            "begin": "2022-05-23T12:21:27.377Z",
+            "end": "2022-11-13T02:16:38.905Z",
+        }
+
+    def test_round_trip(self):
+        """
+        GIVEN
+        An outage dict in the API format
+        WHEN
+        I convert it to a record and back
+        THEN
+        I should receive the original outage, with the timestamps held as epoch milliseconds
+        """
+        record = OutageRecord.from_dict(self.outage)
+        self.assertEqual(1653308487377, record.begin)
+        self.assertEqual(self.outage, record.to_dict())
+        self.assertEqual(self.outage["begin"], record.get("begin"))
+        self.assertIsNone(record.get("name"))
+
+    def test_timestamps_normalised(self):
+        """
+        GIVEN
+        An outage dict with timestamps in another ISO 8601 format
+        WHEN
+        I convert it to a record and back
+        THEN
+        The timestamps should be normalised to UTC in the API format
+        """
+        record = OutageRecord.from_dict({**self.outage, "begin": "2022-05-23T13:21:27.377+01:00"})
+        self.assertEqual(self.outage, record.to_dict())
+
+    def test_ids_and_names_interned(self):
+        """
+        GIVEN
+        Two outages for the same device, parsed separately
+        WHEN
+        I convert them to records and add the device name
+        THEN
+        The records should share a single copy of the device ID and name
+        """
+        first = OutageRecord.from_dict(json.loads(json.dumps(self.outage))).with_name("Battery " + "1")
+        second = OutageRecord.from_dict(json.loads(json.dumps(self.outage))).with_name("Battery " + "1")
+        self.assertIs(first.id, second.id)
+        self.assertIs(first.name, second.name)
+        self.assertEqual(first, second)
+
+    def test_to_json(self):
+        """
+        GIVEN
+        Records with and without a device name
+        WHEN
+        I encode them straight to JSON
+        THEN
+        The JSON should decode to the same outages as the dicts in the upload format
+        """
+        records = [
+            OutageRecord.from_dict(self.outage),
+            with_device_name(OutageRecord.from_dict(self.outage), 'Battery "1"'),
+        ]
+        self.assertEqual([record.to_dict() for record in records], json.loads(encode_json_array(records)))
+        self.assertEqual({**self.outage, "name": 'Battery "1"'}, json.loads(records[1].to_json()))
+
+
+class TestToRecordsAfterDatetime(unittest.TestCase):
+    """
+    Test suite for the to_records_after_datetime function
+    """
+
+    def test_filter_matches_per_dict_path(self):
+        """
+        GIVEN
+        Outages with begin times either side of a cutoff
+        WHEN
+        I convert them to records after the cutoff
+        THEN
+        I should receive records of the same outages as the per-dict filter
+        """
+        outages = [
+            {"id": "a", "begin": "2021-12-31T23:59:59.999Z", "end": "2022-01-01T00:00:00.000Z"},
+            {"id": "b", "begin": "2022-01-01T00:00:00.000Z", "end": "2022-01-02T00:00:00.000Z"},
+            {"id": "c", "begin": "2022-01-01T00:00:00.001Z", "end": "2022-01-02T00:00:00.000Z"},
+        ]
+        for cutoff in (outages_processor.api.outages.DEFAULT_DATETIME_EARLIEST,
+                       datetime.datetime(2022, 1, 1, 0, 0, 0, 500, tzinfo=datetime.timezone.utc)):
+            expected = outages_processor.api.filter_outages_after_datetime(outages, cutoff)
+            self.assertEqual(expected, [record.to_dict() for record in to_records_after_datetime(outages, cutoff)])
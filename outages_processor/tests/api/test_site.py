@@ -2,12 +2,16 @@
 Tests for api.site
 """
 import json
-import unittest
+import unittest.mock
 
 import httpretty
 
 import outages_processor.api.site
+import outages_processor.utils.http
+import outages_processor.utils.ratelimit
+from outages_processor.api.records import OutageRecord
 from outages_processor.constants import API_BASE_URL
+from outages_processor.utils.errors import ChunkUploadError
 
 
 class TestGetSiteInfo(unittest.TestCase):
@@ -32,6 +36,7 @@ class TestGetSiteInfo(unittest.TestCase):
                 }
             ]
         }
+        outages_processor.api.site.get_site_info_cache().clear()
 
     @httpretty.activate
     def test_get_site_info_raw(self):
@@ -75,6 +80,80 @@ class TestGetSiteInfo(unittest.TestCase):
         }, result)
 
 
+    @httpretty.activate
+    def test_get_site_info_cached(self):
+        """
+        GIVEN
+        I call the function to retrieve site info twice
+        WHEN
+        The cached site info is still fresh
+        THEN
+        Only one request should be made, the second call counted as a cache hit and the devices map built once and
+        shared by both calls
+        """
+        httpretty.register_uri(
+            httpretty.GET,
+            f"{API_BASE_URL}/site-info/some-site-name",
+            body=json.dumps(self.site_data),
+        )
+        with unittest.mock.patch("outages_processor.api.site.build_devices_map",
+                                 wraps=outages_processor.api.site.build_devices_map) as mock_build:
+            first = outages_processor.api.site.get_site_info("some-site-name")
+            second = outages_processor.api.site.get_site_info("some-site-name")
+        self.assertIs(first, second)
+        self.assertEqual(1, mock_build.call_count)
+        self.assertEqual(1, len(httpretty.latest_requests()))
+        stats = outages_processor.api.site.get_site_info_cache().stats()
+        self.assertEqual((1, 1, 0), (stats.hits, stats.misses, stats.revalidations))
+
+    @httpretty.activate
+    def test_get_site_info_revalidated(self):
+        """
+        GIVEN
+        I call the function to retrieve site info twice
+        WHEN
+        The cached site info has gone stale and the API responds 304 Not Modified to the conditional request
+        THEN
+        The second request should send the cached ETag and the cached site info should be returned
+        """
+        outages_processor.api.site.configure_site_info_cache(ttl=0)
+        self.addCleanup(outages_processor.api.site.configure_site_info_cache)
+        httpretty.register_uri(
+            httpretty.GET,
+            f"{API_BASE_URL}/site-info/some-site-name",
+            responses=[
+                httpretty.Response(body=json.dumps(self.site_data), adding_headers={"ETag": '"v1"'}),
+                httpretty.Response(body="", status=304),
+            ],
+        )
+        first = outages_processor.api.site.get_site_info("some-site-name", devices_map=False)
+        second = outages_processor.api.site.get_site_info("some-site-name", devices_map=False)
+        self.assertEqual(self.site_data, first)
+        self.assertEqual(self.site_data, second)
+        self.assertEqual('"v1"', httpretty.last_request().headers.get("If-None-Match"))
+        stats = outages_processor.api.site.get_site_info_cache().stats()
+        self.assertEqual((0, 1, 1), (stats.hits, stats.misses, stats.revalidations))
+
+    @httpretty.activate
+    def test_get_site_info_bypass_cache(self):
+        """
+        GIVEN
+        I call the function to retrieve site info twice
+        WHEN
+        I disable the cache
+        THEN
+        Both calls should request the site info from the API
+        """
+        httpretty.register_uri(
+            httpretty.GET,
+            f"{API_BASE_URL}/site-info/some-site-name",
+            body=json.dumps(self.site_data),
+        )
+        outages_processor.api.site.get_site_info("some-site-name", use_cache=False)
+        outages_processor.api.site.get_site_info("some-site-name", use_cache=False)
+        self.assertEqual(2, len(httpretty.latest_requests()))
+        self.assertIsNone(outages_processor.api.site.get_site_info_cache().get("some-site-name"))
+
 class TestUploadSiteOutages(unittest.TestCase):
     """
     Test suite for the upload_site_outages function
@@ -110,3 +189,172 @@ class TestUploadSiteOutages(unittest.TestCase):
         ]
         result = outages_processor.api.upload_site_outages("some-other-site-name", device_data)
         self.assertEqual(True, result)
+
+    @httpretty.activate
+    def test_upload_site_outages_from_iterator(self):
+        """
+        GIVEN
+        I call the API to upload site outages
+        WHEN
+        I provide the outages as an iterator
+        THEN
+        A post request should be sent with the outages encoded as a JSON array and True returned
+        """
+        httpretty.register_uri(
+            httpretty.POST,
+            f"{API_BASE_URL}/site-outages/some-other-site-name",
+            body="",
+        )
+        device_data = [
+            {
+                "id": "002b28fc-283c-47ec-9af2-ea287336dc1b",
+                "begin": "2021-07-26T17:09:31.036Z",
+                "end": "2021-08-29T00:37:42.253Z",
+                "name": "Device 1",
+            },
+        ]
+        result = outages_processor.api.upload_site_outages("some-other-site-name", iter(device_data))
+        self.assertEqual(True, result)
+        request = httpretty.last_request()
+        self.assertEqual("application/json", request.headers.get("Content-Type"))
+        self.assertEqual(device_data, json.loads(request.body))
+
+
+    @httpretty.activate
+    def test_upload_site_outages_from_records(self):
+        """
+        GIVEN
+        I call the API to upload site outages
+        WHEN
+        I provide the outages as compact records
+        THEN
+        A post request should be sent with the outages encoded in the upload format and True returned
+        """
+        httpretty.register_uri(
+            httpretty.POST,
+            f"{API_BASE_URL}/site-outages/some-other-site-name",
+            body="",
+        )
+        device_data = [
+            {
+                "id": "002b28fc-283c-47ec-9af2-ea287336dc1b",
+                "begin": "2021-07-26T17:09:31.036Z",
+                "end": "2021-08-29T00:37:42.253Z",
+                "name": "Device 1",
+            },
+        ]
+        records = [OutageRecord.from_dict(outage) for outage in device_data]
+        result = outages_processor.api.upload_site_outages("some-other-site-name", records)
+        self.assertEqual(True, result)
+        request = httpretty.last_request()
+        self.assertEqual("application/json", request.headers.get("Content-Type"))
+        self.assertEqual(device_data, json.loads(request.body))
+
+class TestUploadSiteOutagesChunked(unittest.TestCase):
+    """
+    Test suite for uploading site outages in chunks.
+    httpretty is not thread-safe, so chunks are uploaded one at a time.
+    """
+    def setUp(self):
+        """
+        Common setup, shared across the suite
+        """
+        self.outages = [{"id": f"device-{i}", "name": f"Device {i}"} for i in range(5)]
+        self.received = []
+        self.attempts = {}
+        self.failing = {}
+
+    def callback(self, request, _, headers):
+        """
+        Records each chunk received, failing chunks by their first device ID as configured in self.failing
+        """
+        chunk = json.loads(request.body)
+        first_id = chunk[0]["id"]
+        self.attempts[first_id] = self.attempts.get(first_id, 0) + 1
+        statuses = self.failing.get(first_id, [])
+        if self.attempts[first_id] <= len(statuses):
+            return statuses[self.attempts[first_id] - 1], headers, ""
+        self.received.append(chunk)
+        return 200, headers, ""
+
+    @httpretty.activate
+    def test_upload_in_chunks(self):
+        """
+        GIVEN
+        I call the API to upload site outages in chunks of two
+        WHEN
+        I provide five outages as an iterator
+        THEN
+        Three requests should be sent which together contain every outage, and True returned
+        """
+        httpretty.register_uri(httpretty.POST, f"{API_BASE_URL}/site-outages/some-site-name", body=self.callback)
+        result = outages_processor.api.upload_site_outages("some-site-name",
+                                                           iter(self.outages),
+                                                           outages_processor.api.site.UploadConfig(2, 1))
+        self.assertTrue(result)
+        self.assertEqual([2, 2, 1], sorted((len(chunk) for chunk in self.received), reverse=True))
+        self.assertEqual(self.outages, sorted((outage for chunk in self.received for outage in chunk),
+                                              key=lambda outage: outage["id"]))
+
+    @httpretty.activate
+    @unittest.mock.patch("time.sleep")
+    def test_chunk_retried_on_500(self, _):
+        """
+        GIVEN
+        I call the API to upload site outages in chunks of two
+        WHEN
+        The second chunk fails twice with a 503 error
+        THEN
+        Only the second chunk should be resent, and True returned
+        """
+        self.failing = {"device-2": [503, 503]}
+        httpretty.register_uri(httpretty.POST, f"{API_BASE_URL}/site-outages/some-site-name", body=self.callback)
+        result = outages_processor.api.upload_site_outages("some-site-name",
+                                                           self.outages,
+                                                           outages_processor.api.site.UploadConfig(2, 1))
+        self.assertTrue(result)
+        self.assertEqual({"device-0": 1, "device-2": 3, "device-4": 1}, self.attempts)
+
+    @httpretty.activate
+    @unittest.mock.patch("time.sleep")
+    def test_throttled_chunk_not_retried_again(self, _):
+        """
+        GIVEN
+        I call the API to upload site outages in chunks of two
+        WHEN
+        The first chunk is rate limited with a 429 error on every attempt
+        THEN
+        The chunk should only be sent as many times as api_request retries rate limiting, not retried again on top
+        """
+        self.addCleanup(outages_processor.utils.ratelimit.configure_rate_limiter)
+        limiter = outages_processor.utils.ratelimit.configure_rate_limiter()
+        self.failing = {"device-0": [429] * 10}
+        httpretty.register_uri(httpretty.POST, f"{API_BASE_URL}/site-outages/some-site-name", body=self.callback)
+        with unittest.mock.patch.object(limiter, "pause"), self.assertRaises(ChunkUploadError):
+            outages_processor.api.upload_site_outages("some-site-name",
+                                                      self.outages,
+                                                      outages_processor.api.site.UploadConfig(2, 1))
+        self.assertEqual(outages_processor.utils.http.THROTTLE_RETRIES + 1, self.attempts["device-0"])
+
+    @httpretty.activate
+    @unittest.mock.patch("time.sleep")
+    def test_failed_chunks_reported(self, _):
+        """
+        GIVEN
+        I call the API to upload site outages in chunks of two
+        WHEN
+        The first chunk fails with a 400 error and the last chunk fails with a 500 error on every attempt
+        THEN
+        A ChunkUploadError should be raised listing both chunks, the 400 should not have been retried
+        and the other chunk should still be uploaded
+        """
+        self.failing = {"device-0": [400], "device-4": [500] * 4}
+        httpretty.register_uri(httpretty.POST, f"{API_BASE_URL}/site-outages/some-site-name", body=self.callback)
+        with self.assertRaises(ChunkUploadError) as context:
+            outages_processor.api.upload_site_outages("some-site-name",
+                                                      self.outages,
+                                                      outages_processor.api.site.UploadConfig(2, 1))
+        self.assertEqual([(0, 0, 2), (2, 4, 1)],
+                         [failure[:3] for failure in context.exception.failed_chunks])
+        self.assertEqual({"device-0": 1, "device-2": 1, "device-4": 4}, self.attempts)
+        self.assertEqual([self.outages[2:4]], self.received)
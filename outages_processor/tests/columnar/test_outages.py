@@ -0,0 +1,127 @@
+"""
+Tests for columnar.outages
+"""
+import datetime
+import json
+import os
+import unittest
+
+import httpretty
+import pytest
+
+numpy = pytest.importorskip("numpy")
+
+# pylint: disable=wrong-import-position
+import outages_processor.api  # noqa: E402
+import outages_processor.columnar  # noqa: E402
+from outages_processor.api.site import SiteDeviceInfo, build_devices_map  # noqa: E402
+from outages_processor.columnar import OutageColumns  # noqa: E402
+from outages_processor.constants import API_BASE_URL  # noqa: E402
+from outages_processor.tests.fixtures import mixed_format_outages  # noqa: E402
+
+
+SCRIPTS_TESTS_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "scripts")
+
+
+class TestColumnarOutages(unittest.TestCase):
+    """
+    Test suite for the columnar filter and device join
+    """
+    def setUp(self):
+        """
+        Common setup, shared across the suite
+        """
+        self.outages = mixed_format_outages()
+        self.site_devices_map = {
+            "a": SiteDeviceInfo("a", "Battery A"),
+            "b": SiteDeviceInfo("b", "Battery B"),
+        }
+
+    def test_round_trip(self):
+        """
+        GIVEN
+        Outages loaded into columns
+        WHEN
+        I convert them back to dicts
+        THEN
+        I should receive the original outages, with each device ID coded once
+        """
+        columns = OutageColumns.from_outages(self.outages)
+        self.assertEqual(5, len(columns))
+        self.assertEqual(["a", "b", "c"], columns.device_ids.tolist())
+        self.assertEqual(self.outages, columns.to_outages())
+
+    def test_outages_without_end_time(self):
+        """
+        GIVEN
+        Outages including an ongoing outage, with a null end time
+        WHEN
+        I load them into columns, filter them and join them with a site's devices
+        THEN
+        The end time should be loaded as NaT, and the results should match the per-dict path
+        """
+        outages = self.outages + [{"id": "a", "begin": "2022-05-01T00:00:00.000Z", "end": None}]
+        cutoff = outages_processor.api.outages.DEFAULT_DATETIME_EARLIEST
+        columns = OutageColumns.from_outages(outages)
+        self.assertTrue(numpy.isnat(columns.end[-1]))
+        self.assertEqual(outages, columns.to_outages())
+        filtered = outages_processor.api.filter_outages_after_datetime(outages, cutoff)
+        self.assertEqual(
+            outages_processor.api.add_device_info_to_outages(filtered, self.site_devices_map),
+            outages_processor.columnar.add_device_info_to_outages(
+                outages_processor.columnar.filter_outages_after_datetime(columns, cutoff),
+                self.site_devices_map,
+            ),
+        )
+
+    def test_filter_matches_per_dict_path(self):
+        """
+        GIVEN
+        Outages with begin times either side of a cutoff, in several timestamp formats
+        WHEN
+        I filter them as columns
+        THEN
+        I should receive the same outages as the per-dict filter
+        """
+        for cutoff in (outages_processor.api.outages.DEFAULT_DATETIME_EARLIEST,
+                       datetime.datetime(2022, 1, 1, 0, 0, 0, 500, tzinfo=datetime.timezone.utc)):
+            columns = outages_processor.columnar.filter_outages_after_datetime(
+                OutageColumns.from_outages(self.outages), cutoff)
+            self.assertEqual(outages_processor.api.filter_outages_after_datetime(self.outages, cutoff),
+                             columns.to_outages())
+
+    def test_join_matches_per_dict_path(self):
+        """
+        GIVEN
+        Outages loaded into columns
+        WHEN
+        I join them with the devices of a site
+        THEN
+        I should receive the same enhanced outages as the per-dict join, in feed order
+        """
+        columns = OutageColumns.from_outages(self.outages)
+        self.assertEqual(outages_processor.api.add_device_info_to_outages(self.outages, self.site_devices_map),
+                         outages_processor.columnar.add_device_info_to_outages(columns, self.site_devices_map))
+        self.assertEqual({"site": [], "other": []},
+                         outages_processor.columnar.add_device_info_to_site_outages(
+                             OutageColumns.from_outages([]), {"site": self.site_devices_map, "other": {}}))
+
+    @httpretty.activate
+    def test_get_outages_after_datetime(self):
+        """
+        GIVEN
+        I request the outages as columns
+        WHEN
+        The API responds with the example outages
+        THEN
+        The filtered and joined outages should match the per-dict path
+        """
+        with open(os.path.join(SCRIPTS_TESTS_DIR, "outages_get.json"), "r", encoding="utf-8") as file_handle:
+            outages_body = file_handle.read()
+        with open(os.path.join(SCRIPTS_TESTS_DIR, "site_info_get.json"), "r", encoding="utf-8") as file_handle:
+            site_devices_map = build_devices_map(json.load(file_handle))
+        httpretty.register_uri(httpretty.GET, f"{API_BASE_URL}/outages", body=outages_body)
+        columns = outages_processor.columnar.get_outages_after_datetime()
+        expected = outages_processor.api.add_device_info_to_outages(
+            outages_processor.api.get_outages_after_datetime(), site_devices_map)
+        self.assertEqual(expected, outages_processor.columnar.add_device_info_to_outages(columns, site_devices_map))
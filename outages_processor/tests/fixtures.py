@@ -0,0 +1,18 @@
+"""
+Outage fixtures shared by the test suites of the alternative filter and join engines
+"""
+
+
+def mixed_format_outages() -> list[dict]:
+    """
+    Outages for several devices with begin times either side of the default cutoff, in the API format and with UTC
+    offsets. A new list is returned on each call, so suites may modify it.
+    :return: A list of outage dicts
+    """
+    return [
+        {"id": "a", "begin": "2021-12-31T23:59:59.999Z", "end": "2022-01-01T00:00:00.000Z"},
+        {"id": "b", "begin": "2022-01-01T00:59:59.999+01:00", "end": "2022-01-02T00:00:00.000Z"},
+        {"id": "a", "begin": "2022-01-01T00:00:00.000Z", "end": "2022-01-02T00:00:00.000Z"},
+        {"id": "c", "begin": "2022-01-01T01:00:00.000+01:00", "end": "2022-01-02T00:00:00.000Z"},
+        {"id": "b", "begin": "2023-01-01T00:00:00.000Z", "end": "2023-01-02T00:00:00.000Z"},
+    ]
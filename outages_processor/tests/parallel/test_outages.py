@@ -0,0 +1,118 @@
+"""
+Tests for parallel.outages
+"""
+import unittest.mock
+from multiprocessing import shared_memory
+
+import iso8601
+
+import outages_processor.api
+import outages_processor.parallel
+from outages_processor.api.outages import DEFAULT_DATETIME_EARLIEST
+from outages_processor.api.site import SiteDeviceInfo
+from outages_processor.parallel import SharedOutages
+from outages_processor.tests.fixtures import mixed_format_outages
+
+
+class TestParallelOutages(unittest.TestCase):
+    """
+    Test suite for the parallel filter and device join
+    """
+    def setUp(self):
+        """
+        Common setup, shared across the suite
+        """
+        self.outages = mixed_format_outages()
+        self.addCleanup(outages_processor.parallel.close_process_pool)
+
+    def test_shards(self):
+        """
+        GIVEN
+        Outages copied into shared memory
+        WHEN
+        I split them into 2 shards
+        THEN
+        The shards should cover the outages in order, with the byte range of each shard's begin times
+        """
+        with SharedOutages(self.outages) as shared:
+            shards = shared.shards(2)
+            self.assertEqual([(0, 3), (3, 5)], [(shard.start, shard.stop) for shard in shards])
+            text = bytes(shared.memory.buf[shards[1].text_start:shards[1].text_stop]).decode("ascii")
+            self.assertEqual([self.outages[3]["begin"], self.outages[4]["begin"]], text.split("\n"))
+            self.assertEqual({"a": 0, "b": 1, "c": 2}, shared.device_codes)
+
+    def test_filter_and_join_match_single_process(self):
+        """
+        GIVEN
+        Outages with begin times either side of the cutoff, in several formats
+        WHEN
+        I filter them, and filter and join them with several sites, across 2 processes
+        THEN
+        The results should be the same, and in the same order, as the single process filter and join
+        """
+        site_devices_maps = {
+            "site-1": {"a": SiteDeviceInfo("a", "A1"), "b": SiteDeviceInfo("b", "B1")},
+            "site-2": {"b": SiteDeviceInfo("b", "B2"), "unknown": SiteDeviceInfo("unknown", "U")},
+            "site-3": {},
+        }
+        filtered = outages_processor.api.filter_outages_after_datetime(self.outages, DEFAULT_DATETIME_EARLIEST)
+        self.assertEqual(
+            filtered,
+            outages_processor.parallel.filter_outages_after_datetime(self.outages, DEFAULT_DATETIME_EARLIEST, 2),
+        )
+        self.assertEqual(
+            outages_processor.api.add_device_info_to_site_outages(filtered, site_devices_maps),
+            outages_processor.parallel.add_device_info_to_site_outages(self.outages, site_devices_maps, 2),
+        )
+
+    def test_process_pool_reused(self):
+        """
+        GIVEN
+        Outages filtered across 2 processes
+        WHEN
+        I filter them again with the same number of processes, and then with a different number
+        THEN
+        The worker processes should be started once and reused, and only replaced for a different number
+        """
+        with unittest.mock.patch("outages_processor.parallel.outages.create_process_pool",
+                                 wraps=outages_processor.parallel.create_process_pool) as mock_create:
+            for processes in (2, 2, 1):
+                outages_processor.parallel.filter_outages_after_datetime(self.outages, DEFAULT_DATETIME_EARLIEST,
+                                                                         processes)
+        self.assertEqual([unittest.mock.call(2), unittest.mock.call(1)], mock_create.call_args_list)
+
+    def test_shared_memory_freed_on_error(self):
+        """
+        GIVEN
+        Outages being copied into shared memory
+        WHEN
+        Copying the outages fails after the shared memory block has been created
+        THEN
+        The block should be freed before the error is raised
+        """
+        created = []
+        shared_memory_class = shared_memory.SharedMemory
+
+        def create_too_small(**_):
+            created.append(shared_memory_class(create=True, size=1))
+            return created[-1]
+
+        with unittest.mock.patch("outages_processor.parallel.outages.shared_memory.SharedMemory",
+                                 side_effect=create_too_small):
+            with self.assertRaises(ValueError):
+                SharedOutages(self.outages)
+        with self.assertRaises(FileNotFoundError):
+            shared_memory.SharedMemory(created[0].name)
+
+    def test_invalid_begin_time(self):
+        """
+        GIVEN
+        An outage without a begin time
+        WHEN
+        I filter the outages across 2 processes
+        THEN
+        A ParseError should be raised, as it is by the single process filter
+        """
+        outages = self.outages + [{"id": "a"}]
+        with self.assertRaises(iso8601.ParseError):
+            outages_processor.parallel.filter_outages_after_datetime(outages, DEFAULT_DATETIME_EARLIEST, 2)
@@ -1,8 +1,13 @@
 """
 Tests for api.outages
 """
-import argparse
+import concurrent.futures
+import json
 import os
+import pstats
+import signal
+import tempfile
+import threading
 import unittest.mock
 import warnings
 
@@ -11,6 +16,7 @@ import pytest
 import requests
 
 import outages_processor.scripts.outages
+import outages_processor.utils.metrics
 from outages_processor.constants import API_BASE_URL
 
 
@@ -22,9 +28,9 @@ def exception_callback(*args):
     raise requests.ConnectionError("Mock connection error")
 
 
-class TestProcessOutages(unittest.TestCase):
+class ProcessOutagesTestCase(unittest.TestCase):
     """
-    Test suite for the process_outages function
+    Base class for the process_outages test suites, with the mock API responses
     """
     def setUp(self):
         """
@@ -36,6 +42,38 @@ class TestProcessOutages(unittest.TestCase):
 
         with open(os.path.join(os.path.dirname(__file__), "site_info_get.json"), "r", encoding="utf-8") as file_handle:
             self.site_info_get_body = file_handle.read()
+        outages_processor.api.site.get_site_info_cache().clear()
+
+    def register_site_uris(self, site_names: list):
+        """
+        Registers successful responses for the outages and the given sites
+        :param site_names: Names of the sites to register
+        """
+        httpretty.register_uri(
+            httpretty.GET,
+            f"{API_BASE_URL}/outages",
+            body=self.outages_get_body,
+            status=200,
+        )
+        for site_name in site_names:
+            httpretty.register_uri(
+                httpretty.GET,
+                f"{API_BASE_URL}/site-info/{site_name}",
+                body=self.site_info_get_body,
+                status=200,
+            )
+            httpretty.register_uri(
+                httpretty.POST,
+                f"{API_BASE_URL}/site-outages/{site_name}",
+                body="",
+                status=200,
+            )
+
+
+class TestProcessOutages(ProcessOutagesTestCase):
+    """
+    Test suite for the process_outages function
+    """
 
     @httpretty.activate
     @unittest.mock.patch("sys.exit")
@@ -67,7 +105,7 @@ class TestProcessOutages(unittest.TestCase):
             body="",
             status=200,
         )
-        parsed_args = argparse.Namespace(site_name="norwich-pear-tree")
+        parsed_args = outages_processor.scripts.outages.parse_args(["--site-name", "norwich-pear-tree"])
         with unittest.mock.patch("outages_processor.scripts.outages.parse_args", return_value=parsed_args):
             outages_processor.scripts.outages.process_outages()
             request = httpretty.last_request()
@@ -124,7 +162,7 @@ class TestProcessOutages(unittest.TestCase):
             body="",
             status=400,
         )
-        parsed_args = argparse.Namespace(site_name="norwich-pear-tree")
+        parsed_args = outages_processor.scripts.outages.parse_args(["--site-name", "norwich-pear-tree"])
         with unittest.mock.patch("outages_processor.scripts.outages.parse_args", return_value=parsed_args):
             outages_processor.scripts.outages.process_outages()
         mock_sys_exit.assert_called_with(1)
@@ -147,7 +185,551 @@ class TestProcessOutages(unittest.TestCase):
             status=200,
             body=exception_callback,
         )
-        parsed_args = argparse.Namespace(site_name="norwich-pear-tree")
+        parsed_args = outages_processor.scripts.outages.parse_args(["--site-name", "norwich-pear-tree"])
         with unittest.mock.patch("outages_processor.scripts.outages.parse_args", return_value=parsed_args):
             outages_processor.scripts.outages.process_outages()
         mock_sys_exit.assert_called_with(1)
+
+    @httpretty.activate
+    @unittest.mock.patch("sys.exit")
+    def test_process_outages_multiple_sites(self, mock_sys_exit):
+        """
+        GIVEN
+        I make a request to process the outages for several sites
+        WHEN
+        All required data can be retrieved successfully
+        THEN
+        The outages should be fetched once and a POST request sent for each site
+        The script exits gracefully with code 0
+        """
+        httpretty.register_uri(
+            httpretty.GET,
+            f"{API_BASE_URL}/outages",
+            body=self.outages_get_body,
+            status=200,
+        )
+        for site_name in ("norwich-pear-tree", "kingfisher"):
+            httpretty.register_uri(
+                httpretty.GET,
+                f"{API_BASE_URL}/site-info/{site_name}",
+                body=self.site_info_get_body,
+                status=200,
+            )
+            httpretty.register_uri(
+                httpretty.POST,
+                f"{API_BASE_URL}/site-outages/{site_name}",
+                body="",
+                status=200,
+            )
+        parsed_args = outages_processor.scripts.outages.parse_args(
+            ["--site-name", "norwich-pear-tree", "--site-name", "kingfisher", "--max-workers", "2"]
+        )
+        with unittest.mock.patch("outages_processor.scripts.outages.parse_args", return_value=parsed_args):
+            outages_processor.scripts.outages.process_outages()
+        paths = [request.path for request in httpretty.latest_requests()]
+        self.assertEqual(1, sum(1 for path in paths if path.endswith("/outages")))
+        posts = sorted({request.path for request in httpretty.latest_requests() if request.method == "POST"})
+        self.assertEqual([
+            "/interview-tests-mock-api/v1/site-outages/kingfisher",
+            "/interview-tests-mock-api/v1/site-outages/norwich-pear-tree",
+        ], posts)
+        mock_sys_exit.assert_called_with(0)
+
+    @httpretty.activate
+    @unittest.mock.patch("sys.exit")
+    def test_process_outages_multiple_sites_one_fails(self, mock_sys_exit):
+        """
+        GIVEN
+        I make a request to process the outages for several sites
+        WHEN
+        The upload for one of the sites fails with a HTTP 400 error
+        THEN
+        The other site should still be uploaded and reported as successful
+        The script exits with code 1
+        """
+        httpretty.register_uri(
+            httpretty.GET,
+            f"{API_BASE_URL}/outages",
+            body=self.outages_get_body,
+            status=200,
+        )
+        for site_name, status in (("norwich-pear-tree", 200), ("kingfisher", 400)):
+            httpretty.register_uri(
+                httpretty.GET,
+                f"{API_BASE_URL}/site-info/{site_name}",
+                body=self.site_info_get_body,
+                status=200,
+            )
+            httpretty.register_uri(
+                httpretty.POST,
+                f"{API_BASE_URL}/site-outages/{site_name}",
+                body="",
+                status=status,
+            )
+        results = outages_processor.scripts.outages.process_sites(["norwich-pear-tree", "kingfisher"], max_workers=2)
+        self.assertEqual(["norwich-pear-tree", "kingfisher"], [result.site_name for result in results])
+        self.assertEqual([True, False], [result.success for result in results])
+        self.assertEqual(3, results[0].outages_uploaded)
+
+        parsed_args = outages_processor.scripts.outages.parse_args(
+            ["--site-name", "norwich-pear-tree", "--site-name", "kingfisher"]
+        )
+        with unittest.mock.patch("outages_processor.scripts.outages.parse_args", return_value=parsed_args):
+            outages_processor.scripts.outages.process_outages()
+        mock_sys_exit.assert_called_with(1)
+
+    @httpretty.activate
+    @unittest.mock.patch("sys.exit")
+    def test_process_outages_streamed(self, mock_sys_exit):
+        """
+        GIVEN
+        I make a request to process the outages for a given site in streaming mode
+        WHEN
+        All required data can be retrieved successfully
+        THEN
+        A POST request with the same payload as the non-streamed mode should be sent
+        The script exits gracefully with code 0
+        """
+        self.register_site_uris(["norwich-pear-tree"])
+        parsed_args = outages_processor.scripts.outages.parse_args(["--site-name", "norwich-pear-tree", "--stream"])
+        with unittest.mock.patch("outages_processor.scripts.outages.parse_args", return_value=parsed_args):
+            outages_processor.scripts.outages.process_outages()
+        request = httpretty.last_request()
+        self.assertEqual("POST", request.method)
+        self.assertEqual(["Battery 1", "Battery 1", "Battery 2"],
+                         [outage["name"] for outage in json.loads(request.body)])
+        mock_sys_exit.assert_called_with(0)
+
+    @httpretty.activate
+    def test_process_outages_inner_streamed(self):
+        """
+        GIVEN
+        I process the outages for a single site with process_outages_inner in streaming mode
+        WHEN
+        All required data can be retrieved successfully
+        THEN
+        A POST request with the enhanced outages should be sent
+        """
+        self.register_site_uris(["norwich-pear-tree"])
+        outages_processor.scripts.outages.process_outages_inner("norwich-pear-tree", stream=True)
+        request = httpretty.last_request()
+        # pylint: disable=no-member
+        self.assertEqual("/interview-tests-mock-api/v1/site-outages/norwich-pear-tree", request.path)
+        self.assertEqual(3, len(json.loads(request.body)))
+
+    def test_process_outages_inner_fetches_concurrently(self):
+        """
+        GIVEN
+        I process the outages for a site
+        WHEN
+        Fetching the outages and the site's devices each wait for the other to start
+        THEN
+        Both should be fetched at the same time, and the outages joined with the devices uploaded
+        """
+        barrier = threading.Barrier(2, timeout=5)
+
+        def fetch(value):
+            barrier.wait()
+            return value
+
+        outages = json.loads(self.outages_get_body)
+        site_devices_map = {outages[0]["id"]: outages_processor.api.site.SiteDeviceInfo(outages[0]["id"], "Battery 1")}
+        with unittest.mock.patch("outages_processor.scripts.outages.fetch_outages",
+                                 side_effect=lambda: fetch(outages)), \
+                unittest.mock.patch("outages_processor.scripts.outages.get_site_devices_map",
+                                    side_effect=lambda _: fetch(site_devices_map)), \
+                unittest.mock.patch("outages_processor.api.upload_site_outages") as mock_upload:
+            outages_processor.scripts.outages.process_outages_inner("norwich-pear-tree")
+        uploaded = list(mock_upload.call_args[0][1])
+        self.assertEqual([outages[0]["id"]] * len(uploaded), [outage["id"] for outage in uploaded])
+        self.assertEqual({"Battery 1"}, {outage["name"] for outage in uploaded})
+
+    @httpretty.activate
+    def test_process_sites_streamed_one_fails(self):
+        """
+        GIVEN
+        I process the outages for several sites in streaming mode
+        WHEN
+        The site info for one site fails with a HTTP 400 error
+        THEN
+        The other sites should be uploaded and reported as successful, in the order the sites were given
+        """
+        self.register_site_uris(["norwich-pear-tree", "kingfisher"])
+        httpretty.register_uri(httpretty.GET, f"{API_BASE_URL}/site-info/heron", body="", status=400)
+        results = outages_processor.scripts.outages.process_sites(["heron", "norwich-pear-tree", "kingfisher"],
+                                                                  stream=True)
+        self.assertEqual(["heron", "norwich-pear-tree", "kingfisher"], [result.site_name for result in results])
+        self.assertEqual([False, True, True], [result.success for result in results])
+        self.assertEqual([0, 3, 3], [result.outages_uploaded for result in results])
+
+    @httpretty.activate
+    @unittest.mock.patch("sys.exit")
+    def test_process_outages_pipeline(self, mock_sys_exit):
+        """
+        GIVEN
+        I make a request to process the outages for a given site in pipeline mode
+        WHEN
+        All required data can be retrieved successfully
+        THEN
+        A POST request with the same payload as the non-pipelined mode should be sent
+        The script exits gracefully with code 0
+        """
+        self.register_site_uris(["norwich-pear-tree"])
+        parsed_args = outages_processor.scripts.outages.parse_args(["--site-name", "norwich-pear-tree", "--pipeline"])
+        with unittest.mock.patch("outages_processor.scripts.outages.parse_args", return_value=parsed_args):
+            outages_processor.scripts.outages.process_outages()
+        request = httpretty.last_request()
+        self.assertEqual("POST", request.method)
+        self.assertEqual(["Battery 1", "Battery 1", "Battery 2"],
+                         [outage["name"] for outage in json.loads(request.body)])
+        mock_sys_exit.assert_called_with(0)
+
+    @httpretty.activate
+    @unittest.mock.patch("sys.exit")
+    def test_process_outages_incremental(self, mock_sys_exit):
+        """
+        GIVEN
+        I make two requests to process the outages for a given site in incremental mode
+        WHEN
+        The outages have not changed between the runs
+        THEN
+        The first run should upload all the enhanced outages and the second run should not upload anything
+        The script exits gracefully with code 0 both times
+        """
+        self.register_site_uris(["norwich-pear-tree"])
+        with tempfile.TemporaryDirectory() as temp_dir:
+            parsed_args = outages_processor.scripts.outages.parse_args(
+                ["--incremental", "--state-file", os.path.join(temp_dir, "state.json")]
+            )
+            with unittest.mock.patch("outages_processor.scripts.outages.parse_args", return_value=parsed_args):
+                outages_processor.scripts.outages.process_outages()
+                self.assertEqual(3, len(json.loads(httpretty.last_request().body)))
+                httpretty.reset()
+                self.register_site_uris(["norwich-pear-tree"])
+                outages_processor.scripts.outages.process_outages()
+        self.assertEqual([], [request for request in httpretty.latest_requests() if request.method == "POST"])
+        mock_sys_exit.assert_called_with(0)
+
+    @httpretty.activate
+    @unittest.mock.patch("sys.exit")
+    def test_process_outages_chunked_upload(self, mock_sys_exit):
+        """
+        GIVEN
+        I make a request to process the outages for a given site, uploading in chunks
+        WHEN
+        All required data can be retrieved successfully
+        THEN
+        The enhanced outages should be uploaded in two requests
+        The script exits gracefully with code 0
+        """
+        self.register_site_uris(["norwich-pear-tree"])
+        # httpretty is not thread-safe, so chunks are uploaded one at a time
+        parsed_args = outages_processor.scripts.outages.parse_args(["--upload-chunk-size", "2",
+                                                                    "--upload-workers", "1"])
+        with unittest.mock.patch("outages_processor.scripts.outages.parse_args", return_value=parsed_args):
+            outages_processor.scripts.outages.process_outages()
+        bodies = {request.body for request in httpretty.latest_requests() if request.method == "POST"}
+        self.assertEqual([1, 2], sorted(len(json.loads(body)) for body in bodies))
+        mock_sys_exit.assert_called_with(0)
+
+    @httpretty.activate
+    @unittest.mock.patch("sys.exit")
+    def test_process_outages_cache_dir(self, mock_sys_exit):
+        """
+        GIVEN
+        I make a request to process the outages for a given site with a cache directory
+        WHEN
+        All required data can be retrieved successfully
+        THEN
+        The site information should be saved to the cache directory and reused by the next run
+        The script exits gracefully with code 0
+        """
+        self.register_site_uris(["norwich-pear-tree"])
+        self.addCleanup(outages_processor.api.site.configure_site_info_cache)
+        self.addCleanup(outages_processor.api.outages.configure_outages_cache, None)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            parsed_args = outages_processor.scripts.outages.parse_args(["--cache-dir", temp_dir])
+            with unittest.mock.patch("outages_processor.scripts.outages.parse_args", return_value=parsed_args):
+                outages_processor.scripts.outages.process_outages()
+                self.assertTrue(os.path.exists(os.path.join(temp_dir, "site-info.json")))
+                outages_processor.scripts.outages.process_outages()
+        stats = outages_processor.api.site.get_site_info_cache().stats()
+        self.assertEqual((1, 0), (stats.hits, stats.misses))
+        mock_sys_exit.assert_called_with(0)
+
+    @httpretty.activate
+    @unittest.mock.patch("sys.exit")
+    def test_process_outages_clear_cache(self, mock_sys_exit):
+        """
+        GIVEN
+        I make a request to process the outages for a given site with a cache directory
+        WHEN
+        I run again, clearing the cache, and then again bypassing the cache
+        THEN
+        The site information should be fetched from the API each time
+        The script exits gracefully with code 0
+        """
+        self.register_site_uris(["norwich-pear-tree"])
+        self.addCleanup(outages_processor.api.site.configure_site_info_cache)
+        self.addCleanup(outages_processor.api.outages.configure_outages_cache, None)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            for argv in (["--cache-dir", temp_dir], ["--cache-dir", temp_dir, "--clear-cache"], ["--no-cache"]):
+                parsed_args = outages_processor.scripts.outages.parse_args(argv)
+                with unittest.mock.patch("outages_processor.scripts.outages.parse_args", return_value=parsed_args):
+                    outages_processor.scripts.outages.process_outages()
+                stats = outages_processor.api.site.get_site_info_cache().stats()
+                self.assertEqual((0, 1), (stats.hits, stats.misses))
+            self.assertFalse(os.path.exists(os.path.join(temp_dir, "outages.pickle")))
+        self.assertIsNone(outages_processor.api.outages.get_outages_cache())
+        mock_sys_exit.assert_called_with(0)
+
+    @httpretty.activate
+    @unittest.mock.patch("sys.exit")
+    def test_process_outages_columnar(self, mock_sys_exit):
+        """
+        GIVEN
+        I make a request to process the outages for a given site with the columnar engine
+        WHEN
+        All required data can be retrieved successfully
+        THEN
+        A POST request with the same payload as the default engine should be sent
+        The script exits gracefully with code 0
+        """
+        pytest.importorskip("numpy")
+        self.register_site_uris(["norwich-pear-tree"])
+        bodies = []
+        for argv in ([], ["--columnar"]):
+            parsed_args = outages_processor.scripts.outages.parse_args(argv)
+            with unittest.mock.patch("outages_processor.scripts.outages.parse_args", return_value=parsed_args):
+                outages_processor.scripts.outages.process_outages()
+            bodies.append(json.loads(httpretty.last_request().body))
+        self.assertEqual(3, len(bodies[1]))
+        self.assertEqual(bodies[0], bodies[1])
+        mock_sys_exit.assert_called_with(0)
+
+    @httpretty.activate
+    @unittest.mock.patch("sys.exit")
+    def test_process_outages_metrics_file(self, mock_sys_exit):
+        """
+        GIVEN
+        I make a request to process the outages for a given site, writing the metrics to a Prometheus textfile
+        WHEN
+        All required data can be retrieved successfully
+        THEN
+        The textfile should include the time taken and outages produced by each stage and the requests to each route
+        The script exits gracefully with code 0
+        """
+        self.register_site_uris(["norwich-pear-tree"])
+        self.addCleanup(outages_processor.utils.metrics.configure_metrics, False)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, "outages_processor.prom")
+            parsed_args = outages_processor.scripts.outages.parse_args(["--metrics-file", path])
+            with unittest.mock.patch("outages_processor.scripts.outages.parse_args", return_value=parsed_args):
+                outages_processor.scripts.outages.process_outages()
+            with open(path, "r", encoding="utf-8") as file_handle:
+                textfile = file_handle.read()
+        for stage in ("fetch", "parse", "filter", "site_info", "join", "upload"):
+            self.assertIn(f'outages_processor_stage_seconds_total{{stage="{stage}"}}', textfile)
+        self.assertIn('outages_processor_stage_records_total{stage="upload"} 3\n', textfile)
+        for route in ("/outages", "/site-info", "/site-outages"):
+            self.assertIn(f'outages_processor_http_request_duration_seconds_count{{route="{route}"}} 1\n', textfile)
+        mock_sys_exit.assert_called_with(0)
+
+    @httpretty.activate
+    @unittest.mock.patch("sys.exit")
+    def test_process_outages_profile(self, mock_sys_exit):
+        """
+        GIVEN
+        I make a request to process the outages for several sites with profiling enabled
+        WHEN
+        All required data can be retrieved successfully
+        THEN
+        The profile written should include the work done for each site on the worker threads
+        The script exits gracefully with code 0
+        """
+        self.register_site_uris(["norwich-pear-tree", "kingfisher"])
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, "process_outages.pstats")
+            parsed_args = outages_processor.scripts.outages.parse_args(
+                ["--site-name", "norwich-pear-tree", "--site-name", "kingfisher", "--profile", path]
+            )
+            with unittest.mock.patch("outages_processor.scripts.outages.parse_args", return_value=parsed_args):
+                outages_processor.scripts.outages.process_outages()
+            calls = {function: stat[1] for (_, _, function), stat in pstats.Stats(path).stats.items()}
+        self.assertEqual(2, calls["join_and_upload"])
+        mock_sys_exit.assert_called_with(0)
+
+    @httpretty.activate
+    @unittest.mock.patch("sys.exit")
+    def test_process_outages_daemon(self, mock_sys_exit):
+        """
+        GIVEN
+        I run the outages processor as a daemon
+        WHEN
+        SIGTERM is received during the second run
+        THEN
+        The second run should complete before the daemon stops, reusing the cached site information
+        The script exits gracefully with code 0
+        """
+        self.register_site_uris(["norwich-pear-tree"])
+        self.addCleanup(outages_processor.api.outages.configure_outages_cache, None)
+        run_once = outages_processor.scripts.outages.run_once
+        runs = []
+
+        def run_once_then_terminate(*args):
+            runs.append(run_once(*args))
+            if len(runs) == 2:
+                os.kill(os.getpid(), signal.SIGTERM)
+            return runs[-1]
+
+        parsed_args = outages_processor.scripts.outages.parse_args(["--interval", "0.01", "--jitter", "0"])
+        with unittest.mock.patch("outages_processor.scripts.outages.parse_args", return_value=parsed_args), \
+                unittest.mock.patch("outages_processor.scripts.outages.run_once", side_effect=run_once_then_terminate):
+            outages_processor.scripts.outages.process_outages()
+        self.assertEqual([True, True], runs)
+        self.assertEqual(1, sum(request.path.endswith("/site-info/norwich-pear-tree")
+                                for request in httpretty.latest_requests()))
+        self.assertIs(signal.default_int_handler, signal.getsignal(signal.SIGINT))
+        mock_sys_exit.assert_called_with(0)
+
+
+class TestProcessSites(ProcessOutagesTestCase):
+    """
+    Test suite for the process_sites functions
+    """
+    @httpretty.activate
+    def test_process_sites_indexed(self):
+        """
+        GIVEN
+        I process the outages for enough sites for the outages to be indexed by device
+        WHEN
+        All required data can be retrieved successfully
+        THEN
+        Each site should be uploaded the same enhanced outages as without the index
+        """
+        self.register_site_uris(["norwich-pear-tree", "kingfisher"])
+        with unittest.mock.patch("outages_processor.constants.OUTAGE_INDEX_MIN_SITES", 2), \
+                unittest.mock.patch("outages_processor.api.OutageIndex",
+                                    wraps=outages_processor.api.OutageIndex) as mock_index:
+            results = outages_processor.scripts.outages.process_sites(["norwich-pear-tree", "kingfisher"])
+        mock_index.assert_called_once()
+        self.assertEqual([3, 3], [result.outages_uploaded for result in results])
+        for request in httpretty.latest_requests():
+            if request.method == "POST":
+                self.assertEqual(["Battery 1", "Battery 1", "Battery 2"],
+                                 [outage["name"] for outage in json.loads(request.body)])
+
+    @httpretty.activate
+    def test_process_sites_parallel(self):
+        """
+        GIVEN
+        I process the outages for several sites across 2 worker processes
+        WHEN
+        All required data can be retrieved successfully
+        THEN
+        Each site should be uploaded the same enhanced outages as in a single process
+        """
+        self.register_site_uris(["norwich-pear-tree", "kingfisher"])
+        # httpretty replaces the socket module, which the fork server needs, so the workers run as threads here
+        pool = concurrent.futures.ThreadPoolExecutor(2)
+        self.addCleanup(pool.shutdown)
+        with unittest.mock.patch("outages_processor.parallel.outages.get_process_pool",
+                                 return_value=pool) as mock_pool:
+            results = outages_processor.scripts.outages.process_sites_parallel(["norwich-pear-tree", "kingfisher"],
+                                                                               processes=2)
+        mock_pool.assert_called_once_with(2)
+        self.assertEqual([3, 3], [result.outages_uploaded for result in results])
+        for request in httpretty.latest_requests():
+            if request.method == "POST":
+                self.assertEqual(["Battery 1", "Battery 1", "Battery 2"],
+                                 [outage["name"] for outage in json.loads(request.body)])
+
+    @httpretty.activate
+    def test_process_sites_pipelined_one_fails(self):
+        """
+        GIVEN
+        I process the outages for several sites in pipeline mode
+        WHEN
+        The site info for one site and the upload for another fail with HTTP 400 errors
+        THEN
+        The remaining site should be uploaded and reported as successful, in the order the sites were given
+        """
+        self.register_site_uris(["norwich-pear-tree", "kingfisher"])
+        httpretty.register_uri(httpretty.GET, f"{API_BASE_URL}/site-info/heron", body="", status=400)
+        httpretty.register_uri(httpretty.POST, f"{API_BASE_URL}/site-outages/kingfisher", body="", status=400)
+        results = outages_processor.scripts.outages.process_sites_pipelined(["heron", "norwich-pear-tree",
+                                                                             "kingfisher"])
+        self.assertEqual(["heron", "norwich-pear-tree", "kingfisher"], [result.site_name for result in results])
+        self.assertEqual([False, True, False], [result.success for result in results])
+        self.assertEqual(3, results[1].outages_uploaded)
+
+    @httpretty.activate
+    def test_process_sites_pipelined_outages_fail(self):
+        """
+        GIVEN
+        I process the outages for several sites in pipeline mode
+        WHEN
+        The outages cannot be fetched
+        THEN
+        The error should be raised, and no outages uploaded
+        """
+        self.register_site_uris(["norwich-pear-tree", "kingfisher"])
+        httpretty.register_uri(httpretty.GET, f"{API_BASE_URL}/outages", body="", status=400)
+        with self.assertRaises(outages_processor.utils.errors.APIError):
+            outages_processor.scripts.outages.process_sites_pipelined(["norwich-pear-tree", "kingfisher"])
+        self.assertEqual([], [request for request in httpretty.latest_requests() if request.method == "POST"])
+
+
+class TestGetSiteNames(unittest.TestCase):
+    """
+    Test suite for the get_site_names function
+    """
+    def test_default_site_name(self):
+        """
+        GIVEN
+        The command line arguments are parsed
+        WHEN
+        No site names are given
+        THEN
+        The default site name should be used
+        """
+        args = outages_processor.scripts.outages.parse_args([])
+        self.assertEqual(["norwich-pear-tree"], outages_processor.scripts.outages.get_site_names(args))
+
+    def test_site_names_from_flags_and_file(self):
+        """
+        GIVEN
+        The command line arguments are parsed
+        WHEN
+        Site names are given as repeated flags and in a file, with duplicates, comments and blank lines
+        THEN
+        The unique site names should be returned in the order given
+        """
+        with tempfile.TemporaryDirectory() as temp_dir:
+            sites_file = os.path.join(temp_dir, "sites.txt")
+            with open(sites_file, "w", encoding="utf-8") as file_handle:
+                file_handle.write("# Sites to process\nkingfisher\n\nnorwich-pear-tree\n  heron  \n")
+            args = outages_processor.scripts.outages.parse_args(
+                ["--site-name", "norwich-pear-tree", "--sites-file", sites_file]
+            )
+            site_names = outages_processor.scripts.outages.get_site_names(args)
+        self.assertEqual(["norwich-pear-tree", "kingfisher", "heron"], site_names)
+
+
+class TestParseArgs(unittest.TestCase):
+    """
+    Test suite for the parse_args function
+    """
+    def test_profile_paths_must_differ(self):
+        """
+        GIVEN
+        The command line arguments
+        WHEN
+        --profile and --profile-memory are given the same file, and then different files
+        THEN
+        The arguments should be rejected when the files are the same, as one profile would overwrite the other
+        """
+        with unittest.mock.patch("sys.stderr"), self.assertRaises(SystemExit):
+            outages_processor.scripts.outages.parse_args(["--profile", "out", "--profile-memory", "./out"])
+        args = outages_processor.scripts.outages.parse_args(["--profile", "out.pstats", "--profile-memory", "out"])
+        self.assertEqual(("out.pstats", "out"), (args.profile, args.profile_memory))
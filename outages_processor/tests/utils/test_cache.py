@@ -0,0 +1,198 @@
+"""
+Tests for utils.cache
+"""
+import os
+import tempfile
+import time
+import unittest.mock
+
+import outages_processor.utils.cache
+from outages_processor.utils.cache import CacheEntry, CacheStats, FileCache, TTLCache
+from outages_processor.utils.errors import StateError
+
+
+class TestCacheEntry(unittest.TestCase):
+    """
+    Test suite for the CacheEntry class
+    """
+
+    def test_conditional_headers(self):
+        """
+        GIVEN
+        A cache entry
+        WHEN
+        I get the conditional request headers
+        THEN
+        Only headers for the validators the entry has should be returned
+        """
+        entry = CacheEntry({}, '"abc"', "Mon, 23 May 2022 12:21:27 GMT", 0)
+        self.assertEqual({"If-None-Match": '"abc"', "If-Modified-Since": "Mon, 23 May 2022 12:21:27 GMT"},
+                         entry.conditional_headers())
+        self.assertEqual({"If-None-Match": '"abc"'}, entry._replace(last_modified=None).conditional_headers())
+        self.assertEqual({}, CacheEntry({}, None, None, 0).conditional_headers())
+
+
+class TestTTLCache(unittest.TestCase):
+    """
+    Test suite for the TTLCache class
+    """
+
+    def test_least_recently_used_evicted(self):
+        """
+        GIVEN
+        A cache with a maximum size of two
+        WHEN
+        I store three entries, having used the first since storing it
+        THEN
+        The second entry should be evicted and counted in the statistics
+        """
+        cache = TTLCache(maxsize=2)
+        cache.set("a", CacheEntry(1, None, None, time.time()))
+        cache.set("b", CacheEntry(2, None, None, time.time()))
+        cache.get("a")
+        cache.set("c", CacheEntry(3, None, None, time.time()))
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(1, cache.get("a").value)
+        self.assertEqual(3, cache.get("c").value)
+        self.assertEqual(CacheStats(0, 0, 0, 1), cache.stats())
+
+    def test_entries_go_stale(self):
+        """
+        GIVEN
+        A cache with a time to live of 60 seconds
+        WHEN
+        I check the freshness of an entry stored now and another stored two minutes ago
+        THEN
+        Only the entry stored now should be fresh, and the stale entry should still be returned
+        """
+        cache = TTLCache(ttl=60)
+        cache.set("fresh", CacheEntry(1, None, None, time.time()))
+        cache.set("stale", CacheEntry(2, None, None, time.time() - 120))
+        self.assertTrue(cache.is_fresh(cache.get("fresh")))
+        self.assertFalse(cache.is_fresh(cache.get("stale")))
+        self.assertTrue(cache.is_fresh(cache.get("stale").revalidated()))
+
+    def test_persisted_between_instances(self):
+        """
+        GIVEN
+        A cache backed by a file
+        WHEN
+        I store an entry, flush the cache and create a new cache from the same file
+        THEN
+        The file should only be written by the flush, and the new cache should contain the entry, unless its
+        maximum size is 0
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "cache", "site-info.json")
+            entry = CacheEntry({"devices": []}, '"abc"', None, time.time())
+            cache = TTLCache(path=path)
+            cache.set("some-site", entry)
+            self.assertFalse(os.path.exists(path))
+            cache.flush()
+            self.assertEqual(entry, TTLCache(path=path).get("some-site"))
+            self.assertIsNone(TTLCache(maxsize=0, path=path).get("some-site"))
+
+    def test_clear(self):
+        """
+        GIVEN
+        A cache backed by a file, with an entry and statistics recorded
+        WHEN
+        I clear the cache
+        THEN
+        The entries and statistics should be reset and the file deleted
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "site-info.json")
+            cache = TTLCache(path=path)
+            cache.set("some-site", CacheEntry({}, None, None, time.time()))
+            cache.flush()
+            cache.record("misses")
+            cache.clear()
+            self.assertIsNone(cache.get("some-site"))
+            self.assertEqual(CacheStats(0, 0, 0, 0), cache.stats())
+            self.assertFalse(os.path.exists(path))
+
+    def test_corrupt_file(self):
+        """
+        GIVEN
+        A cache file which is not valid JSON
+        WHEN
+        I create a cache from the file
+        THEN
+        A StateError should be raised
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "site-info.json")
+            with open(path, "w", encoding="utf-8") as file_handle:
+                file_handle.write("{")
+            with self.assertRaises(StateError):
+                TTLCache(path=path)
+
+    def test_write_failure(self):
+        """
+        GIVEN
+        A cache backed by a file
+        WHEN
+        The file cannot be written when the cache is flushed
+        THEN
+        A StateError should be raised
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            cache = TTLCache(path=os.path.join(directory, "site-info.json"))
+            with unittest.mock.patch.object(outages_processor.utils.cache.os, "replace", side_effect=OSError):
+                cache.set("some-site", CacheEntry({}, None, None, time.time()))
+                with self.assertRaises(StateError):
+                    cache.flush()
+
+
+class TestFileCache(unittest.TestCase):
+    """
+    Test suite for the FileCache class
+    """
+
+    def test_persisted_between_instances(self):
+        """
+        GIVEN
+        A file cache
+        WHEN
+        I store an entry and create a new cache from the same file
+        THEN
+        The new cache should contain the entry, already parsed
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "outages.pickle")
+            entry = CacheEntry([{"id": "a", "begin": "2022-01-01T00:00:00.000Z"}], '"abc"', None, time.time())
+            FileCache(path).set(entry)
+            self.assertEqual(entry, FileCache(path).get())
+
+    def test_unreadable_file_ignored(self):
+        """
+        GIVEN
+        A cache file which is not a valid pickle
+        WHEN
+        I get the cached entry
+        THEN
+        No entry should be returned
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "outages.pickle")
+            with open(path, "wb") as file_handle:
+                file_handle.write(b"not a pickle")
+            self.assertIsNone(FileCache(path).get())
+
+    def test_clear(self):
+        """
+        GIVEN
+        A file cache with an entry
+        WHEN
+        I clear the cache
+        THEN
+        The entry should be removed and the file deleted
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "outages.pickle")
+            cache = FileCache(path)
+            cache.set(CacheEntry([], None, None, time.time()))
+            cache.clear()
+            self.assertIsNone(cache.get())
+            self.assertFalse(os.path.exists(path))
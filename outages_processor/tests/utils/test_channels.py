@@ -0,0 +1,81 @@
+"""
+Tests for utils.channels
+"""
+import threading
+import unittest
+
+import outages_processor.utils.metrics
+from outages_processor.utils.channels import Channel, produce
+from outages_processor.utils.errors import APIError
+
+
+class TestChannel(unittest.TestCase):
+    """
+    Test suite for the Channel class
+    """
+
+    def test_items_passed_in_batches(self):
+        """
+        GIVEN
+        A channel with a batch size of 2
+        WHEN
+        A producer thread sends 5 items
+        THEN
+        The consumer should receive the items in order, in batches of 2 and a final batch of 1
+        """
+        channel = Channel("test", maxsize=1, batch_size=2)
+        thread = threading.Thread(target=produce, args=(channel, range(5)))
+        thread.start()
+        self.assertEqual([[0, 1], [2, 3], [4]], list(channel.batches()))
+        thread.join()
+
+    def test_producer_error_raised_after_items(self):
+        """
+        GIVEN
+        A producer which fails after sending 3 items
+        WHEN
+        The consumer iterates over the channel
+        THEN
+        The 3 items should be received, and then the producer's error raised
+        """
+        def items():
+            yield from range(3)
+            raise APIError("Feed failed")
+
+        channel = Channel("test", maxsize=10, batch_size=2)
+        with self.assertRaises(APIError):
+            produce(channel, items())
+        received = []
+        with self.assertRaisesRegex(APIError, "Feed failed"):
+            for item in channel:
+                received.append(item)
+        self.assertEqual([0, 1, 2], received)
+
+    def test_full_channel_blocks_producer_until_cancelled(self):
+        """
+        GIVEN
+        A producer sending an unbounded stream of items to a channel which holds 2 batches
+        WHEN
+        The consumer reads a single batch and then cancels the channel
+        THEN
+        The producer should wait for space, counting the wait, then stop once cancelled and close the stream
+        """
+        self.addCleanup(outages_processor.utils.metrics.configure_metrics, False)
+        metrics = outages_processor.utils.metrics.configure_metrics(True)
+        closed = threading.Event()
+
+        def items():
+            try:
+                yield from iter(int, 1)
+            finally:
+                closed.set()
+
+        channel = Channel("test", maxsize=2, batch_size=10)
+        thread = threading.Thread(target=produce, args=(channel, items()))
+        thread.start()
+        self.assertEqual([0] * 10, next(channel.batches()))
+        channel.cancel()
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+        self.assertTrue(closed.is_set())
+        self.assertGreater(metrics.counters()["test_queue_full"], 0)
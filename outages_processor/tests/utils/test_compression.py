@@ -0,0 +1,93 @@
+"""
+Tests for utils.compression
+"""
+import gzip
+import unittest.mock
+
+import outages_processor.utils.compression
+
+
+class TestResolveEncoding(unittest.TestCase):
+    """
+    Test suite for the resolve_encoding function
+    """
+
+    def test_resolve_encodings(self):
+        """
+        GIVEN
+        The function is called
+        WHEN
+        I pass each of the supported settings, in any case
+        THEN
+        I should receive the matching content encoding, or None for no compression
+        """
+        self.assertIsNone(outages_processor.utils.compression.resolve_encoding("none"))
+        self.assertIsNone(outages_processor.utils.compression.resolve_encoding(None))
+        self.assertEqual("gzip", outages_processor.utils.compression.resolve_encoding("GZIP"))
+
+    def test_resolve_zstd_without_zstandard(self):
+        """
+        GIVEN
+        The zstandard package is not installed
+        WHEN
+        I pass zstd
+        THEN
+        I should receive gzip instead
+        """
+        with unittest.mock.patch("outages_processor.utils.compression.zstandard", None):
+            self.assertEqual("gzip", outages_processor.utils.compression.resolve_encoding("zstd"))
+            self.assertEqual(("gzip",), outages_processor.utils.compression.available_encodings())
+
+    def test_resolve_unsupported(self):
+        """
+        GIVEN
+        The function is called
+        WHEN
+        I pass an unsupported encoding
+        THEN
+        A ValueError should be raised
+        """
+        with self.assertRaises(ValueError):
+            outages_processor.utils.compression.resolve_encoding("br")
+
+
+class TestCompress(unittest.TestCase):
+    """
+    Test suite for the compress function
+    """
+
+    def setUp(self):
+        """
+        Common setup, shared across the suite
+        """
+        self.body = b'[{"id":"002b28fc-283c-47ec-9af2-ea287336dc1b","begin":"2021-07-26T17:09:31.036Z"}]' * 100
+
+    def test_compress_gzip(self):
+        """
+        GIVEN
+        The function is called
+        WHEN
+        I compress a body with gzip
+        THEN
+        The compressed body should be smaller, deterministic and decompress to the original
+        """
+        compressed = outages_processor.utils.compression.compress(self.body, "gzip")
+        self.assertLess(len(compressed), len(self.body))
+        self.assertEqual(compressed, outages_processor.utils.compression.compress(self.body, "gzip"))
+        self.assertEqual(self.body, gzip.decompress(compressed))
+
+    def test_compress_zstd(self):
+        """
+        GIVEN
+        The zstandard package is installed
+        WHEN
+        I compress a body with zstd
+        THEN
+        The compressed body should be smaller and decompress to the original
+        """
+        zstandard = outages_processor.utils.compression.zstandard
+        if zstandard is None:
+            self.skipTest("zstandard is not installed")
+        compressed = outages_processor.utils.compression.compress(self.body, "zstd")
+        self.assertLess(len(compressed), len(self.body))
+        self.assertEqual(self.body, zstandard.ZstdDecompressor().decompress(compressed))
@@ -0,0 +1,57 @@
+"""
+Tests for utils.files
+"""
+import os
+import tempfile
+import unittest
+
+from outages_processor.utils.errors import StateError
+from outages_processor.utils.files import write_atomically
+
+
+class TestWriteAtomically(unittest.TestCase):
+    """
+    Test suite for the write_atomically function
+    """
+    def test_write(self):
+        """
+        GIVEN
+        A file in a directory which does not exist yet
+        WHEN
+        I write it atomically, and then write it again in binary mode
+        THEN
+        The file should hold the last content written, with no temporary files left beside it
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "state", "file.json")
+            write_atomically(path, lambda file_handle: file_handle.write("first"))
+            write_atomically(path, lambda file_handle: file_handle.write(b"second"), mode="wb")
+            with open(path, "rb") as file_handle:
+                self.assertEqual(b"second", file_handle.read())
+            self.assertEqual(["file.json"], os.listdir(os.path.dirname(path)))
+
+    def test_failed_write(self):
+        """
+        GIVEN
+        An existing file
+        WHEN
+        Writing it again fails part way through, with an OSError and then with another error
+        THEN
+        A StateError should be raised for the OSError and the other error should be raised as it is, leaving the
+        existing file unchanged and deleting the temporary files
+        """
+        def fail(file_handle, error):
+            file_handle.write("partial")
+            raise error
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "file.json")
+            write_atomically(path, lambda file_handle: file_handle.write("original"))
+            with self.assertRaisesRegex(StateError, "Failed to write state file"):
+                write_atomically(path, lambda file_handle: fail(file_handle, OSError("disk full")),
+                                 description="state file")
+            with self.assertRaises(TypeError):
+                write_atomically(path, lambda file_handle: fail(file_handle, TypeError("not serializable")))
+            with open(path, encoding="utf-8") as file_handle:
+                self.assertEqual("original", file_handle.read())
+            self.assertEqual(["file.json"], os.listdir(directory))
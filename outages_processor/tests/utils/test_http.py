@@ -1,6 +1,8 @@
 """
 Tests for utils.api
 """
+import concurrent.futures
+import gzip
 import json
 import unittest.mock
 
@@ -8,6 +10,8 @@ import httpretty
 import requests
 
 import outages_processor.utils.http
+import outages_processor.utils.metrics
+import outages_processor.utils.ratelimit
 from outages_processor.constants import API_BASE_URL, API_KEY, HTTP_TIMEOUT_SECONDS
 from outages_processor.utils.errors import APIError
 
@@ -53,6 +57,146 @@ class TestCreateSession(unittest.TestCase):
         session = outages_processor.utils.http.create_session(retries=4)
         self.assertEqual(4, session.adapters.get("http://").max_retries.total)
 
+    def test_returns_session_with_pool_config(self):
+        """
+        GIVEN
+        The function is called
+        WHEN
+        I pass a custom connection pool config
+        THEN
+        I should receive a session with the pool sizes applied to its adapters
+        """
+        pool_config = outages_processor.utils.http.PoolConfig(connections=2, maxsize=20, block=True)
+        session = outages_processor.utils.http.create_session(pool_config=pool_config)
+        adapter = session.adapters.get("https://")
+        # pylint: disable=protected-access
+        self.assertEqual(2, adapter._pool_connections)
+        self.assertEqual(20, adapter._pool_maxsize)
+        self.assertTrue(adapter._pool_block)
+        self.assertEqual("keep-alive", session.headers.get("Connection"))
+
+    def test_returns_session_without_keep_alive(self):
+        """
+        GIVEN
+        The function is called
+        WHEN
+        I pass a pool config with keep-alive disabled
+        THEN
+        I should receive a session which asks the server to close connections
+        """
+        pool_config = outages_processor.utils.http.PoolConfig(keep_alive=False)
+        session = outages_processor.utils.http.create_session(pool_config=pool_config)
+        self.assertEqual("close", session.headers.get("Connection"))
+
+
+class TestSharedSession(unittest.TestCase):
+    """
+    Test suite for the shared session helpers
+    """
+
+    def setUp(self):
+        """
+        Common setup, shared across the suite
+        """
+        outages_processor.utils.http.close_session()
+
+    def tearDown(self):
+        """
+        Common teardown, discards the shared session
+        """
+        outages_processor.utils.http.close_session()
+
+    def test_session_reused_across_requests(self):
+        """
+        GIVEN
+        I make several API requests
+        WHEN
+        No session is passed explicitly
+        THEN
+        A single session should be created and used for every request
+        """
+        mock_session = unittest.mock.MagicMock()
+        with unittest.mock.patch("outages_processor.utils.http.create_session",
+                                 return_value=mock_session) as mock_create_session:
+            outages_processor.utils.http.api_request("GET", "/outages")
+            outages_processor.utils.http.api_request("GET", "/site-info/norwich-pear-tree")
+        mock_create_session.assert_called_once()
+        self.assertEqual(2, mock_session.request.call_count)
+
+    def test_injected_session_used(self):
+        """
+        GIVEN
+        I inject a session with set_session
+        WHEN
+        I make an API request
+        THEN
+        The injected session should be used and the previous one handed back
+        """
+        mock_session = unittest.mock.MagicMock()
+        self.assertIsNone(outages_processor.utils.http.set_session(mock_session))
+        outages_processor.utils.http.api_request("GET", "/outages")
+        mock_session.request.assert_called_once()
+        self.assertIs(mock_session, outages_processor.utils.http.set_session(None))
+
+    def test_explicit_session_argument_used(self):
+        """
+        GIVEN
+        I make an API request
+        WHEN
+        I pass a session explicitly
+        THEN
+        The given session should be used instead of the shared one
+        """
+        mock_session = unittest.mock.MagicMock()
+        with unittest.mock.patch("outages_processor.utils.http.create_session") as mock_create_session:
+            outages_processor.utils.http.api_request("GET", "/outages", session=mock_session)
+        mock_create_session.assert_not_called()
+        mock_session.request.assert_called_once()
+
+    def test_close_session(self):
+        """
+        GIVEN
+        A shared session has been created
+        WHEN
+        I close it
+        THEN
+        The session should be closed and a new one created on next use
+        """
+        first = outages_processor.utils.http.get_session()
+        with unittest.mock.patch.object(first, "close") as mock_close:
+            outages_processor.utils.http.close_session()
+        mock_close.assert_called_once()
+        self.assertIsNot(first, outages_processor.utils.http.get_session())
+
+    def test_configure_session(self):
+        """
+        GIVEN
+        A shared session has been created
+        WHEN
+        I configure new pool settings
+        THEN
+        The next shared session should be created with those settings
+        """
+        outages_processor.utils.http.get_session()
+        outages_processor.utils.http.configure_session(outages_processor.utils.http.PoolConfig(maxsize=32))
+        adapter = outages_processor.utils.http.get_session().adapters.get("https://")
+        # pylint: disable=protected-access
+        self.assertEqual(32, adapter._pool_maxsize)
+        outages_processor.utils.http.configure_session(None)
+
+    def test_concurrent_get_session_creates_one(self):
+        """
+        GIVEN
+        Several threads need the shared session at the same time
+        WHEN
+        None has been created yet
+        THEN
+        Every thread should receive the same session
+        """
+        with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
+            sessions = list(executor.map(lambda _: outages_processor.utils.http.get_session(), range(32)))
+        self.assertEqual(1, len({id(session) for session in sessions}))
+
 
 class TestAPIRequest(unittest.TestCase):
     """
@@ -74,6 +218,13 @@ class TestAPIRequest(unittest.TestCase):
         self.standard_headers = {
             "x-api-key": API_KEY,
         }
+        outages_processor.utils.http.close_session()
+
+    def tearDown(self):
+        """
+        Common teardown, discards the shared session so pooled connections do not leak between tests
+        """
+        outages_processor.utils.http.close_session()
 
     def test_api_request_get_correct_requests_call(self):
         """
@@ -142,7 +293,7 @@ class TestAPIRequest(unittest.TestCase):
         The function makes a HTTP call on the requests session
         THEN
         The arguments should indicate a POST method to the base URL concatenated with /site-outages/norwich-pear-tree
-        and a JSON payload
+        and a compact JSON payload encoded as bytes
         """
         json_data = {
             "some_key": "some_value",
@@ -156,8 +307,8 @@ class TestAPIRequest(unittest.TestCase):
         mock_create_session.request.assert_called_once_with(
             method="POST",
             url=f"{API_BASE_URL}/site-outages/norwich-pear-tree",
-            headers=self.standard_headers,
-            json=json_data,
+            headers={**self.standard_headers, "Content-Type": "application/json"},
+            data=b'{"some_key":"some_value"}',
             timeout=HTTP_TIMEOUT_SECONDS,
         )
 
@@ -264,3 +415,196 @@ class TestAPIRequest(unittest.TestCase):
         )
         with self.assertRaises(APIError):
             outages_processor.utils.http.api_request("GET", "/outages")
+
+    @httpretty.activate
+    def test_api_request_post_compressed(self):
+        """
+        GIVEN
+        I call the function with a POST request and gzip compression
+        WHEN
+        The JSON body is larger than the compression threshold
+        THEN
+        The body should be sent gzip compressed, with the Content-Encoding header set
+        """
+        httpretty.register_uri(httpretty.POST, f"{API_BASE_URL}/site-outages/norwich-pear-tree", status=200)
+        outages = self.outages_get_body * 100
+        outages_processor.utils.http.api_request("POST",
+                                                 "/site-outages/norwich-pear-tree",
+                                                 json=outages,
+                                                 compression="gzip")
+        request = httpretty.last_request()
+        self.assertEqual("gzip", request.headers.get("Content-Encoding"))
+        self.assertEqual("application/json", request.headers.get("Content-Type"))
+        self.assertEqual(outages, json.loads(gzip.decompress(request.body)))
+
+    @httpretty.activate
+    def test_api_request_post_small_body_not_compressed(self):
+        """
+        GIVEN
+        I call the function with a POST request and gzip compression
+        WHEN
+        The JSON body is smaller than the compression threshold
+        THEN
+        The body should be sent uncompressed
+        """
+        httpretty.register_uri(httpretty.POST, f"{API_BASE_URL}/site-outages/norwich-pear-tree", status=200)
+        outages_processor.utils.http.api_request("POST",
+                                                 "/site-outages/norwich-pear-tree",
+                                                 json=self.outages_get_body,
+                                                 compression="gzip")
+        request = httpretty.last_request()
+        self.assertIsNone(request.headers.get("Content-Encoding"))
+        self.assertEqual(self.outages_get_body, json.loads(request.body))
+
+    @httpretty.activate
+    def test_iter_response_content_decodes_gzip(self):
+        """
+        GIVEN
+        I make a streamed GET request to /outages
+        WHEN
+        The server responds with a gzip encoded body
+        THEN
+        The decoded body should be returned as it is read
+        """
+        body = json.dumps(self.outages_get_body * 100).encode("utf-8")
+        httpretty.register_uri(
+            httpretty.GET,
+            f"{API_BASE_URL}/outages",
+            body=gzip.compress(body),
+            adding_headers={"Content-Encoding": "gzip"},
+        )
+        response = outages_processor.utils.http.api_request("GET", "/outages", stream=True)
+        chunks = list(outages_processor.utils.http.iter_response_content(response, chunk_size=256))
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(body, b"".join(chunks))
+
+    @httpretty.activate
+    def test_read_json(self):
+        """
+        GIVEN
+        I call the API and read the response as JSON
+        WHEN
+        The server responds with valid JSON, then with a body which is not JSON
+        THEN
+        I should receive the parsed body, then an APIError
+        """
+        httpretty.register_uri(
+            httpretty.GET,
+            f"{API_BASE_URL}/outages",
+            responses=[
+                httpretty.Response(status=200, body=json.dumps(self.outages_get_body)),
+                httpretty.Response(status=200, body="<html>Bad gateway</html>"),
+            ],
+        )
+        response = outages_processor.utils.http.api_request("GET", "/outages")
+        self.assertEqual(self.outages_get_body, outages_processor.utils.http.read_json(response))
+        with self.assertRaises(APIError):
+            outages_processor.utils.http.read_json(outages_processor.utils.http.api_request("GET", "/outages"))
+
+    @httpretty.activate
+    @unittest.mock.patch("time.sleep")
+    def test_api_request_metrics(self, _):
+        """
+        GIVEN
+        Metrics are enabled
+        WHEN
+        I upload to a site and fetch the outages, which succeeds after the session retries a 500 error
+        THEN
+        The requests should be recorded per route, without the site name, along with the retry and the bytes sent
+        and received
+        """
+        self.addCleanup(outages_processor.utils.metrics.configure_metrics, False)
+        metrics = outages_processor.utils.metrics.configure_metrics(True)
+        body = json.dumps(self.outages_get_body)
+        httpretty.register_uri(
+            httpretty.GET,
+            f"{API_BASE_URL}/outages",
+            responses=[
+                httpretty.Response(status=500, body=""),
+                httpretty.Response(status=200, body=body),
+            ],
+        )
+        httpretty.register_uri(httpretty.POST, f"{API_BASE_URL}/site-outages/norwich-pear-tree", body="")
+        outages_processor.utils.http.api_request("POST", "/site-outages/norwich-pear-tree", data=b"[]")
+        outages_processor.utils.http.api_request("GET", "/outages")
+        routes = metrics.routes()
+        self.assertEqual({"/site-outages", "/outages"}, set(routes))
+        self.assertEqual((1, 0, 1), tuple(routes["/outages"][:3]))
+        self.assertEqual({"bytes_sent": 2, "bytes_received": len(body)}, metrics.counters())
+
+    @httpretty.activate
+    def test_api_request_retry_on_429_after_retry_after(self):
+        """
+        GIVEN
+        I call the function with a POST request to a site, which the session does not retry
+        WHEN
+        The server responds with a 429 error and a Retry-After header of 2 seconds, followed by a 200
+        THEN
+        Requests should be paused for 2 seconds, the request retried and the concurrency limit reduced
+        """
+        self.addCleanup(outages_processor.utils.ratelimit.configure_rate_limiter)
+        limiter = outages_processor.utils.ratelimit.configure_rate_limiter(max_concurrency=8)
+        httpretty.register_uri(
+            httpretty.POST,
+            f"{API_BASE_URL}/site-outages/norwich-pear-tree",
+            responses=[
+                httpretty.Response(status=429, body="", adding_headers={"Retry-After": "2"}),
+                httpretty.Response(status=200, body=""),
+            ],
+        )
+        with unittest.mock.patch.object(limiter, "pause") as mock_pause:
+            response = outages_processor.utils.http.api_request("POST", "/site-outages/norwich-pear-tree")
+        self.assertEqual(200, response.status_code)
+        mock_pause.assert_called_once_with(2.0)
+        self.assertEqual(4, limiter.concurrency.limit)
+
+    @httpretty.activate
+    def test_api_request_retry_on_429_attempts_exceeded(self):
+        """
+        GIVEN
+        I call the function with a GET request to /outages
+        WHEN
+        The server always responds with a 429 error without a Retry-After header
+        THEN
+        Requests should be paused with a backoff delay before each retry, then an APIError raised which is not
+        retryable again by callers
+        """
+        self.addCleanup(outages_processor.utils.ratelimit.configure_rate_limiter)
+        limiter = outages_processor.utils.ratelimit.configure_rate_limiter()
+        httpretty.register_uri(httpretty.GET, f"{API_BASE_URL}/outages", status=429, body="")
+        with unittest.mock.patch.object(limiter, "pause") as mock_pause:
+            with self.assertRaises(APIError) as context:
+                outages_processor.utils.http.api_request("GET", "/outages")
+        self.assertEqual([unittest.mock.call(2.0), unittest.mock.call(4.0), unittest.mock.call(8.0)],
+                         mock_pause.call_args_list)
+        self.assertFalse(outages_processor.utils.http.is_retryable_error(context.exception))
+
+
+class TestGetRetryAfter(unittest.TestCase):
+    """
+    Test suite for the get_retry_after function
+    """
+
+    def test_get_retry_after(self):
+        """
+        GIVEN
+        Responses with a Retry-After header in seconds, as an HTTP date, too long, invalid or missing
+        WHEN
+        I get the delay for each
+        THEN
+        The delay should be parsed, capped at MAX_RETRY_AFTER, or 0 when the header is invalid or missing
+        """
+        cases = {
+            "3": 3.0,
+            "3600": outages_processor.utils.http.MAX_RETRY_AFTER,
+            "Wed, 21 Oct 2015 07:28:00 GMT": 0.0,
+            "soon": 0.0,
+            None: 0.0,
+        }
+        for value, expected in cases.items():
+            with self.subTest(value=value):
+                response = requests.Response()
+                if value is not None:
+                    response.headers["Retry-After"] = value
+                self.assertEqual(expected, outages_processor.utils.http.get_retry_after(response))
+        self.assertEqual(0.0, outages_processor.utils.http.get_retry_after(None))
@@ -0,0 +1,123 @@
+"""
+Tests for utils.jsonstream
+"""
+import json
+import unittest
+
+from outages_processor.utils.jsonstream import encode_json_array, iter_json_array
+
+
+class TestIterJSONArray(unittest.TestCase):
+    """
+    Test suite for the iter_json_array function
+    """
+    def setUp(self):
+        """
+        Common setup, shared across the suite
+        """
+        self.items = [
+            {
+                "id": "002b28fc-283c-47ec-9af2-ea287336dc1b",
+                "begin": "2022-05-23T12:21:27.377Z",
+                "end": "2022-11-13T02:16:38.905Z",
+                "name": "Bättery 1",
+            },
+            12345,
+            -1.5e3,
+            [1, [2, 3]],
+            "some string",
+            None,
+            True,
+        ]
+
+    def test_parse_in_chunks_of_every_size(self):
+        """
+        GIVEN
+        A JSON array is split into chunks
+        WHEN
+        The chunks split items, numbers and multi-byte characters at every possible position
+        THEN
+        The items should be yielded exactly as json.loads would parse them
+        """
+        body = json.dumps(self.items, indent=2).encode("utf-8")
+        for chunk_size in range(1, 40):
+            chunks = (body[i:i + chunk_size] for i in range(0, len(body), chunk_size))
+            self.assertEqual(self.items, list(iter_json_array(chunks)), f"chunk size {chunk_size}")
+
+    def test_parse_str_chunks(self):
+        """
+        GIVEN
+        A JSON array is split into str chunks
+        WHEN
+        It is parsed
+        THEN
+        The items should be yielded
+        """
+        self.assertEqual([1, 2], list(iter_json_array(["[1", ", 2", "]"])))
+
+    def test_parse_empty_array(self):
+        """
+        GIVEN
+        An empty JSON array surrounded by whitespace
+        WHEN
+        It is parsed
+        THEN
+        No items should be yielded
+        """
+        self.assertEqual([], list(iter_json_array([b" [ ", b"] \n"])))
+
+    def test_items_yielded_before_end_of_input(self):
+        """
+        GIVEN
+        A JSON array is being received in chunks
+        WHEN
+        The first item has been received in full
+        THEN
+        It should be yielded before the remaining chunks are read
+        """
+        def chunks():
+            yield b'[{"id": 1}, '
+            raise AssertionError("Read past the first item")
+
+        self.assertEqual({"id": 1}, next(iter_json_array(chunks())))
+
+    def test_invalid_documents(self):
+        """
+        GIVEN
+        An invalid or truncated JSON array
+        WHEN
+        It is parsed
+        THEN
+        A JSONDecodeError should be raised
+        """
+        for body in (b"", b"{}", b"[1,", b"[1 2]", b"[1,]", b"[,1]", b'[{"id": 1'):
+            with self.assertRaises(json.JSONDecodeError, msg=body):
+                list(iter_json_array([body]))
+
+
+class TestEncodeJSONArray(unittest.TestCase):
+    """
+    Test suite for the encode_json_array function
+    """
+    def test_encode_iterator(self):
+        """
+        GIVEN
+        An iterator of items
+        WHEN
+        It is encoded in batches smaller than the number of items
+        THEN
+        The result should be a JSON array of all the items
+        """
+        items = [{"id": i, "name": f"Device {i}"} for i in range(5)]
+        self.assertEqual(items, json.loads(encode_json_array(iter(items), chunk_size=2)))
+
+    def test_encode_empty(self):
+        """
+        GIVEN
+        No items
+        WHEN
+        They are encoded
+        THEN
+        The result should be an empty JSON array
+        """
+        self.assertEqual(b"[]", encode_json_array(iter([])))
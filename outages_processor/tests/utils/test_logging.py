@@ -0,0 +1,124 @@
+"""
+Tests for utils.logging
+"""
+import io
+import json
+import logging
+import unittest
+
+import outages_processor.utils.logging
+from outages_processor.utils.logging import JSON, PACKAGE_LOGGER, configure_logging, get_logger, shutdown_logging
+
+
+class TestLogging(unittest.TestCase):
+    """
+    Test suite for the logging configuration
+    """
+
+    def setUp(self):
+        """
+        Common setup, logs to an in-memory stream and restores the default configuration afterwards
+        """
+        self.stream = io.StringIO()
+        self.addCleanup(configure_logging)
+
+    def test_get_logger_does_not_add_handlers(self):
+        """
+        GIVEN
+        Logging configured to write to a stream
+        WHEN
+        I get the same module logger several times and log a message
+        THEN
+        The module logger should have no handlers of its own, and the message should be written once
+        """
+        configure_logging(stream=self.stream)
+        for _ in range(3):
+            logger = get_logger(f"{PACKAGE_LOGGER}.tests.module")
+        logger.info("Processed %s outages", 5)
+        self.assertEqual([], logger.handlers)
+        self.assertEqual(1, len(logging.getLogger(PACKAGE_LOGGER).handlers))
+        self.assertEqual(1, self.stream.getvalue().count("Processed 5 outages"))
+
+    def test_configure_logging_replaces_handler(self):
+        """
+        GIVEN
+        Logging configured twice, at INFO and then at DEBUG level
+        WHEN
+        I log a debug message
+        THEN
+        Only the handler from the second call should remain, and the message should be written once
+        """
+        configure_logging(stream=io.StringIO())
+        configure_logging(level=logging.DEBUG, stream=self.stream)
+        get_logger(f"{PACKAGE_LOGGER}.tests.module").debug("Debugging")
+        self.assertEqual(1, len(logging.getLogger(PACKAGE_LOGGER).handlers))
+        self.assertEqual(1, self.stream.getvalue().count("Debugging"))
+
+    def test_external_logger(self):
+        """
+        GIVEN
+        Logging configured to write to a stream
+        WHEN
+        I get a logger outside the package several times and then configure logging again
+        THEN
+        The logger should only ever hold the current handler
+        """
+        configure_logging(stream=io.StringIO())
+        for _ in range(3):
+            logger = get_logger("tests.external")
+        configure_logging(stream=self.stream)
+        logger.info("External message")
+        self.assertEqual(1, len(logger.handlers))
+        self.assertEqual(1, self.stream.getvalue().count("External message"))
+
+    def test_json_format(self):
+        """
+        GIVEN
+        Logging configured for JSON output
+        WHEN
+        I log an exception with an extra field
+        THEN
+        A single line JSON object should be written with the message, extra field and traceback
+        """
+        configure_logging(log_format=JSON, stream=self.stream)
+        try:
+            raise ValueError("Bad outage")
+        except ValueError:
+            get_logger(f"{PACKAGE_LOGGER}.tests.module").exception("Failed site %s", "norwich", extra={"site": "n"})
+        lines = self.stream.getvalue().splitlines()
+        self.assertEqual(1, len(lines))
+        entry = json.loads(lines[0])
+        self.assertEqual("ERROR", entry["level"])
+        self.assertEqual(f"{PACKAGE_LOGGER}.tests.module", entry["logger"])
+        self.assertEqual("Failed site norwich", entry["message"])
+        self.assertEqual("n", entry["site"])
+        self.assertIn("ValueError: Bad outage", entry["exception"])
+
+    def test_queue(self):
+        """
+        GIVEN
+        Logging configured to write from a background thread
+        WHEN
+        I log a message with arguments which change after the call, then shut logging down
+        THEN
+        The message should be written with the arguments as they were when logged
+        """
+        configure_logging(use_queue=True, stream=self.stream)
+        outages = [1, 2]
+        get_logger(f"{PACKAGE_LOGGER}.tests.module").info("Outages: %s", outages)
+        outages.append(3)
+        shutdown_logging()
+        self.assertIn("Outages: [1, 2]", self.stream.getvalue())
+        self.assertEqual([], logging.getLogger(PACKAGE_LOGGER).handlers)
+
+    def test_unsupported_format(self):
+        """
+        GIVEN
+        The logging helpers
+        WHEN
+        I create a formatter for an unsupported format
+        THEN
+        A ValueError should be raised
+        """
+        with self.assertRaises(ValueError):
+            outages_processor.utils.logging.create_formatter("xml")
@@ -0,0 +1,118 @@
+"""
+Tests for utils.metrics
+"""
+import socket
+import unittest.mock
+
+from outages_processor.utils.metrics import Metrics, send_statsd, to_prometheus, to_statsd
+
+
+class TestMetrics(unittest.TestCase):
+    """
+    Test suite for the Metrics class
+    """
+
+    def test_disabled(self):
+        """
+        GIVEN
+        Metrics which are disabled
+        WHEN
+        I time a stage, observe a request and increment a counter
+        THEN
+        Nothing should be recorded
+        """
+        metrics = Metrics()
+        with metrics.stage("fetch") as timer:
+            timer.records = 10
+        metrics.observe_request("/outages", 0.1)
+        metrics.increment("bytes_sent", 100)
+        self.assertEqual({"stages": {}, "routes": {}, "counters": {}}, metrics.summary())
+
+    @unittest.mock.patch("time.perf_counter", side_effect=[0.5, 1.0, 1.5, 2.0, 2.25])
+    def test_stages(self, _):
+        """
+        GIVEN
+        Metrics which are enabled
+        WHEN
+        I time the same stage twice, setting the number of outages it produced
+        THEN
+        The calls, time taken and outages should be summed, the throughput calculated from the totals and the
+        start and end recorded from when the metrics were enabled
+        """
+        metrics = Metrics(enabled=True)
+        for records in (100, 50):
+            with metrics.stage("join") as timer:
+                timer.records = records
+        stats = metrics.stages()["join"]
+        self.assertEqual((2, 0.75, 150, 0.5, 1.75), tuple(stats))
+        self.assertEqual(200, stats.records_per_second)
+
+    def test_requests(self):
+        """
+        GIVEN
+        Metrics which are enabled
+        WHEN
+        I observe requests to a route with different latencies, including a failure and retries
+        THEN
+        The requests should be counted in the matching latency buckets, along with the errors and retries
+        """
+        metrics = Metrics(enabled=True)
+        metrics.observe_request("/outages", 0.004)
+        metrics.observe_request("/outages", 0.005, retries=2)
+        metrics.observe_request("/outages", 30, failed=True)
+        stats = metrics.routes()["/outages"]
+        self.assertEqual((3, 1, 2), (stats.requests, stats.errors, stats.retries))
+        self.assertEqual((2, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 1), stats.buckets)
+        self.assertEqual(2, metrics.summary()["routes"]["/outages"]["buckets"]["0.005"])
+
+
+class TestExport(unittest.TestCase):
+    """
+    Test suite for the export functions
+    """
+    def setUp(self):
+        """
+        Common setup, shared across the suite
+        """
+        self.metrics = Metrics(enabled=True)
+        self.metrics.record_stage("upload", 0.5, 100)
+        self.metrics.observe_request("/site-info", 0.02, retries=1)
+        self.metrics.increment("bytes_sent", 2048)
+
+    def test_to_prometheus(self):
+        """
+        GIVEN
+        Recorded metrics
+        WHEN
+        I format them for Prometheus
+        THEN
+        Each metric family should have a type and the latency histogram should have cumulative buckets
+        """
+        textfile = to_prometheus(self.metrics)
+        self.assertIn("# TYPE outages_processor_stage_seconds_total counter\n"
+                      'outages_processor_stage_seconds_total{stage="upload"} 0.5\n', textfile)
+        self.assertIn('outages_processor_http_request_duration_seconds_bucket{route="/site-info",le="0.01"} 0\n'
+                      'outages_processor_http_request_duration_seconds_bucket{route="/site-info",le="0.025"} 1\n',
+                      textfile)
+        self.assertIn('outages_processor_http_request_duration_seconds_bucket{route="/site-info",le="+Inf"} 1\n',
+                      textfile)
+        self.assertIn('outages_processor_http_retries_total{route="/site-info"} 1\n', textfile)
+        self.assertIn("outages_processor_bytes_sent_total 2048\n", textfile)
+
+    def test_send_statsd(self):
+        """
+        GIVEN
+        Recorded metrics
+        WHEN
+        I send them to a StatsD server
+        THEN
+        Each metric should be received as a StatsD line
+        """
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as server:
+            server.bind(("127.0.0.1", 0))
+            server.settimeout(5)
+            send_statsd(self.metrics, server.getsockname())
+            received = [server.recv(1024).decode("utf-8") for _ in to_statsd(self.metrics)]
+        self.assertIn("outages_processor.stage.upload.seconds:500.000|ms", received)
+        self.assertIn("outages_processor.http.site_info.retries:1|c", received)
+        self.assertIn("outages_processor.bytes_sent:2048|c", received)
@@ -0,0 +1,104 @@
+"""
+Tests for utils.profiling
+"""
+import os
+import pstats
+import tempfile
+import threading
+import time
+import tracemalloc
+import unittest
+
+from outages_processor.utils.profiling import (
+    MEMORY_SNAPSHOT_GROWTH,
+    MemoryTrace,
+    Profiling,
+    SamplingProfile,
+    ThreadedProfile,
+)
+
+
+def busy_worker(seconds: float = 0.05) -> None:
+    """
+    Keeps a thread busy, so it is seen by the profilers
+    :param seconds: Time to keep busy for
+    """
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        sum(range(100))
+
+
+def run_in_thread(target) -> None:
+    """
+    Runs a function in a new thread and waits for it to finish
+    :param target: The function to run
+    """
+    thread = threading.Thread(target=target, name="worker")
+    thread.start()
+    thread.join()
+
+
+class TestProfiles(unittest.TestCase):
+    """
+    Test suite for the profilers
+    """
+    def setUp(self):
+        """
+        Common setup, shared across the suite
+        """
+        self.temp_dir = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.addCleanup(self.temp_dir.cleanup)
+
+    def test_threaded_profile(self):
+        """
+        GIVEN
+        A cProfile profile
+        WHEN
+        I run a function in a thread started while profiling
+        THEN
+        The function should be included in the profile written
+        """
+        path = os.path.join(self.temp_dir.name, "run.pstats")
+        with Profiling({path: ThreadedProfile()}):
+            run_in_thread(busy_worker)
+        functions = {function for _, _, function in pstats.Stats(path).stats}
+        self.assertIn("busy_worker", functions)
+
+    def test_sampling_profile(self):
+        """
+        GIVEN
+        A sampling profile
+        WHEN
+        I run a function in a thread while sampling
+        THEN
+        The collapsed stacks written should include the function, under the name of the thread
+        """
+        path = os.path.join(self.temp_dir.name, "run.collapsed")
+        with Profiling({path: SamplingProfile(interval=0.001)}):
+            run_in_thread(lambda: busy_worker(0.1))
+        with open(path, "r", encoding="utf-8") as file_handle:
+            lines = file_handle.read().splitlines()
+        worker_lines = [line for line in lines if line.startswith("worker;") and "busy_worker" in line]
+        self.assertTrue(worker_lines)
+        self.assertTrue(all(line.rsplit(" ", 1)[1].isdigit() for line in lines))
+
+    def test_memory_trace(self):
+        """
+        GIVEN
+        A memory trace
+        WHEN
+        I allocate a large block of memory and free it before tracing stops
+        THEN
+        The peak should include the block and the snapshot written should have been taken while it was allocated,
+        at least to within the growth between snapshots
+        """
+        path = os.path.join(self.temp_dir.name, "run.snapshot")
+        trace = MemoryTrace(interval=0.01)
+        with Profiling({path: trace}):
+            block = [bytes(1000) for _ in range(10000)]
+            time.sleep(0.1)
+            del block
+        self.assertGreater(trace.peak, 10000 * 1000)
+        snapshot = tracemalloc.Snapshot.load(path)
+        self.assertGreater(sum(statistic.size for statistic in snapshot.statistics("filename")),
+                           10000 * 1000 / MEMORY_SNAPSHOT_GROWTH)
@@ -0,0 +1,234 @@
+"""
+Tests for utils.ratelimit
+"""
+import asyncio
+import threading
+import unittest.mock
+
+import outages_processor.utils.ratelimit
+from outages_processor.utils.ratelimit import AIMDLimiter, RateLimiter, TokenBucket
+
+
+class FakeClock:
+    """
+    Monotonic clock which only advances when slept on
+    """
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self) -> float:
+        """
+        :return: The current time
+        """
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        """
+        Advances the clock
+        """
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class TestTokenBucket(unittest.TestCase):
+    """
+    Test suite for the TokenBucket class
+    """
+
+    def setUp(self):
+        """
+        Common setup, replacing the clock used by the bucket
+        """
+        self.clock = FakeClock()
+        for name in ("monotonic", "sleep"):
+            patcher = unittest.mock.patch(f"time.{name}", getattr(self.clock, name))
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_acquire_allows_burst_then_limits_rate(self):
+        """
+        GIVEN
+        A bucket allowing 10 requests per second in bursts of 2
+        WHEN
+        I acquire 4 tokens
+        THEN
+        The first 2 should not wait, each after should wait a tenth of a second
+        """
+        bucket = TokenBucket(rate=10, burst=2)
+        waits = [bucket.acquire() for _ in range(4)]
+        self.assertEqual([0.0, 0.0], waits[:2])
+        for wait in waits[2:]:
+            self.assertAlmostEqual(0.1, wait)
+
+    def test_acquire_unlimited(self):
+        """
+        GIVEN
+        A bucket without a rate limit
+        WHEN
+        I acquire many tokens
+        THEN
+        None should wait
+        """
+        bucket = TokenBucket()
+        self.assertEqual(0.0, sum(bucket.acquire() for _ in range(100)))
+        self.assertEqual([], self.clock.sleeps)
+
+    def test_pause(self):
+        """
+        GIVEN
+        A bucket without a rate limit, paused for 2 seconds and then for 1 second
+        WHEN
+        I acquire a token
+        THEN
+        It should wait for the longer pause
+        """
+        bucket = TokenBucket()
+        bucket.pause(2)
+        bucket.pause(1)
+        self.assertEqual(2.0, bucket.acquire())
+
+
+class TestAIMDLimiter(unittest.TestCase):
+    """
+    Test suite for the AIMDLimiter class
+    """
+
+    def test_throttled_window_halves_limit_once(self):
+        """
+        GIVEN
+        A limiter with a limit of 8 and 4 requests in flight
+        WHEN
+        Every request is throttled
+        THEN
+        The limit should only be halved once, as the requests were all sent before the first cut
+        """
+        limiter = AIMDLimiter(8)
+        tokens = [limiter.acquire() for _ in range(4)]
+        for token in tokens:
+            limiter.release(token, throttled=True)
+        self.assertEqual(4, limiter.limit)
+        limiter.release(limiter.acquire(), throttled=True)
+        self.assertEqual(2, limiter.limit)
+
+    def test_limit_increases_additively_to_maximum(self):
+        """
+        GIVEN
+        A limiter with a maximum of 4, cut to 2 by a throttled request
+        WHEN
+        Requests then succeed
+        THEN
+        The limit should grow by about one for each limit's worth of requests, up to the maximum
+        """
+        limiter = AIMDLimiter(4)
+        limiter.release(limiter.acquire(), throttled=True)
+        self.assertEqual(2, limiter.limit)
+        for _ in range(3):
+            limiter.release(limiter.acquire())
+        self.assertEqual(3, limiter.limit)
+        for _ in range(20):
+            limiter.release(limiter.acquire())
+        self.assertEqual(4, limiter.limit)
+
+    def test_limit_never_below_minimum(self):
+        """
+        GIVEN
+        A limiter with a limit of 2
+        WHEN
+        Many consecutive requests are throttled
+        THEN
+        The limit should stay at the minimum of 1
+        """
+        limiter = AIMDLimiter(2)
+        for _ in range(5):
+            limiter.release(limiter.acquire(), throttled=True)
+        self.assertEqual(1, limiter.limit)
+
+    def test_acquire_blocks_at_limit(self):
+        """
+        GIVEN
+        A limiter with a limit of 1 and a request in flight
+        WHEN
+        Another thread acquires the limiter
+        THEN
+        It should wait until the first request is released
+        """
+        limiter = AIMDLimiter(1)
+        token = limiter.acquire()
+        acquired = threading.Event()
+        thread = threading.Thread(target=lambda: (limiter.acquire(), acquired.set()))
+        thread.start()
+        self.assertFalse(acquired.wait(0.05))
+        limiter.release(token)
+        self.assertTrue(acquired.wait(5))
+        thread.join()
+
+    def test_acquire_async_waits_at_limit(self):
+        """
+        GIVEN
+        A limiter with a limit of 1 and a request in flight
+        WHEN
+        A coroutine acquires the limiter
+        THEN
+        It should wait without blocking the event loop until the first request is released
+        """
+        limiter = AIMDLimiter(1)
+
+        async def acquire_twice():
+            token = await limiter.acquire_async()
+            waiting = asyncio.create_task(limiter.acquire_async())
+            await asyncio.sleep(0.01)
+            self.assertFalse(waiting.done())
+            limiter.release(token)
+            await asyncio.wait_for(waiting, 5)
+
+        asyncio.run(acquire_twice())
+
+    def test_unlimited(self):
+        """
+        GIVEN
+        A limiter without a limit
+        WHEN
+        Many requests are acquired and throttled
+        THEN
+        None should wait and the limit should stay unlimited
+        """
+        limiter = AIMDLimiter(0)
+        tokens = [limiter.acquire() for _ in range(100)]
+        for token in tokens:
+            limiter.release(token, throttled=True)
+        self.assertEqual(0, limiter.limit)
+
+
+class TestRateLimiter(unittest.TestCase):
+    """
+    Test suite for the RateLimiter class and shared rate limiter
+    """
+
+    def test_permit_releases_throttled(self):
+        """
+        GIVEN
+        A rate limiter with a maximum concurrency of 4
+        WHEN
+        A request is sent under a permit which is marked as throttled
+        THEN
+        The concurrency limit should be halved once the permit is released
+        """
+        limiter = RateLimiter(max_concurrency=4)
+        with limiter.permit() as permit:
+            permit.throttled = True
+        self.assertEqual(2, limiter.concurrency.limit)
+
+    def test_configure_rate_limiter(self):
+        """
+        GIVEN
+        The shared rate limiter
+        WHEN
+        I configure it with a rate and maximum concurrency
+        THEN
+        The shared rate limiter should be replaced with one using those settings
+        """
+        self.addCleanup(outages_processor.utils.ratelimit.configure_rate_limiter)
+        limiter = outages_processor.utils.ratelimit.configure_rate_limiter(rate=5, burst=2, max_concurrency=3)
+        self.assertIs(limiter, outages_processor.utils.ratelimit.get_rate_limiter())
+        self.assertEqual((5, 2, 3), (limiter.bucket.rate, limiter.bucket.burst, limiter.concurrency.limit))
@@ -0,0 +1,98 @@
+"""
+Tests for utils.scheduler
+"""
+import os
+import signal
+import unittest.mock
+
+from outages_processor.utils.scheduler import Scheduler, restore_signal_handlers
+
+
+class TestScheduler(unittest.TestCase):
+    """
+    Test suite for the Scheduler class
+    """
+
+    def test_run_limited_runs(self):
+        """
+        GIVEN
+        A scheduler with a short interval
+        WHEN
+        I run a job for at most 3 runs
+        THEN
+        The job should run 3 times
+        """
+        job = unittest.mock.MagicMock()
+        self.assertEqual(3, Scheduler(0.001).run(job, runs=3))
+        self.assertEqual(3, job.call_count)
+
+    def test_stop_from_job(self):
+        """
+        GIVEN
+        A scheduler with a long interval
+        WHEN
+        The job stops the scheduler on its first run
+        THEN
+        The scheduler should return after the run without waiting for the interval
+        """
+        scheduler = Scheduler(3600)
+        self.assertEqual(1, scheduler.run(scheduler.stop))
+        self.assertTrue(scheduler.stopped)
+
+    def test_next_delay(self):
+        """
+        GIVEN
+        A scheduler with an interval of 60 seconds and 10 seconds of jitter
+        WHEN
+        I get the delay after a run which started 20 seconds ago, and after one which started 90 seconds ago
+        THEN
+        The delays should be the rest of the interval and no delay, each plus up to 10 seconds of jitter
+        """
+        scheduler = Scheduler(60, jitter=10, seed=1)
+        with unittest.mock.patch("time.monotonic", return_value=1000.0):
+            delays = [scheduler.next_delay(980.0) for _ in range(20)], [scheduler.next_delay(910.0) for _ in range(20)]
+        self.assertTrue(all(40 <= delay <= 50 for delay in delays[0]))
+        self.assertTrue(all(0 <= delay <= 10 for delay in delays[1]))
+        self.assertGreater(len(set(delays[0])), 1)
+
+    def test_signal_stops_after_run(self):
+        """
+        GIVEN
+        A scheduler handling SIGTERM
+        WHEN
+        SIGTERM is received during a run
+        THEN
+        The run should complete and the scheduler stop, then the previous handler should be restored
+        """
+        scheduler = Scheduler(0.001)
+        completed = []
+
+        def job():
+            os.kill(os.getpid(), signal.SIGTERM)
+            completed.append(True)
+
+        previous = signal.getsignal(signal.SIGTERM)
+        handlers = scheduler.install_signal_handlers((signal.SIGTERM,))
+        try:
+            self.assertEqual(1, scheduler.run(job))
+        finally:
+            restore_signal_handlers(handlers)
+        self.assertEqual([True], completed)
+        self.assertIs(previous, signal.getsignal(signal.SIGTERM))
+
+    def test_second_signal_exits(self):
+        """
+        GIVEN
+        A scheduler handling SIGTERM which has already been stopped by a signal
+        WHEN
+        SIGTERM is received again
+        THEN
+        SystemExit should be raised
+        """
+        scheduler = Scheduler(0.001)
+        handlers = scheduler.install_signal_handlers((signal.SIGTERM,))
+        self.addCleanup(restore_signal_handlers, handlers)
+        os.kill(os.getpid(), signal.SIGTERM)
+        self.assertTrue(scheduler.stopped)
+        with self.assertRaises(SystemExit):
+            os.kill(os.getpid(), signal.SIGTERM)
@@ -0,0 +1,98 @@
+"""
+Tests for utils.serialization
+"""
+import json
+import unittest.mock
+
+import outages_processor.utils.serialization
+
+
+class TestResolveBackend(unittest.TestCase):
+    """
+    Test suite for the resolve_backend function
+    """
+
+    def test_resolve_auto(self):
+        """
+        GIVEN
+        The function is called
+        WHEN
+        I pass auto or None
+        THEN
+        I should receive the fastest installed backend
+        """
+        fastest = outages_processor.utils.serialization.available_backends()[0]
+        self.assertEqual(fastest, outages_processor.utils.serialization.resolve_backend("AUTO").name)
+        self.assertEqual(fastest, outages_processor.utils.serialization.resolve_backend(None).name)
+
+    def test_resolve_missing_backend(self):
+        """
+        GIVEN
+        Neither orjson nor ujson is installed
+        WHEN
+        I request either of them, or auto
+        THEN
+        I should receive the standard library backend
+        """
+        stdlib = outages_processor.utils.serialization.resolve_backend("json")
+        with unittest.mock.patch.dict(outages_processor.utils.serialization._serializers,  # pylint: disable=protected-access
+                                      {"json": stdlib}, clear=True):
+            for backend in ("orjson", "ujson", "auto"):
+                self.assertEqual("json", outages_processor.utils.serialization.resolve_backend(backend).name)
+
+    def test_resolve_unsupported(self):
+        """
+        GIVEN
+        The function is called
+        WHEN
+        I pass an unknown backend
+        THEN
+        A ValueError should be raised
+        """
+        with self.assertRaises(ValueError):
+            outages_processor.utils.serialization.resolve_backend("pickle")
+
+
+class TestSerializers(unittest.TestCase):
+    """
+    Test suite for the serializers of each installed backend
+    """
+
+    def test_backends_agree(self):
+        """
+        GIVEN
+        Outages including non-ASCII text and characters which need escaping
+        WHEN
+        I encode and parse them with each installed backend
+        THEN
+        Each backend should write compact UTF-8 JSON bytes which parse back to the same outages, from bytes or str
+        """
+        outages = [
+            {"id": "002b28fc", "begin": "2022-05-23T12:21:27.377Z", "end": None, "name": 'Batterie "Nord" / Süd'},
+        ]
+        for backend in outages_processor.utils.serialization.available_backends():
+            serializer = outages_processor.utils.serialization.resolve_backend(backend)
+            body = serializer.dumps(outages)
+            self.assertIsInstance(body, bytes, backend)
+            self.assertEqual(json.dumps(outages, separators=(",", ":"), ensure_ascii=False).encode("utf-8"), body,
+                             backend)
+            self.assertEqual(outages, serializer.loads(body), backend)
+            self.assertEqual(outages, serializer.loads(body.decode("utf-8")), backend)
+
+    def test_set_serializer(self):
+        """
+        GIVEN
+        The current serializer
+        WHEN
+        I set the standard library backend
+        THEN
+        It should be used by dumps and loads, and the previous serializer returned
+        """
+        previous = outages_processor.utils.serialization.set_serializer("json")
+        try:
+            self.assertEqual("json", outages_processor.utils.serialization.get_serializer().name)
+            self.assertEqual(b'{"a":[1,2]}', outages_processor.utils.serialization.dumps({"a": [1, 2]}))
+            self.assertEqual({"a": [1, 2]}, outages_processor.utils.serialization.loads(b'{"a":[1,2]}'))
+        finally:
+            outages_processor.utils.serialization.set_serializer(previous.name)
+        self.assertEqual(previous, outages_processor.utils.serialization.get_serializer())
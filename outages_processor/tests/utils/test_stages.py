@@ -0,0 +1,73 @@
+"""
+Tests for utils.stages
+"""
+import threading
+import unittest
+
+from outages_processor.utils.errors import APIError
+from outages_processor.utils.stages import StageGraph
+
+
+class TestStageGraph(unittest.TestCase):
+    """
+    Test suite for the StageGraph class
+    """
+
+    def test_independent_stages_run_concurrently(self):
+        """
+        GIVEN
+        A graph with two independent stages which each wait for the other to start, and a stage depending on both
+        WHEN
+        The graph runs
+        THEN
+        The independent stages should run at the same time and the dependent stage receive both results in order
+        """
+        barrier = threading.Barrier(2, timeout=5)
+
+        def fetch(value):
+            barrier.wait()
+            return value
+
+        with StageGraph(max_workers=2) as graph:
+            outages = graph.add(lambda: fetch("outages"))
+            devices = graph.add(lambda: fetch("devices"))
+            joined = graph.add(lambda *results: results, outages, devices)
+        self.assertEqual(("outages", "devices"), joined.result())
+
+    def test_chain_with_one_worker(self):
+        """
+        GIVEN
+        A graph with a single worker and a chain of dependent stages
+        WHEN
+        The graph runs
+        THEN
+        Each stage should run after the one before, without waiting stages holding up the worker
+        """
+        with StageGraph(max_workers=1) as graph:
+            stage = graph.add(lambda: 1)
+            for _ in range(10):
+                stage = graph.add(lambda value: value + 1, stage)
+        self.assertEqual(11, stage.result())
+
+    def test_failed_dependency(self):
+        """
+        GIVEN
+        A graph where a stage fails with an APIError
+        WHEN
+        The graph runs
+        THEN
+        The dependent stage should not run and should fail with the same error, while an independent stage succeeds
+        """
+        calls = []
+
+        def fail():
+            raise APIError("Failed to communicate with the API")
+
+        with StageGraph(max_workers=2) as graph:
+            failed = graph.add(fail)
+            dependent = graph.add(calls.append, failed)
+            independent = graph.add(lambda: "ok")
+        self.assertIs(failed.exception(), dependent.exception())
+        self.assertIsInstance(dependent.exception(), APIError)
+        self.assertEqual("ok", independent.result())
+        self.assertEqual([], calls)
@@ -0,0 +1,150 @@
+"""
+Tests for utils.timestamps
+"""
+import datetime
+import unittest
+
+import iso8601
+
+from outages_processor.utils.timestamps import (
+    begins_at_or_after, format_timestamp, from_epoch_ms, is_api_format, parse_timestamp, to_epoch_ms,
+)
+
+
+class TestParseTimestamp(unittest.TestCase):
+    """
+    Test suite for the parse_timestamp function
+    """
+    def test_parse_api_format(self):
+        """
+        GIVEN
+        A timestamp in the API format
+        WHEN
+        It is parsed
+        THEN
+        The result should match iso8601
+        """
+        value = "2022-05-23T12:21:27.377Z"
+        self.assertTrue(is_api_format(value))
+        self.assertEqual(iso8601.parse_date(value), parse_timestamp(value))
+        self.assertEqual(datetime.timezone.utc, parse_timestamp(value).tzinfo)
+
+    def test_parse_other_formats(self):
+        """
+        GIVEN
+        Timestamps in other ISO 8601 formats
+        WHEN
+        They are parsed
+        THEN
+        They should fall back to iso8601 and give the same results
+        """
+        for value in ("2022-05-23T12:21:27Z", "2022-05-23T13:21:27.377+01:00", "2022-05-23T12:21:27.377123Z",
+                      "2022-05-23"):
+            self.assertFalse(is_api_format(value), value)
+            self.assertEqual(iso8601.parse_date(value), parse_timestamp(value))
+
+    def test_parse_invalid(self):
+        """
+        GIVEN
+        An invalid timestamp
+        WHEN
+        It is parsed
+        THEN
+        An iso8601 ParseError should be raised
+        """
+        for value in ("not a timestamp", None):
+            with self.assertRaises(iso8601.ParseError):
+                parse_timestamp(value)
+
+
+class TestFormatTimestamp(unittest.TestCase):
+    """
+    Test suite for the format_timestamp function
+    """
+    def test_format_normalises_to_utc(self):
+        """
+        GIVEN
+        A datetime in another timezone
+        WHEN
+        It is formatted
+        THEN
+        A UTC timestamp in the API format should be returned
+        """
+        value = iso8601.parse_date("2022-05-23T13:21:27.377+01:00")
+        self.assertEqual("2022-05-23T12:21:27.377Z", format_timestamp(value))
+
+    def test_format_rounding(self):
+        """
+        GIVEN
+        A datetime with sub-millisecond precision
+        WHEN
+        It is formatted
+        THEN
+        The milliseconds should be truncated, or rounded up when requested
+        """
+        value = datetime.datetime(2022, 12, 31, 23, 59, 59, 999001, tzinfo=datetime.timezone.utc)
+        self.assertEqual("2022-12-31T23:59:59.999Z", format_timestamp(value))
+        self.assertEqual("2023-01-01T00:00:00.000Z", format_timestamp(value, round_up=True))
+
+
+class TestEpochMilliseconds(unittest.TestCase):
+    """
+    Test suite for the to_epoch_ms and from_epoch_ms functions
+    """
+    def test_round_trip(self):
+        """
+        GIVEN
+        A timezone aware datetime with millisecond precision
+        WHEN
+        I convert it to epoch milliseconds and back
+        THEN
+        I should receive the same instant in UTC
+        """
+        value = datetime.datetime(2022, 5, 23, 13, 21, 27, 377000,
+                                  tzinfo=datetime.timezone(datetime.timedelta(hours=1)))
+        self.assertEqual(1653308487377, to_epoch_ms(value))
+        self.assertEqual(value, from_epoch_ms(to_epoch_ms(value)))
+        self.assertEqual(datetime.timezone.utc, from_epoch_ms(0).tzinfo)
+
+    def test_rounding(self):
+        """
+        GIVEN
+        A datetime with sub-millisecond precision
+        WHEN
+        I convert it to epoch milliseconds, with and without rounding up
+        THEN
+        It should be truncated, or rounded up to the next millisecond
+        """
+        value = datetime.datetime(1970, 1, 1, 0, 0, 0, 1500, tzinfo=datetime.timezone.utc)
+        self.assertEqual(1, to_epoch_ms(value))
+        self.assertEqual(2, to_epoch_ms(value, round_up=True))
+        self.assertEqual(1, to_epoch_ms(value.replace(microsecond=1000), round_up=True))
+
+
+class TestBeginsAtOrAfter(unittest.TestCase):
+    """
+    Test suite for the begins_at_or_after function
+    """
+    def test_predicates_agree_with_iso8601(self):
+        """
+        GIVEN
+        A cutoff datetime with sub-millisecond precision
+        WHEN
+        Timestamps around the cutoff, in a mixture of formats, are compared with and without string comparison
+        THEN
+        Both predicates should agree with comparing iso8601 parsed datetimes
+        """
+        cutoff = datetime.datetime(2023, 6, 12, 11, 12, 14, 500, tzinfo=datetime.timezone.utc)
+        values = [
+            "2023-06-12T11:12:14.000Z",
+            "2023-06-12T11:12:14.001Z",
+            "2023-06-12T11:12:13.999Z",
+            "2023-06-12T12:12:14.001+01:00",
+            "2023-06-12T11:12:14.000500Z",
+            "2023-06-12T11:12:14.000499Z",
+            "2024-01-01T00:00:00.000Z",
+        ]
+        for compare_strings in (False, True):
+            predicate = begins_at_or_after(cutoff, compare_strings=compare_strings)
+            for value in values:
+                self.assertEqual(iso8601.parse_date(value) >= cutoff, predicate(value), (compare_strings, value))
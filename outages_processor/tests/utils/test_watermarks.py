@@ -0,0 +1,182 @@
+"""
+Tests for utils.watermarks
+"""
+import os
+import tempfile
+import unittest
+
+from outages_processor.api.records import OutageRecord
+from outages_processor.utils.errors import StateError
+from outages_processor.utils.watermarks import SiteWatermark, WatermarkStore, WatermarkTracker, outage_digest
+
+
+class TestWatermarkTracker(unittest.TestCase):
+    """
+    Test suite for the WatermarkTracker class
+    """
+    def setUp(self):
+        """
+        Common setup, shared across the suite
+        """
+        self.outages = [
+            {"id": "a", "begin": "2022-01-01T00:00:00.000Z", "end": "2022-01-02T00:00:00.000Z", "name": "A"},
+            {"id": "b", "begin": "2022-03-01T00:00:00.000Z", "end": "2022-03-05T00:00:00.000Z", "name": "B"},
+            {"id": "a", "begin": "2022-02-01T00:00:00.000Z", "end": "2022-06-01T00:00:00.000Z", "name": "A"},
+        ]
+
+    def run_tracker(self, outages: list, watermark: SiteWatermark = None) -> tuple:
+        """
+        Selects outages with a tracker
+        :return: The selected outages and the new watermark
+        """
+        tracker = WatermarkTracker(watermark)
+        return list(tracker.select(outages)), tracker.watermark
+
+    def test_first_run_selects_all(self):
+        """
+        GIVEN
+        A site has no high-water mark
+        WHEN
+        Outages are selected
+        THEN
+        All outages should be selected and the high-water mark set to the latest begin and end times
+        """
+        selected, watermark = self.run_tracker(self.outages)
+        self.assertEqual(self.outages, selected)
+        self.assertEqual("2022-03-01T00:00:00.000Z", watermark.begin)
+        self.assertEqual("2022-06-01T00:00:00.000Z", watermark.end)
+        self.assertEqual({"b|2022-03-01T00:00:00.000Z", "a|2022-02-01T00:00:00.000Z"}, set(watermark.outages))
+
+    def test_unchanged_outages_not_selected(self):
+        """
+        GIVEN
+        A site has a high-water mark
+        WHEN
+        The same outages are selected again
+        THEN
+        No outages should be selected and the high-water mark should not change
+        """
+        _, watermark = self.run_tracker(self.outages)
+        selected, new_watermark = self.run_tracker(self.outages, watermark)
+        self.assertEqual([], selected)
+        self.assertEqual((watermark.begin, watermark.end, watermark.outages),
+                         (new_watermark.begin, new_watermark.end, new_watermark.outages))
+
+    def test_new_and_changed_outages_selected(self):
+        """
+        GIVEN
+        A site has a high-water mark
+        WHEN
+        A new outage has begun, and an outage at the high-water mark has been extended
+        THEN
+        Only the new and extended outages should be selected
+        """
+        _, watermark = self.run_tracker(self.outages)
+        new_outage = {"id": "b", "begin": "2022-07-01T00:00:00.000Z", "end": "2022-07-02T00:00:00.000Z", "name": "B"}
+        extended_outage = {**self.outages[2], "end": "2022-08-01T00:00:00.000Z"}
+        selected, watermark = self.run_tracker([self.outages[0], self.outages[1], extended_outage, new_outage],
+                                               watermark)
+        self.assertEqual([extended_outage, new_outage], selected)
+        self.assertEqual("2022-07-01T00:00:00.000Z", watermark.begin)
+        self.assertEqual("2022-08-01T00:00:00.000Z", watermark.end)
+
+    def test_other_timestamp_formats_normalised(self):
+        """
+        GIVEN
+        A site has a high-water mark
+        WHEN
+        Outages use timestamps with a UTC offset
+        THEN
+        They should be compared against the high-water mark in UTC
+        """
+        _, watermark = self.run_tracker(self.outages)
+        earlier = {"id": "c", "begin": "2022-03-01T00:30:00.000+01:00", "end": "2022-03-02T00:00:00.000+01:00"}
+        later = {"id": "c", "begin": "2022-03-01T01:30:00.000+01:00", "end": "2022-03-02T00:00:00.000+01:00"}
+        selected, _ = self.run_tracker([earlier, later], watermark)
+        self.assertEqual([later], selected)
+
+    def test_ongoing_outages(self):
+        """
+        GIVEN
+        A site has a high-water mark, and an early outage which is ongoing, without an end time
+        WHEN
+        Outages are selected again, and then again once the ongoing outage has ended
+        THEN
+        The unchanged ongoing outage should not be selected again, but should be selected once it has ended, and the
+        end high-water mark should only be moved by outages which have ended
+        """
+        ongoing = {"id": "c", "begin": "2021-12-01T00:00:00.000Z", "end": None}
+        selected, watermark = self.run_tracker(self.outages + [ongoing])
+        self.assertEqual(self.outages + [ongoing], selected)
+        self.assertEqual("2022-06-01T00:00:00.000Z", watermark.end)
+        selected, watermark = self.run_tracker(self.outages + [ongoing], watermark)
+        self.assertEqual([], selected)
+        ended = {**ongoing, "end": "2022-01-01T00:00:00.000Z"}
+        selected, _ = self.run_tracker(self.outages + [ended], watermark)
+        self.assertEqual([ended], selected)
+
+
+    def test_records(self):
+        """
+        GIVEN
+        A site has a high-water mark from outages selected as dicts
+        WHEN
+        The same outages are selected again as records, and then with one record changed
+        THEN
+        Records should hash the same as the equivalent dicts, so only the changed record should be selected
+        """
+        records = [OutageRecord.from_dict(outage) for outage in self.outages]
+        self.assertEqual([outage_digest(outage) for outage in self.outages],
+                         [outage_digest(record) for record in records])
+        _, watermark = self.run_tracker(self.outages)
+        selected, _ = self.run_tracker(records, watermark)
+        self.assertEqual([], selected)
+        changed = OutageRecord.from_dict({**self.outages[2], "name": "Renamed"})
+        selected, _ = self.run_tracker(records[:2] + [changed], watermark)
+        self.assertEqual([changed], selected)
+        with self.assertRaises(TypeError):
+            outage_digest({"id": object()})
+
+
+class TestWatermarkStore(unittest.TestCase):
+    """
+    Test suite for the WatermarkStore class
+    """
+    def setUp(self):
+        """
+        Common setup, shared across the suite
+        """
+        temp_dir = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.addCleanup(temp_dir.cleanup)
+        self.path = os.path.join(temp_dir.name, "state", "state.json")
+
+    def test_round_trip(self):
+        """
+        GIVEN
+        A high-water mark is stored for a site
+        WHEN
+        The state file is loaded by a new store
+        THEN
+        The same high-water mark should be returned, and no high-water mark for other sites
+        """
+        watermark = SiteWatermark("2022-03-01T00:00:00.000Z", "2022-06-01T00:00:00.000Z", "abc", {"a|b": "123"})
+        WatermarkStore(self.path).update("norwich-pear-tree", watermark)
+        store = WatermarkStore(self.path)
+        self.assertEqual(watermark, store.get("norwich-pear-tree"))
+        self.assertIsNone(store.get("kingfisher"))
+        self.assertEqual(watermark, store.tracker("norwich-pear-tree").previous)
+
+    def test_corrupt_state_file(self):
+        """
+        GIVEN
+        The state file is not valid JSON
+        WHEN
+        It is loaded
+        THEN
+        A StateError should be raised
+        """
+        os.makedirs(os.path.dirname(self.path))
+        with open(self.path, "w", encoding="utf-8") as file_handle:
+            file_handle.write("{")
+        with self.assertRaises(StateError):
+            WatermarkStore(self.path)
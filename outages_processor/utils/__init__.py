@@ -2,11 +2,13 @@
 Exports for the utils module
 """
 from .errors import OutagesProcessorError
-from .http import api_request
+from .http import api_request, close_session, set_session
 from .logging import get_logger
 
 __all__ = [
     "api_request",
+    "close_session",
     "get_logger",
     "OutagesProcessorError",
+    "set_session",
 ]
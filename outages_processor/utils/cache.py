@@ -0,0 +1,290 @@
+"""
+Caches for API responses, revalidated with conditional requests once stale
+"""
+import json
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+import requests
+
+from outages_processor.utils.errors import StateError
+from outages_processor.utils.files import write_atomically
+from outages_processor.utils.logging import get_logger
+
+
+logger = get_logger(__name__)
+
+CACHE_VERSION = 1
+
+
+def _remove(path: str) -> None:
+    """
+    Deletes a file if it exists
+    """
+    if path and os.path.exists(path):
+        try:
+            os.remove(path)
+        except OSError as exc:
+            raise StateError(f"Failed to delete cache file {path}") from exc
+
+
+class CacheEntry(namedtuple("_CacheEntry", ("value", "etag", "last_modified", "stored_at"))):
+    """
+    Container class for a cached response body and its validators.
+    stored_at is the time the entry was fetched or last revalidated, in seconds since the epoch.
+    """
+
+    @classmethod
+    def from_response(cls, value, response: requests.Response) -> "CacheEntry":
+        """
+        Creates an entry for a response, keeping its ETag and Last-Modified validators
+        :param value: The value to cache, e.g. the parsed response body
+        :param response: The response the value was read from
+        :type response: requests.Response
+        :return: The cache entry
+        :rtype: CacheEntry
+        """
+        return cls(value, response.headers.get("ETag"), response.headers.get("Last-Modified"), time.time())
+
+    def conditional_headers(self) -> dict:
+        """
+        Gets the headers which make a request conditional on the cached value having changed
+        :return: If-None-Match and/or If-Modified-Since headers, empty if the entry has no validators
+        :rtype: dict
+        """
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+    def revalidated(self) -> "CacheEntry":
+        """
+        :return: A copy of the entry marked as fresh, for use after a 304 Not Modified response
+        :rtype: CacheEntry
+        """
+        return self._replace(stored_at=time.time())
+
+
+class CacheStats(namedtuple("_CacheStats", ("hits", "misses", "revalidations", "evictions"))):
+    """
+    Container class for cache statistics.
+    hits are lookups served from a fresh entry, misses lookups with no usable entry, revalidations stale entries
+    confirmed unchanged by the API and evictions entries dropped to stay within the maximum size.
+    """
+
+
+class TTLCache:
+    """
+    Thread-safe least recently used cache whose entries go stale after a time to live.
+    Stale entries are kept, so their validators can be used to revalidate them with a conditional request.
+    Entries can optionally be persisted to a JSON file, so they survive between runs. The file is only written by
+    flush, so a run storing many entries writes it once rather than once per entry.
+    """
+    def __init__(self, maxsize: int = 128, ttl: float = 300, path: str = None):
+        """
+        :param maxsize: Maximum number of entries to keep
+        :type maxsize: int
+        :param ttl: Number of seconds an entry stays fresh, 0 to always revalidate
+        :type ttl: float
+        :param path: Optional path of a JSON file to persist the entries to, which must be JSON serialisable
+        :type path: str
+        :raises StateError: If the cache file exists but cannot be read
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._dirty = False
+        self._stats = {field: 0 for field in CacheStats._fields}
+        if path:
+            self._load()
+
+    def _load(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as file_handle:
+                state = json.load(file_handle)
+            entries = [(key, CacheEntry(**entry)) for key, entry in state["entries"].items()]
+        except (OSError, ValueError, KeyError, TypeError) as exc:
+            raise StateError(f"Failed to read cache file {self.path}") from exc
+        # Oldest first, so the most recently stored entries are the last to be evicted
+        entries.sort(key=lambda item: item[1].stored_at)
+        for key, entry in entries[max(0, len(entries) - self.maxsize):]:
+            self._entries[key] = entry
+        logger.debug("Loaded %s cache entries from %s", len(self._entries), self.path)
+
+    def _save(self) -> None:
+        state = {
+            "version": CACHE_VERSION,
+            "entries": {key: entry._asdict() for key, entry in self._entries.items()},
+        }
+        write_atomically(self.path, lambda file_handle: json.dump(state, file_handle), description="cache file")
+
+    def is_fresh(self, entry: CacheEntry) -> bool:
+        """
+        :param entry: A cache entry
+        :type entry: CacheEntry
+        :return: True if the entry is still within its time to live
+        :rtype: bool
+        """
+        return time.time() - entry.stored_at < self.ttl
+
+    def get(self, key: str) -> CacheEntry:
+        """
+        Gets an entry, marking it as the most recently used
+        :param key: The cache key
+        :type key: str
+        :return: The entry, which may be stale, or None if there is no entry
+        :rtype: CacheEntry
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key: str, entry: CacheEntry) -> None:
+        """
+        Stores an entry, evicting the least recently used entries if the cache is full.
+        The cache file is not saved until flush is called.
+        :param key: The cache key
+        :type key: str
+        :param entry: The entry to store
+        :type entry: CacheEntry
+        """
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+            self._dirty = True
+
+    def flush(self) -> None:
+        """
+        Saves the cache file, if there is one and entries have been stored since it was last saved
+        :raises StateError: If the cache file cannot be written
+        """
+        with self._lock:
+            if self.path and self._dirty:
+                self._save()
+                self._dirty = False
+
+    def record(self, stat: str) -> None:
+        """
+        Increments a statistic
+        :param stat: The name of the statistic, one of the CacheStats fields
+        :type stat: str
+        """
+        with self._lock:
+            self._stats[stat] += 1
+
+    def stats(self) -> CacheStats:
+        """
+        :return: The statistics since the cache was created or last cleared
+        :rtype: CacheStats
+        """
+        with self._lock:
+            return CacheStats(**self._stats)
+
+    def clear(self) -> None:
+        """
+        Removes every entry and resets the statistics, deleting the cache file if there is one
+        :raises StateError: If the cache file cannot be deleted
+        """
+        with self._lock:
+            self._entries.clear()
+            self._dirty = False
+            self._stats = {field: 0 for field in CacheStats._fields}
+            _remove(self.path)
+
+
+class FileCache:
+    """
+    Thread-safe cache of a single response, persisted to a file in pickled form, or only held in memory.
+    The value is stored already parsed, so reusing it avoids parsing the response body again. It is always
+    revalidated with a conditional request before use. Only use cache files from a trusted location, as loading a
+    pickle can run arbitrary code.
+    """
+    def __init__(self, path: str = None):
+        """
+        :param path: Path of the cache file, which is created on first save if it does not exist, or None to only
+        hold the entry in memory
+        :type path: str
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._entry = None
+        self._loaded = False
+        self._stats = {field: 0 for field in CacheStats._fields}
+
+    def get(self) -> CacheEntry:
+        """
+        Gets the cached entry, loading it from the cache file on first use.
+        A cache file which cannot be read is ignored, so the response is fetched again in full.
+        :return: The entry, or None if there is no entry
+        :rtype: CacheEntry
+        """
+        with self._lock:
+            if not self._loaded and self.path and os.path.exists(self.path):
+                try:
+                    with open(self.path, "rb") as file_handle:
+                        version, entry = pickle.load(file_handle)
+                    if version == CACHE_VERSION:
+                        self._entry = CacheEntry(*entry)
+                except (OSError, pickle.UnpicklingError, EOFError, ValueError, TypeError) as exc:
+                    logger.warning("Ignoring unreadable cache file %s: %s", self.path, exc)
+            self._loaded = True
+            return self._entry
+
+    def set(self, entry: CacheEntry) -> None:
+        """
+        Stores the entry and saves the cache file
+        :param entry: The entry to store
+        :type entry: CacheEntry
+        :raises StateError: If the cache file cannot be written
+        """
+        with self._lock:
+            self._entry = entry
+            self._loaded = True
+            if not self.path:
+                return
+            state = (CACHE_VERSION, tuple(entry))
+            write_atomically(self.path,
+                             lambda file_handle: pickle.dump(state, file_handle, protocol=pickle.HIGHEST_PROTOCOL),
+                             mode="wb", description="cache file")
+
+    def record(self, stat: str) -> None:
+        """
+        Increments a statistic
+        :param stat: The name of the statistic, one of the CacheStats fields
+        :type stat: str
+        """
+        with self._lock:
+            self._stats[stat] += 1
+
+    def stats(self) -> CacheStats:
+        """
+        :return: The statistics since the cache was created or last cleared
+        :rtype: CacheStats
+        """
+        with self._lock:
+            return CacheStats(**self._stats)
+
+    def clear(self) -> None:
+        """
+        Removes the entry and resets the statistics, deleting the cache file
+        :raises StateError: If the cache file cannot be deleted
+        """
+        with self._lock:
+            self._entry = None
+            self._loaded = True
+            self._stats = {field: 0 for field in CacheStats._fields}
+            _remove(self.path)
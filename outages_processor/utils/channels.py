@@ -0,0 +1,135 @@
+"""
+Bounded channels connecting the stages of a pipeline which run in separate threads.
+Items are passed in batches to keep the cost of the queue low. A producer blocks while its channel is full, so a fast
+stage is held back by the slower stage after it rather than buffering the whole feed in memory.
+"""
+import queue
+from collections import namedtuple
+from typing import Iterable, Iterator
+
+from outages_processor.constants import PIPELINE_BATCH_SIZE, PIPELINE_QUEUE_SIZE
+from outages_processor.utils.metrics import get_metrics
+
+
+class _End(namedtuple("_End", ("error",))):
+    """
+    Sent by the producer after its last batch, with the error it failed with if any
+    """
+
+
+class Channel:
+    """
+    A bounded queue of batches from one producer thread to one consumer thread.
+    The producer calls put for each item and close once it is done, passing the error if it failed. The consumer
+    iterates over the items, which raises the producer's error after the items sent before it. A consumer which stops
+    early calls cancel, after which the producer's items are discarded rather than blocking it.
+    """
+    def __init__(self, name: str, maxsize: int = PIPELINE_QUEUE_SIZE, batch_size: int = PIPELINE_BATCH_SIZE):
+        """
+        :param name: Name of the stage consuming the channel, used for the <name>_queue_full counter
+        :type name: str
+        :param maxsize: Maximum number of batches waiting to be consumed
+        :type maxsize: int
+        :param batch_size: Number of items in each batch
+        :type batch_size: int
+        """
+        self.name = name
+        self.batch_size = max(1, batch_size)
+        self.cancelled = False
+        self._queue = queue.Queue(maxsize=max(1, maxsize))
+        self._batch = []
+
+    def put(self, item) -> bool:
+        """
+        Adds an item, sending the batch once it is full and waiting while the channel is full
+        :param item: The item
+        :return: False if the consumer has stopped and the item was discarded
+        :rtype: bool
+        """
+        self._batch.append(item)
+        if len(self._batch) >= self.batch_size:
+            self._send(self._batch)
+            self._batch = []
+        return not self.cancelled
+
+    def close(self, error: BaseException = None) -> None:
+        """
+        Sends the last batch and marks the end of the items
+        :param error: The error the producer failed with, raised to the consumer
+        :type error: BaseException
+        """
+        if self._batch:
+            self._send(self._batch)
+            self._batch = []
+        self._send(_End(error))
+
+    def cancel(self) -> None:
+        """
+        Stops consuming the channel, discarding any items sent after
+        """
+        self.cancelled = True
+        # Empty the queue, in case the producer is waiting for space. Only one more batch can be sent before it sees
+        # the channel has been cancelled, which there is now room for.
+        try:
+            while True:
+                self._queue.get_nowait()
+        except queue.Empty:
+            pass
+
+    def batches(self) -> Iterator[list]:
+        """
+        Consumes the channel a batch at a time
+        :return: An iterator over the batches, ending once the producer closes the channel
+        :rtype: Iterator
+        :raises: The error passed to close by the producer
+        """
+        while True:
+            batch = self._queue.get()
+            if isinstance(batch, _End):
+                if batch.error is not None:
+                    raise batch.error
+                return
+            yield batch
+
+    def __iter__(self) -> Iterator:
+        for batch in self.batches():
+            yield from batch
+
+    def _send(self, batch) -> None:
+        if self.cancelled:
+            return
+        try:
+            self._queue.put_nowait(batch)
+        except queue.Full:
+            # The consumer is slower than the producer, counted to show which stage is holding the pipeline up
+            get_metrics().increment(f"{self.name}_queue_full")
+            self._queue.put(batch)
+
+
+def produce(channel: Channel, items: Iterable) -> int:
+    """
+    Sends every item to a channel and closes it, as the body of a producer thread. Stops early if the consumer
+    cancels the channel, closing the items if they are a generator.
+    :param channel: The channel to send to
+    :type channel: Channel
+    :param items: The items to send
+    :type items: Iterable
+    :return: The number of items sent
+    :rtype: int
+    :raises: Any error raised by the items, which is also sent to the consumer
+    """
+    sent = 0
+    try:
+        for item in items:
+            sent += 1
+            if not channel.put(item):
+                break
+    except BaseException as exc:  # pylint: disable=broad-except
+        # Including OutagesProcessorError, which derives from BaseException
+        channel.close(exc)
+        raise
+    finally:
+        if hasattr(items, "close"):
+            items.close()
+    channel.close()
+    return sent
@@ -0,0 +1,69 @@
+"""
+Helpers for compressing request bodies sent to the outages API
+"""
+import gzip
+
+from outages_processor.utils.logging import get_logger
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - zstd support is optional
+    zstandard = None
+
+
+logger = get_logger(__name__)
+
+NO_COMPRESSION = "none"
+GZIP = "gzip"
+ZSTD = "zstd"
+# Levels favour speed, the bodies are JSON which compresses well even at low levels
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+# Bodies smaller than this are sent uncompressed, as the saving would not be worth the extra work
+MIN_COMPRESS_BYTES = 1024
+
+
+def available_encodings() -> tuple:
+    """
+    Gets the content encodings which can be used to compress request bodies
+    :return: The names of the available encodings, as used in the Content-Encoding header
+    :rtype: tuple
+    """
+    return (GZIP, ZSTD) if zstandard is not None else (GZIP,)
+
+
+def resolve_encoding(encoding: str) -> str:
+    """
+    Resolves a configured compression setting to a usable content encoding.
+    zstd falls back to gzip if the zstandard package is not installed.
+    :param encoding: The configured compression, e.g. gzip, zstd or none
+    :type encoding: str
+    :return: The content encoding to use, or None for no compression
+    :rtype: str
+    :raises ValueError: If the encoding is not supported
+    """
+    encoding = (encoding or NO_COMPRESSION).lower()
+    if encoding == NO_COMPRESSION:
+        return None
+    if encoding == ZSTD and zstandard is None:
+        logger.warning("zstd compression requested but zstandard is not installed, falling back to gzip")
+        return GZIP
+    if encoding not in (GZIP, ZSTD):
+        raise ValueError(f"Unsupported compression: {encoding}")
+    return encoding
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    """
+    Compresses a request body with the given content encoding
+    :param body: The body to compress
+    :type body: bytes
+    :param encoding: The content encoding, see resolve_encoding
+    :type encoding: str
+    :return: The compressed body
+    :rtype: bytes
+    """
+    if encoding == ZSTD:
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(body)
+    # mtime is fixed so that identical bodies compress to identical bytes
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
@@ -13,3 +13,24 @@ class APIError(OutagesProcessorError):
     """
     Error class to be used when an error is experienced connecting to the API
     """
+
+
+class ChunkUploadError(APIError):
+    """
+    Error class to be used when one or more chunks of a chunked upload could not be uploaded
+    """
+    def __init__(self, message: str, failed_chunks: list):
+        """
+        :param message: Description of the error
+        :type message: str
+        :param failed_chunks: The chunks which failed, as ChunkFailure entries
+        :type failed_chunks: list
+        """
+        super().__init__(message)
+        self.failed_chunks = failed_chunks
+
+
+class StateError(OutagesProcessorError):
+    """
+    Error class to be used when the local state file cannot be read or written
+    """
@@ -0,0 +1,49 @@
+"""
+Helpers for the local files used to persist state between runs
+"""
+import contextlib
+import os
+import tempfile
+from typing import Callable, IO
+
+from outages_processor.utils.errors import StateError
+
+
+def write_atomically(path: str, write: Callable[[IO], None], mode: str = "w", description: str = "file") -> None:
+    """
+    Writes a file via a temporary file in the same directory, then moves it into place, so a failed write never
+    leaves the file corrupted. The temporary file is deleted if the write fails.
+    :param path: The file to write
+    :type path: str
+    :param write: Function writing the content to the open temporary file
+    :type write: Callable
+    :param mode: The mode to open the temporary file with, "w" or "wb"
+    :type mode: str
+    :param description: What the file is, for the error message, e.g. "cache file"
+    :type description: str
+    :raises StateError: If the file cannot be written
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    temporary_path = None
+    try:
+        os.makedirs(directory, exist_ok=True)
+        encoding = None if "b" in mode else "utf-8"
+        with tempfile.NamedTemporaryFile(mode, encoding=encoding, dir=directory, delete=False) as file_handle:
+            temporary_path = file_handle.name
+            write(file_handle)
+        os.replace(temporary_path, path)
+    except OSError as exc:
+        _discard(temporary_path)
+        raise StateError(f"Failed to write {description} {path}") from exc
+    except BaseException:
+        _discard(temporary_path)
+        raise
+
+
+def _discard(path: str) -> None:
+    """
+    Deletes a temporary file left by a failed write, if there is one
+    """
+    if path:
+        with contextlib.suppress(OSError):
+            os.remove(path)
@@ -1,18 +1,54 @@
 """
 Helpers for communicating with the outages API
 """
+import threading
+import time
+from collections import namedtuple
+from typing import Iterator
+
 import requests
 from requests.adapters import HTTPAdapter, Retry
+from urllib3.exceptions import InvalidHeader
 
-from outages_processor.constants import API_BASE_URL, API_KEY, HTTP_TIMEOUT_SECONDS
+from outages_processor.constants import (
+    API_BASE_URL,
+    API_KEY,
+    HTTP_ACCEPT_ENCODING,
+    HTTP_KEEP_ALIVE,
+    HTTP_POOL_CONNECTIONS,
+    HTTP_POOL_MAXSIZE,
+    HTTP_TIMEOUT_SECONDS,
+)
+from outages_processor.utils.compression import MIN_COMPRESS_BYTES, compress, resolve_encoding
 from outages_processor.utils.errors import APIError
 from outages_processor.utils.logging import get_logger
+from outages_processor.utils.metrics import Metrics, get_metrics
+from outages_processor.utils.ratelimit import THROTTLE_STATUS_CODES, get_rate_limiter
+from outages_processor.utils.serialization import get_serializer
 
 
 logger = get_logger(__name__)
 
+RETRY_STATUS_CODES = (500, 502, 503, 504)
+# Too Many Requests, retried by api_request for every method as the API has not processed the request
+TOO_MANY_REQUESTS = 429
+THROTTLE_RETRIES = 3
+# Longest Retry-After honoured, in seconds, so a misbehaving API cannot stall the run indefinitely
+MAX_RETRY_AFTER = 60.0
+
+
+class PoolConfig(namedtuple("_PoolConfig",
+                            ("connections", "maxsize", "block", "keep_alive"),
+                            defaults=(HTTP_POOL_CONNECTIONS, HTTP_POOL_MAXSIZE, False, HTTP_KEEP_ALIVE))):
+    """
+    Container class for connection pool settings.
+    connections is the number of per-host pools to cache, maxsize is the maximum number of connections kept open
+    to a single host, block makes callers wait for a free connection rather than opening a throwaway one once
+    maxsize is reached and keep_alive controls whether connections are reused between requests.
+    """
+
 
-def create_session(retries: int = 3, backoff_factor: float = 1.0) -> requests.Session:
+def create_session(retries: int = 3, backoff_factor: float = 1.0, pool_config: PoolConfig = None) -> requests.Session:
     """
     Create a requests session with retries enabled with the given parameters.
     :param retries: Maximum number of times to attempt the HTTP request
@@ -20,41 +56,242 @@ def create_session(retries: int = 3, backoff_factor: float = 1.0) -> requests.Se
     :param backoff_factor: The backoff factor to feed into requests/urllib, this affects the delay urllib
     will leave between request attempts. See https://urllib3.readthedocs.io/en/stable/reference/urllib3.util.html
     :type backoff_factor: float
+    :param pool_config: Connection pool settings, defaults to the values in constants when not given
+    :type pool_config: PoolConfig
     :return: A requests session object with the retries configured correctly
     :rtype: requests.Session
     """
+    pool_config = pool_config or PoolConfig()
     session = requests.Session()
     logger.debug("Creating session with retries: %s and backoff factor: %s", retries, backoff_factor)
+    logger.debug("Connection pool config: %s", pool_config)
     retries = Retry(
         total=retries,
         backoff_factor=backoff_factor,
-        status_forcelist=[500, 502, 503, 504],
+        status_forcelist=list(RETRY_STATUS_CODES),
+    )
+    adapter = HTTPAdapter(
+        max_retries=retries,
+        pool_connections=pool_config.connections,
+        pool_maxsize=pool_config.maxsize,
+        pool_block=pool_config.block,
     )
-    adapter = HTTPAdapter(max_retries=retries)
     session.mount("https://", adapter)
     session.mount("http://", adapter)
+    if not pool_config.keep_alive:
+        session.headers["Connection"] = "close"
+    if HTTP_ACCEPT_ENCODING:
+        # Compressed responses are decoded by urllib3 as they are read, including when streamed
+        session.headers["Accept-Encoding"] = HTTP_ACCEPT_ENCODING
     return session
 
 
-def api_request(verb: str, route: str, json: dict = None) -> requests.Response:
+def get_backoff_time(retry_number: int, backoff_factor: float = 1.0) -> float:
+    """
+    Gets the delay to leave before the given retry, matching the backoff urllib3 applies to requests sessions.
+    For use by callers which retry outside of a session, there is no delay before the first retry.
+    :param retry_number: The retry about to be attempted, starting from 1
+    :type retry_number: int
+    :param backoff_factor: The backoff factor, see create_session
+    :type backoff_factor: float
+    :return: The delay in seconds
+    :rtype: float
+    """
+    if retry_number <= 1:
+        return 0.0
+    return float(min(Retry.DEFAULT_BACKOFF_MAX, backoff_factor * (2 ** (retry_number - 1))))
+
+
+def get_retry_after(response: requests.Response) -> float:
+    """
+    Gets the delay requested by the Retry-After header of a response, given either in seconds or as an HTTP date
+    :param response: The response, or any object with a headers mapping, may be None
+    :type response: requests.Response
+    :return: The delay in seconds, capped at MAX_RETRY_AFTER, or 0 if the header is missing or invalid
+    :rtype: float
+    """
+    value = response.headers.get("Retry-After") if response is not None else None
+    if not value:
+        return 0.0
+    try:
+        return min(MAX_RETRY_AFTER, float(Retry().parse_retry_after(value)))
+    except InvalidHeader:
+        logger.debug("Ignoring invalid Retry-After header: %s", value)
+        return 0.0
+
+
+def is_retryable_error(exc: APIError) -> bool:
+    """
+    Checks whether a failed request is worth retrying, i.e. it failed with a server error, timeout or connection error
+    rather than a client error. Rate limiting is not, as api_request has already retried it up to THROTTLE_RETRIES
+    times, so retrying it again would only multiply the attempts and the time spent waiting on Retry-After.
+    :param exc: The error raised by api_request
+    :type exc: APIError
+    :return: True if the request can be retried
+    :rtype: bool
+    """
+    cause = exc.__cause__
+    if isinstance(cause, requests.HTTPError) and cause.response is not None:
+        return cause.response.status_code in RETRY_STATUS_CODES
+    return isinstance(cause, (requests.ConnectionError, requests.Timeout))
+
+
+class SharedSession:
+    """
+    Thread-safe holder for the session shared by all API requests.
+    The session is created lazily on first use so connections are pooled across requests, and can be replaced or
+    closed explicitly by long-running processes and tests which need to control its lifetime.
+    """
+    def __init__(self, pool_config: PoolConfig = None):
+        """
+        :param pool_config: Connection pool settings used when the session is created
+        :type pool_config: PoolConfig
+        """
+        self._lock = threading.Lock()
+        self._session = None
+        self._pool_config = pool_config
+
+    def get(self) -> requests.Session:
+        """
+        Gets the shared session, creating it if required
+        :return: The shared session
+        :rtype: requests.Session
+        """
+        with self._lock:
+            if self._session is None:
+                self._session = create_session(retries=3, pool_config=self._pool_config)
+            return self._session
+
+    def set(self, session: requests.Session) -> requests.Session:
+        """
+        Injects a session to be shared by all subsequent requests.
+        The caller owns the previous session, which is returned without being closed.
+        :param session: The session to share, or None to create a new one on next use
+        :type session: requests.Session
+        :return: The previously shared session, if any
+        :rtype: requests.Session
+        """
+        with self._lock:
+            previous, self._session = self._session, session
+        return previous
+
+    def configure(self, pool_config: PoolConfig) -> None:
+        """
+        Closes the current session and sets the pool settings used for the next one
+        :param pool_config: Connection pool settings
+        :type pool_config: PoolConfig
+        """
+        with self._lock:
+            self._pool_config = pool_config
+        self.close()
+
+    def close(self) -> None:
+        """
+        Closes the shared session and its pooled connections. A new session is created on next use.
+        """
+        session = self.set(None)
+        if session is not None:
+            logger.debug("Closing shared session")
+            session.close()
+
+
+_shared_session = SharedSession()
+
+
+def get_session() -> requests.Session:
+    """
+    Gets the session shared by all API requests
+    :return: The shared session
+    :rtype: requests.Session
+    """
+    return _shared_session.get()
+
+
+def set_session(session: requests.Session) -> requests.Session:
+    """
+    Injects the session to be shared by all API requests, see SharedSession.set
+    :param session: The session to share, or None to create a new one on next use
+    :type session: requests.Session
+    :return: The previously shared session, if any
+    :rtype: requests.Session
+    """
+    return _shared_session.set(session)
+
+
+def configure_session(pool_config: PoolConfig) -> None:
+    """
+    Sets the connection pool settings for the shared session, closing the current one
+    :param pool_config: Connection pool settings
+    :type pool_config: PoolConfig
+    """
+    _shared_session.configure(pool_config)
+
+
+def close_session() -> None:
+    """
+    Closes the session shared by all API requests
+    """
+    _shared_session.close()
+
+
+def compress_request_body(request_args: dict, compression: str) -> None:
+    """
+    Compresses the body of a request in place, setting the Content-Encoding header.
+    Bodies smaller than MIN_COMPRESS_BYTES are left uncompressed.
+    :param request_args: Arguments for requests.Session.request, including the headers dict
+    :type request_args: dict
+    :param compression: The compression to apply, e.g. gzip, zstd or none
+    :type compression: str
+    """
+    encoding = resolve_encoding(compression)
+    if encoding is None:
+        return
+    body = request_args.get("data")
+    if isinstance(body, str):
+        body = body.encode("utf-8")
+    if not isinstance(body, bytes) or len(body) < MIN_COMPRESS_BYTES:
+        if body is not None:
+            request_args["data"] = body
+        return
+    request_args["data"] = compress(body, encoding)
+    request_args["headers"]["Content-Encoding"] = encoding
+    logger.debug("Compressed request body with %s from %s to %s bytes", encoding, len(body), len(request_args["data"]))
+
+
+def api_request(verb: str,
+                route: str,
+                json: dict = None,
+                session: requests.Session = None,
+                compression: str = None,
+                **request_kwargs) -> requests.Response:
     """
     Helper function to make a request to the API with the given HTTP verb and route.
-    HTTP requests will be automatically retried three times.
+    HTTP requests will be automatically retried three times. Requests wait for the shared rate limiter, see
+    outages_processor.utils.ratelimit, and 429 Too Many Requests responses are retried after their Retry-After delay,
+    pausing every other request for the delay too.
     :param verb: HTTP verb to attach to the request, e.g. GET, POST
     :type verb: str
     :param route: Route to send the request to, relative to the API root URL. e.g. /outages
     :type route: str
-    :param json: Optional JSON body to send with the request (if permitted for the method)
+    :param json: Optional JSON body to send with the request (if permitted for the method), encoded with the current
+    serializer, see outages_processor.utils.serialization
     :type json: dict
+    :param session: Optional session to send the request with, defaults to the shared session
+    :type session: requests.Session
+    :param compression: Optional compression for the request body, e.g. gzip or zstd, see compress_request_body
+    :type compression: str
+    :param request_kwargs: Additional arguments for requests.Session.request, e.g. stream=True or a pre-encoded
+    data body. Any headers given are sent in addition to the API key.
     :return: HTTP response object if successful, None otherwise
     :rtype: requests.Response
     :raises APIError: In the event of an issue connecting to the API or an unexpected HTTP response
     """
     processed_route = route.lstrip("/")
     url = f"{API_BASE_URL}/{processed_route}"
-    session = create_session(retries=3)
+    session = session or get_session()
 
     headers = {
+        **request_kwargs.pop("headers", {}),
         "x-api-key": API_KEY,
     }
 
@@ -64,16 +301,114 @@ def api_request(verb: str, route: str, json: dict = None) -> requests.Response:
         "headers": headers,
     }
     if json:
+        # Encoded here rather than by requests, so the fastest available JSON backend writes the bytes directly
+        headers.setdefault("Content-Type", "application/json")
         request_args.update({
-            "json": json,
+            "data": get_serializer().dumps(json),
         })
+    request_args.update(request_kwargs)
+    if compression:
+        compress_request_body(request_args, compression)
 
+    metrics = get_metrics()
+    start = time.perf_counter() if metrics.enabled else None
     try:
         logger.debug("About to make HTTP request. Method: %s, URL: %s", verb, url)
-        response = session.request(**request_args, timeout=HTTP_TIMEOUT_SECONDS)
+        response = _send(session, request_args)
         logger.debug("Response code: %s", response.status_code)
         response.raise_for_status()
     except requests.RequestException as exc:
         logger.debug("Caught request exception: %s", exc)
+        if start is not None:
+            _record_request(metrics, processed_route, start, request_args, getattr(exc, "response", None))
         raise APIError("Failed to communicate with the API") from exc
+    if start is not None:
+        _record_request(metrics, processed_route, start, request_args, response)
+    return response
+
+
+def _is_throttled(response: requests.Response) -> bool:
+    """
+    Checks whether the API throttled a request, including on attempts the session's Retry adapter retried
+    """
+    retries = getattr(getattr(response, "raw", None), "retries", None)
+    history = retries.history if retries is not None else ()
+    return (response.status_code in THROTTLE_STATUS_CODES
+            or any(attempt.status in THROTTLE_STATUS_CODES for attempt in history))
+
+
+def _send(session: requests.Session, request_args: dict) -> requests.Response:
+    """
+    Sends a request within the limits of the shared rate limiter, retrying 429 responses
+    """
+    limiter = get_rate_limiter()
+    for retry_number in range(THROTTLE_RETRIES + 1):
+        with limiter.permit() as permit:
+            try:
+                response = session.request(**request_args, timeout=HTTP_TIMEOUT_SECONDS)
+            except requests.Timeout:
+                permit.throttled = True
+                raise
+            permit.throttled = _is_throttled(response)
+        if response.status_code != TOO_MANY_REQUESTS or retry_number == THROTTLE_RETRIES:
+            return response
+        get_metrics().increment("throttled_requests")
+        delay = get_retry_after(response) or get_backoff_time(retry_number + 2)
+        logger.debug("Request throttled, retrying after %s seconds", delay)
+        response.close()
+        limiter.pause(delay)
     return response
+
+
+def _record_request(metrics: Metrics, route: str, start: float, request_args: dict,
+                    response: requests.Response) -> None:
+    """
+    Records the latency, retries and bytes transferred of a request. The route is reduced to its first segment,
+    e.g. /site-info, so per-site routes are counted together. Streamed response bodies are counted as they are read.
+    """
+    retries = getattr(getattr(response, "raw", None), "retries", None)
+    metrics.observe_request("/" + route.split("/", 1)[0],
+                            time.perf_counter() - start,
+                            failed=response is None or not response.ok,
+                            retries=len(retries.history) if retries is not None else 0)
+    body = request_args.get("data")
+    if isinstance(body, (bytes, str)):
+        metrics.increment("bytes_sent", len(body))
+    if response is not None and not request_args.get("stream"):
+        metrics.increment("bytes_received", len(response.content))
+
+
+def read_json(response: requests.Response):
+    """
+    Parses the body of a response as JSON with the current serializer, straight from the raw bytes
+    :param response: A response from api_request
+    :type response: requests.Response
+    :return: The parsed JSON body
+    :raises APIError: If the response body is not valid JSON
+    """
+    try:
+        return get_serializer().loads(response.content)
+    except ValueError as exc:
+        logger.debug("Caught error parsing response body: %s", exc)
+        raise APIError("Failed to parse the response from the API") from exc
+
+
+def iter_response_content(response: requests.Response, chunk_size: int = 65536) -> Iterator[bytes]:
+    """
+    Iterates over the body of a streamed response, decoding any content encoding as it is read
+    :param response: A response from a request made with stream=True
+    :type response: requests.Response
+    :param chunk_size: Maximum number of bytes to read at a time
+    :type chunk_size: int
+    :return: An iterator over chunks of the response body
+    :rtype: Iterator
+    :raises APIError: In the event of an issue reading the response body from the API
+    """
+    metrics = get_metrics()
+    try:
+        for chunk in response.iter_content(chunk_size=chunk_size):
+            metrics.increment("bytes_received", len(chunk))
+            yield chunk
+    except requests.RequestException as exc:
+        logger.debug("Caught request exception reading response body: %s", exc)
+        raise APIError("Failed to read the response from the API") from exc
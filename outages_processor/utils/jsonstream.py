@@ -0,0 +1,114 @@
+"""
+Helpers for incrementally parsing and encoding large JSON arrays
+"""
+import codecs
+import json
+from typing import Iterable, Iterator
+
+from outages_processor.utils.serialization import get_serializer
+
+
+_WHITESPACE = " \t\n\r"
+_DELIMITERS = _WHITESPACE + ",]"
+# Consumed characters are only dropped from the buffer once there are this many, to avoid copying on every item
+_COMPACT_THRESHOLD = 65536
+# Parser states
+_START, _FIRST_ITEM, _ITEM, _AFTER_ITEM = range(4)
+
+
+def iter_json_array(chunks: Iterable, encoding: str = "utf-8") -> Iterator:
+    """
+    Incrementally parses a JSON array, yielding each item as soon as it has been read in full.
+    Only the current item is held in memory, rather than the whole document.
+    :param chunks: An iterable of bytes or str chunks making up the JSON document, e.g. response.iter_content()
+    :type chunks: Iterable
+    :param encoding: Encoding to decode bytes chunks with
+    :type encoding: str
+    :return: An iterator over the items of the array
+    :rtype: Iterator
+    :raises json.JSONDecodeError: If the document is not a valid JSON array
+    """
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder(encoding)()
+    chunks = iter(chunks)
+    buffer = ""
+    position = 0
+    eof = False
+
+    def read_more() -> bool:
+        nonlocal buffer, position, eof
+        for chunk in chunks:
+            text = text_decoder.decode(chunk) if isinstance(chunk, bytes) else chunk
+            if text:
+                if position > _COMPACT_THRESHOLD:
+                    buffer, position = buffer[position:], 0
+                buffer += text
+                return True
+        buffer += text_decoder.decode(b"", final=True)
+        eof = True
+        return False
+
+    state = _START
+    while True:
+        while position < len(buffer) and buffer[position] in _WHITESPACE:
+            position += 1
+        if position >= len(buffer):
+            if eof or not read_more():
+                raise json.JSONDecodeError("Unterminated JSON array", buffer, position)
+            continue
+
+        char = buffer[position]
+        if state == _START:
+            if char != "[":
+                raise json.JSONDecodeError("Expecting '['", buffer, position)
+            state = _FIRST_ITEM
+            position += 1
+            continue
+        if char == "]" and state in (_FIRST_ITEM, _AFTER_ITEM):
+            return
+        if state == _AFTER_ITEM:
+            if char != ",":
+                raise json.JSONDecodeError("Expecting ',' delimiter", buffer, position)
+            state = _ITEM
+            position += 1
+            continue
+
+        try:
+            item, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            # Most likely the item continues in the next chunk
+            if eof or not read_more():
+                raise
+            continue
+        if (end >= len(buffer) or buffer[end] not in _DELIMITERS) and not eof and read_more():
+            # A number cut short by the end of the buffer may continue in the next chunk, read on before accepting it
+            continue
+        position = end
+        state = _AFTER_ITEM
+        yield item
+
+
+def encode_json_array(items: Iterable, chunk_size: int = 1000) -> bytes:
+    """
+    Encodes items as a compact JSON array, consuming them one at a time so only the encoded form is held in memory
+    :param items: An iterable of JSON serialisable items, encoded with the current serializer. Items with a to_json
+    method, such as OutageRecord, are encoded by calling it.
+    :type items: Iterable
+    :param chunk_size: Number of items to encode at a time
+    :type chunk_size: int
+    :return: The encoded JSON array
+    :rtype: bytes
+    """
+    dumps = get_serializer().dumps
+    body = bytearray(b"[")
+    batch = []
+    for item in items:
+        to_json = getattr(item, "to_json", None)
+        batch.append(to_json().encode("utf-8") if to_json is not None else dumps(item))
+        if len(batch) >= chunk_size:
+            body += (b"," if len(body) > 1 else b"") + b",".join(batch)
+            batch = []
+    if batch:
+        body += (b"," if len(body) > 1 else b"") + b",".join(batch)
+    body += b"]"
+    return bytes(body)
@@ -1,24 +1,180 @@
 """
-Logging helpers
+Logging helpers.
+Logging is configured once, on the outages_processor package logger, which the logger of every module propagates to.
+Records can be written as text or as single line JSON objects, and optionally handed to a background thread through
+a queue so that writing them never blocks the thread which logged them.
 """
+import atexit
+import datetime
+import json
 import logging
-import os
+import logging.handlers
+import queue
+import threading
+
+from outages_processor.constants import DEBUG, LOG_FORMAT, LOG_QUEUE
+
+
+PACKAGE_LOGGER = "outages_processor"
+TEXT = "text"
+JSON = "json"
+LOG_FORMATS = (TEXT, JSON)
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+# Attributes of every log record, anything else on a record was passed with extra= and is added to JSON output
+_RECORD_ATTRIBUTES = frozenset(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+_lock = threading.Lock()
+_handler = None  # pylint: disable=invalid-name
+_listener = None  # pylint: disable=invalid-name
+_external_loggers = set()
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats each record as a single line JSON object with the timestamp in UTC, level, logger name, thread and message,
+    along with any fields passed to the logging call with extra= and the traceback of any exception
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "timestamp": datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc)
+                                          .isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "message": record.getMessage(),
+        }
+        entry.update((key, value) for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """
+    Queue handler which leaves formatting to the handler behind the queue. Only the message arguments and any
+    exception are resolved on the logging thread, as they may change or be released once the call returns.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def create_formatter(log_format: str) -> logging.Formatter:
+    """
+    Creates a formatter for the given output format
+    :param log_format: One of LOG_FORMATS
+    :type log_format: str
+    :return: The formatter
+    :rtype: logging.Formatter
+    :raises ValueError: If the format is not supported
+    """
+    if log_format == TEXT:
+        return logging.Formatter(TEXT_FORMAT)
+    if log_format == JSON:
+        return JsonFormatter()
+    raise ValueError(f"Unsupported log format: {log_format}")
+
+
+def _install(handler: logging.Handler) -> None:
+    """
+    Replaces the handler installed on the package logger and any external loggers, must be called with the lock held
+    """
+    global _handler  # pylint: disable=global-statement
+    for name in (PACKAGE_LOGGER, *_external_loggers):
+        logger = logging.getLogger(name)
+        if _handler is not None:
+            logger.removeHandler(_handler)
+        if handler is not None:
+            logger.addHandler(handler)
+    _handler = handler
+
+
+def _configure(level: int, log_format: str, use_queue: bool, stream) -> None:
+    """
+    Configures logging, must be called with the lock held
+    """
+    global _listener  # pylint: disable=global-statement
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(create_formatter(log_format))
+    previous_listener = _listener
+    if use_queue:
+        _listener = logging.handlers.QueueListener(queue.SimpleQueue(), handler)
+        _listener.start()
+        handler = _QueueHandler(_listener.queue)
+    else:
+        _listener = None
+    _install(handler)
+    if previous_listener is not None:
+        previous_listener.stop()
+    for name in (PACKAGE_LOGGER, *_external_loggers):
+        logging.getLogger(name).setLevel(level)
+
+
+def configure_logging(level: int = None,
+                      log_format: str = LOG_FORMAT,
+                      use_queue: bool = LOG_QUEUE,
+                      stream=None) -> logging.Logger:
+    """
+    Configures logging for the package, replacing any configuration from an earlier call.
+    Called with the defaults from constants the first time get_logger is used, so only needs calling to change them.
+    :param level: The level to log at, defaults to DEBUG if OP_DEBUG is set, otherwise INFO
+    :type level: int
+    :param log_format: One of LOG_FORMATS
+    :type log_format: str
+    :param use_queue: Set to True to write records from a background thread, see shutdown_logging
+    :type use_queue: bool
+    :param stream: Stream to write records to, defaults to stderr
+    :return: The package logger
+    :rtype: logging.Logger
+    :raises ValueError: If the format is not supported
+    """
+    if level is None:
+        level = logging.DEBUG if DEBUG else logging.INFO
+    with _lock:
+        _configure(level, log_format, use_queue, stream)
+    return logging.getLogger(PACKAGE_LOGGER)
+
+
+def shutdown_logging() -> None:
+    """
+    Removes the package's log handler, first writing any records still queued for the background thread.
+    Registered to run at exit. Logging is configured again with the defaults the next time get_logger is used.
+    """
+    global _listener  # pylint: disable=global-statement
+    with _lock:
+        listener, _listener = _listener, None
+        _install(None)
+    if listener is not None:
+        listener.stop()
+
+
+atexit.register(shutdown_logging)
 
 
 def get_logger(name):
     """
-    Returns an instance of a logger with a standard configuration and the given name
+    Returns an instance of a logger with a standard configuration and the given name.
+    Loggers within the package share the package logger's handler, so calling this any number of times never adds
+    another handler.
     :param name: The name to assign to the logger
     :return: A reference to the constructed logger
     """
-    log_level = logging.INFO
     logger = logging.getLogger(name)
-    if os.getenv("OP_DEBUG", "false").lower() == "true":
-        log_level = logging.DEBUG
-    logger.setLevel(log_level)
-    handler = logging.StreamHandler()
-    handler.setLevel(log_level)
-    formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
-    handler.setFormatter(formatter)
-    logger.addHandler(handler)
+    with _lock:
+        if _handler is None:
+            _configure(logging.DEBUG if DEBUG else logging.INFO, LOG_FORMAT, LOG_QUEUE, None)
+        if name != PACKAGE_LOGGER and not name.startswith(f"{PACKAGE_LOGGER}.") and name not in _external_loggers:
+            # Loggers outside the package do not propagate to the package logger, so share its handler directly
+            _external_loggers.add(name)
+            logger.addHandler(_handler)
+            logger.setLevel(logging.getLogger(PACKAGE_LOGGER).level)
     return logger
@@ -0,0 +1,355 @@
+"""
+Lightweight metrics for the processing pipeline: stage timers, HTTP latency histograms per route and counters.
+Metrics are disabled by default, when disabled recording is a single attribute check.
+"""
+import bisect
+import os
+import socket
+import threading
+import time
+from collections import namedtuple
+
+from outages_processor.utils.logging import get_logger
+
+
+logger = get_logger(__name__)
+
+PREFIX = "outages_processor"
+# Upper bounds of the HTTP latency histogram buckets, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class StageStats(namedtuple("_StageStats", ("calls", "seconds", "records", "start", "end"),
+                            defaults=(None, None))):
+    """
+    Container class for the totals of a pipeline stage.
+    seconds is summed across threads, so stages run concurrently for several sites can exceed the wall time of the
+    run. records is the number of outages the stage produced. start and end are the seconds from when the metrics
+    were enabled or reset to when the stage first started and last finished, so stages which ran concurrently, e.g.
+    fetch and site_info, overlap.
+    """
+
+    @property
+    def records_per_second(self) -> float:
+        """
+        :return: The throughput of the stage, or None if it produced no outages or took no measurable time
+        :rtype: float
+        """
+        return self.records / self.seconds if self.records and self.seconds else None
+
+
+class RouteStats(namedtuple("_RouteStats", ("requests", "errors", "retries", "seconds", "buckets"))):
+    """
+    Container class for the totals of requests to an API route.
+    errors are requests which failed after any retries, retries are the retries made by the session's Retry adapter
+    and buckets are the number of requests in each latency bucket, the last bucket counting requests slower than
+    every bound in LATENCY_BUCKETS.
+    """
+
+
+class _NullTimer:
+    """
+    Stage timer used while metrics are disabled, recording nothing. A single instance is shared by every thread.
+    """
+
+    @property
+    def records(self) -> int:
+        """
+        :return: Always 0, records set on the timer are discarded
+        :rtype: int
+        """
+        return 0
+
+    @records.setter
+    def records(self, value: int) -> None:
+        pass
+
+    def __enter__(self) -> "_NullTimer":
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _StageTimer:
+    """
+    Times a stage as a context manager, set records to the number of outages produced before the block exits
+    """
+    def __init__(self, metrics: "Metrics", name: str, records: int):
+        self.metrics = metrics
+        self.name = name
+        self.records = records
+        self._start = None
+
+    def __enter__(self) -> "_StageTimer":
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.metrics.record_stage(self.name, time.perf_counter() - self._start, self.records, self._start)
+        return False
+
+
+class Metrics:
+    """
+    Thread-safe collection of the metrics for a run
+    """
+    def __init__(self, enabled: bool = False):
+        """
+        :param enabled: Set to True to record metrics
+        :type enabled: bool
+        """
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+        self._stages = {}
+        self._routes = {}
+        self._counters = {}
+
+    def stage(self, name: str, records: int = 0):
+        """
+        Times a stage of the pipeline, for use as a context manager
+        :param name: Name of the stage, e.g. fetch or join
+        :type name: str
+        :param records: Number of outages the stage produced, can also be set on the timer before the block exits
+        :type records: int
+        :return: The timer
+        """
+        if not self.enabled:
+            return _NULL_TIMER
+        return _StageTimer(self, name, records)
+
+    def record_stage(self, name: str, seconds: float, records: int = 0, started: float = None) -> None:
+        """
+        Records a run of a stage
+        :param name: Name of the stage
+        :type name: str
+        :param seconds: Time the stage took
+        :type seconds: float
+        :param records: Number of outages the stage produced
+        :type records: int
+        :param started: Optional time.perf_counter() when the stage started, to record when the stage ran
+        :type started: float
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            calls, total, total_records, start, end = self._stages.get(name, (0, 0.0, 0, None, None))
+            if started is not None:
+                offset = started - self._origin
+                start = offset if start is None else min(start, offset)
+                end = offset + seconds if end is None else max(end, offset + seconds)
+            self._stages[name] = (calls + 1, total + seconds, total_records + records, start, end)
+
+    def observe_request(self, route: str, seconds: float, failed: bool = False, retries: int = 0) -> None:
+        """
+        Records a request to the API
+        :param route: The route, without any site name so the number of routes stays small, e.g. /site-info
+        :type route: str
+        :param seconds: Time the request took, including any retries
+        :type seconds: float
+        :param failed: Set to True if the request failed
+        :type failed: bool
+        :param retries: Number of retries made for the request
+        :type retries: int
+        """
+        if not self.enabled:
+            return
+        bucket = bisect.bisect_left(LATENCY_BUCKETS, seconds)
+        with self._lock:
+            stats = self._routes.setdefault(route, [0, 0, 0, 0.0, [0] * (len(LATENCY_BUCKETS) + 1)])
+            stats[0] += 1
+            stats[1] += int(failed)
+            stats[2] += retries
+            stats[3] += seconds
+            stats[4][bucket] += 1
+
+    def increment(self, name: str, amount: int = 1) -> None:
+        """
+        Increments a counter, e.g. bytes_sent
+        :param name: Name of the counter
+        :type name: str
+        :param amount: Amount to add
+        :type amount: int
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def stages(self) -> dict:
+        """
+        :return: A dictionary of stage name to StageStats, in the order the stages first ran
+        :rtype: dict
+        """
+        with self._lock:
+            return {name: StageStats(*stats) for name, stats in self._stages.items()}
+
+    def routes(self) -> dict:
+        """
+        :return: A dictionary of route to RouteStats
+        :rtype: dict
+        """
+        with self._lock:
+            return {route: RouteStats(*stats[:4], tuple(stats[4])) for route, stats in self._routes.items()}
+
+    def counters(self) -> dict:
+        """
+        :return: A dictionary of counter name to value
+        :rtype: dict
+        """
+        with self._lock:
+            return dict(self._counters)
+
+    def summary(self) -> dict:
+        """
+        Gets a structured summary of the metrics, suitable for logging as JSON
+        :return: The stages, routes and counters
+        :rtype: dict
+        """
+        return {
+            "stages": {
+                name: {**stats._asdict(), "records_per_second": stats.records_per_second}
+                for name, stats in self.stages().items()
+            },
+            "routes": {
+                route: {
+                    "requests": stats.requests,
+                    "errors": stats.errors,
+                    "retries": stats.retries,
+                    "mean_seconds": stats.seconds / stats.requests if stats.requests else None,
+                    "buckets": dict(zip([*map(str, LATENCY_BUCKETS), "+Inf"], stats.buckets)),
+                }
+                for route, stats in self.routes().items()
+            },
+            "counters": self.counters(),
+        }
+
+    def reset(self) -> None:
+        """
+        Clears every metric
+        """
+        with self._lock:
+            self._origin = time.perf_counter()
+            self._stages.clear()
+            self._routes.clear()
+            self._counters.clear()
+
+
+def to_prometheus(metrics: Metrics) -> str:
+    """
+    Formats metrics in the Prometheus text exposition format, e.g. for the node exporter textfile collector
+    :param metrics: The metrics to format
+    :type metrics: Metrics
+    :return: The formatted metrics
+    :rtype: str
+    """
+    lines = []
+
+    def family(name: str, metric_type: str, samples: list) -> None:
+        if samples:
+            lines.append(f"# TYPE {PREFIX}_{name} {metric_type}")
+            lines.extend(f"{PREFIX}_{name}{suffix} {value}" for suffix, value in samples)
+
+    stages = metrics.stages()
+    for field in ("seconds", "records"):
+        family(f"stage_{field}_total", "counter",
+               [(f'{{stage="{name}"}}', getattr(stats, field)) for name, stats in stages.items()])
+    routes = metrics.routes()
+    histogram = []
+    for route, stats in routes.items():
+        cumulative = 0
+        for bound, count in zip([*map(str, LATENCY_BUCKETS), "+Inf"], stats.buckets):
+            cumulative += count
+            histogram.append((f'_bucket{{route="{route}",le="{bound}"}}', cumulative))
+        histogram.append((f'_sum{{route="{route}"}}', stats.seconds))
+        histogram.append((f'_count{{route="{route}"}}', stats.requests))
+    family("http_request_duration_seconds", "histogram", histogram)
+    for field in ("errors", "retries"):
+        family(f"http_{field}_total", "counter",
+               [(f'{{route="{route}"}}', getattr(stats, field)) for route, stats in routes.items()])
+    for name, value in metrics.counters().items():
+        family(f"{name}_total", "counter", [("", value)])
+    return "\n".join(lines) + "\n"
+
+
+def to_statsd(metrics: Metrics) -> list[str]:
+    """
+    Formats metrics as StatsD lines: stage and mean request times as timers in milliseconds, everything else as
+    counters
+    :param metrics: The metrics to format
+    :type metrics: Metrics
+    :return: The StatsD lines
+    :rtype: list
+    """
+    lines = []
+    for name, stats in metrics.stages().items():
+        lines.append(f"{PREFIX}.stage.{name}.seconds:{stats.seconds * 1000:.3f}|ms")
+        lines.append(f"{PREFIX}.stage.{name}.records:{stats.records}|c")
+    for route, stats in metrics.routes().items():
+        key = f"{PREFIX}.http.{route.strip('/').replace('-', '_') or 'root'}"
+        lines.append(f"{key}.requests:{stats.requests}|c")
+        lines.append(f"{key}.errors:{stats.errors}|c")
+        lines.append(f"{key}.retries:{stats.retries}|c")
+        if stats.requests:
+            lines.append(f"{key}.latency:{stats.seconds / stats.requests * 1000:.3f}|ms")
+    lines.extend(f"{PREFIX}.{name}:{value}|c" for name, value in metrics.counters().items())
+    return lines
+
+
+def write_prometheus_textfile(metrics: Metrics, path: str) -> None:
+    """
+    Writes metrics to a Prometheus textfile, replacing it atomically so the collector never reads a partial file
+    :param metrics: The metrics to write
+    :type metrics: Metrics
+    :param path: Path of the file, conventionally ending in .prom
+    :type path: str
+    :raises OSError: If the file cannot be written
+    """
+    temporary_path = f"{path}.{os.getpid()}.tmp"
+    with open(temporary_path, "w", encoding="utf-8") as file_handle:
+        file_handle.write(to_prometheus(metrics))
+    os.replace(temporary_path, path)
+
+
+def send_statsd(metrics: Metrics, address: tuple) -> None:
+    """
+    Sends metrics to a StatsD server over UDP, one line per packet. Delivery is not guaranteed.
+    :param metrics: The metrics to send
+    :type metrics: Metrics
+    :param address: (host, port) of the StatsD server
+    :type address: tuple
+    :raises OSError: If the address cannot be resolved
+    """
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        for line in to_statsd(metrics):
+            sock.sendto(line.encode("utf-8"), address)
+
+
+_metrics = Metrics()
+
+
+def get_metrics() -> Metrics:
+    """
+    Gets the metrics shared by the whole pipeline
+    :return: The shared metrics
+    :rtype: Metrics
+    """
+    return _metrics
+
+
+def configure_metrics(enabled: bool) -> Metrics:
+    """
+    Enables or disables the shared metrics, clearing any recorded so far
+    :param enabled: Set to True to record metrics
+    :type enabled: bool
+    :return: The shared metrics
+    :rtype: Metrics
+    """
+    _metrics.reset()
+    _metrics.enabled = enabled
+    logger.debug("Metrics %s", "enabled" if enabled else "disabled")
+    return _metrics
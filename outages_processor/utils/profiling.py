@@ -0,0 +1,241 @@
+"""
+Profilers for diagnosing slow or memory hungry runs: cProfile across every thread, a sampling profiler writing
+collapsed stacks for flame graphs and tracemalloc snapshots taken near the peak of traced memory
+"""
+import collections
+import cProfile
+import pstats
+import sys
+import threading
+import tracemalloc
+
+from outages_processor.utils.logging import get_logger
+
+
+logger = get_logger(__name__)
+
+PSTATS = "pstats"
+COLLAPSED = "collapsed"
+PROFILE_FORMATS = (PSTATS, COLLAPSED)
+# Seconds between stack samples, and between checks of the traced memory
+SAMPLE_INTERVAL = 0.005
+MEMORY_POLL_INTERVAL = 0.1
+# A new memory snapshot is taken each time the traced memory grows by this factor over the last snapshot
+MEMORY_SNAPSHOT_GROWTH = 1.1
+# Number of frames kept for each allocation, and number of allocation sites logged
+MEMORY_FRAMES = 25
+MEMORY_TOP = 10
+
+
+class ThreadedProfile:
+    """
+    Profiles the thread which starts it with cProfile, along with every thread started while it runs.
+    Each thread has its own profiler, which are merged when the profile is written.
+    """
+    def __init__(self):
+        self._profiler = cProfile.Profile()
+        self._thread_profilers = []
+        self._lock = threading.Lock()
+
+    def _profile_thread(self, *_):
+        # Called once by each new thread, enabling a profiler replaces this hook for the rest of the thread
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # From Python 3.12 only one profiler can be enabled, and it already covers every thread
+            threading.setprofile(None)
+            sys.setprofile(None)
+            return
+        with self._lock:
+            self._thread_profilers.append(profiler)
+
+    def start(self) -> None:
+        """
+        Starts profiling
+        """
+        threading.setprofile(self._profile_thread)
+        self._profiler.enable()
+
+    def stop(self) -> None:
+        """
+        Stops profiling. Threads which are still running keep their profilers until they exit.
+        """
+        self._profiler.disable()
+        threading.setprofile(None)
+
+    def write(self, path: str) -> None:
+        """
+        Writes the merged profile in pstats format, to be read with pstats or tools such as snakeviz
+        :param path: Path of the file to write
+        :type path: str
+        :raises OSError: If the file cannot be written
+        """
+        stats = pstats.Stats(self._profiler)
+        with self._lock:
+            for profiler in self._thread_profilers:
+                stats.add(profiler)
+        stats.dump_stats(path)
+
+
+class SamplingProfile:
+    """
+    Samples the stacks of every thread at a fixed interval from a background thread. The overhead does not depend on
+    the number of function calls, so it is suitable for profiling long production runs.
+    """
+    def __init__(self, interval: float = SAMPLE_INTERVAL):
+        """
+        :param interval: Seconds between samples
+        :type interval: float
+        """
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def _sample(self) -> None:
+        while not self._stopped.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():  # pylint: disable=protected-access
+                if ident == self._thread.ident:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def start(self) -> None:
+        """
+        Starts sampling
+        """
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._sample, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """
+        Stops sampling
+        """
+        self._stopped.set()
+        self._thread.join()
+
+    def write(self, path: str) -> None:
+        """
+        Writes the samples as collapsed stacks, one "thread;outer;...;inner count" line per distinct stack, as read by
+        flamegraph.pl and speedscope
+        :param path: Path of the file to write
+        :type path: str
+        :raises OSError: If the file cannot be written
+        """
+        with open(path, "w", encoding="utf-8") as file_handle:
+            for stack, count in self.stacks.most_common():
+                file_handle.write(f"{stack} {count}\n")
+
+
+class MemoryTrace:
+    """
+    Traces memory allocations with tracemalloc, keeping the snapshot taken closest to the peak of traced memory.
+    The traced memory is checked from a background thread, and a new snapshot taken each time it has grown by
+    MEMORY_SNAPSHOT_GROWTH since the last one.
+    """
+    def __init__(self, interval: float = MEMORY_POLL_INTERVAL):
+        """
+        :param interval: Seconds between checks of the traced memory
+        :type interval: float
+        """
+        self.interval = interval
+        self.peak = 0
+        self.snapshot = None
+        self._snapshot_size = 0
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def _take_snapshot_if_grown(self) -> None:
+        current, _ = tracemalloc.get_traced_memory()
+        if current > self._snapshot_size * MEMORY_SNAPSHOT_GROWTH:
+            self.snapshot = tracemalloc.take_snapshot()
+            self._snapshot_size = current
+
+    def _poll(self) -> None:
+        while not self._stopped.wait(self.interval):
+            self._take_snapshot_if_grown()
+
+    def start(self) -> None:
+        """
+        Starts tracing
+        """
+        tracemalloc.start(MEMORY_FRAMES)
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._poll, name="memory-trace", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """
+        Stops tracing, recording the peak traced memory
+        """
+        self._stopped.set()
+        self._thread.join()
+        self._take_snapshot_if_grown()
+        _, self.peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    def write(self, path: str) -> None:
+        """
+        Writes the snapshot, to be loaded with tracemalloc.Snapshot.load, and logs the largest allocation sites in it
+        :param path: Path of the file to write
+        :type path: str
+        :raises OSError: If the file cannot be written
+        """
+        logger.info("Peak traced memory: %.1f MB, snapshot taken at %.1f MB",
+                    self.peak / 1e6, self._snapshot_size / 1e6)
+        if self.snapshot is None:
+            return
+        for statistic in self.snapshot.statistics("lineno")[:MEMORY_TOP]:
+            logger.info("Allocated at %s", statistic)
+        self.snapshot.dump(path)
+
+
+def create_profile(profile_format: str):
+    """
+    Creates a profiler for the given output format
+    :param profile_format: One of PROFILE_FORMATS, pstats for cProfile or collapsed for the sampling profiler
+    :type profile_format: str
+    :return: The profiler, with start, stop and write methods
+    :raises ValueError: If the format is not supported
+    """
+    if profile_format == PSTATS:
+        return ThreadedProfile()
+    if profile_format == COLLAPSED:
+        return SamplingProfile()
+    raise ValueError(f"Unsupported profile format: {profile_format}")
+
+
+class Profiling:
+    """
+    Context manager running the given profilers for the duration of a block and writing each to its path once it
+    exits. Failing to write a profile is logged rather than raised, so profiling never fails a run.
+    """
+    def __init__(self, profilers: dict):
+        """
+        :param profilers: A dictionary of output path to profiler
+        :type profilers: dict
+        """
+        self.profilers = profilers
+
+    def __enter__(self) -> "Profiling":
+        for profiler in self.profilers.values():
+            profiler.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        for path, profiler in self.profilers.items():
+            profiler.stop()
+            try:
+                profiler.write(path)
+                logger.info("Wrote profile to %s", path)
+            except OSError as exc:
+                logger.warning("Failed to write profile to %s: %s", path, exc)
+        return False
@@ -0,0 +1,285 @@
+"""
+Client-side rate limiting and adaptive concurrency control, shared by every request to the API
+"""
+import asyncio
+import threading
+import time
+
+from outages_processor.constants import HTTP_MAX_CONCURRENCY, HTTP_RATE_BURST, HTTP_RATE_LIMIT
+from outages_processor.utils.logging import get_logger
+
+
+logger = get_logger(__name__)
+
+# Responses which show the API is overloaded, and the concurrency limit should back off
+THROTTLE_STATUS_CODES = (429, 503)
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket, limiting the sustained rate of requests while allowing short bursts.
+    Requests can also be paused for a while, e.g. when the API responds with a Retry-After header, so that every
+    thread and coroutine backs off rather than just the one which was throttled.
+    """
+    def __init__(self, rate: float = 0, burst: int = 1):
+        """
+        :param rate: Requests per second, 0 for no limit
+        :type rate: float
+        :param burst: Maximum number of requests which can be made at once after a quiet period
+        :type burst: int
+        """
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _wait_time(self) -> float:
+        """
+        Takes a token if one is available, otherwise returns the time to wait before trying again
+        """
+        with self._lock:
+            now = time.monotonic()
+            if now < self._paused_until:
+                return self._paused_until - now
+            if not self.rate:
+                return 0.0
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    def acquire(self) -> float:
+        """
+        Waits until a request can be made
+        :return: The number of seconds waited
+        :rtype: float
+        """
+        waited = 0.0
+        wait = self._wait_time()
+        while wait > 0:
+            time.sleep(wait)
+            waited += wait
+            wait = self._wait_time()
+        return waited
+
+    async def acquire_async(self) -> float:
+        """
+        Waits until a request can be made, without blocking the running event loop
+        :return: The number of seconds waited
+        :rtype: float
+        """
+        waited = 0.0
+        wait = self._wait_time()
+        while wait > 0:
+            await asyncio.sleep(wait)
+            waited += wait
+            wait = self._wait_time()
+        return waited
+
+    def pause(self, seconds: float) -> None:
+        """
+        Stops any request being made for the given time, extending any pause already in place
+        :param seconds: Time to pause for
+        :type seconds: float
+        """
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+class AIMDLimiter:
+    """
+    Thread-safe adaptive limit on the number of requests in flight, using additive increase, multiplicative decrease.
+    The limit grows by about one for each limit's worth of successful requests and is cut by the decrease factor
+    when the API throttles a request. Throttled requests which were sent before the last cut do not cut it again,
+    so a burst of throttled responses to one window of requests only halves the limit once.
+    """
+    def __init__(self, maximum: int, minimum: int = 1, decrease: float = 0.5):
+        """
+        :param maximum: The initial and maximum limit, 0 for no limit
+        :type maximum: int
+        :param minimum: The minimum limit
+        :type minimum: int
+        :param decrease: Factor the limit is multiplied by when a request is throttled
+        :type decrease: float
+        """
+        self.maximum = maximum
+        self.minimum = max(1, min(minimum, maximum or minimum))
+        self.decrease = decrease
+        self._limit = float(maximum)
+        self._in_flight = 0
+        self._generation = 0
+        self._condition = threading.Condition()
+        self._async_waiters = []
+
+    @property
+    def limit(self) -> int:
+        """
+        :return: The current limit on requests in flight, 0 if there is no limit
+        :rtype: int
+        """
+        with self._condition:
+            return max(self.minimum, int(self._limit)) if self.maximum else 0
+
+    def acquire(self) -> int:
+        """
+        Waits until a request can be sent without exceeding the limit
+        :return: A token to pass to release once the request completes
+        :rtype: int
+        """
+        if not self.maximum:
+            return 0
+        with self._condition:
+            self._condition.wait_for(lambda: self._in_flight < max(self.minimum, int(self._limit)))
+            self._in_flight += 1
+            return self._generation
+
+    async def acquire_async(self) -> int:
+        """
+        Waits until a request can be sent without exceeding the limit, without blocking the running event loop
+        :return: A token to pass to release once the request completes
+        :rtype: int
+        """
+        if not self.maximum:
+            return 0
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._condition:
+                if self._in_flight < max(self.minimum, int(self._limit)):
+                    self._in_flight += 1
+                    return self._generation
+                waiter = loop.create_future()
+                self._async_waiters.append((loop, waiter))
+            await waiter
+
+    def release(self, token: int, throttled: bool = False) -> None:
+        """
+        Records that a request has completed, adjusting the limit
+        :param token: The token returned by acquire
+        :type token: int
+        :param throttled: Set to True if the API throttled the request
+        :type throttled: bool
+        """
+        if not self.maximum:
+            return
+        with self._condition:
+            self._in_flight -= 1
+            if not throttled:
+                self._limit = min(self.maximum, self._limit + 1 / self._limit)
+            elif token == self._generation:
+                self._limit = max(self.minimum, self._limit * self.decrease)
+                self._generation += 1
+                logger.debug("Request throttled, reduced the concurrency limit to %s", int(self._limit))
+            self._condition.notify_all()
+            async_waiters, self._async_waiters = self._async_waiters, []
+        for loop, waiter in async_waiters:
+            loop.call_soon_threadsafe(_wake, waiter)
+
+
+def _wake(waiter: asyncio.Future) -> None:
+    """
+    Wakes a coroutine waiting in AIMDLimiter.acquire_async, unless it has been cancelled
+    """
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+class _Permit:
+    """
+    Permission to send a request, as a context manager or an async context manager.
+    Set throttled before the block exits if the API throttled it.
+    """
+    def __init__(self, limiter: "RateLimiter"):
+        self.limiter = limiter
+        self.throttled = False
+        self._token = None
+
+    def __enter__(self) -> "_Permit":
+        self._token = self.limiter.concurrency.acquire()
+        self.limiter.bucket.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.limiter.concurrency.release(self._token, self.throttled)
+        return False
+
+    async def __aenter__(self) -> "_Permit":
+        self._token = await self.limiter.concurrency.acquire_async()
+        try:
+            await self.limiter.bucket.acquire_async()
+        except BaseException:
+            self.limiter.concurrency.release(self._token)
+            raise
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return self.__exit__(*exc_info)
+
+
+class RateLimiter:
+    """
+    Limits the rate and concurrency of requests to the API, see TokenBucket and AIMDLimiter
+    """
+    def __init__(self, rate: float = 0, burst: int = 1, max_concurrency: int = 0):
+        """
+        :param rate: Requests per second, 0 for no limit
+        :type rate: float
+        :param burst: Maximum number of requests which can be made at once under the rate limit
+        :type burst: int
+        :param max_concurrency: Maximum number of requests in flight, adapted down when the API throttles requests,
+        0 for no limit
+        :type max_concurrency: int
+        """
+        self.bucket = TokenBucket(rate, burst)
+        self.concurrency = AIMDLimiter(max_concurrency)
+
+    def permit(self) -> _Permit:
+        """
+        Waits for permission to send a request, for use as a context manager around sending it, or as an async
+        context manager from a coroutine
+        :return: The permit
+        """
+        return _Permit(self)
+
+    def pause(self, seconds: float) -> None:
+        """
+        Stops any request being sent for the given time, e.g. as requested by a Retry-After header
+        :param seconds: Time to pause for
+        :type seconds: float
+        """
+        logger.debug("Pausing requests for %.1f seconds", seconds)
+        self.bucket.pause(seconds)
+
+
+_rate_limiter = RateLimiter(HTTP_RATE_LIMIT, HTTP_RATE_BURST, HTTP_MAX_CONCURRENCY)
+
+
+def get_rate_limiter() -> RateLimiter:
+    """
+    Gets the rate limiter shared by all API requests
+    :return: The shared rate limiter
+    :rtype: RateLimiter
+    """
+    return _rate_limiter
+
+
+def configure_rate_limiter(rate: float = HTTP_RATE_LIMIT,
+                           burst: int = HTTP_RATE_BURST,
+                           max_concurrency: int = HTTP_MAX_CONCURRENCY) -> RateLimiter:
+    """
+    Replaces the rate limiter shared by all API requests, see RateLimiter
+    :param rate: Requests per second, 0 for no limit
+    :type rate: float
+    :param burst: Maximum number of requests which can be made at once under the rate limit
+    :type burst: int
+    :param max_concurrency: Maximum number of requests in flight, 0 for no limit
+    :type max_concurrency: int
+    :return: The new rate limiter
+    :rtype: RateLimiter
+    """
+    global _rate_limiter  # pylint: disable=global-statement
+    _rate_limiter = RateLimiter(rate, burst, max_concurrency)
+    return _rate_limiter
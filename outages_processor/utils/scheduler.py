@@ -0,0 +1,111 @@
+"""
+Scheduler for running the pipeline repeatedly from one long-running process, so the interpreter, connection pool
+and caches are reused between runs rather than paid for on every run
+"""
+import random
+import signal
+import threading
+import time
+from typing import Callable
+
+from outages_processor.utils.logging import get_logger
+
+
+logger = get_logger(__name__)
+
+STOP_SIGNALS = (signal.SIGTERM, signal.SIGINT)
+
+
+class Scheduler:
+    """
+    Runs a job at a fixed interval until stopped. Each run starts the interval after the previous run started, or
+    straight after it finished if it took longer, plus a random delay of up to jitter seconds so that processes
+    started together do not keep running in step. Stopping waits for the current run to finish.
+    """
+    def __init__(self, interval: float, jitter: float = 0.0, seed: int = None):
+        """
+        :param interval: Seconds between the start of each run
+        :type interval: float
+        :param jitter: Maximum random delay in seconds added before each run, including the first
+        :type jitter: float
+        :param seed: Optional seed for the jitter
+        :type seed: int
+        """
+        self.interval = interval
+        self.jitter = jitter
+        self._random = random.Random(seed)
+        self._stopped = threading.Event()
+
+    @property
+    def stopped(self) -> bool:
+        """
+        :return: True once the scheduler has been asked to stop
+        :rtype: bool
+        """
+        return self._stopped.is_set()
+
+    def stop(self) -> None:
+        """
+        Stops the scheduler once the current run, if any, has finished
+        """
+        self._stopped.set()
+
+    def next_delay(self, started: float) -> float:
+        """
+        Gets the delay before the next run
+        :param started: time.monotonic() when the previous run started
+        :type started: float
+        :return: The delay in seconds
+        :rtype: float
+        """
+        return max(0.0, self.interval - (time.monotonic() - started)) + self._random.uniform(0, self.jitter)
+
+    def run(self, job: Callable[[], None], runs: int = None) -> int:
+        """
+        Runs the job on the schedule until stopped. Exceptions raised by the job are not caught.
+        :param job: The job to run, taking no arguments
+        :type job: Callable
+        :param runs: Optional maximum number of runs
+        :type runs: int
+        :return: The number of runs completed
+        :rtype: int
+        """
+        completed = 0
+        delay = self._random.uniform(0, self.jitter)
+        while not self._stopped.wait(delay):
+            started = time.monotonic()
+            job()
+            completed += 1
+            if runs is not None and completed >= runs:
+                break
+            delay = self.next_delay(started)
+            logger.info("Next run in %.1f seconds", delay)
+        return completed
+
+    def _handle_signal(self, signum: int, _) -> None:
+        if self.stopped:
+            # A second signal while waiting for the current run to finish stops straight away
+            raise SystemExit(128 + signum)
+        logger.info("Received %s, stopping after the current run", signal.Signals(signum).name)
+        self.stop()
+
+    def install_signal_handlers(self, signals: tuple = STOP_SIGNALS) -> dict:
+        """
+        Stops the scheduler gracefully when one of the given signals is received, a second signal exits immediately.
+        Must be called from the main thread.
+        :param signals: The signals to handle, SIGTERM and SIGINT by default
+        :type signals: tuple
+        :return: A dictionary of signal to the previous handler, to restore with restore_signal_handlers
+        :rtype: dict
+        """
+        return {signum: signal.signal(signum, self._handle_signal) for signum in signals}
+
+
+def restore_signal_handlers(handlers: dict) -> None:
+    """
+    Restores the signal handlers replaced by Scheduler.install_signal_handlers
+    :param handlers: A dictionary of signal to handler
+    :type handlers: dict
+    """
+    for signum, handler in handlers.items():
+        signal.signal(signum, handler)
@@ -0,0 +1,132 @@
+"""
+Pluggable JSON serializers for request and response bodies, using orjson or ujson when installed
+"""
+import json
+from collections import namedtuple
+
+from outages_processor.constants import JSON_BACKEND
+from outages_processor.utils.logging import get_logger
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson support is optional
+    orjson = None
+
+try:
+    import ujson
+except ImportError:  # pragma: no cover - ujson support is optional
+    ujson = None
+
+
+logger = get_logger(__name__)
+
+AUTO = "auto"
+ORJSON = "orjson"
+UJSON = "ujson"
+STDLIB = "json"
+
+
+class Serializer(namedtuple("_Serializer", ("name", "dumps", "loads"))):
+    """
+    Container class for a JSON backend.
+    dumps encodes an object as compact UTF-8 JSON bytes and loads parses JSON from bytes or str, without decoding
+    bytes to str first.
+    """
+
+
+def _stdlib_dumps(obj) -> bytes:
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def _ujson_dumps(obj) -> bytes:
+    return ujson.dumps(obj, ensure_ascii=False, escape_forward_slashes=False).encode("utf-8")
+
+
+def _create_serializers() -> dict:
+    serializers = {STDLIB: Serializer(STDLIB, _stdlib_dumps, json.loads)}
+    if ujson is not None:
+        serializers[UJSON] = Serializer(UJSON, _ujson_dumps, ujson.loads)
+    if orjson is not None:
+        serializers[ORJSON] = Serializer(ORJSON, orjson.dumps, orjson.loads)
+    return serializers
+
+
+_serializers = _create_serializers()
+
+
+def available_backends() -> tuple:
+    """
+    Gets the JSON backends which can be used, fastest first
+    :return: The names of the available backends
+    :rtype: tuple
+    """
+    return tuple(backend for backend in (ORJSON, UJSON, STDLIB) if backend in _serializers)
+
+
+def resolve_backend(backend: str) -> Serializer:
+    """
+    Resolves a configured JSON backend to a serializer.
+    auto picks the fastest installed backend, and orjson or ujson fall back to the standard library json module if
+    they are not installed.
+    :param backend: The configured backend, one of auto, orjson, ujson or json
+    :type backend: str
+    :return: The serializer to use
+    :rtype: Serializer
+    :raises ValueError: If the backend is not supported
+    """
+    backend = (backend or AUTO).lower()
+    if backend == AUTO:
+        return _serializers[available_backends()[0]]
+    if backend not in (ORJSON, UJSON, STDLIB):
+        raise ValueError(f"Unsupported JSON backend: {backend}")
+    if backend not in _serializers:
+        logger.warning("JSON backend %s requested but it is not installed, falling back to json", backend)
+        return _serializers[STDLIB]
+    return _serializers[backend]
+
+
+_serializer = resolve_backend(JSON_BACKEND)
+
+
+def get_serializer() -> Serializer:
+    """
+    Gets the serializer used for API request and response bodies
+    :return: The current serializer
+    :rtype: Serializer
+    """
+    return _serializer
+
+
+def set_serializer(backend: str) -> Serializer:
+    """
+    Sets the serializer used for API request and response bodies, see resolve_backend
+    :param backend: The backend to use, one of auto, orjson, ujson or json
+    :type backend: str
+    :return: The previous serializer
+    :rtype: Serializer
+    :raises ValueError: If the backend is not supported
+    """
+    global _serializer  # pylint: disable=global-statement
+    previous, _serializer = _serializer, resolve_backend(backend)
+    logger.debug("Using the %s JSON backend", _serializer.name)
+    return previous
+
+
+def dumps(obj) -> bytes:
+    """
+    Encodes an object as compact JSON with the current serializer
+    :param obj: A JSON serialisable object
+    :return: The UTF-8 encoded JSON
+    :rtype: bytes
+    """
+    return _serializer.dumps(obj)
+
+
+def loads(data):
+    """
+    Parses JSON with the current serializer
+    :param data: The JSON document, as bytes or str
+    :return: The parsed object
+    :raises ValueError: If the document is not valid JSON
+    """
+    return _serializer.loads(data)
@@ -0,0 +1,97 @@
+"""
+Runs the stages of the pipeline as a small dependency graph, so stages which do not depend on each other, such as
+fetching the outages and fetching the site information, run concurrently
+"""
+import concurrent.futures
+import threading
+from typing import Callable
+
+
+class _Stage:
+    """
+    A stage waiting for its dependencies, submitted to the graph's executor once the last of them completes
+    """
+    def __init__(self, graph: "StageGraph", function: Callable, dependencies: tuple):
+        self.graph = graph
+        self.function = function
+        self.dependencies = dependencies
+        self.future = concurrent.futures.Future()
+        self._pending = len(dependencies)
+        self._lock = threading.Lock()
+
+    def dependency_done(self, _) -> None:
+        """
+        Called as each dependency completes, starts the stage after the last one
+        """
+        with self._lock:
+            self._pending -= 1
+            ready = not self._pending
+        if ready:
+            self.start()
+
+    def start(self) -> None:
+        """
+        Submits the stage, or fails it straight away with the error of the first dependency which failed
+        """
+        for dependency in self.dependencies:
+            if dependency.exception() is not None:
+                self.future.set_exception(dependency.exception())
+                return
+        self.graph.executor.submit(self.run)
+
+    def run(self) -> None:
+        """
+        Runs the stage with the results of its dependencies, setting the result or error on its future
+        """
+        try:
+            self.future.set_result(self.function(*(dependency.result() for dependency in self.dependencies)))
+        except BaseException as exc:  # pylint: disable=broad-except
+            # Any error, including OutagesProcessorError which derives from BaseException, is raised by result()
+            self.future.set_exception(exc)
+
+
+class StageGraph:
+    """
+    Runs stages on a thread pool, each starting as soon as the stages it depends on have completed and taking their
+    results as arguments. A stage whose dependency failed is not run, and fails with the same error.
+    Use as a context manager, which waits for every stage to complete on exit.
+    """
+    def __init__(self, max_workers: int):
+        """
+        :param max_workers: Maximum number of stages to run at once
+        :type max_workers: int
+        """
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=max(1, max_workers))
+        self._futures = []
+
+    def add(self, function: Callable, *dependencies: concurrent.futures.Future) -> concurrent.futures.Future:
+        """
+        Adds a stage to the graph
+        :param function: The stage, called with the result of each dependency in the order given
+        :type function: Callable
+        :param dependencies: Futures of the stages this stage depends on, as returned by add
+        :return: A future for the result of the stage
+        :rtype: concurrent.futures.Future
+        """
+        stage = _Stage(self, function, dependencies)
+        self._futures.append(stage.future)
+        if not dependencies:
+            stage.start()
+        for dependency in dependencies:
+            dependency.add_done_callback(stage.dependency_done)
+        return stage.future
+
+    def wait(self) -> None:
+        """
+        Waits for every stage added so far to complete, whether it succeeded or failed
+        """
+        concurrent.futures.wait(self._futures)
+
+    def __enter__(self) -> "StageGraph":
+        return self
+
+    def __exit__(self, *exc_info):
+        # Stages are submitted as their dependencies complete, so wait for them all before shutting the pool down
+        self.wait()
+        self.executor.shutdown()
+        return False
@@ -0,0 +1,107 @@
+"""
+Helpers for parsing and comparing the timestamps used by the outages API
+"""
+import datetime
+import re
+from typing import Callable
+
+import iso8601
+
+
+_EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+_MILLISECOND = datetime.timedelta(milliseconds=1)
+# The shape the API uses for all timestamps, e.g. 2022-05-23T12:21:27.377Z
+_API_FORMAT_MATCH = re.compile(r"\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d\.\d{3}Z\Z").match
+
+
+def is_api_format(value: str) -> bool:
+    """
+    Checks whether a timestamp is in the fixed YYYY-MM-DDTHH:MM:SS.sssZ format used by the API
+    :param value: The timestamp to check
+    :type value: str
+    :return: True if the timestamp is in the API format
+    :rtype: bool
+    """
+    return isinstance(value, str) and _API_FORMAT_MATCH(value) is not None
+
+
+def parse_timestamp(value: str) -> datetime.datetime:
+    """
+    Parses a timestamp into a timezone aware datetime.
+    Timestamps in the API format are parsed on a fast path, anything else falls back to iso8601.
+    :param value: The timestamp to parse
+    :type value: str
+    :return: The parsed datetime
+    :rtype: datetime.datetime
+    :raises iso8601.ParseError: If the timestamp is not a valid ISO 8601 timestamp
+    """
+    if is_api_format(value):
+        return datetime.datetime.fromisoformat(value[:23]).replace(tzinfo=datetime.timezone.utc)
+    return iso8601.parse_date(value)
+
+
+def format_timestamp(value: datetime.datetime, round_up: bool = False) -> str:
+    """
+    Formats a datetime as a normalised UTC timestamp in the API format.
+    Timestamps in this format sort in the same order as the datetimes they represent, so can be compared as strings.
+    :param value: The datetime to format, a naive datetime is assumed to be in local time
+    :type value: datetime.datetime
+    :param round_up: Set to True to round sub-millisecond values up rather than down, so that comparisons against
+    millisecond precision timestamps give the same result as comparing against the datetime itself
+    :type round_up: bool
+    :return: The formatted timestamp
+    :rtype: str
+    """
+    value = value.astimezone(datetime.timezone.utc)
+    if round_up and value.microsecond % 1000:
+        value += datetime.timedelta(microseconds=1000 - value.microsecond % 1000)
+    return (f"{value.year:04d}-{value.month:02d}-{value.day:02d}T"
+            f"{value.hour:02d}:{value.minute:02d}:{value.second:02d}.{value.microsecond // 1000:03d}Z")
+
+
+def to_epoch_ms(value: datetime.datetime, round_up: bool = False) -> int:
+    """
+    Converts a datetime to integer milliseconds since the Unix epoch
+    :param value: The datetime to convert, a naive datetime is assumed to be in local time
+    :type value: datetime.datetime
+    :param round_up: Set to True to round sub-millisecond values up rather than down, see format_timestamp
+    :type round_up: bool
+    :return: Milliseconds since the epoch
+    :rtype: int
+    """
+    delta = value.astimezone(datetime.timezone.utc) - _EPOCH
+    return -(-delta // _MILLISECOND) if round_up else delta // _MILLISECOND
+
+
+def from_epoch_ms(value: int) -> datetime.datetime:
+    """
+    Converts integer milliseconds since the Unix epoch to a UTC datetime
+    :param value: Milliseconds since the epoch
+    :type value: int
+    :return: The timezone aware datetime
+    :rtype: datetime.datetime
+    """
+    return _EPOCH + value * _MILLISECOND
+
+
+def begins_at_or_after(datetime_earliest: datetime.datetime, compare_strings: bool = False) -> Callable[[str], bool]:
+    """
+    Builds a predicate which checks whether a timestamp is at or after the given datetime
+    :param datetime_earliest: The datetime to compare against
+    :type datetime_earliest: datetime.datetime
+    :param compare_strings: Set to True to compare timestamps in the API format directly against the normalised
+    datetime as strings, without building datetime objects. Other timestamps are still parsed.
+    :type compare_strings: bool
+    :return: A function taking a timestamp and returning True if it is at or after the given datetime
+    :rtype: Callable
+    """
+    if not compare_strings:
+        return lambda value: parse_timestamp(value) >= datetime_earliest
+
+    cutoff = format_timestamp(datetime_earliest, round_up=True)
+
+    def predicate(value: str) -> bool:
+        if is_api_format(value):
+            return value >= cutoff
+        return iso8601.parse_date(value) >= datetime_earliest
+    return predicate
@@ -0,0 +1,205 @@
+"""
+Per-site high-water marks, persisted to a local state file, so that runs only upload new or changed outages
+"""
+import hashlib
+import json
+import os
+import threading
+from collections import namedtuple
+from typing import Iterable, Iterator
+
+from outages_processor.utils.errors import StateError
+from outages_processor.utils.files import write_atomically
+from outages_processor.utils.logging import get_logger
+from outages_processor.utils.timestamps import format_timestamp, is_api_format, parse_timestamp
+
+
+logger = get_logger(__name__)
+
+STATE_VERSION = 1
+
+
+class SiteWatermark(namedtuple("_SiteWatermark", ("begin", "end", "upload_digest", "outages"),
+                               defaults=("", "", "", {}))):
+    """
+    Container class for the high-water mark of a site.
+    begin and end are the latest begin and end times processed, as normalised UTC timestamps. upload_digest is a hash
+    of the last upload and outages holds a content hash for each outage at the high-water mark, keyed by outage_key.
+    """
+
+
+def normalise_timestamp(value: str) -> str:
+    """
+    Normalises a timestamp so that it can be compared with others as a string
+    :param value: The timestamp to normalise
+    :type value: str
+    :return: The timestamp as a UTC timestamp in the API format
+    :rtype: str
+    """
+    return value if is_api_format(value) else format_timestamp(parse_timestamp(value))
+
+
+def outage_key(outage: dict) -> str:
+    """
+    Gets the key identifying an outage, the combination of its device ID and begin time
+    :param outage: The outage
+    :type outage: dict
+    :return: The key
+    :rtype: str
+    """
+    return f"{outage.get('id')}|{outage.get('begin')}"
+
+
+def _outage_fields(outage) -> dict:
+    """
+    Gets the fields of an outage which json cannot serialize itself, e.g. an OutageRecord
+    """
+    if hasattr(outage, "to_dict"):
+        return outage.to_dict()
+    raise TypeError(f"Object of type {type(outage).__name__} is not an outage")
+
+
+def outage_digest(outage: dict) -> str:
+    """
+    Gets a content hash of an outage, which changes if any of its fields change.
+    A record gives the same hash as the same outage as a dict, see outages_processor.api.records.
+    :param outage: The outage, as a dict or a record
+    :type outage: dict
+    :return: The hash as a hex string
+    :rtype: str
+    """
+    serialized = json.dumps(outage, sort_keys=True, default=_outage_fields)
+    return hashlib.sha256(serialized.encode("utf-8")).hexdigest()[:16]
+
+
+class WatermarkTracker:
+    """
+    Selects the outages which are new or changed since a site's high-water mark, and tracks the new high-water mark.
+    An outage is new or changed if it began at or after the latest begin time processed, or ended at or after the
+    latest end time processed (e.g. an ongoing outage which has since been extended) or has no end time, and it is not
+    identical to the outage uploaded with the same key. Outages wholly before the high-water mark are assumed not to
+    have changed, unless they were kept with it, as ongoing outages are.
+    """
+    def __init__(self, watermark: SiteWatermark = None):
+        """
+        :param watermark: The high-water mark from the previous run, or None to select every outage
+        :type watermark: SiteWatermark
+        """
+        self.previous = watermark or SiteWatermark()
+        self._begin = self.previous.begin
+        self._end = self.previous.end
+        self._candidates = []
+        self._upload_hash = hashlib.sha256()
+
+    def select(self, outages: Iterable[dict]) -> Iterator[dict]:
+        """
+        Yields the outages which are new or changed, consuming them one at a time
+        :param outages: The outages for the site
+        :type outages: Iterable
+        :return: An iterator over the new or changed outages
+        :rtype: Iterator
+        """
+        for outage in outages:
+            begin = normalise_timestamp(outage.get("begin"))
+            # An outage without an end is ongoing, so can still change and is always considered, without moving the
+            # end high-water mark
+            end = outage.get("end")
+            end = normalise_timestamp(end) if end is not None else None
+            key = outage_key(outage)
+            # Outages kept with the previous high-water mark, such as ongoing outages, are compared even once they
+            # fall before it, so an ongoing outage which has since ended is selected
+            if begin < self.previous.begin and end is not None and end < self.previous.end \
+                    and key not in self.previous.outages:
+                continue
+            digest = outage_digest(outage)
+            self._begin = max(self._begin, begin)
+            if end is not None:
+                self._end = max(self._end, end)
+            self._candidates.append((begin, end, key, digest))
+            if self.previous.outages.get(key) != digest:
+                self._upload_hash.update(digest.encode("ascii"))
+                yield outage
+
+    @property
+    def watermark(self) -> SiteWatermark:
+        """
+        :return: The high-water mark after the outages selected so far
+        :rtype: SiteWatermark
+        """
+        return SiteWatermark(
+            begin=self._begin,
+            end=self._end,
+            upload_digest=self._upload_hash.hexdigest(),
+            # Only outages at the new high-water mark can be selected again by the next run
+            outages={
+                key: digest for begin, end, key, digest in self._candidates
+                if begin >= self._begin or end is None or end >= self._end
+            },
+        )
+
+
+class WatermarkStore:
+    """
+    Thread-safe store of per-site high-water marks, backed by a JSON state file
+    """
+    def __init__(self, path: str):
+        """
+        :param path: Path of the state file, which is created on first save if it does not exist
+        :type path: str
+        :raises StateError: If the state file exists but cannot be read
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._sites = self._load()
+
+    def _load(self) -> dict:
+        if not os.path.exists(self.path):
+            logger.debug("No state file found at %s, processing all outages", self.path)
+            return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as file_handle:
+                state = json.load(file_handle)
+            return {site_name: SiteWatermark(**watermark) for site_name, watermark in state["sites"].items()}
+        except (OSError, ValueError, KeyError, TypeError) as exc:
+            raise StateError(f"Failed to read state file {self.path}") from exc
+
+    def get(self, site_name: str) -> SiteWatermark:
+        """
+        Gets the high-water mark of a site
+        :param site_name: The name of the site
+        :type site_name: str
+        :return: The high-water mark, or None if the site has not been processed before
+        :rtype: SiteWatermark
+        """
+        with self._lock:
+            return self._sites.get(site_name)
+
+    def tracker(self, site_name: str) -> WatermarkTracker:
+        """
+        Creates a tracker for selecting the new or changed outages of a site
+        :param site_name: The name of the site
+        :type site_name: str
+        :return: A tracker starting from the site's high-water mark
+        :rtype: WatermarkTracker
+        """
+        return WatermarkTracker(self.get(site_name))
+
+    def update(self, site_name: str, watermark: SiteWatermark) -> None:
+        """
+        Sets the high-water mark of a site and saves the state file.
+        The file is replaced atomically so a failed save never leaves it corrupted.
+        :param site_name: The name of the site
+        :type site_name: str
+        :param watermark: The new high-water mark
+        :type watermark: SiteWatermark
+        :raises StateError: If the state file cannot be written
+        """
+        with self._lock:
+            self._sites[site_name] = watermark
+            state = {
+                "version": STATE_VERSION,
+                "sites": {name: site_watermark._asdict() for name, site_watermark in self._sites.items()},
+            }
+            write_atomically(self.path,
+                             lambda file_handle: json.dump(state, file_handle, indent=2, sort_keys=True),
+                             description="state file")
@@ -11,12 +11,29 @@ REQUIREMENTS = [
 ]
 
 EXTRA_REQUIREMENTS = {
+    "aio": [
+        "aiohttp",
+    ],
+    "columnar": [
+        "numpy",
+    ],
+    "json": [
+        "orjson",
+    ],
     "test": [
+        "aiohttp",
         "httpretty",
+        "numpy",
+        "orjson",
         "pylint",
         "pytest",
         "pytest-cov",
         "tox",
+        "ujson",
+        "zstandard",
+    ],
+    "zstd": [
+        "zstandard",
     ],
 }
 